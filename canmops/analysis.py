@@ -55,6 +55,103 @@ class Analysis(object):
         # convert int to hexadecimal
         hex_num = hex(num)
         return(num)
+
+class AdcConverter(object):
+    '''
+    Conversion of the MOPS ADC values with one lookup table of 4096 entries per channel
+    > The tables are computed once from the channel types, the Hardware section and the chip calibration
+    > LUT[channel, code] = (calib_a * code + calib_b) * ref_voltage/4096 * resistor_ratio [* adc_gain + adc_offset]
+    > A whole sweep [or a whole file] is converted with one NumPy indexing operation
+    > Codes outside of [0, 4095] are converted to NaN
+    Example:
+    converter = AdcConverter.from_config(dev, ref_voltage = 0.85)
+    values = converter.convert(raw) # raw: (..., n_channels) array in the order of adc_channels_reg
+    '''
+    def __init__(self, channels, channel_types=None, ref_voltage=None, resistor_ratio=None,
+                 calib_a=1.0, calib_b=0.0, adc_gain=1.0, adc_offset=0.0, bits=12):
+        self.channels = np.asarray([int(c) for c in channels])
+        self.channel_types = list(channel_types) if channel_types is not None else ["V"] * len(self.channels)
+        self.ref_voltage = ref_voltage
+        self.resistor_ratio = resistor_ratio
+        self.size = 2**bits
+        self.__row = {int(c): r for r, c in enumerate(self.channels)}
+        # Lookup of the table row of a channel number
+        self.__channel_row = np.full(int(self.channels.max()) + 1 if len(self.channels) else 1, -1, dtype=np.intp)
+        self.__channel_row[self.channels] = np.arange(len(self.channels))
+        codes = np.arange(self.size, dtype=np.float64)
+        ratio = np.broadcast_to(np.asarray(resistor_ratio, dtype=np.float64), (len(self.channels),))
+        scale = np.array([ref_voltage / self.size * r if t in ["V", "T"] else 1.0
+                          for t, r in zip(self.channel_types, ratio)])
+        self.lut = ((calib_a * codes[np.newaxis, :] + calib_b) * scale[:, np.newaxis]) * adc_gain + adc_offset
+        # The last column holds NaN for the codes outside of the ADC range
+        self.lut = np.concatenate([self.lut, np.full((len(self.channels), 1), np.nan)], axis=1)
+
+    @classmethod
+    def from_config(cls, dev, ref_voltage=None, resistor_ratio=None, chipId=None, calibration_file=None, apply_gain=False):
+        '''
+        Build the converter of the ADC channels of a device yaml file [e.g. mops_config.yml]
+        > ref_voltage and resistor_ratio default to the Hardware section
+        > calibration_file is a csv file with the columns chip, calib_a, calib_b [e.g. adc_calibration.csv], one row per chip
+        > adc_gain and adc_offset of the Hardware section are only applied with apply_gain = True
+        '''
+        hardware = dev["Hardware"]
+        adc_channels_reg = dev["adc_channels_reg"]["adc_channels"]
+        calib_a, calib_b = 1.0, 0.0
+        if calibration_file is not None:
+            chipId = chipId if chipId is not None else dev["Application"].get("chipId")
+            calib_a, calib_b = cls.read_calibration(calibration_file, chipId)
+        return cls(channels=list(adc_channels_reg), channel_types=list(adc_channels_reg.values()),
+                   ref_voltage=ref_voltage if ref_voltage is not None else hardware["ref_voltage"],
+                   resistor_ratio=resistor_ratio if resistor_ratio is not None else hardware["resistor_ratio"],
+                   calib_a=calib_a, calib_b=calib_b,
+                   adc_gain=hardware.get("adc_gain", 1.0) if apply_gain else 1.0,
+                   adc_offset=hardware.get("adc_offset", 0.0) if apply_gain else 0.0)
+
+    @staticmethod
+    def read_calibration(calibration_file, chipId):
+        '''
+        Return (calib_a, calib_b) of the chip from the calibration file [(1, 0) if the chip is not listed]
+        > ValueError if the chip has several rows with different constants
+        '''
+        calibration = np.genfromtxt(calibration_file, delimiter=",", names=True, ndmin=1)
+        rows = calibration[calibration["chip"] == int(chipId)] if chipId is not None else calibration[:0]
+        if len(rows) == 0:
+            return 1.0, 0.0
+        constants = {(float(a), float(b)) for a, b in zip(rows["calib_a"], rows["calib_b"])}
+        if len(constants) > 1:
+            raise ValueError(f"Chip {chipId} has {len(rows)} conflicting rows in {calibration_file}: {sorted(constants)}")
+        return constants.pop()
+
+    def _codes(self, raw):
+        raw = np.asarray(raw)
+        valid = (raw >= 0) & (raw < self.size)
+        return np.where(valid, raw, self.size).astype(np.intp)
+
+    def convert(self, raw, channels=None):
+        '''
+        Convert an array of ADC codes
+        > channels = None: the last axis of raw follows the channel order of the converter
+        > otherwise channels holds the channel number of each code [same shape as raw]
+        '''
+        codes = self._codes(raw)
+        if channels is None:
+            return self.lut[np.arange(len(self.channels)), codes]
+        return self.lut[self.__channel_row[np.asarray(channels, dtype=np.intp)], codes]
+
+    def convert_one(self, channel, raw):
+        '''
+        Convert one ADC code of a channel [None stays None]
+        '''
+        if raw is None:
+            return None
+        raw = int(raw)
+        return float(self.lut[self.__row[int(channel)], raw if 0 <= raw < self.size else self.size])
+
+    def convert_rows(self, rows):
+        '''
+        Convert a structured array with the fields channel and raw [e.g. a table of H5Store]
+        '''
+        return self.convert(rows["raw"], channels=rows["channel"])
     
 if __name__ == "__main__":
         pass
@@ -13,6 +13,7 @@ import os
 import yaml
 import numpy as np
 import pandas as pd
+import tables as tb
 import csv
 from pathlib import Path
 import coloredlogs as cl
@@ -28,7 +28,13 @@ lib_dir = rootdir[:-8]
 config_file = "socketcan_CANSettings.yml"
 
 class CanConfig(WATCHCan):
-    """description of class"""
+    """Settings and SocketCAN buses of all the channels of a *_CANSettings.yml file
+
+    The channels are kept in registries keyed by the channel number [channel0..channelN sections
+    of the file], ``ch0``/``ch1``, ``can_0_settings``/``can_1_settings`` and ``_busOn0``/``_busOn1``
+    are aliases of the first two channels. The link monitor [:class:`WATCHCan`] is only started
+    if ``link_monitor: true`` is set in the file or :meth:`start_link_monitor` is called.
+    """
     def __init__(self, file='socketcan_CANSettings.yml', directory=config_dir):
 
         WATCHCan.__init__(self)
@@ -37,65 +43,93 @@ class CanConfig(WATCHCan):
         self.logger = log_call.setup_main_logger()
         
         _canSettings = AnalysisUtils().open_yaml_file(file=self._file, directory=self._directory)
-        self._can_channels = list(_canSettings)[1:]#['channel0', 'channel1']
+        self._can_channels = [ch for ch in list(_canSettings)[1:] if isinstance(_canSettings[ch], dict)]#['channel0', 'channel1', ...]
         self._can_settings_attr = ['bitrate', 'channel', 'samplePoint', 'SJW', 'tseg1', 'tseg2', 'ipAddress', 'timeout']
 
-        self.can_0_settings = {}
-        self.can_1_settings = {}
+        """:obj:`dict` : Settings of each channel keyed by the channel number"""
+        self.can_settings = {}
+        """:obj:`dict` : Bus of each channel keyed by the channel number"""
+        self.buses = {}
+        """:obj:`dict` : Bus state of each channel keyed by the channel number"""
+        self.bus_on = {}
        
         self._interface = _canSettings['CAN_Interfaces']
+        """:obj:`bool` : Start the link monitor with the module [``link_monitor`` of the file, default off]"""
+        self.link_monitor = bool(_canSettings.get('link_monitor', False))
         self.sem_read_block = threading.Semaphore(value=0)
         self.sem_recv_block = threading.Semaphore(value=0)
         self.sem_config_block = threading.Semaphore()
-        self.ch0 = None
-        self.ch1 = None
-        self._busOn0 = False
-        self._busOn1 = False
         can.util.set_logging_level('warning')
 
         for channel in self._can_channels:
-            for value in _canSettings[channel]:
-                
-                if channel == self._can_channels[0]:
-                    self.can_0_settings[f'{value}'] = _canSettings[channel][f'{value}']
-                else:
-                    self.can_1_settings[f'{value}'] = _canSettings[channel][f'{value}']
+            settings = {f'{value}': _canSettings[channel][f'{value}'] for value in _canSettings[channel]}
+            self.can_settings[settings['channel']] = settings
+            self.buses[settings['channel']] = None
+            self.bus_on[settings['channel']] = False
+        self._channel_numbers = list(self.can_settings)
+        # The link monitor watches every configured channel and restarts the channels going down
+        self.set_interfaces([f"can{channel}" for channel in self._channel_numbers])
+        self.watchdog_notifier.subscribe("restart bus_channel", self.restart_channel_connection)
+
+    def start_link_monitor(self):
+        """Start the link monitor of the channels [once, further calls are ignored]"""
+        if self.ident is None:
+            self.logger.info(f'Starting the link monitor of {", ".join(self.interfaces)}')
+            self.start()
+
+    def _nth_channel(self, n):
+        return self._channel_numbers[n] if len(self._channel_numbers) > n else None
+
+    @property
+    def can_0_settings(self):
+        return self.can_settings.get(self._nth_channel(0), {})
+
+    @property
+    def can_1_settings(self):
+        return self.can_settings.get(self._nth_channel(1), {})
+
+    @property
+    def ch0(self):
+        return self.buses.get(self._nth_channel(0))
+
+    @property
+    def ch1(self):
+        return self.buses.get(self._nth_channel(1))
+
+    @property
+    def _busOn0(self):
+        return self.bus_on.get(self._nth_channel(0), False)
+
+    @property
+    def _busOn1(self):
+        return self.bus_on.get(self._nth_channel(1), False)
+
+    def channels(self):
+        """Numbers of the configured channels"""
+        return list(self._channel_numbers)
+
+    def get_bus(self, channel: int):
+        """Return the bus of the channel, (re)connecting it if it is not on"""
+        if channel not in self.can_settings:
+            self.logger.error(f"Channel {channel} is not configured in {self._file}")
+            return None
+        if not self.bus_on[channel]:
+            self.restart_channel_connection(channel)
+        return self.buses[channel]
 
     def send(self, channel: int, msg: can.message, timeout: int):
         try:
-            if channel == self.can_0_settings['channel']:
-                if self._busOn0 is True:
-                    self.ch0.send(msg, timeout)
-                else:
-                    self.restart_channel_connection(channel)
-                    self.ch0.send(msg, timeout)
-            elif channel == self.can_1_settings['channel']:
-                if self._busOn1 is True:
-                    self.ch1.send(msg, timeout)
-                else:
-                    self.restart_channel_connection(channel)
-                    self.ch1.send(msg, timeout)
+            bus = self.get_bus(channel)
+            if bus is not None:
+                bus.send(msg, timeout)
         except can.CanError:
             return can.CanError
 
     def receive(self, channel: int):
         try:
-            if channel == self.can_0_settings['channel']:
-                if self._busOn0 is True:
-                    frame = self.ch0.recv(0.0)
-                    return frame
-                else:
-                    self.restart_channel_connection(channel)
-                    frame = self.ch0.recv(0.0)
-                    return frame
-            elif channel == self.can_1_settings['channel']:
-                if self._busOn1 is True:
-                    frame = self.ch1.recv(0.0)
-                    return frame
-                else:
-                    self.restart_channel_connection(channel)
-                    frame = self.ch0.recv(0.0)
-                    return frame
+            bus = self.get_bus(channel)
+            if bus is not None:
+                return bus.recv(0.0)
         except can.CanError:
             return can.CanError
 
@@ -104,60 +138,43 @@ class CanConfig(WATCHCan):
         self.sem_config_block.acquire()
         self.logger.info("Resetting CAN Interface")
         self.set_interface(interface)
-        if channel == self.can_0_settings['channel']:
-            if self._busOn0:
-                self.ch0.shutdown()
-                subprocess.Popen(["sudo", 'bash', 'can_setup.sh', "can0", f"{self.can_0_settings['bitrate']}",
-                                 f"{self.can_0_settings['tseg1']}", f"{self.can_0_settings['tseg2']}",
-                                 f"{self.can_0_settings['SJW']}", f"{self.can_0_settings['samplePoint']}"],
-                                cwd=lib_dir+"/"+config_dir)
-                # subprocess.call(['sh', './socketcan_wrapper_enable.sh', f"{self.can_0_settings['bitrate']}",
-                #                  f"{self.can_0_settings['samplePoint']}",f"{self.can_0_settings['SJW']}",f"{self.can_0_settings['channel']}","can",
-                #                  f"{self.can_0_settings['tseg1']}", f"{self.can_0_settings['tseg2']}"],
-                #                  cwd=lib_dir+"/canmops")
-                # os.system(". " + lib_dir+"/canmops" + "/socketcan_wrapper_enable.sh %s %s %s %s %s %s %s" % ( f"{self.can_0_settings['bitrate']}",
-                #                   f"{self.can_0_settings['samplePoint']}",f"{self.can_0_settings['SJW']}","can0","can",
-                #                   f"{self.can_0_settings['tseg1']}", f"{self.can_0_settings['tseg2']}"))
-            ch_set = self.set_channel_connection(self.can_0_settings['channel'],interface )
-        elif channel == self.can_1_settings['channel']:
-            if self._busOn1:
-                self.ch1.shutdown()
-            subprocess.call(['sh', './can_setup.sh', "can1", f"{self.can_1_settings['bitrate']}",
-                             f"{self.can_1_settings['tseg1']}", f"{self.can_1_settings['tseg2']}",
-                             f"{self.can_1_settings['SJW']}", f"{self.can_1_settings['samplePoint']}"],
+        ch_set = None
+        if channel in self.can_settings:
+            settings = self.can_settings[channel]
+            if self.bus_on[channel]:
+                self.buses[channel].shutdown()
+                self.bus_on[channel] = False
+            subprocess.Popen(["sudo", 'bash', 'can_setup.sh', f"can{channel}", f"{settings['bitrate']}",
+                             f"{settings['tseg1']}", f"{settings['tseg2']}",
+                             f"{settings['SJW']}", f"{settings['samplePoint']}"],
                             cwd=lib_dir+"/"+config_dir)
-            ch_set = self.set_channel_connection(self.can_1_settings['channel'])
+            ch_set = self.set_channel_connection(channel, interface)
+        else:
+            self.logger.error(f"Setup of Channel {channel} did not worked because of missing reference in dict")
 
         self.logger.info(f"Channel {channel} is set")
         self.sem_config_block.release()
         self.logger.info("Resetting of CAN Interface finished. Returning to communication.")
         return ch_set
     
-    def set_channel_connection(self, channel: int, interface : str):
+    def set_channel_connection(self, channel: int, interface : str = None):
         """Bind |CAN| socket
            Set the internal attribute for the |CAN| channel
            The function is important to initialise the channel
             """
+        ch_set = None
         try:
-            if channel == self.can_0_settings['channel']:
-                channel = "can" + str(self.can_0_settings['channel'])
-                self.ch0 = can.interface.Bus(bustype=self._interface, channel=channel,
-                                             bitrate=self.can_0_settings['bitrate'])
-                self.ch0.RECV_LOGGING_LEVEL = 0
-                self._busOn0 = True
-                self.logger.info(f'Setting of channel {channel} worked.')
-                ch_set = self.ch0
-            elif channel == self.can_1_settings['channel']:
-                channel = "can" + str(self.can_1_settings['channel'])
-                self.ch1 = can.interface.Bus(bustype=self._interface, channel=channel,
-                                             bitrate=self.can_1_settings['bitrate'])
-                self.ch1.RECV_LOGGING_LEVEL = 0
-                self._busOn1 = True
-                self.logger.info(f'Setting of channel {channel} worked.')
-                ch_set = self.ch1
+            if channel in self.can_settings:
+                name = "can" + str(channel)
+                bus = can.interface.Bus(bustype=self._interface, channel=name,
+                                        bitrate=self.can_settings[channel]['bitrate'])
+                bus.RECV_LOGGING_LEVEL = 0
+                self.buses[channel] = bus
+                self.bus_on[channel] = True
+                self.logger.info(f'Setting of channel {name} worked.')
+                ch_set = bus
             else:
                 self.logger.error(f"Setting of Channel {channel} did not worked because of missing reference in dict")
-                ch_set =  None
         except Exception as e:
             self.logger.exception(e)
             self.logger.error(f'Error by setting channel {channel}.')
@@ -171,15 +188,10 @@ class CanConfig(WATCHCan):
             this method is called automatically when the statement is exited.
             """
         self.logger.info(f'Going to stop channel {channel}')
-        if channel == self.can_0_settings['channel']:
-            if self._busOn0:
-                self.ch0.shutdown()
-                self._busOn0 = False
-                self.logger.info(f'Channel {channel} was stopped successful.')
-        elif channel == self.can_1_settings['channel']:
-            if self._busOn1:
-                self.ch1.shutdown()
-                self._busOn1 = False
+        if channel in self.can_settings:
+            if self.bus_on[channel]:
+                self.buses[channel].shutdown()
+                self.bus_on[channel] = False
                 self.logger.info(f'Channel {channel} was stopped successful.')
         else:
             self.logger.error(f"Stopping Channel {channel} did not worked because of missing reference in dict")
@@ -191,22 +203,16 @@ class CanConfig(WATCHCan):
         until the last handle to the channel goes off bus.
         """
         self.logger.info(f'Restarting Channel {channel}.')
-        if channel == self.can_0_settings['channel']:
-            if self._busOn0:
-                self.ch0.shutdown()
-                self.logger.info(f'Channel {channel} was stopped.')
-                self._busOn0 = False
-                self.set_channel_connection(channel)
-                self.logger.info(f'Reset of Channel {channel} finished.')
-        elif channel == self.can_1_settings['channel']:
-            if self._busOn1:
-                self.ch1.shutdown()
+        if channel in self.can_settings:
+            if self.bus_on[channel]:
+                self.buses[channel].shutdown()
                 self.logger.info(f'Channel {channel} was stopped.')
-                self._busOn1 = False
-                self.set_channel_connection(channel)
-                self.logger.info(f'Reset of Channel {channel} finished.')
+                self.bus_on[channel] = False
+            self.set_channel_connection(channel)
+            self.logger.info(f'Reset of Channel {channel} finished.')
         else:
             self.logger.error(f"Restart of Channel {channel} did not worked because of missing reference in dict")
+
     def set_interface(self, x):
         self.__interface = x
         
@@ -216,4 +222,5 @@ class CanConfig(WATCHCan):
         return self.__interface
 
 can_config = CanConfig()
-#can_config.watchdog_notifier.subscribe("restart Interface", can_config.can_setup)
+if can_config.link_monitor:
+    can_config.start_link_monitor()
@@ -0,0 +1,379 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+
+import os
+import time
+import logging
+from threading import Lock
+try:
+    from .logger_main import Logger
+    from .analysis_utils import AnalysisUtils
+    from .can_dispatcher import CanDispatcher
+    from .can_ring_buffer import CanRingBuffer
+    from .sdo_engine import SdoEngine
+    from .sdo_transfer import SdoTransfer
+    from .metrics import MetricCounter, MetricsRegistry
+    from .node_health import NodeHealth
+except (ImportError, ModuleNotFoundError):
+    from logger_main import Logger
+    from analysis_utils import AnalysisUtils
+    from can_dispatcher import CanDispatcher
+    from can_ring_buffer import CanRingBuffer
+    from sdo_engine import SdoEngine
+    from sdo_transfer import SdoTransfer
+    from metrics import MetricCounter, MetricsRegistry
+    from node_health import NodeHealth
+
+try:
+    import can
+except (ImportError, ModuleNotFoundError):
+    can = None
+try:
+    from canlib import canlib, Frame
+except (ImportError, ModuleNotFoundError):
+    canlib = None
+try:
+    import analib
+except (ImportError, ModuleNotFoundError):
+    analib = None
+
+log_call = Logger(name = "CAN Channel ",console_loglevel=logging.INFO, logger_file = False)
+
+rootdir = os.path.dirname(os.path.abspath(__file__))
+config_dir = "config_files/"
+lib_dir = rootdir[:-8]
+
+# Acceptance filters of the SocketCAN channels [primary channel of CanWrapper included]
+SOCKETCAN_FILTERS = [{"can_id": 0x000, "can_mask": 0xFFF},
+                     {"can_id": 0x500, "can_mask": 0xF60},
+                     {"can_id": 0x600, "can_mask": 0xF60},
+                     {"can_id": 0x700, "can_mask": 0xF60},
+                     {"can_id": 0x800, "can_mask": 0xF60}]
+KVASER_FILTERS = [{"can_id": 0x500, "can_mask": 0x540}]
+
+def channel_name(interface, channel):
+    """Name of a channel in the registry [e.g. can0, vcan1, Kvaser0, AnaGate2]"""
+    prefix = {"socketcan": "can", "virtual": "vcan", "virtual_bus": "vbus"}.get(interface, interface)
+    return f"{prefix}{channel}"
+
+class CanChannel(object):
+    """One |CAN| channel with its own receive thread and TX path
+
+    Every channel owns its bus handle, a :class:`CanDispatcher`, a :class:`CanRingBuffer`
+    of the received frames, a TX lock and its counters. It offers the same
+    ``dispatcher``, ``write_can_message``, ``read_can_message`` and ``cnt`` as :class:`CanWrapper`,
+    so an :class:`SdoEngine` can run directly on it [:attr:`sdo_engine`].
+    The primary channel of a :class:`CanWrapper` is one of them, the wrapper delegates its
+    transport [bus, receive thread and TX path] to it.
+
+    Parameters
+    ----------
+    interface : :obj:`str`
+        'socketcan', 'virtual' [SocketCAN vcan], 'virtual_bus' [in-process python-can bus], 'Kvaser' or 'AnaGate'
+    channel : :obj:`int`
+        Channel number of the interface [e.g. 1 for can1]
+    """
+
+    def __init__(self, interface, channel, bitrate=125000, sjw=4, tseg1=7, tseg2=8, ipAddress=None,
+                 filters=None, ring_capacity=4096):
+        self.logger = log_call.setup_main_logger()
+        self.interface = interface
+        self.channel = int(channel)
+        self.name = channel_name(interface, self.channel)
+        self.bitrate = bitrate
+        self.sjw = sjw
+        self.tseg1 = tseg1
+        self.tseg2 = tseg2
+        self.ipAddress = ipAddress
+        self.filters = list(filters) if filters is not None else list(SOCKETCAN_FILTERS)
+        self.bus = None
+        self.bus_on = False
+        self.cnt = MetricCounter()
+        self.ring = CanRingBuffer(capacity=ring_capacity)
+        self.__dispatcher = None
+        self.__txLock = Lock()
+        self.__readLock = Lock()
+        self.__rxObservers = []
+        self.__txObservers = []
+        self.__sdo_engine = None
+        self.__sdo_transfer = None
+        self.metrics = MetricsRegistry(self.cnt, labels={"channel": self.name})
+        self.metrics.add_gauge("dispatcher_queue_depth", self.dispatcher_qsize, "Frames waiting in the queue of the receive thread")
+        self.node_health = NodeHealth(self.cnt)
+        self.metrics.add_gauge("nodes_parked", lambda: len(self.node_health.parked()), "Nodes parked by the circuit breaker")
+
+    @classmethod
+    def from_settings(cls, interface, settings, **kwargs):
+        """Create a channel from one section [e.g. channel1] of a *_CANSettings.yml file"""
+        return cls(interface, settings["channel"],
+                   bitrate=settings.get("bitrate", 125000),
+                   sjw=settings.get("SJW", 4),
+                   tseg1=settings.get("tseg1", 7),
+                   tseg2=settings.get("tseg2", 8),
+                   ipAddress=settings.get("ipAddress"), **kwargs)
+
+    def __str__(self):
+        return f"{self.name} [{self.interface}], Bitrate:{self.bitrate}"
+
+    def open(self):
+        """Go in 'Bus On' state and start the receive thread"""
+        if self.bus_on:
+            return self
+        if self.interface == 'Kvaser':
+            canlib.initializeLibrary()
+            self.bus = canlib.openChannel(self.channel, canlib.canOPEN_ACCEPT_VIRTUAL)
+            self.bus.setBusOutputControl(canlib.Driver.NORMAL)
+            self.bus.setBusParams(freq=int(self.bitrate), sjw=int(self.sjw), tseg1=int(self.tseg1), tseg2=int(self.tseg2))
+            self.bus.busOn()
+            for filt in KVASER_FILTERS:
+                self.bus.canSetAcceptanceFilter(filt["can_id"], filt["can_mask"])
+        elif self.interface == 'AnaGate':
+            self.bus = analib.Channel(ipAddress=self.ipAddress, port=self.channel, baudrate=self.bitrate)
+        elif self.interface == 'virtual':
+            self.bus = can.interface.Bus(bustype="socketcan", channel=self.name)
+        elif self.interface == 'virtual_bus':
+            self.bus = can.interface.Bus(bustype="virtual", channel=self.name, receive_own_messages=False)
+        else:
+            self.bus = can.interface.Bus(bustype=self.interface, channel=self.name, bitrate=self.bitrate)
+            self.bus.set_filters(self.filters)
+        self.bus_on = True
+        self.start_dispatcher()
+        self.logger.success(f"Channel {self} is open")
+        return self
+
+    def close(self):
+        self.stop_dispatcher()
+        if self.bus is not None and self.bus_on:
+            try:
+                if self.interface == 'Kvaser':
+                    self.bus.busOff()
+                    self.bus.close()
+                elif self.interface == 'AnaGate':
+                    self.bus.close()
+                else:
+                    self.bus.shutdown()
+            except Exception as e:
+                self.logger.error(f"Closing channel {self.name} failed: {e}")
+        self.bus_on = False
+        self.cnt['Residual CAN messages'] = self.dispatcher_qsize()
+
+    def restart(self):
+        self.logger.warning(f"Restarting channel {self.name}")
+        self.close()
+        return self.open()
+
+    # Receive path
+    @property
+    def dispatcher(self):
+        """:class:`CanDispatcher` : Receive thread of the channel"""
+        return self.__dispatcher
+
+    def dispatcher_qsize(self):
+        return self.__dispatcher.qsize() if self.__dispatcher is not None else 0
+
+    def _read_frame(self, timeout):
+        if self.interface == 'Kvaser':
+            try:
+                with self.__readLock:
+                    frame = self.bus.read(int(timeout * 1000))
+            except canlib.CanNoMsg:
+                return None
+            return frame.id, frame.data, frame.dlc, frame.flags, frame.timestamp, None
+        elif self.interface == 'AnaGate':
+            cobid, data, dlc, flag, t = self.bus.getMessage()
+            if cobid == 0 and dlc == 0:
+                time.sleep(min(timeout, 0.001))
+                return None
+            return cobid, data, dlc, flag, t, None
+        frame = self.bus.recv(timeout)
+        if frame is None:
+            return None
+        return (frame.arbitration_id, frame.data, frame.dlc, frame.is_extended_id,
+                frame.timestamp, frame.is_error_frame)
+
+    def _monitor_frame(self, cobid, data, dlc, flag, t, error_frame):
+        """Observer of :class:`CanDispatcher` keeping the counters and the ring buffer :attr:`ring`"""
+        self.cnt.inc('rx_msg')
+        if cobid == 0x88:
+            self.cnt.inc('error_frame')
+        elif cobid == 0x3F3 and dlc == 1 and data[0] == 0x08:
+            self.cnt.inc('uC_error_counter')
+            self.logger.error(f'Received error message from Microcontroller with cobid:{hex(cobid)}')
+        elif 0x700 < cobid < 0x780:
+            self.cnt.inc('NMT_message')
+        self.ring.push(cobid, data, dlc, flag, t, error_frame)
+
+    @property
+    def read_lock(self):
+        """:class:`~threading.Lock` : Lock of the read operations on a Kvaser channel"""
+        return self.__readLock
+
+    def add_filters(self, cobids):
+        """Accept additional |COBID| in the acceptance filters of the channel [e.g. the TPDOs]"""
+        _filters = [{"can_id": cobid, "can_mask": 0x7FF} for cobid in cobids]
+        self.filters = self.filters + [f for f in _filters if f not in self.filters]
+        if not self.bus_on:
+            return
+        if self.interface == 'Kvaser':
+            # Kvaser has one acceptance filter for standard identifiers: open it
+            self.bus.canSetAcceptanceFilter(0, 0)
+        elif self.interface not in ['AnaGate', 'virtual', 'virtual_bus']:
+            self.bus.set_filters(self.filters)
+
+    def start_dispatcher(self):
+        self.stop_dispatcher()
+        fileno = None
+        if self.interface not in ['Kvaser', 'AnaGate']:
+            try:
+                fileno = self.bus.fileno()
+            except (AttributeError, NotImplementedError):
+                fileno = None
+            if fileno is not None and fileno < 0: fileno = None
+        self.__dispatcher = CanDispatcher(read_frame=self._read_frame, fileno=fileno, name=self.name)
+        self.__dispatcher.add_observer(self._monitor_frame)
+        for observer in self.__rxObservers:
+            self.__dispatcher.add_observer(observer)
+        self.__dispatcher.start()
+        return self.__dispatcher
+
+    def stop_dispatcher(self):
+        if self.__dispatcher is not None:
+            self.__dispatcher.stop()
+            self.__dispatcher = None
+
+    def add_frame_observer(self, observer, rx=True, tx=False):
+        """Call ``observer(cobid, data, dlc, flag, t, error_frame)`` for every received (rx) and/or transmitted (tx) frame"""
+        if rx:
+            self.__rxObservers = self.__rxObservers + [observer]
+            if self.__dispatcher is not None:
+                self.__dispatcher.add_observer(observer)
+        if tx:
+            self.__txObservers = self.__txObservers + [observer]
+
+    def remove_frame_observer(self, observer):
+        self.__rxObservers = [o for o in self.__rxObservers if o is not observer]
+        self.__txObservers = [o for o in self.__txObservers if o is not observer]
+        if self.__dispatcher is not None:
+            self.__dispatcher.remove_observer(observer)
+
+    # Transmit path
+    def send(self, cobid, data, dlc=8, flag=0):
+        """Send one frame. Thread-safe, only the senders of the same channel wait for each other.
+
+        Returns
+        -------
+        :obj:`int`
+            1 if the frame was sent, 0 otherwise
+        """
+        try:
+            with self.__txLock:
+                if self.interface == 'Kvaser':
+                    self.bus.write(Frame(id_=cobid, data=data, timestamp=None, dlc=dlc, flags=canlib.MessageFlag.STD))
+                elif self.interface == 'AnaGate':
+                    self.bus.write(cobid, data, flag)
+                else:
+                    self.bus.send(can.Message(arbitration_id=cobid, data=data, is_extended_id=False,
+                                              is_error_frame=False, dlc=dlc), 0.01)
+            self.cnt.inc('tx_msg')
+        except Exception:
+            self.cnt.inc('Not_active_bus')
+            self.logger.error(f"An Error occurred, The bus {self.name} is not active")
+            return 0
+        if self.__txObservers:
+            t = time.time()
+            for observer in self.__txObservers:
+                observer(cobid, data, dlc, flag, t, None)
+        return 1
+
+    async def write_can_message(self, cobid=None, data=[None], flag=0, dlc=8):
+        return self.send(cobid, data, dlc=dlc, flag=flag)
+
+    async def read_can_message(self, timeout=0.01):
+        """Read the next frame which was not routed to a waiter [same format as :meth:`CanWrapper.read_can_message`]"""
+        frame = await self.__dispatcher.get_async(timeout) if self.__dispatcher is not None else None
+        if frame is None:
+            return None, None, None, None, None, None, None, None
+        cobid, data, dlc, flag, t, error_frame = frame
+        return cobid, data, dlc, flag, 1, None, t, error_frame
+
+    @property
+    def sdo_engine(self):
+        """:class:`SdoEngine` : Pipelined |SDO| client running on this channel"""
+        if self.__sdo_engine is None:
+            self.__sdo_engine = SdoEngine(self)
+        return self.__sdo_engine
+
+    @property
+    def sdo_transfer(self):
+        """:class:`SdoTransfer` : Segmented and block |SDO| transfers on this channel"""
+        if self.__sdo_transfer is None:
+            self.__sdo_transfer = SdoTransfer(self)
+        return self.__sdo_transfer
+
+class CanChannelRegistry(object):
+    """Registry of the :class:`CanChannel` keyed by channel name [e.g. can0..canN]"""
+
+    def __init__(self, channels=None):
+        self.logger = log_call.setup_main_logger()
+        self._channels = {}
+        for channel in channels or []:
+            self.add(channel)
+
+    @classmethod
+    def from_settings_file(cls, interface, directory=None, file=None, **kwargs):
+        """Build the registry from all the channel sections [channel0, channel1, ...] of a *_CANSettings.yml file"""
+        directory = directory if directory is not None else os.path.join(lib_dir, config_dir)
+        file = file if file is not None else interface + "_CANSettings.yml"
+        _canSettings = AnalysisUtils().open_yaml_file(file=file, directory=directory)
+        registry = cls()
+        for section, settings in _canSettings.items():
+            if section.startswith("channel") and isinstance(settings, dict) and "channel" in settings:
+                registry.add(CanChannel.from_settings(interface, settings, **kwargs))
+        if not registry.names():
+            registry.logger.warning(f"No channel sections found in {os.path.join(directory, file)}")
+        return registry
+
+    def add(self, channel):
+        if channel.name in self._channels:
+            raise ValueError(f"Channel {channel.name} is already registered")
+        self._channels[channel.name] = channel
+        return channel
+
+    def remove(self, name):
+        channel = self._channels.pop(name)
+        channel.close()
+        return channel
+
+    def get(self, name, default=None):
+        return self._channels.get(name, default)
+
+    def __getitem__(self, name):
+        return self._channels[name]
+
+    def __contains__(self, name):
+        return name in self._channels
+
+    def __iter__(self):
+        return iter(list(self._channels.values()))
+
+    def names(self):
+        return list(self._channels)
+
+    def open_all(self):
+        for channel in self:
+            channel.open()
+        return self
+
+    def close_all(self):
+        for channel in self:
+            channel.close()
+
+    def statistics(self):
+        """Counters of every channel"""
+        return {channel.name: dict(channel.cnt) for channel in self}
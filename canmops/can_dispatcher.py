@@ -0,0 +1,332 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+
+import os
+import queue
+import asyncio
+import logging
+import selectors
+from collections import deque
+from threading import Thread, Event, Lock, Condition
+try:
+    from .logger_main import Logger
+except (ImportError, ModuleNotFoundError):
+    from logger_main import Logger
+
+log_call = Logger(name = "CAN Dispatch",console_loglevel=logging.INFO, logger_file = False)
+
+def _wake(loop, future, result=None):
+    """Resolve an :class:`asyncio.Future` of the event loop from the receive thread"""
+    def _set():
+        if not future.done():
+            future.set_result(result)
+    try:
+        loop.call_soon_threadsafe(_set)
+    except RuntimeError:
+        # The event loop is closed
+        pass
+
+class FrameWaiter(object):
+    """One-shot waiter for a frame with a given |COBID|. It is created by
+    :meth:`CanDispatcher.register_waiter` before the request is sent.
+
+    A thread waits with :meth:`wait`, a coroutine awaits :meth:`wait_async`
+    without blocking the event loop."""
+    __slots__ = ("cobids", "predicate", "frame", "_event", "_loop", "_future")
+
+    def __init__(self, cobids, predicate=None):
+        self.cobids = cobids
+        self.predicate = predicate
+        self.frame = None
+        self._event = Event()
+        self._loop = None
+        self._future = None
+
+    def accept(self, frame):
+        if self._event.is_set():
+            return False
+        if self.predicate is not None and not self.predicate(frame):
+            return False
+        self.frame = frame
+        self._set()
+        return True
+
+    def _set(self):
+        self._event.set()
+        if self._future is not None:
+            _wake(self._loop, self._future)
+
+    def wait(self, timeout=None):
+        """Return the frame ``(cobid, data, dlc, flag, t, error_frame)`` or ``None`` on timeout"""
+        self._event.wait(timeout)
+        return self.frame
+
+    async def wait_async(self, timeout=None):
+        """Same as :meth:`wait` for a coroutine. The receive thread resolves a future
+        of the running event loop, other coroutines run in the meantime."""
+        if not self._event.is_set():
+            self._loop = asyncio.get_running_loop()
+            self._future = self._loop.create_future()
+            # The frame may have been accepted before the future was set
+            if not self._event.is_set():
+                try:
+                    await asyncio.wait_for(self._future, timeout)
+                except asyncio.TimeoutError:
+                    pass
+        return self.frame
+
+    def release(self):
+        """Wake up the waiting thread without a frame [e.g. when the deadline of the request expired]"""
+        self._set()
+
+class AsyncFrameQueue(object):
+    """Queue of the frames routed to a coroutine [see :meth:`CanDispatcher.route`]
+
+    :meth:`put` is called by the receive thread and hands the frame to the event loop
+    which created the queue, :meth:`get` awaits the next frame without blocking the loop.
+    """
+
+    def __init__(self, loop=None):
+        self._loop = loop if loop is not None else asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+
+    def put(self, frame):
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, frame)
+        except RuntimeError:
+            # The event loop is closed
+            pass
+
+    async def get(self, timeout=None):
+        """Return the next frame or ``None`` on timeout"""
+        if not self._queue.empty():
+            return self._queue.get_nowait()
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def qsize(self):
+        return self._queue.qsize()
+
+class CanDispatcher(Thread):
+    """Single long-lived receive thread of one |CAN| channel
+
+    The thread blocks on the socket file descriptor (if the interface offers one)
+    or in the blocking read function of the interface. Every received frame is
+
+    1. handed to the registered observers (logger, GUI trace, recorders,...),
+    2. routed in O(1) to the waiters and routes registered for its |COBID|,
+    3. otherwise stored in a bounded queue read by :meth:`get`.
+
+    Parameters
+    ----------
+    read_frame : callable
+        ``read_frame(timeout)`` returning ``(cobid, data, dlc, flag, t, error_frame)`` or ``None``
+    fileno : :obj:`int`, optional
+        File descriptor of the |CAN| socket. If given, the thread waits in :mod:`selectors`
+        and reads the frames without timeout.
+    maxlen : :obj:`int`
+        Size of the queue holding the frames which were not routed
+    """
+
+    def __init__(self, read_frame, fileno=None, name="can0", maxlen=1000, poll_timeout=0.1):
+        Thread.__init__(self, name=f"CanDispatcher[{name}]", daemon=True)
+        self.logger = log_call.setup_main_logger()
+        self._read_frame = read_frame
+        self._fileno = fileno
+        self._poll_timeout = poll_timeout
+        self._routes = {}      # cobid -> list of FrameWaiter or queue.Queue
+        self._observers = []
+        self._routeLock = Lock()
+        self._unrouted = deque([], maxlen)
+        self._unroutedCond = Condition()
+        self._unroutedFutures = []   # (loop, future) of the coroutines in get_async
+        self._pill2kill = Event()
+        if fileno is not None:
+            self._wakeup_r, self._wakeup_w = os.pipe()
+        self.frames = 0
+        self.dropped = 0
+
+    # Registration
+    def register_waiter(self, cobids, predicate=None):
+        """Register a one-shot waiter for the |COBID| (or list of |COBID|) before sending the request"""
+        cobids = (cobids,) if isinstance(cobids, int) else tuple(cobids)
+        waiter = FrameWaiter(cobids, predicate)
+        with self._routeLock:
+            for cobid in cobids:
+                self._routes.setdefault(cobid, []).append(waiter)
+        return waiter
+
+    def cancel_waiter(self, waiter):
+        self._remove(waiter.cobids, waiter)
+
+    def route(self, cobids, frame_queue=None):
+        """Route all the frames with the given |COBID| into a queue until :meth:`unroute` is called
+        [a :class:`queue.Queue` for a thread, an :class:`AsyncFrameQueue` for a coroutine]"""
+        cobids = (cobids,) if isinstance(cobids, int) else tuple(cobids)
+        if frame_queue is None:
+            frame_queue = queue.Queue()
+        with self._routeLock:
+            for cobid in cobids:
+                self._routes.setdefault(cobid, []).append(frame_queue)
+        return frame_queue
+
+    def unroute(self, cobids, frame_queue):
+        cobids = (cobids,) if isinstance(cobids, int) else tuple(cobids)
+        self._remove(cobids, frame_queue)
+
+    def _remove(self, cobids, target):
+        with self._routeLock:
+            for cobid in cobids:
+                targets = self._routes.get(cobid)
+                if targets is None:
+                    continue
+                try:
+                    targets.remove(target)
+                except ValueError:
+                    pass
+                if not targets:
+                    del self._routes[cobid]
+
+    def add_observer(self, observer):
+        """Add a callable ``observer(cobid, data, dlc, flag, t, error_frame)`` called for every frame"""
+        with self._routeLock:
+            self._observers = self._observers + [observer]
+
+    def remove_observer(self, observer):
+        with self._routeLock:
+            self._observers = [o for o in self._observers if o is not observer]
+
+    # Frames
+    def dispatch(self, frame):
+        """Dispatch a frame. Called by the receive thread, but also usable to inject frames
+        (e.g. from the AnaGate callback)."""
+        self.frames += 1
+        for observer in self._observers:
+            try:
+                observer(*frame)
+            except Exception as e:
+                self.logger.error(f"Observer {observer} failed: {e}")
+        with self._routeLock:
+            targets = self._routes.get(frame[0])
+            if targets:
+                for target in list(targets):
+                    if isinstance(target, FrameWaiter):
+                        if target.accept(frame):
+                            for cobid in target.cobids:
+                                _targets = self._routes.get(cobid)
+                                if _targets is not None and target in _targets:
+                                    _targets.remove(target)
+                                    if not _targets:
+                                        del self._routes[cobid]
+                            return
+                    else:
+                        target.put(frame)
+                        return
+        with self._unroutedCond:
+            if len(self._unrouted) == self._unrouted.maxlen:
+                self.dropped += 1
+            self._unrouted.append(frame)
+            self._unroutedCond.notify()
+            if self._unroutedFutures:
+                for loop, future in self._unroutedFutures:
+                    _wake(loop, future)
+                self._unroutedFutures = []
+
+    def get(self, timeout=None):
+        """Return the oldest frame which was not routed to a waiter or ``None`` on timeout"""
+        with self._unroutedCond:
+            if not self._unrouted:
+                self._unroutedCond.wait(timeout)
+            if self._unrouted:
+                return self._unrouted.popleft()
+        return None
+
+    async def get_async(self, timeout=None):
+        """Same as :meth:`get` for a coroutine, the event loop is not blocked while waiting"""
+        with self._unroutedCond:
+            if self._unrouted:
+                return self._unrouted.popleft()
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._unroutedFutures.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        with self._unroutedCond:
+            if (loop, future) in self._unroutedFutures:
+                self._unroutedFutures.remove((loop, future))
+            if self._unrouted:
+                return self._unrouted.popleft()
+        return None
+
+    def clear(self):
+        with self._unroutedCond:
+            self._unrouted.clear()
+
+    def qsize(self):
+        """Number of frames waiting in the queue of :meth:`get`"""
+        return len(self._unrouted)
+
+    # Thread
+    def run(self):
+        if self._fileno is not None:
+            self._run_selector()
+        else:
+            while not self._pill2kill.is_set():
+                try:
+                    frame = self._read_frame(self._poll_timeout)
+                except Exception as e:
+                    if self._pill2kill.is_set():
+                        break
+                    self.logger.error(f"Error while reading {self.name}: {e}")
+                    self._pill2kill.wait(self._poll_timeout)
+                    continue
+                if frame is not None:
+                    self.dispatch(frame)
+
+    def _run_selector(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._fileno, selectors.EVENT_READ)
+        selector.register(self._wakeup_r, selectors.EVENT_READ)
+        try:
+            while not self._pill2kill.is_set():
+                for key, _ in selector.select():
+                    if key.fd == self._wakeup_r:
+                        continue
+                    # Drain the socket without blocking
+                    try:
+                        frame = self._read_frame(0)
+                        while frame is not None:
+                            self.dispatch(frame)
+                            frame = self._read_frame(0)
+                    except Exception as e:
+                        if not self._pill2kill.is_set():
+                            self.logger.error(f"Error while reading {self.name}: {e}")
+        finally:
+            selector.close()
+            os.close(self._wakeup_r)
+            os.close(self._wakeup_w)
+
+    def stop(self, timeout=1):
+        self._pill2kill.set()
+        if self._fileno is not None and self.is_alive():
+            try:
+                os.write(self._wakeup_w, b"\0")
+            except OSError:
+                pass
+        if self.is_alive():
+            self.join(timeout)
+        with self._unroutedCond:
+            self._unroutedCond.notify_all()
+            for loop, future in self._unroutedFutures:
+                _wake(loop, future)
+            self._unroutedFutures = []
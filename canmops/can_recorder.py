@@ -0,0 +1,187 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+
+import os
+import time
+import logging
+from collections import deque
+from threading import Thread, Event
+import numpy as np
+try:
+    from .logger_main import Logger
+except (ImportError, ModuleNotFoundError):
+    from logger_main import Logger
+
+log_call = Logger(name = "CAN Recorder",console_loglevel=logging.INFO, logger_file = False)
+
+RECORD_MAGIC = b"CANMOPSR"
+RECORD_VERSION = 1
+# Flags of a record
+FLAG_TX = 0x01
+FLAG_ERROR = 0x02
+FLAG_EXTENDED = 0x04
+# Extended identifier bit of the interface flag of a frame [python-can: the flag is is_extended_id]
+INTERFACE_EXTENDED = {"Kvaser": 0x0004, "AnaGate": 0x0001}
+
+def is_extended(flag, interface=None):
+    """True if the interface flag of a frame marks a 29 bit identifier"""
+    if flag is None:
+        return False
+    mask = INTERFACE_EXTENDED.get(interface)
+    return bool(int(flag) & mask) if mask is not None else bool(flag)
+
+def interface_flag(extended, interface=None):
+    """Interface flag of a frame with a 29 bit [``extended``] or an 11 bit identifier [inverse of :func:`is_extended`]"""
+    mask = INTERFACE_EXTENDED.get(interface)
+    return (mask if extended else 0) if mask is not None else bool(extended)
+
+# One frame = 24 bytes
+FRAME_DTYPE = np.dtype([("t", "<f8"),
+                        ("cobid", "<u4"),
+                        ("dlc", "u1"),
+                        ("flags", "u1"),
+                        ("reserved", "<u2"),
+                        ("data", "u1", (8,))])
+
+HEADER_DTYPE = np.dtype([("magic", "S8"),
+                         ("version", "<u2"),
+                         ("record_size", "<u2"),
+                         ("reserved", "<u4"),
+                         ("start_time", "<f8"),
+                         ("channel", "S40")])
+HEADER_SIZE = HEADER_DTYPE.itemsize
+
+class CanRecorder(Thread):
+    """Record the received and transmitted |CAN| frames into a binary file
+
+    The observers :meth:`record` and :meth:`record_tx` only append a tuple to a :class:`~collections.deque`.
+    A background thread converts the pending frames into :data:`FRAME_DTYPE` records
+    and appends them to the file every ``flush_interval`` s. The file is a fixed header
+    followed by the records and can be opened with :func:`open_recording` as a :class:`numpy.memmap`.
+
+    Parameters
+    ----------
+    filename : :obj:`str`
+        Output file [e.g. output_data/trace.canrec]
+    channel : :obj:`str`
+        Name of the recorded channel stored in the header
+    interface : :obj:`str`, optional
+        Interface of the channel, used to read the extended identifier bit of the frame flags
+    flush_interval : :obj:`float`
+        Time in s between two writes
+    """
+
+    def __init__(self, filename, channel="can0", interface=None, flush_interval=0.5):
+        Thread.__init__(self, name=f"CanRecorder[{channel}]", daemon=True)
+        self.logger = log_call.setup_main_logger()
+        self.filename = filename
+        self.channel = channel
+        self.interface = interface
+        self.flush_interval = flush_interval
+        self._pending = deque()
+        self._pill2kill = Event()
+        self.frames = 0
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header["magic"] = RECORD_MAGIC
+        header["version"] = RECORD_VERSION
+        header["record_size"] = FRAME_DTYPE.itemsize
+        header["start_time"] = time.time()
+        header["channel"] = channel.encode()[:40]
+        self._file = open(filename, "wb")
+        self._file.write(header.tobytes())
+
+    # Observers [called by the receive thread and the TX path]
+    def record(self, cobid, data, dlc, flag, t, error_frame):
+        self._pending.append((t, cobid, dlc, (FLAG_ERROR if error_frame else 0)
+                              | (FLAG_EXTENDED if is_extended(flag, self.interface) else 0), bytes(data)))
+
+    def record_tx(self, cobid, data, dlc, flag, t, error_frame):
+        self._pending.append((t, cobid, dlc, FLAG_TX | (FLAG_EXTENDED if is_extended(flag, self.interface) else 0), bytes(data)))
+
+    def _write_pending(self):
+        # Drain only the frames appended so far, the observers keep appending to the same deque
+        pending = [self._pending.popleft() for _ in range(len(self._pending))]
+        if not pending:
+            return
+        t, cobid, dlc, flags, data = zip(*pending)
+        records = np.zeros(len(pending), dtype=FRAME_DTYPE)
+        records["t"] = t
+        records["cobid"] = cobid
+        records["dlc"] = dlc
+        records["flags"] = flags
+        records["data"] = np.frombuffer(b"".join(d[:8].ljust(8, b"\0") for d in data), dtype=np.uint8).reshape(-1, 8)
+        self._file.write(records.tobytes())
+        self._file.flush()
+        self.frames += len(pending)
+
+    def run(self):
+        while not self._pill2kill.wait(self.flush_interval):
+            self._write_pending()
+        self._write_pending()
+        self._file.close()
+
+    def stop(self, timeout=5):
+        self._pill2kill.set()
+        if self.is_alive():
+            self.join(timeout)
+        self.logger.notice(f"{self.frames} frames are saved to {self.filename}")
+
+def read_header(filename):
+    """Return the header of a recording as :obj:`dict`"""
+    header = np.fromfile(filename, dtype=HEADER_DTYPE, count=1)
+    if len(header) == 0 or header["magic"][0] != RECORD_MAGIC:
+        raise ValueError(f"{filename} is not a CAN recording")
+    return {"version": int(header["version"][0]),
+            "record_size": int(header["record_size"][0]),
+            "start_time": float(header["start_time"][0]),
+            "channel": header["channel"][0].decode()}
+
+def open_recording(filename):
+    """Map the records of a recording read-only
+
+    Returns
+    -------
+    :class:`numpy.memmap`
+        Structured array with the fields of :data:`FRAME_DTYPE`
+    """
+    header = read_header(filename)
+    if header["record_size"] != FRAME_DTYPE.itemsize:
+        raise ValueError(f"Unsupported record size {header['record_size']} in {filename}")
+    n = (os.path.getsize(filename) - HEADER_SIZE) // FRAME_DTYPE.itemsize
+    if n == 0:
+        return np.zeros(0, dtype=FRAME_DTYPE)
+    return np.memmap(filename, dtype=FRAME_DTYPE, mode="r", offset=HEADER_SIZE, shape=(n,))
+
+def to_candump(filename, outfile, channel=None):
+    """Convert a recording into a candump log file [``candump -l`` format, readable by canplayer]"""
+    records = open_recording(filename)
+    channel = channel if channel is not None else read_header(filename)["channel"]
+    with open(outfile, "w") as out:
+        for r in records:
+            cobid = f"{r['cobid']:08X}" if r["flags"] & FLAG_EXTENDED else f"{r['cobid']:03X}"
+            out.write(f"({r['t']:.6f}) {channel} {cobid}#{bytes(r['data'][:r['dlc']]).hex().upper()}\n")
+    return len(records)
+
+def to_python_can(filename, outfile):
+    """Convert a recording into any log format of python-can chosen by the suffix of outfile [.blf, .asc,...]"""
+    import can
+    records = open_recording(filename)
+    with can.Logger(outfile) as writer:
+        for r in records:
+            writer.on_message_received(can.Message(timestamp=float(r["t"]),
+                                                   arbitration_id=int(r["cobid"]),
+                                                   is_extended_id=bool(r["flags"] & FLAG_EXTENDED),
+                                                   is_error_frame=bool(r["flags"] & FLAG_ERROR),
+                                                   is_rx=not r["flags"] & FLAG_TX,
+                                                   dlc=int(r["dlc"]),
+                                                   data=bytes(r["data"][:r["dlc"]])))
+    return len(records)
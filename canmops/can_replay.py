@@ -0,0 +1,249 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+
+import re
+import time
+import logging
+from threading import Thread, Event
+import numpy as np
+try:
+    from .logger_main import Logger
+    from .can_recorder import FRAME_DTYPE, FLAG_TX, FLAG_ERROR, FLAG_EXTENDED, RECORD_MAGIC, open_recording, \
+        is_extended, interface_flag
+except (ImportError, ModuleNotFoundError):
+    from logger_main import Logger
+    from can_recorder import FRAME_DTYPE, FLAG_TX, FLAG_ERROR, FLAG_EXTENDED, RECORD_MAGIC, open_recording, \
+        is_extended, interface_flag
+
+log_call = Logger(name = " CAN Replay ",console_loglevel=logging.INFO, logger_file = False)
+
+# Flags of the identifier in candump logs [linux/can.h]
+CAN_EFF_FLAG = 0x80000000
+CAN_RTR_FLAG = 0x40000000
+CAN_ERR_FLAG = 0x20000000
+_CANDUMP_LINE = re.compile(r"\((\d+\.\d+)\)\s+(\S+)\s+([0-9A-Fa-f]+)#(R\d*|[0-9A-Fa-f]*)")
+
+def read_candump(filename, channel=None):
+    """Read a candump log [``candump -l``, see also :func:`to_candump`] into :data:`FRAME_DTYPE` records
+
+    Parameters
+    ----------
+    channel : :obj:`str`, optional
+        Keep only the frames of this interface [e.g. can0] if the log has several
+    """
+    t, cobid, dlc, flags, data = [], [], [], [], []
+    with open(filename, "r") as f:
+        for line in f:
+            m = _CANDUMP_LINE.match(line)
+            if m is None or (channel is not None and m.group(2) != channel):
+                continue
+            _id, _data = int(m.group(3), 16), m.group(4)
+            _flags = FLAG_EXTENDED if len(m.group(3)) == 8 else 0
+            if _id & CAN_ERR_FLAG:
+                _flags |= FLAG_ERROR
+            payload = b"" if _data.startswith("R") else bytes.fromhex(_data)
+            t.append(float(m.group(1)))
+            cobid.append(_id & 0x1FFFFFFF)
+            dlc.append(len(payload))
+            flags.append(_flags)
+            data.append(payload[:8].ljust(8, b"\0"))
+    records = np.zeros(len(t), dtype=FRAME_DTYPE)
+    if records.size:
+        records["t"] = t
+        records["cobid"] = cobid
+        records["dlc"] = dlc
+        records["flags"] = flags
+        records["data"] = np.frombuffer(b"".join(data), dtype=np.uint8).reshape(-1, 8)
+    return records
+
+def read_python_can(filename):
+    """Read any log format of python-can [.asc, .blf, .trc, ...] into :data:`FRAME_DTYPE` records"""
+    import can
+    messages = list(can.LogReader(filename))
+    records = np.zeros(len(messages), dtype=FRAME_DTYPE)
+    for i, msg in enumerate(messages):
+        records[i]["t"] = msg.timestamp
+        records[i]["cobid"] = msg.arbitration_id
+        records[i]["dlc"] = min(msg.dlc, 8)
+        records[i]["flags"] = (FLAG_EXTENDED if msg.is_extended_id else 0) | (FLAG_ERROR if msg.is_error_frame else 0) \
+                              | (0 if msg.is_rx else FLAG_TX)
+        records[i]["data"][:len(msg.data[:8])] = list(msg.data[:8])
+    return records
+
+def load_trace(filename, channel=None):
+    """Load a recording of :class:`CanRecorder`, a candump log or a python-can log [by the content and the suffix]"""
+    with open(filename, "rb") as f:
+        magic = f.read(len(RECORD_MAGIC))
+    if magic == RECORD_MAGIC:
+        return open_recording(filename)
+    if filename.endswith(".log"):
+        return read_candump(filename, channel=channel)
+    return read_python_can(filename)
+
+class CanReplay(Thread):
+    """Replay recorded traffic into a |CAN| backend at the recorded rate, N times faster or as fast as possible
+
+    The target of the frames is one of
+
+    * a :class:`CanWrapper`, :class:`CanChannel` or :class:`CanDispatcher`: the frames are injected with
+      :meth:`CanDispatcher.dispatch` into the receive path [observers, waiters, routes and queue]
+      as if the receive thread read them, no bus is needed
+    * a python-can bus [virtual or vcan]: the frames are sent and pass through the whole receive path
+    * any callable ``target(cobid, data, dlc, flag, t, error_frame)`` [e.g. :meth:`MopsSimulator.replay_frame`,
+      so the GUI windows polling the simulator show the recorded values at the replayed rate]
+
+    :meth:`statistics` reports the achieved rate, the time spent in the target and how far the replay
+    fell behind the schedule: a slow observer, decoder or storage sink shows up as lag.
+
+    Parameters
+    ----------
+    trace : :obj:`str` or :class:`numpy.ndarray`
+        File name [see :func:`load_trace`] or :data:`FRAME_DTYPE` records
+    speed : :obj:`float`
+        1 replays at the recorded rate, N N times faster, 0 or :data:`None` as fast as possible
+    repeat : :obj:`int`
+        Number of passes through the trace [0: until :meth:`stop`]
+    include_tx : :obj:`bool`
+        Also replay the frames recorded as transmitted [the requests of the recording wrapper,
+        candump logs do not mark them: use ``cobids`` to select the frames]
+    retime : :obj:`bool`
+        Stamp the frames with the replay time instead of the recorded time
+    interface : :obj:`str`, optional
+        Interface whose flag convention the frames follow [default: the interface of the wrapper or
+        channel, python-can otherwise]: the extended identifier bit is set in the flag as the
+        receive thread of this interface does
+    """
+
+    def __init__(self, trace, target, speed=1.0, repeat=1, include_tx=False, retime=True, cobids=None, channel=None,
+                 interface=None):
+        Thread.__init__(self, name="CanReplay", daemon=True)
+        self.logger = log_call.setup_main_logger()
+        records = load_trace(trace, channel=channel) if isinstance(trace, str) else trace
+        keep = np.ones(len(records), dtype=bool)
+        if not include_tx:
+            keep &= (records["flags"] & FLAG_TX) == 0
+        if cobids is not None:
+            keep &= np.isin(records["cobid"], list(cobids))
+        records = records[keep]
+        self.speed = speed if speed else None
+        self.repeat = repeat
+        self.retime = retime
+        self.interface = interface if interface is not None else self._interface(target)
+        self._emit = self._emitter(target, self.interface)
+        self._t = records["t"] - records["t"][0] if len(records) else np.zeros(0)
+        # Frames prebuilt as the tuples of the receive thread [interface flag, not the record flags]
+        self._frames = [(cobid, bytes(data[:dlc]), dlc, interface_flag(flags & FLAG_EXTENDED, self.interface), t,
+                         bool(flags & FLAG_ERROR))
+                        for cobid, data, dlc, flags, t in zip(records["cobid"].tolist(), records["data"],
+                                                              records["dlc"].tolist(), records["flags"].tolist(),
+                                                              records["t"].tolist())]
+        self._pill2kill = Event()
+        self.frames = 0
+        self.max_lag = 0.0
+        self.busy = 0.0
+        self.elapsed = 0.0
+
+    @staticmethod
+    def _interface(target):
+        """Interface of a wrapper or channel target, ``None`` [python-can flag] for the others"""
+        if hasattr(target, "get_interface"):
+            return target.get_interface()
+        return getattr(target, "interface", None) if hasattr(target, "dispatcher") else None
+
+    @staticmethod
+    def _emitter(target, interface=None):
+        dispatcher = getattr(target, "dispatcher", target)
+        if hasattr(dispatcher, "dispatch"):
+            return dispatcher.dispatch
+        if hasattr(target, "send"):
+            import can
+            def _send(frame):
+                cobid, data, dlc, flag, t, error_frame = frame
+                target.send(can.Message(arbitration_id=cobid, data=data, dlc=dlc,
+                                        is_extended_id=is_extended(flag, interface),
+                                        is_error_frame=error_frame, timestamp=t))
+            return _send
+        if callable(target):
+            return lambda frame: target(*frame)
+        raise TypeError(f"Can not replay into {target!r}")
+
+    def __len__(self):
+        return len(self._frames)
+
+    def play(self):
+        """Replay the trace in the calling thread and return :meth:`statistics`"""
+        n = len(self._frames)
+        if n == 0:
+            return self.statistics()
+        duration = float(self._t[-1]) + (float(self._t[-1]) / (n - 1) if n > 1 else 0.0)
+        emit, frames, speed, retime = self._emit, self._frames, self.speed, self.retime
+        t0 = time.perf_counter()
+        offset = 0.0
+        _pass = 0
+        while not self._pill2kill.is_set() and (self.repeat == 0 or _pass < self.repeat):
+            for i, t in enumerate(self._t.tolist()):
+                if speed is not None:
+                    due = t0 + (offset + t) / speed
+                    now = time.perf_counter()
+                    if due > now:
+                        if self._pill2kill.wait(due - now):
+                            break
+                    elif now - due > self.max_lag:
+                        self.max_lag = now - due
+                elif self._pill2kill.is_set():
+                    break
+                frame = frames[i]
+                if retime:
+                    frame = frame[:4] + (time.time(), frame[5])
+                t_emit = time.perf_counter()
+                try:
+                    emit(frame)
+                except Exception as e:
+                    self.logger.error(f"Replaying frame {i} failed: {e}")
+                self.busy += time.perf_counter() - t_emit
+                self.frames += 1
+            offset += duration
+            _pass += 1
+        self.elapsed = time.perf_counter() - t0
+        return self.statistics()
+
+    def run(self):
+        stats = self.play()
+        self.logger.notice(f"Replayed {stats['frames']} frames in {stats['seconds']:.3f} s "
+                           f"[{stats['frames_per_s']:.0f} frames/s, max lag {stats['max_lag'] * 1e3:.1f} ms]")
+
+    def statistics(self):
+        """Frames replayed, their rate, the share of the time spent in the target and the maximum lag in s"""
+        return {"frames": self.frames, "seconds": self.elapsed,
+                "frames_per_s": self.frames / self.elapsed if self.elapsed else 0.0,
+                "busy": self.busy / self.elapsed if self.elapsed else 0.0,
+                "max_lag": self.max_lag}
+
+    def stop(self, timeout=1):
+        self._pill2kill.set()
+        if self.is_alive():
+            self.join(timeout)
+
+if __name__ == "__main__":
+    import argparse
+    import can
+    parser = argparse.ArgumentParser(description="Replay a recording or a candump log onto a CAN interface")
+    parser.add_argument("trace")
+    parser.add_argument("--interface", default="virtual", help="virtual [vcanN] or socketcan [canN]")
+    parser.add_argument("--channel", type=int, default=0)
+    parser.add_argument("--speed", type=float, default=1.0, help="1: recorded rate, N: N times faster, 0: maximum")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+    bus = can.Bus(interface="socketcan", channel=("vcan" if args.interface == "virtual" else "can") + str(args.channel))
+    replay = CanReplay(args.trace, bus, speed=args.speed, repeat=args.repeat)
+    try:
+        replay.run()
+    except KeyboardInterrupt:
+        replay.stop()
+    bus.shutdown()
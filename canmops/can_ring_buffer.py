@@ -0,0 +1,214 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+
+import time
+import struct
+from threading import Condition
+import numpy as np
+try:
+    from .can_recorder import FLAG_ERROR
+except (ImportError, ModuleNotFoundError):
+    from can_recorder import FLAG_ERROR
+
+# One slot of the ring = 32 bytes [the fields of FRAME_DTYPE preceded by the sequence number,
+# msg_flag holds the flag of the interface]
+RING_DTYPE = np.dtype([("seq", "<u8"),
+                       ("t", "<f8"),
+                       ("cobid", "<u4"),
+                       ("dlc", "u1"),
+                       ("flags", "u1"),
+                       ("msg_flag", "<u2"),
+                       ("data", "u1", (8,))])
+_SLOT = struct.Struct("<QdIBBH8s")
+
+class CanRingBuffer(object):
+    """Preallocated ring buffer of |CAN| frames with one producer and many consumers
+
+    The producer [the receive thread] packs every frame with :meth:`push` into a fixed
+    :obj:`bytearray` viewed as a structured array of :data:`RING_DTYPE`. Nothing is allocated
+    per frame and the producer never waits: when the ring is full the oldest frame is overwritten.
+    Each frame gets a sequence number. Every consumer [:class:`RingReader`] keeps its own
+    position and counts the frames it lost because they were overwritten before it read them.
+
+    Parameters
+    ----------
+    capacity : :obj:`int`
+        Number of slots, rounded up to a power of two
+    """
+
+    def __init__(self, capacity=4096):
+        self.capacity = 1 << max(int(capacity) - 1, 1).bit_length()
+        self._mask = self.capacity - 1
+        self._mem = bytearray(self.capacity * RING_DTYPE.itemsize)
+        self.records = np.frombuffer(self._mem, dtype=RING_DTYPE)
+        """:obj:`int` : Sequence number of the next frame [= number of frames written]"""
+        self.head = 0
+        self._cond = Condition()
+        self._waiting = 0
+
+    def push(self, cobid, data, dlc, flag, t, error_frame):
+        """Write one frame [producer only]. The arguments are those of a dispatcher observer,
+        ``data`` is packed without a copy and must be :obj:`bytes` or :obj:`bytearray`."""
+        seq = self.head
+        _SLOT.pack_into(self._mem, (seq & self._mask) * RING_DTYPE.itemsize, seq, t if t is not None else 0.0,
+                        cobid, dlc, FLAG_ERROR if error_frame else 0, (flag or 0) & 0xFFFF, data or b"")
+        self.head = seq + 1
+        if self._waiting:
+            with self._cond:
+                self._cond.notify_all()
+
+    def tail(self):
+        """Sequence number of the oldest frame still in the ring"""
+        return max(self.head - self.capacity, 0)
+
+    def frame(self, seq):
+        """Return the frame ``(cobid, data, dlc, flag, t, error_frame)`` with the sequence number or
+        :data:`None` if it was overwritten"""
+        _seq, t, cobid, dlc, flags, msg_flag, data = _SLOT.unpack_from(self._mem, (seq & self._mask) * RING_DTYPE.itemsize)
+        if _seq != seq or seq >= self.head:
+            return None
+        return cobid, data[:dlc], dlc, msg_flag, t, bool(flags & FLAG_ERROR)
+
+    def snapshot(self, start=None):
+        """Copy of the frames from the sequence number ``start`` [default: the oldest] to the head
+        as a structured array of :data:`RING_DTYPE` in order of arrival"""
+        head = self.head
+        start = max(self.tail() if start is None else start, head - self.capacity, 0)
+        if start >= head:
+            return np.zeros(0, dtype=RING_DTYPE)
+        index = np.arange(start, head, dtype=np.uint64) & np.uint64(self._mask)
+        records = self.records[index.astype(np.intp)]
+        # Drop the slots which were overwritten while copying
+        return records[records["seq"] == np.arange(start, head, dtype=np.uint64)]
+
+    def wait(self, seq, timeout=None):
+        """Wait until the frame with the sequence number ``seq`` is written"""
+        if self.head > seq:
+            return True
+        with self._cond:
+            self._waiting += 1
+            try:
+                return self._cond.wait_for(lambda: self.head > seq, timeout)
+            finally:
+                self._waiting -= 1
+
+    def reader(self, start=None):
+        """Create a consumer reading from the sequence number ``start`` [default: new frames only]"""
+        return RingReader(self, self.head if start is None else start)
+
+    def wakeup(self):
+        """Wake up all the consumers blocked in :meth:`RingReader.get`"""
+        with self._cond:
+            self._cond.notify_all()
+
+class RingReader(object):
+    """Consumer of a :class:`CanRingBuffer` with its own position and overflow counters"""
+    __slots__ = ("ring", "seq", "lost", "overflows")
+
+    def __init__(self, ring, seq=0):
+        self.ring = ring
+        self.seq = seq
+        self.lost = 0
+        self.overflows = 0
+
+    def _skip_overwritten(self):
+        tail = self.ring.tail()
+        if self.seq < tail:
+            self.lost += tail - self.seq
+            self.overflows += 1
+            self.seq = tail
+
+    def pending(self):
+        """Number of frames not read yet"""
+        self._skip_overwritten()
+        return self.ring.head - self.seq
+
+    def get(self, timeout=None):
+        """Return the next frame ``(cobid, data, dlc, flag, t, error_frame)`` or :data:`None` on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self._skip_overwritten()
+            if self.seq < self.ring.head:
+                frame = self.ring.frame(self.seq)
+                if frame is not None:
+                    self.seq += 1
+                    return frame
+                continue
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            if not self.ring.wait(self.seq, remaining):
+                return None
+
+    def read(self):
+        """Return all the pending frames as a structured array of :data:`RING_DTYPE`"""
+        self._skip_overwritten()
+        records = self.ring.snapshot(self.seq)
+        if len(records):
+            first = int(records["seq"][0])
+            if first > self.seq:
+                self.lost += first - self.seq
+                self.overflows += 1
+            self.seq = int(records["seq"][-1]) + 1
+        return records
+
+    def statistics(self):
+        return {"seq": self.seq, "pending": self.pending(), "lost": self.lost, "overflows": self.overflows}
+
+class CanMsgQueueView(object):
+    """Read view of a :class:`CanRingBuffer` compatible with the former ``deque`` :attr:`CanWrapper.canMsgQueue`
+
+    Like the deque filled with ``appendleft``, the newest frame is at index 0 and
+    :meth:`pop` returns the oldest frame. The view holds the frames which were not popped yet.
+    """
+
+    def __init__(self, ring):
+        self.ring = ring
+        self._reader = ring.reader(start=0)
+
+    def __len__(self):
+        return self._reader.pending()
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        for seq in range(self.ring.head - 1, self._reader.seq - 1, -1):
+            frame = self.ring.frame(seq)
+            if frame is None:
+                break
+            yield frame
+
+    def __getitem__(self, i):
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("canMsgQueue index out of range")
+        frame = self.ring.frame(self.ring.head - 1 - i)
+        if frame is None:
+            raise IndexError("canMsgQueue frame was overwritten")
+        return frame
+
+    def pop(self):
+        frame = self._reader.get(timeout=0)
+        if frame is None:
+            raise IndexError("pop from an empty canMsgQueue")
+        return frame
+
+    def clear(self):
+        self._reader.seq = self.ring.head
+
+    @property
+    def maxlen(self):
+        return self.ring.capacity
+
+    @property
+    def lost(self):
+        return self._reader.lost
@@ -2,65 +2,208 @@
 """
     This file is part of the MOPS-Hub project.
     Author: Ahmed Qamesh (University of Wuppertal)
-    email: ahmed.qamesh@cern.ch  
+    email: ahmed.qamesh@cern.ch
     Date: 01.05.2020
 """
 ########################################################
 
+import os
 import queue
 import time
+import selectors
 #from symbol import except_clause
 
 try:
     from .logger_main import Logger
     from .can_bus_config import can_config
+    from .can_dispatcher import FrameWaiter
 except:
     from logger_main import Logger
     from can_bus_config import can_config
+    from can_dispatcher import FrameWaiter
 
-from threading import Thread
+from threading import Thread, Event, Lock
 import logging
 
 class READSocketcan(Thread):
+    """Receive thread of the SocketCAN channels of :data:`can_config`
 
-    def __init__(self):
-        Thread.__init__(self)
+    The thread blocks on the sockets of the channels [:mod:`selectors`] until a frame arrives or
+    the nearest deadline of the outstanding requests expires. Any number of requests
+    [channel, |COBID|, subindex] can be outstanding at the same time, see :meth:`expect`.
+
+    The former handshake is still served: set :attr:`current_channel`, :attr:`cobid_ret` and
+    :attr:`current_subindex`, release ``can_config.sem_recv_block`` and wait for
+    ``can_config.sem_read_block``, the response is then in :attr:`receive_queue`.
+    Such a request is picked up within ``idle_timeout`` s.
+
+    Parameters
+    ----------
+    get_bus : callable, optional
+        ``get_bus(channel)`` returning the python-can bus of a channel [default: ``can_config.get_bus``]
+    """
+
+    def __init__(self, get_bus=None, idle_timeout=0.05):
+        Thread.__init__(self, daemon=True)
         self.receive_queue = queue.Queue()
         self.current_subindex = None
         self.current_channel = None
         self.cobid_ret = None
 
         self.read_timeout = 2000
+        self.idle_timeout = idle_timeout
         self.logger_thread = logging.getLogger('mopshub_log:socketcan_receive_thread')
         self.logger_thread.setLevel(logging.WARNING)
         self.running = True
         self.err_counter = 0
         self.good_frames = 0
+        self.timeouts = 0
+        self._get_bus = get_bus if get_bus is not None else can_config.get_bus
+        self._waiters = []
+        self._waitersLock = Lock()
+        self._pill2kill = Event()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        os.set_blocking(self._wakeup_w, False)
 
-    def run(self):
-        while self.running:
-            self.logger_thread.info("Receive Thread is waiting")
-            can_config.sem_recv_block.acquire()
-            self.logger_thread.info("Receive Thread is running")
-            t0 = time.perf_counter()
-            break_flag = True
-            while time.perf_counter() - t0 < self.read_timeout / 1000 and break_flag:
-                try:
-                    can_msg = can_config.receive(self.current_channel)
-                    if can_msg is not None:
-                        data = can_msg.data
-                        if can_msg.is_error_frame:
-                            self.err_counter += 1
-                        if data[3] == self.current_subindex and not can_msg.is_error_frame and \
-                                can_msg.arbitration_id == self.cobid_ret:
-                            self.logger_thread.info(f"Read msg from socket: {can_msg}")
-                            self.receive_queue.put(can_msg)
-                            self.good_frames += 1
-                            break_flag = False
-                except Exception as e:
-                    self.logger_thread.error(f'Some Error occurred while reading Channel {self.channel}: {e}')
+    def expect(self, channel, cobid, subindex=None, timeout=None, callback=None):
+        """Register a request for the next frame with the |COBID| [and subindex in byte 3] on the channel
+
+        Call it before sending the request. :meth:`FrameWaiter.wait` returns the :class:`can.Message`
+        or :data:`None` when the deadline [default: :attr:`read_timeout` ms] expired.
+        ``callback(msg)`` is called from the thread with the same result.
+        """
+        timeout = self.read_timeout / 1000 if timeout is None else timeout
+        predicate = None
+        if subindex is not None:
+            predicate = lambda msg: len(msg.data) > 3 and msg.data[3] == subindex
+        waiter = FrameWaiter((cobid,), predicate)
+        with self._waitersLock:
+            self._waiters.append((channel, time.monotonic() + timeout, waiter, callback))
+        self._wakeup()
+        return waiter
+
+    def cancel(self, waiter):
+        with self._waitersLock:
+            self._waiters = [w for w in self._waiters if w[2] is not waiter]
+
+    def pending(self):
+        """Number of outstanding requests"""
+        return len(self._waiters)
+
+    def _wakeup(self):
+        try:
+            os.write(self._wakeup_w, b"\0")
+        except OSError:
+            pass
+
+    def _legacy_request(self):
+        """Turn a request of the semaphore handshake into a waiter"""
+        if not can_config.sem_recv_block.acquire(blocking=False):
+            return
+        self.logger_thread.info("Receive Thread is running")
+        def _done(msg):
+            if msg is not None:
+                self.receive_queue.put(msg)
             self.logger_thread.info("Receive Thread is finished")
             can_config.sem_read_block.release()
+        self.expect(self.current_channel, self.cobid_ret, self.current_subindex, callback=_done)
+
+    def _dispatch(self, channel, msg):
+        if msg.is_error_frame:
+            self.err_counter += 1
+            return
+        with self._waitersLock:
+            for i, (_channel, _, waiter, callback) in enumerate(self._waiters):
+                if _channel == channel and msg.arbitration_id in waiter.cobids and waiter.accept(msg):
+                    del self._waiters[i]
+                    break
+            else:
+                return
+        self.logger_thread.info(f"Read msg from socket: {msg}")
+        self.good_frames += 1
+        if callback is not None:
+            callback(msg)
+
+    def _expire(self, now):
+        """Release the waiters whose deadline expired and return the time to the nearest deadline"""
+        expired = []
+        with self._waitersLock:
+            waiters = []
+            for item in self._waiters:
+                (expired if item[1] <= now else waiters).append(item)
+            self._waiters = waiters
+            nearest = min((item[1] for item in waiters), default=None)
+        for _, _, waiter, callback in expired:
+            self.timeouts += 1
+            waiter.release()
+            if callback is not None:
+                callback(None)
+        return self.idle_timeout if nearest is None else min(max(nearest - now, 0), self.idle_timeout)
+
+    def _buses(self):
+        buses = {}
+        with self._waitersLock:
+            channels = {item[0] for item in self._waiters}
+        for channel in channels:
+            try:
+                buses[channel] = self._get_bus(channel)
+            except Exception as e:
+                self.logger_thread.error(f'Some Error occurred while opening Channel {channel}: {e}')
+        return {channel: bus for channel, bus in buses.items() if bus is not None}
+
+    def _read(self, channel, bus, timeout):
+        try:
+            msg = bus.recv(timeout)
+            while msg is not None:
+                self._dispatch(channel, msg)
+                msg = bus.recv(0)
+        except Exception as e:
+            self.logger_thread.error(f'Some Error occurred while reading Channel {channel}: {e}')
+
+    def run(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._wakeup_r, selectors.EVENT_READ)
+        registered = {}
+        try:
+            while self.running and not self._pill2kill.is_set():
+                self._legacy_request()
+                timeout = self._expire(time.monotonic())
+                buses = self._buses()
+                filenos = {}
+                for channel, bus in buses.items():
+                    try:
+                        fileno = bus.fileno()
+                    except (AttributeError, NotImplementedError):
+                        fileno = -1
+                    if fileno is not None and fileno >= 0:
+                        filenos[fileno] = (channel, bus)
+                for fileno in set(registered) - set(filenos):
+                    selector.unregister(fileno)
+                for fileno in set(filenos) - set(registered):
+                    selector.register(fileno, selectors.EVENT_READ)
+                registered = filenos
+                if not filenos and len(buses) == 1:
+                    # Interfaces without socket [e.g. python-can virtual]: block in recv
+                    channel, bus = next(iter(buses.items()))
+                    self._read(channel, bus, timeout)
+                    continue
+                for key, _ in selector.select(timeout):
+                    if key.fd == self._wakeup_r:
+                        try:
+                            while os.read(self._wakeup_r, 64):
+                                pass
+                        except (BlockingIOError, OSError):
+                            pass
+                    else:
+                        self._read(*registered[key.fd], 0)
+                for channel, bus in buses.items():
+                    if bus not in [b for _, b in registered.values()]:
+                        self._read(channel, bus, 0)
+        finally:
+            selector.close()
 
     def stop(self):
         self.running = False
+        self._pill2kill.set()
+        self._wakeup()
@@ -31,13 +31,39 @@ try:
     from .logger_main import Logger
     from .analysis_utils import AnalysisUtils
     from .watchdog_can_interface import WATCHCan
+    from .sdo_engine import SdoResult, SDO_OK, SDO_SKIPPED, encode_sdo_request, frame_register
+    from .pdo_acquisition import PdoAcquisition, count_tpdos
+    from .can_recorder import CanRecorder
+    from .can_replay import CanReplay
+    from .h5_store import H5Store
+    from .data_pipeline import DataPipeline, CsvSink, H5Sink
+    from .can_ring_buffer import CanMsgQueueView
+    from .object_dictionary import load_object_dictionary
+    from .can_channel import CanChannel, CanChannelRegistry, channel_name
+    from .sharded_acquisition import ShardedAcquisition, AcquisitionShard, samples_of
+    from .node_health import CLOSED
+    from .poll_scheduler import PollScheduler
+    from .deadband import DeadbandFilter
 except (ImportError, ModuleNotFoundError):
     from analysis import Analysis
     from logger_main   import Logger
     from analysis_utils import AnalysisUtils
     from watchdog_can_interface import WATCHCan
+    from sdo_engine import SdoResult, SDO_OK, SDO_SKIPPED, encode_sdo_request, frame_register
+    from pdo_acquisition import PdoAcquisition, count_tpdos
+    from can_recorder import CanRecorder
+    from can_replay import CanReplay
+    from h5_store import H5Store
+    from data_pipeline import DataPipeline, CsvSink, H5Sink
+    from can_ring_buffer import CanMsgQueueView
+    from object_dictionary import load_object_dictionary
+    from can_channel import CanChannel, CanChannelRegistry, channel_name
+    from sharded_acquisition import ShardedAcquisition, AcquisitionShard, samples_of
+    from node_health import CLOSED
+    from poll_scheduler import PollScheduler
+    from deadband import DeadbandFilter
 # Third party modules
-from collections import deque, Counter
+from collections import Counter
 from tqdm import tqdm
 import ctypes as ct
 import logging
@@ -109,35 +135,19 @@ class CanWrapper(object):#READSocketcan):#Instead of object
         self.logger_file = log_file.setup_file_logger(logger_file = logger_file)
         
         self.logger.info(f'Existing logging Handler: {logger_file}')
+        """:obj:`dict` : Settings of each channel of the *_CANSettings.yml file keyed by the channel number"""
+        self.can_settings = {}
         if load_config:
            # Read CAN settings from a file 
             self.__channels, self.__ipAddress,self.__bitrate, self.__samplePoint,\
             self.__sjw, self.__tseg1, self.__tseg2, self.__can_channels, _canSettings =   self.load_settings_file(interface = interface, channel = channel)
-            self.can_0_settings = {}     
-            self.can_1_settings = {}       
-            for ch in self.__can_channels:
-                for value in _canSettings[ch]:
-                    if ch == self.__can_channels[0]:
-                        self.can_0_settings[f'{value}'] = _canSettings[ch][f'{value}']
-                    else:
-                        if ch == self.__can_channels[1]:
-                            self.can_1_settings[f'{value}'] = _canSettings[ch][f'{value}']
+            for ch in self.__can_channels or []:
+                if isinstance(_canSettings[ch], dict) and "channel" in _canSettings[ch]:
+                    settings = {f'{value}': _canSettings[ch][f'{value}'] for value in _canSettings[ch]}
+                    self.can_settings[settings['channel']] = settings
         else:
             pass
 
-        self.__filter = [
-           {"can_id": 0x000, "can_mask": 0xFFF},  # Covers 0x000 to 0x1FF  0101
-           {"can_id": 0x500, "can_mask": 0xF60},  # Covers 0x580 to 0x5FF  0101 0000 0000 
-           {"can_id": 0x600, "can_mask": 0xF60},  # Covers 0x600 to 0x7FF  0110 0000 0000 
-           {"can_id": 0x700, "can_mask": 0xF60},  # Covers 0x700 to 0x7FF  0111 0000 0000 
-           {"can_id": 0x800, "can_mask": 0xF60},  # Covers 0x700 to 0x7FF  0111 0000 0000 
-                ]
-        self.__filter_canlib = [
-            #{"can_id": 0x000, "can_mask": 0x7FF},  # Covers 0x000 to 0x1FF
-            {"can_id": 0x500, "can_mask": 0x540},  # Covers 0x580 to 0x5FF
-            # {"can_id": 0x600, "can_mask": 0x770},  # Covers 0x600 to 0x7FF
-        ]
-        
         # Initialize default arguments
         """:obj:`str` : Internal attribute for the interface"""
         self.__interface = interface
@@ -162,34 +172,51 @@ class CanWrapper(object):#READSocketcan):#Instead of object
         if ipAddress is not None:
              self.__ipAddress = ipAddress
               
-        # Initialize library and set connection parameters
-        self.__cnt = Counter()
-
-        """:obj:`bool` : If communication is established"""
-        self.__busOn0 = False  
-        self.__busOn1 = False
         """:obj:`int` : Internal attribute for the channel index"""
         if channel is not None:
             self.__channel = channel
-        """Internal attribute for the |CAN| channel"""
-        self.ch0= None
-        self.ch1 = None
+        """:class:`CanChannel` : Primary channel [bus, receive thread, ring buffer, TX path and counters]"""
+        self.__primary = self._new_channel(self.__interface, self.__channel)
+        # Initialize library and set connection parameters
+        self.__cnt = self.__primary.cnt
+        # Preallocated ring of all the received frames [one producer: the receive thread]
+        self.__canMsgRing = self.__primary.ring
+        self.__canMsgQueue = CanMsgQueueView(self.__canMsgRing)
+        self.__pill2kill = Event()
+        self.__lock = Lock()
+        self.__recorder = None
+        self.__replay = None
+        self.__poll_scheduler = None
+        """:obj:`float` : Time to wait for an |SDO| download response in s, first timeout of the uploads"""
+        self.__sdo_timeout = 0.01
+        """:obj:`int` : Number of times an |SDO| request without response is sent again"""
+        self.__sdo_retries = 1
+        """:obj:`dict` : Pre-encoded |SDO| request frames and response filters"""
+        self.__sdo_frames = {}
+        """:class:`CanChannelRegistry` : Primary channel and additional channels [can1..canN] with their own reader and TX path"""
+        self.__channelRegistry = CanChannelRegistry([self.__primary])
+        """:class:`MetricsRegistry` : |SDO| latency histograms, counters and queue depths"""
+        self.metrics = self.__primary.metrics
+        self.metrics.add_gauge("can_msg_queue_depth", lambda: len(self.__canMsgQueue), "Frames in canMsgQueue not popped yet")
+        """:class:`NodeHealth` : Adaptive |SDO| timeouts and circuit breaker of the nodes"""
+        self.node_health = self.__primary.node_health
+        self.node_health.initial_timeout = self.__sdo_timeout
         #Setup CAN
         self.can_setup(channel = self.__channel, interface = self.__interface)
         self.set_channel_connection(interface=self.__interface)            
-        """Internal attribute for the |CAN| channel"""
-        self.__busOn0 = True
-        self.__busOn1 = True
-        self.__canMsgQueue = deque([], 100)  # queue with a size of 100 to queue all the messages in the bus
-        self.__pill2kill = Event()
-        self.__lock = Lock()
-        self.__kvaserLock = Lock()
+        """:class:`asyncio.AbstractEventLoop` : Long-lived event loop serving all the |SDO| requests"""
+        self.__loop = None
+        self.__loopThread = None
+        self.start_event_loop()
+        """:class:`SdoEngine` : Pipelined |SDO| client used by :meth:`read_sdo_batch`"""
+        self.sdo_engine = self.__primary.sdo_engine
+        self.sdo_transfer = self.__primary.sdo_transfer
         self.logger_file.success('....Done Initialization!')
         if trim_mode == True:
-            asyncio.run(self.trim_nodes(channel==channel))    
+            self.run_coroutine_sync(self.trim_nodes(channel==channel))    
         
         if nodeid is not None:
-            asyncio.run(self.confirm_nodes(nodeIds = [str(nodeid)]))
+            self.run_coroutine_sync(self.confirm_nodes(nodeIds = [str(nodeid)]))
             self.stop() 
             
     def __str__(self):
@@ -201,11 +228,215 @@ class CanWrapper(object):#READSocketcan):#Instead of object
                 #chdata_EAN = chdata.card_upc_no
                 #chdata_serial = chdata.card_serial_no
                 return f'Using {chdataname}, Bitrate:{self.__bitrate}'
-        elif self.__interface == 'AnaGate': return f'Using {self.ch0}, Bitrate:{self.__bitrate}'
+        elif self.__interface == 'AnaGate': return f'Using {self.__primary.bus}, Bitrate:{self.__primary.bitrate}'
         else:
-            if self.ch0 != None: return f'Using {self.ch0.channel_info}, Bitrate:{self.__bitrate}'
-            if self.ch1 != None: return f'Using {self.ch1.channel_info}, Bitrate:{self.__bitrate}'
+            return f'Using {getattr(self.__primary.bus, "channel_info", self.__primary.name)}, Bitrate:{self.__primary.bitrate}'
                     
+    def start_event_loop(self):
+        """Start the long-lived event loop of the wrapper on a dedicated thread
+
+        All the coroutines of this class (e.g. :meth:`read_sdo_can`) are executed in this
+        loop instead of creating and tearing down a new loop with :func:`asyncio.run` for
+        every single request. The loop is started once in the constructor and closed in :meth:`stop`.
+
+        Returns
+        -------
+        :class:`asyncio.AbstractEventLoop`
+            The running event loop
+        """
+        if self.__loop is not None and self.__loop.is_running():
+            return self.__loop
+        self.__loop = asyncio.new_event_loop()
+        _ready = Event()
+
+        def _run_loop(loop):
+            asyncio.set_event_loop(loop)
+            loop.call_soon(_ready.set)
+            loop.run_forever()
+            loop.close()
+
+        self.__loopThread = Thread(target=_run_loop, args=(self.__loop,), name="CanWrapperLoop", daemon=True)
+        self.__loopThread.start()
+        _ready.wait()
+        return self.__loop
+
+    def stop_event_loop(self, timeout=5):
+        """Stop the event loop started by :meth:`start_event_loop` and wait for its thread to finish"""
+        if self.__loop is None:
+            return
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        if self.__loopThread is not threading.current_thread():
+            self.__loopThread.join(timeout)
+        self.__loop = None
+        self.__loopThread = None
+
+    def run_coroutine(self, coro):
+        """Schedule a coroutine in the event loop of the wrapper. The function is thread-safe
+        and can be called from any thread (e.g. the GUI thread).
+
+        Parameters
+        ----------
+        coro : coroutine
+            e.g. ``self.read_sdo_can(nodeId=3, index=0x1000, subindex=0)``
+
+        Returns
+        -------
+        :class:`concurrent.futures.Future`
+            Future holding the result of the coroutine
+        """
+        if self.__loop is None or not self.__loop.is_running():
+            self.start_event_loop()
+        return asyncio.run_coroutine_threadsafe(coro, self.__loop)
+
+    def run_coroutine_sync(self, coro, timeout=None):
+        """Run a coroutine in the event loop of the wrapper and block until its result is available"""
+        if self.__loopThread is threading.current_thread():
+            coro.close()
+            raise RuntimeError("run_coroutine_sync can not be called from inside the event loop of the wrapper, use await instead")
+        return self.run_coroutine(coro).result(timeout)
+
+    def read_sdo_can_future(self, *args, **kwargs):
+        """Thread-safe version of :meth:`read_sdo_can` returning a :class:`concurrent.futures.Future`.
+        Several requests can be submitted before waiting for any of the results."""
+        return self.run_coroutine(self.read_sdo_can(*args, **kwargs))
+
+    def read_sdo_can_sync(self, *args, timeout=None, **kwargs):
+        """Blocking version of :meth:`read_sdo_can` which can be called from any thread"""
+        return self.run_coroutine_sync(self.read_sdo_can(*args, **kwargs), timeout=timeout)
+
+    def write_can_message_sync(self, *args, timeout=None, **kwargs):
+        """Blocking version of :meth:`write_can_message` which can be called from any thread"""
+        return self.run_coroutine_sync(self.write_can_message(*args, **kwargs), timeout=timeout)
+
+    async def read_sdo_batch(self, requests, channel=None):
+        """Read many objects with pipelined |SDO| requests (one outstanding request per node)
+
+        Parameters
+        ----------
+        requests : :obj:`list` of :obj:`tuple`
+            ``(nodeId, index, subindex)`` or ``(nodeId, index, subindex, bus)``
+        channel : :obj:`str` or :obj:`int`, optional
+            Channel of :attr:`channels` to use [default: the primary channel]
+
+        Returns
+        -------
+        values : :class:`numpy.ndarray`
+            The data of each request
+        status : :class:`numpy.ndarray`
+            Status of each request (see :mod:`sdo_engine`)
+        """
+        return await self.get_can_channel(channel).sdo_engine.read_batch(requests)
+
+    def read_sdo_batch_sync(self, requests, timeout=None, channel=None):
+        """Blocking version of :meth:`read_sdo_batch` which can be called from any thread"""
+        return self.run_coroutine_sync(self.read_sdo_batch(requests, channel=channel), timeout=timeout)
+
+    async def read_sdo_batch_channels(self, requests):
+        """Read the requests of many channels at the same time
+
+        The pipelines of the channels run concurrently in the event loop of the wrapper,
+        every channel has its own receive thread and the channels do not wait for each other.
+
+        Parameters
+        ----------
+        requests : :obj:`dict`
+            Requests of :meth:`read_sdo_batch` keyed by channel [None for the primary channel]
+
+        Returns
+        -------
+        :obj:`dict`
+            ``(values, status)`` keyed by channel
+        """
+        channels = list(requests)
+        results = await asyncio.gather(*[self.read_sdo_batch(requests[ch], channel=ch) for ch in channels])
+        return dict(zip(channels, results))
+
+    # Additional channels
+    def open_channel(self, channel, interface=None, bitrate=None, **kwargs):
+        """Open an additional channel [e.g. can1] next to the primary channel of the wrapper
+
+        The channel gets its own receive thread, ring buffer, TX lock and counters
+        [see :class:`CanChannel`]. It is used with the ``channel`` argument of
+        :meth:`read_sdo_can`, :meth:`read_sdo_batch`, :meth:`write_can_message`
+        and :meth:`read_can_message`.
+
+        Returns
+        -------
+        :class:`CanChannel`
+        """
+        interface = interface if interface is not None else self.__interface
+        name = channel_name(interface, channel)
+        if name in self.__channelRegistry:
+            return self.__channelRegistry[name]
+        _channel = self._new_channel(interface, channel, bitrate=bitrate, **kwargs)
+        self.__channelRegistry.add(_channel).open()
+        self.metrics.add_child(_channel.metrics)
+        return _channel
+
+    def _new_channel(self, interface, channel, bitrate=None, **kwargs):
+        """:class:`CanChannel` with the settings of the wrapper [not opened]"""
+        kwargs.setdefault("sjw", getattr(self, "_CanWrapper__sjw", 4))
+        kwargs.setdefault("tseg1", getattr(self, "_CanWrapper__tseg1", 7))
+        kwargs.setdefault("tseg2", getattr(self, "_CanWrapper__tseg2", 8))
+        kwargs.setdefault("ipAddress", getattr(self, "_CanWrapper__ipAddress", None))
+        if interface not in ['Kvaser', 'AnaGate'] and hasattr(self, "_CanWrapper__primary"):
+            kwargs.setdefault("filters", self.__primary.filters)
+        bitrate = bitrate if bitrate is not None else getattr(self, "_CanWrapper__bitrate", 125000)
+        return CanChannel(interface, channel, bitrate=bitrate, **kwargs)
+
+    def open_channels(self, interface=None, file=None, directory=None):
+        """Open all the channels of the *_CANSettings.yml file of the interface except the primary channel"""
+        interface = interface if interface is not None else self.__interface
+        registry = CanChannelRegistry.from_settings_file(interface, directory=directory, file=file)
+        for _channel in registry:
+            if _channel.name in self.__channelRegistry:
+                continue
+            if interface not in ['Kvaser', 'AnaGate']:
+                _channel.filters = list(self.__primary.filters)
+            self.__channelRegistry.add(_channel).open()
+            self.metrics.add_child(_channel.metrics)
+        return self.__channelRegistry
+
+    def close_channel(self, channel):
+        key = self._channel_key(channel)
+        if key == self.__primary.name:
+            raise ValueError(f"Channel {key} is the primary channel of the wrapper, it is closed by stop")
+        _channel = self.__channelRegistry.remove(key)
+        self.metrics.remove_child(_channel.metrics)
+        return _channel
+
+    def start_metrics_server(self, port=9464, addr="127.0.0.1"):
+        """Serve the metrics of all the channels in the Prometheus text format on http://addr:port/metrics"""
+        return self.metrics.start_http_server(port=port, addr=addr)
+
+    def _channel_key(self, channel):
+        return channel if isinstance(channel, str) else channel_name(self.__interface, channel)
+
+    def get_can_channel(self, channel=None):
+        """Return the :class:`CanChannel` of a channel [name or number, :data:`None` for the primary channel]"""
+        if channel is None:
+            return self.__primary
+        key = self._channel_key(channel)
+        _channel = self.__channelRegistry.get(key)
+        if _channel is None:
+            raise KeyError(f"Channel {key} is not open, use open_channel first")
+        return _channel
+
+    @property
+    def channels(self):
+        """:class:`CanChannelRegistry` : Primary channel and the additional channels opened with :meth:`open_channel`"""
+        return self.__channelRegistry
+
+    @property
+    def primary_channel(self):
+        """:class:`CanChannel` : Primary channel of the wrapper"""
+        return self.__primary
+
+    @property
+    def loop(self):
+        """:class:`asyncio.AbstractEventLoop` : Event loop used by the wrapper"""
+        return self.__loop
+
     async def  confirm_nodes(self, channel=0,nodeIds = ["1","2"], trim = False, busId = 0):
         _nodeIds = nodeIds 
         self.set_nodeList(_nodeIds)
@@ -289,31 +520,13 @@ class CanWrapper(object):#READSocketcan):#Instead of object
             interface: String
         """
         self.logger_file.notice('Going in \'Bus On\' state ...')
+        if interface is not None and interface != self.__primary.interface:
+            raise ValueError(f"The primary channel uses the {self.__primary.interface} interface, not {interface}")
         try:
-            if interface == 'Kvaser':
-                canlib.initializeLibrary()
-                self.ch0= canlib.openChannel(int(self.__channel), canlib.canOPEN_ACCEPT_VIRTUAL) 
-                self.ch0.setBusOutputControl(canlib.Driver.NORMAL)  # New from tutorial
-                self.ch0.setBusParams(freq = int(self.__bitrate), sjw =int(self.__sjw), tseg1=int(self.__tseg1), tseg2=int(self.__tseg2))
-                self.ch0.busOn()
-                for filt in self.__filter_canlib:
-                    canid = filt["can_id"]
-                    mask = filt["can_mask"]    
-                    self.ch0.canSetAcceptanceFilter(canid, mask)
-                self.__canMsgThread = Thread(target=self.read_can_message_thread)
-            elif interface == 'AnaGate':
-                self.ch0= analib.Channel(ipAddress=self.__ipAddress, port=self.__channel, baudrate=self.__bitrate)
-            elif interface == 'virtual':
-                channel = "vcan" + str(self.__channel)
-                self.ch0= can.interface.Bus(bustype="socketcan", channel=channel)
-                             
-            else:
-                channel = "can" + str(self.__channel)
-                self.ch0= can.interface.Bus(bustype=interface, channel=channel, bitrate=self.__bitrate) 
-                self.ch0.set_filters(self.__filter) 
+            self.__primary.open()
             self.logger_file.success(str(self))      
         except Exception:
-            self.logger_file.error("TCP/IP or USB socket error in channel %s with %s interface" % (self.ch0,interface)) 
+            self.logger_file.error("TCP/IP or USB socket error in channel %s with %s interface" % (self.__primary.name,interface)) 
             sys.exit(1)      
     
     def start_channel_connection(self, interface =None):
@@ -331,93 +544,336 @@ class CanWrapper(object):#READSocketcan):#Instead of object
             In case of errors
         """
         self.logger_file.notice('Starting CAN Connection ...')
-        _interface = self.get_interface()
-        if _interface == 'Kvaser':
-            if not self.__busOn0:
-                self.logger_file.notice('Going in \'Bus On\' state ...')
-                self.__busOn0 = True
-        if _interface == 'AnaGate':
-            if not self.ch0.deviceOpen:
+        if not self.__primary.bus_on:
+            self.logger_file.notice('Going in \'Bus On\' state ...')
+            self.__primary.open()
+        if self.__primary.interface == 'AnaGate':
+            _bus = self.__primary.bus
+            if not _bus.deviceOpen:
                 self.logger_file.notice('Reopening AnaGate CAN interface')
-                self.ch0.openChannel() 
-            if self.ch0.state != 'CONNECTED':
+                _bus.openChannel() 
+            if _bus.state != 'CONNECTED':
                 self.logger_file.notice('Restarting AnaGate CAN interface.')
-                self.ch0.restart()
+                _bus.restart()
             # self.__cbFunc = analib.wrapper.dll.CBFUNC(self._anagateCbFunc())
-            # self.ch0.setCallback(self.__cbFunc)
+            # _bus.setCallback(self.__cbFunc)
         else:# SocketCAN
             pass
-        self.__canMsgThread = Thread(target=self.read_can_message_thread)
-        self.__canMsgThread.start()
+        if self.dispatcher is None or not self.dispatcher.is_alive():
+            self.start_dispatcher()
+
+    def add_can_filters(self, cobids):
+        """Accept additional |COBID| in the acceptance filters of the primary channel [e.g. the TPDOs]"""
+        self.__primary.add_filters(cobids)
+
+    def start_dispatcher(self):
+        """Start the receive thread :class:`CanDispatcher` of the primary channel.
+        The thread blocks on the socket of SocketCAN channels and in the read function of the other interfaces.
+        """
+        return self.__primary.start_dispatcher()
+
+    def add_frame_observer(self, observer, rx=True, tx=False):
+        """Call ``observer(cobid, data, dlc, flag, t, error_frame)`` for every received (rx) and/or
+        transmitted (tx) frame of the primary channel. The observers are kept if the receive thread is restarted."""
+        self.__primary.add_frame_observer(observer, rx=rx, tx=tx)
+
+    def remove_frame_observer(self, observer):
+        self.__primary.remove_frame_observer(observer)
+
+    def start_recorder(self, filename, flush_interval=0.5):
+        """Record all the received and transmitted frames into a binary file (see :mod:`can_recorder`)"""
+        self.stop_recorder()
+        self.__recorder = CanRecorder(filename, channel=f"{self.__interface}{self.__channel}", interface=self.__interface,
+                                      flush_interval=flush_interval)
+        self.add_frame_observer(self.__recorder.record)
+        self.add_frame_observer(self.__recorder.record_tx, rx=False, tx=True)
+        self.__recorder.start()
+        self.logger_file.notice(f"Recording CAN frames to {filename}")
+        return self.__recorder
+
+    def stop_recorder(self):
+        if self.__recorder is not None:
+            self.remove_frame_observer(self.__recorder.record)
+            self.remove_frame_observer(self.__recorder.record_tx)
+            self.__recorder.stop()
+            self.__recorder = None
+
+    def start_replay(self, trace, speed=1.0, repeat=1, **kwargs):
+        """Inject recorded traffic into the receive path of the channel (see :class:`CanReplay`)
+
+        Parameters
+        ----------
+        trace : :obj:`str`
+            Recording of :meth:`start_recorder`, candump log or python-can log
+        speed : :obj:`float`
+            1 at the recorded rate, N N times faster, 0 as fast as possible
+        """
+        self.stop_replay()
+        self.__replay = CanReplay(trace, self, speed=speed, repeat=repeat, **kwargs)
+        self.__replay.start()
+        return self.__replay
+
+    def stop_replay(self):
+        if self.__replay is not None:
+            self.__replay.stop()
+            self.__replay = None
+
+    def start_polling(self, nodeIds, file="mops_config.yml", directory=None, buses=(0,), periods=None, default=None,
+                      callback=None, channel=None, utilisation=0.5):
+        """Poll the objects of the nodes with a sampling period per object (see :class:`PollScheduler`)
 
-    async def read_mopshub_buses(self, bus_range, file, directory , nodeIds, outputname, outputdir, n_readings):
+        Parameters
+        ----------
+        periods : :obj:`dict`, optional
+            Periods in s by object, index, channel type or group [see :func:`object_periods`],
+            default: the ``polling`` section of the yaml file of the device
+        callback : callable, optional
+            ``callback(t, requests, values, status)`` after every batch
+        utilisation : :obj:`float`
+            Share of the bus available to the polling
+        """
+        self.stop_polling()
+        od = load_object_dictionary(file=file, directory=directory if directory is not None else os.path.join(lib_dir, config_dir))
+        self.__poll_scheduler = PollScheduler(self, callback=callback, utilisation=utilisation, channel=channel,
+                                              counters=self.get_can_channel(channel).cnt)
+        self.__poll_scheduler.add_object_dictionary(od, nodeIds, buses=buses, periods=periods, default=default)
+        self.__poll_scheduler.start()
+        return self.__poll_scheduler
+
+    def stop_polling(self):
+        """Stop the scheduler of :meth:`start_polling` and return its :meth:`PollScheduler.statistics`"""
+        if self.__poll_scheduler is None:
+            return None
+        self.__poll_scheduler.stop()
+        statistics = self.__poll_scheduler.statistics()
+        self.__poll_scheduler = None
+        if statistics["overruns"]:
+            self.logger_file.warning(f'{statistics["overruns"]} polling samples were lost [demand {statistics["demand"]:.0f} SDO/s, '
+                                     f'budget {statistics["capacity"]:.0f} SDO/s, max lag {statistics["max_lag"] * 1e3:.1f} ms]')
+        return statistics
+
+    @property
+    def poll_scheduler(self):
+        """:class:`PollScheduler` of :meth:`start_polling` or None"""
+        return self.__poll_scheduler
+
+    def stop_dispatcher(self):
+        self.__primary.stop_dispatcher()
+
+    @property
+    def dispatcher(self):
+        """:class:`CanDispatcher` : Receive thread of the primary channel. Observers (e.g. a GUI trace or a recorder)
+        can be added with :meth:`CanDispatcher.add_observer`"""
+        return self.__primary.dispatcher
+
+    async def read_mopshub_buses(self, bus_range, file, directory , nodeIds, outputname, outputdir, n_readings, storage = "CSV", channel=None, channels=None, processes=False, deadband=False):
+        """Read the ADC channels of many nodes on many MOPSHUB buses
+        The data are saved to outputdir/outputname.csv [storage = "CSV"] or to one table
+        per (bus, node) in outputdir/outputname.h5 [storage = "HDF5", see :class:`H5Store`]
+        With ``channels`` [e.g. ["can0", "can1"]] all the channels are read at the same time,
+        each one to its own file outputname_<channel>. With ``processes`` every channel is
+        read by its own process [see :class:`ShardedAcquisition`].
+        Every sample is saved by default. With ``deadband`` [True or a :class:`DeadbandFilter`] only the
+        samples passing the filter of the ``deadband`` section of the yaml file [or the given filter] are
+        saved; the filter is meant for the GUI and the OPC UA server, the archive should keep every sample.
+        """
+        if channels and processes:
+            shards = [AcquisitionShard(self.__interface, ch, file, directory, nodeIds, bus_range, bitrate=self.__bitrate,
+                                       ipAddress=getattr(self, "_CanWrapper__ipAddress", None), n_readings=n_readings)
+                      for ch in channels]
+            await asyncio.to_thread(self.read_mopshub_shards, shards, file, directory, outputname, outputdir, storage, deadband=deadband)
+            return
+        if channels:
+            await asyncio.gather(*[self.read_mopshub_buses(bus_range, file, directory, nodeIds,
+                                                           f"{outputname}_{self._channel_key(ch)}", outputdir,
+                                                           n_readings, storage=storage, channel=ch, deadband=deadband)
+                                   for ch in channels])
+            return
         SDO_TX=0x600 
         SDO_RX=0x580
         index = 0x1000
-        self.logger_file.info(f'Reading ADC channels of Mops with ID {nodeId}')
-        dev = AnalysisUtils().open_yaml_file(file=file, directory=directory)
-        # yaml file is needed to get the object dictionary items
-        _adc_channels_reg = dev["adc_channels_reg"]["adc_channels"]
-        _adc_index = list(dev["adc_channels_reg"]["adc_index"])[0]
-        _channelItems = [int(channel) for channel in list(_adc_channels_reg)]
+        self.logger_file.info(f'Reading ADC channels of Mops with IDs {nodeIds}')
+        # The object dictionary is compiled once per yaml file
+        od = load_object_dictionary(file=file, directory=directory)
+        dev = od.dev
+        _adc_index = od.adc[0].index_key
         # Write header to the data
-        fieldnames = ['time',"test_tx",'bus_id',"nodeId","adc_ch","index","sub_index","adc_data", "adc_data_converted","reqmsg","requestreg","respmsg","responsereg", "status"]
+        fieldnames = ['time',"test_tx",'bus_id',"nodeId","adc_ch","index","sub_index","adc_data", "adc_data_converted", "status"]
         
-        csv_writer = AnalysisUtils().build_data_base(fieldnames=fieldnames,outputname =outputname, directory = outputdir)
+        csv_writer, csv_file, h5_store = None, None, None
+        if storage == "HDF5":
+            h5_store = H5Store(os.path.join(outputdir, outputname + ".h5"))
+        else:
+            csv_writer, csv_file = AnalysisUtils().build_data_base(fieldnames=fieldnames,outputname =outputname, directory = outputdir)
+        pipelines = self.start_storage_pipelines(csv_writer=csv_writer, csv_file=csv_file, h5_store=h5_store,
+                                                 formatter=lambda s: (str(s[0]), str(1), str(s[1]), str(s[2]), str(s[3]),
+                                                                      str(_adc_index), str(s[3] - 2), str(s[4]), str(s[5] if s[4] is not None else 0),
+                                                                      int(s[4] is not None)))
+        # All the requests of one reading are sent through the pipelined SDO engine
+        requests = od.adc_requests(nodeIds, buses=bus_range)
+        _channels = np.tile(od.adc_channels(), len(requests) // max(len(od.adc_channels()), 1))
+        _deadband = self._deadband_filter(deadband, dev)
+        converter = od.converter()
         monitoringTime = time.time()
-        count = 0
-        for point in np.arange(0, n_readings):
-            for bus in bus_range:
-                for nodeId in nodeIds:  
-                # Read ADC channels
-                    for c in tqdm(np.arange(len(_channelItems)),colour="green"):
-                        channel =  _channelItems[c]
-                        subindex = channel - 2
-                        data_point, reqmsg, requestreg, respmsg,responsereg , status, errorResponse  =  await self.read_sdo_can(nodeId = nodeId,
-                                                                                                                  index=int(_adc_index, 16),
-                                                                                                                  subindex=subindex,
-                                                                                                                  bus = bus)
-                        
-                        ts = time.time()
-                        elapsedtime = ts - monitoringTime
-                        if errorResponse: code = "E"
-                        else: code = "R"
-                        if data_point is not None:
-                             adc_converted = Analysis().adc_conversion(_adc_channels_reg[str(channel)], data_point)
-                             adc_converted = round(adc_converted, 3)
-                             self.logger.report(f'[{code}] Got data for channel {channel}: = {adc_converted}')
-                        else: adc_converted = 0
-                        csv_writer.writerow((str(elapsedtime),
-                                             str(1),
-                                             str(bus),
-                                             str(nodeId),
-                                             str(channel),
-                                             str(_adc_index),
-                                             str(subindex),
-                                             str(data_point),
-                                             str(adc_converted),
-                                             reqmsg,
-                                             str(requestreg), 
-                                             respmsg,
-                                             str(responsereg), 
-                                             status))
-                await asyncio.sleep(0.01)
-        self.logger_file.info(f'No. request timeout = {self.__cnt["SDO_read_request_timeout"]}|| No. read abort {self.__cnt["SDO_read_abort"]}')
+        for point in tqdm(np.arange(0, n_readings),colour="green"):
+            values, status = await self.read_sdo_batch(requests, channel=channel)
+            ts = time.time()
+            elapsedtime = ts - monitoringTime
+            # Convert the whole reading at once
+            converted = np.round(converter.convert(values, channels=_channels), 3)
+            for (nodeId, _, subindex, bus), data_point, st, adc_converted in zip(requests, values, status, converted):
+                adc_channel = subindex + 2
+                if st == SDO_OK:
+                    data_point = int(data_point)
+                    adc_converted = float(adc_converted)
+                    self.logger.report(f'[R] Got data for channel {adc_channel}: = {adc_converted}')
+                else: data_point, adc_converted = None, None
+                if _deadband is not None and not _deadband.accept((channel, bus, nodeId, adc_channel), adc_converted, elapsedtime):
+                    continue
+                for pipeline in pipelines:
+                    pipeline.put((elapsedtime, bus, nodeId, adc_channel, data_point, adc_converted))
+            await asyncio.sleep(0.01)
+        for pipeline in pipelines:
+            self.stop_storage_pipeline(pipeline)
+        if _deadband is not None:
+            _stats = _deadband.statistics()
+            self.logger_file.info(f'Deadband: {_stats["published"]} samples saved, {_stats["suppressed"]} unchanged samples suppressed')
+        self.logger_file.info(f'No. request timeout = {self.__cnt["SDO_read_request_timeout"]}|| No. response timeout = {self.__cnt["SDO_read_response_timeout"]}|| No. read abort {self.__cnt["SDO_read_abort"]}|| No. skipped {self.__cnt["SDO_read_skipped"]}')
+        _parked = self.get_can_channel(channel).node_health.parked()
+        if _parked:
+            self.logger_file.warning(f'Nodes parked by the circuit breaker [bus, nodeId]: {_parked}')
+        _latency = self.metrics.sdo_latency().summary()
+        if _latency["count"]:
+            self.logger_file.info(f'SDO round trip: p50 = {_latency["p50"] * 1e3:.3f} ms|| p99 = {_latency["p99"] * 1e3:.3f} ms|| max = {_latency["max"] * 1e3:.3f} ms [{_latency["count"]} responses]')
         self.logger_file.notice("MOPSHUB data are saved to %s/%s" % (outputdir,outputname))
             
+    def _deadband_filter(self, deadband, dev):
+        """:class:`DeadbandFilter` of the deadband argument of :meth:`read_mopshub_buses` or None"""
+        if isinstance(deadband, DeadbandFilter):
+            return deadband
+        if deadband and dev.get("deadband", None):
+            return DeadbandFilter.from_config(dev)
+        return None
+
+    def read_mopshub_shards(self, shards, file, directory, outputname, outputdir, storage = "CSV", context = "spawn", deadband=False):
+        """Run a :class:`ShardedAcquisition` until all the shards finished their readings
+        and save the merged stream to one file per shard outputname_<channel> [same format as :meth:`read_mopshub_buses`,
+        every sample unless ``deadband`` is given]
+        """
+        fieldnames = ['time',"test_tx",'bus_id',"nodeId","adc_ch","index","sub_index","adc_data", "adc_data_converted", "status"]
+        _od = load_object_dictionary(file=file, directory=directory)
+        _adc_index = _od.adc[0].index_key
+        _deadband = self._deadband_filter(deadband, _od.dev)
+        acquisition = ShardedAcquisition(shards, context=context)
+        pipelines = {}
+        for shard_id, shard in enumerate(shards):
+            _outputname = f"{outputname}_{self._channel_key(shard.channel)}"
+            csv_writer, csv_file, h5_store = None, None, None
+            if storage == "HDF5":
+                h5_store = H5Store(os.path.join(outputdir, _outputname + ".h5"))
+            else:
+                csv_writer, csv_file = AnalysisUtils().build_data_base(fieldnames=fieldnames,outputname =_outputname, directory = outputdir)
+            pipelines[shard_id] = self.start_storage_pipelines(csv_writer=csv_writer, csv_file=csv_file, h5_store=h5_store,
+                                                               formatter=lambda s: (str(s[0]), str(1), str(s[1]), str(s[2]), str(s[3]),
+                                                                                    str(_adc_index), str(s[3] - 2), str(s[4]), str(s[5] if s[4] is not None else 0),
+                                                                                    int(s[4] is not None)))
+        monitoringTime = time.time()
+        def _store(block):
+            block = block.copy()
+            block["time"] -= monitoringTime
+            shard_id = int(block["shard"][0])
+            samples = samples_of(block)
+            if _deadband is not None:
+                # The shards read the same buses and nodes on different channels
+                samples = _deadband.filter(samples, prefix=(shard_id,))
+            for pipeline in pipelines[shard_id]:
+                pipeline.put_many(samples)
+        acquisition.subscribe(_store)
+        statistics = acquisition.start().join()
+        for shard_pipelines in pipelines.values():
+            for pipeline in shard_pipelines:
+                self.stop_storage_pipeline(pipeline)
+        for shard_id, stats in statistics.items():
+            self.logger_file.info(f'Shard {shard_id} [{shards[shard_id].interface}{shards[shard_id].channel}]: {stats["samples"]} samples, worker {stats["worker"]}')
+            if stats["error"] is not None:
+                self.logger_file.error(f'Shard {shard_id} failed: {stats["error"]}')
+        self.logger_file.notice("MOPSHUB data are saved to %s/%s_*" % (outputdir,outputname))
+        return statistics
+
     def create_mopshub_adc_data_file(self,outputname, outputdir):
         # Write header to the data
         fieldnames = ['Time', 'Channel', "nodeId", "ADCChannel", "ADCData" , "ADCDataConverted"]
         csv_writer = AnalysisUtils().build_data_base(fieldnames=fieldnames,outputname = outputname, directory = outputdir)        
         return csv_writer
     
+    def start_storage_pipelines(self, csv_writer=None, csv_file=None, h5_store=None, formatter=None,
+                                batch_rows=1000, batch_interval=1.0, maxsize=100000):
+        """Start one :class:`DataPipeline` worker per storage [csv file and/or :class:`H5Store`]
+        The samples put into the pipelines are ``(time, bus, nodeId, channel, raw, value)``.
+    
+        Parameters
+        ----------
+        formatter : callable, optional
+            Converts a sample into the row of the csv file
+        batch_rows, batch_interval :
+            The samples are written in batches of batch_rows samples or after batch_interval s
+        """
+        pipelines = []
+        if csv_writer is not None:
+            pipelines.append(DataPipeline(CsvSink(csv_writer, csv_file, formatter=formatter), maxsize=maxsize,
+                                          batch_rows=batch_rows, batch_interval=batch_interval, name="csv"))
+        if h5_store is not None:
+            pipelines.append(DataPipeline(H5Sink(h5_store), maxsize=maxsize,
+                                          batch_rows=batch_rows, batch_interval=batch_interval, name="hdf5"))
+        for pipeline in pipelines:
+            pipeline.start()
+        return pipelines
+
+    def stop_storage_pipeline(self, pipeline):
+        """Write the queued samples, close the storage and count the dropped samples"""
+        statistics = pipeline.stop()
+        self.__cnt.inc('storage_dropped', statistics["dropped"])
+        self.__cnt.inc('storage_errors', statistics["errors"])
+        return statistics
+
+    async def setup_pdo_acquisition(self, nodeIds, adc_index, subindices, dictionary_items=None, bus=0):
+        """Configure the TPDO mappings of the ADC channels once for push-mode acquisition
+    
+        Parameters
+        ----------
+        nodeIds : :obj:`list` of :obj:`int`
+            The nodes to be configured
+        adc_index : :obj:`int`
+            The |OD| index of the ADC channels [e.g. 0x2400]
+        subindices : :obj:`list` of :obj:`int`
+            The ADC subindices in the order of the returned samples
+        dictionary_items : :obj:`dict`
+            The index_items of the yaml file used to find the number of TPDOs
+    
+        Returns
+        -------
+        :class:`PdoAcquisition`
+            The configured acquisition or None if a node rejected the configuration
+        """
+        _n_tpdo = count_tpdos(dictionary_items) if dictionary_items is not None else 2
+        pdo = PdoAcquisition(self, nodeIds=nodeIds, subindices=subindices, adc_index=adc_index,
+                             n_tpdo=_n_tpdo, bus=bus)
+        if not await pdo.configure():
+            self.logger_file.warning("TPDO configuration failed. Use SDO polling instead.")
+            return None
+        return pdo
+
     async def read_adc_channels(self, file= None, directory= None , nodeId= None,
                                 resistor_ratio = None,ref_voltage = None,
-                                 outputdir= None, n_readings= None, csv_writer= None, csv_file = None):
+                                 outputdir= None, n_readings= None, csv_writer= None, csv_file = None,
+                                 acquisition_mode = "SDO", h5_store = None):
         """Start actual CANopen communication
         This function contains an endless loop in which it is looped over all
         ADC channels. Each value is read using
-        :meth:`read_sdo_can_thread` and written to its corresponding
+        :meth:`read_sdo_can` [acquisition_mode = "SDO"] or all the channels are
+        sampled at one SYNC with the TPDOs [acquisition_mode = "PDO"] and written to its corresponding
+        csv file and/or to the table of the node in h5_store [:class:`H5Store`].
+        The files are written by the workers of :class:`DataPipeline`, not in the acquisition loop.
         """     
         self.logger.info(f'Reading ADC channels of Mops with ID {nodeId}')
         def exit_handler():
@@ -426,51 +882,57 @@ class CanWrapper(object):#READSocketcan):#Instead of object
             self.stop()
             sys.exit(0)
             
-        dev = AnalysisUtils().open_yaml_file(file=file, directory=directory)
-        # yaml file is needed to get the object dictionary items
-        _adc_channels_reg = dev["adc_channels_reg"]["adc_channels"]
-        _adc_index = list(dev["adc_channels_reg"]["adc_index"])[0]
-        _channelItems = [int(channel) for channel in list(_adc_channels_reg)]
+        # The object dictionary is compiled once per yaml file
+        od = load_object_dictionary(file=file, directory=directory)
+        dev = od.dev
+        _adc = od.adc[0]
+        _adc_index = _adc.index
+        pdo = None
+        if acquisition_mode == "PDO":
+            pdo = await self.setup_pdo_acquisition(nodeIds=[nodeId], adc_index=_adc_index,
+                                                   subindices=[int(s) for s in _adc.subindices],
+                                                   dictionary_items=dev["Application"]["index_items"])
         atexit.register(exit_handler)
+        converter = od.converter(ref_voltage=ref_voltage, resistor_ratio=resistor_ratio)
+        _channel = self.get_channel()
+        pipelines = self.start_storage_pipelines(csv_writer=csv_writer, csv_file=csv_file, h5_store=h5_store,
+                                                 formatter=lambda s: (str(round(s[0], 1)), str(_channel), str(s[2]),
+                                                                      str(s[3] - 2), str(s[4]), str(s[5])))
         monitoringTime = time.time()
+        elapsedtime = 0
         i = 0
         try:
             while True:
                 i = i+1
+                if pdo is not None:
+                    values, status, ts = await pdo.read_sweep()
                 # Read ADC channels
-                for c in np.arange(len(_channelItems)): #tqdm(np.arange(len(_channelItems))):
-                    channel =  _channelItems[c]
-                    subindex = channel - 2                                                                                                 
-                    data_point,_,_,_,_,_,errorResponse =  await self.read_sdo_can(nodeId = nodeId, 
-                                                                    index = int(_adc_index, 16),
-                                                                    subindex = subindex)
+                for c, (subindex, channel) in enumerate(zip(_adc.subindices, _adc.channels)):
+                    if pdo is not None:
+                        data_point = int(values[0, c]) if status[0, c] == SDO_OK else None
+                        errorResponse = data_point is None
+                    else:
+                        data_point,_,_,_,_,_,errorResponse =  await self.read_sdo_can(nodeId = nodeId, 
+                                                                        index = _adc_index,
+                                                                        subindex = int(subindex))
+                        ts = time.time()
                     if errorResponse: code = "E"
                     else: code = "R"
                     #await asyncio.sleep(0.01)
-                    ts = time.time()
                     elapsedtime = ts - monitoringTime
                     if data_point is not None:
-                        adc_converted = Analysis().adc_conversion(_adc_channels_reg[str(channel)], data_point,resistor_ratio ,ref_voltage)
-                        adc_converted = round(adc_converted, 3)
-                        csv_writer.writerow((str(round(elapsedtime, 1)),
-                                             str(self.get_channel()),
-                                             str(nodeId),
-                                             str(subindex),
-                                             str(data_point),
-                                             str(adc_converted)))
+                        adc_converted = round(converter.convert_one(channel, data_point), 3)
+                        for pipeline in pipelines:
+                            pipeline.put((elapsedtime, 0, nodeId, channel, data_point, adc_converted))
                         self.logger.report(f'[{code}] Got data for channel {channel}: = {adc_converted} V [ADC = {data_point}]')
-                        csv_file.flush() # Flush the buffer to update the file
         except (KeyboardInterrupt):
             #Handle Ctrl+C to gracefully exit the loop
             self.logger_file.warning("User interrupted. Closing the program.")             
         finally:
-            csv_writer.writerow((str(elapsedtime),
-                         str(None),
-                         str(None),
-                         str(None), 
-                         str(None), 
-                         "End of Test"))  
-            csv_file.close()
+            for pipeline in pipelines:
+                if isinstance(pipeline.sink, CsvSink):
+                    pipeline.sink.footer = (str(elapsedtime), str(None), str(None), str(None), str(None), "End of Test")
+                self.stop_storage_pipeline(pipeline)
 
             self.logger_file.notice("ADC data are saved to %s" % (outputdir))
             return None
@@ -489,22 +951,9 @@ class CanWrapper(object):#READSocketcan):#Instead of object
             
         self.logger_file.warning('Resetting the CAN channel.')
         #Stop the bus
-        with self.lock:
-            self.__cnt['Residual CAN messages'] = len(self.__canMsgQueue)
         self.__pill2kill.set()
-        if self.__busOn0:
-            if _interface == 'Kvaser':
-                try:
-                    self.__canMsgThread.join()
-                except RuntimeError:
-                    pass
-                self.ch0.busOff()
-                self.ch0.close()
-            elif _interface == 'AnaGate': 
-                self.ch0.close()
-            else:
-                self.ch0.shutdown()            
-        self.__busOn0 = False
+        self.__primary.close()
+        self.__cnt['Residual CAN messages'] = len(self.__canMsgQueue)
         self.set_channel_connection(interface = _interface)
         self.__pill2kill = Event()
         self.logger_file.notice('The channel is reset') 
@@ -515,28 +964,20 @@ class CanWrapper(object):#READSocketcan):#Instead of object
         correct manner. When this class is used within a :obj:`with` statement
         this method is called automatically when the statement is exited.
         """
-        with self.lock:
-            self.__cnt['Residual CAN messages'] = len(self.__canMsgQueue)
         self.logger_file.warning('Stopping helper threads. This might take a '
                             'minute')
         self.logger_file.warning('Closing the CAN channel.')
         self.__pill2kill.set()
-        if self.__busOn0:
-            if self.__interface == 'Kvaser':
-                try:
-                    self.__canMsgThread.join()
-                except RuntimeError:
-                    pass
-                self.logger_file.warning('Going in \'Bus Off\' state.')
-                self.ch0.busOff()
-                self.ch0.close()
-            elif self.__interface == 'AnaGate': 
-                self.ch0.close()
-            else:
-                self.ch0.shutdown()
-                #channel = "can" + str(self.__channel)
-                        
-        self.__busOn0 = False
+        self.stop_polling()
+        self.stop_replay()
+        if self.__interface == 'Kvaser':
+            self.logger_file.warning('Going in \'Bus Off\' state.')
+        # The receive threads and the buses of all the channels [primary included]
+        self.__channelRegistry.close_all()
+        self.stop_recorder()
+        self.__cnt['Residual CAN messages'] = len(self.__canMsgQueue)
+        self.metrics.stop_http_server()
+        self.stop_event_loop()
         self.logger_file.warning('Stopping the server.')
     
     async def read_sdo_can_thread(self, nodeId=None, index=None, subindex=None, max_data_bytes=8, SDO_TX=None, SDO_RX=None, cobid=None,bus = 0):
@@ -566,35 +1007,45 @@ class CanWrapper(object):#READSocketcan):#Instead of object
         self.start_channel_connection(interface=self.__interface)
         if nodeId is None or index is None or subindex is None:
             self.logger_file.warning('SDO read protocol cancelled before it could begin.')         
-            return None
+            return None, None
+        if SDO_TX is None: SDO_TX = 0x600
+        if SDO_RX is None: SDO_RX = 0x580
+        if cobid is None: cobid = SDO_TX + nodeId
         self.logger_file.info(f'Send SDO read request to node {nodeId}.')
         msg = [0 for i in range(max_data_bytes)]
         msg[0] = 0x40
         msg[1], msg[2] = index.to_bytes(2, 'little')
         msg[3] = subindex
         msg[7] =bus
-        try:
-            await self.write_can_message(cobid = cobid, 
-                                         data = msg, 
-                                         dlc = 8)
-        except CanGeneralError:
-            self.__cnt['SDO_read_request_timeout'] += 1
-            return None
+        # The waiter is registered before sending so that the response can not be missed
+        waiter = self.dispatcher.register_waiter(SDO_RX + nodeId, self._sdo_response_filter(index, subindex))
+        reqmsg = await self.write_can_message(cobid = cobid, 
+                                              data = msg, 
+                                              dlc = 8)
+        if not reqmsg:
+            self.dispatcher.cancel_waiter(waiter)
+            self.__cnt.inc('SDO_read_request_timeout')
+            return None, None
         # Wait for response
-        t0 = time.perf_counter()
-        messageValid = False
-        errorResponse = False
-        cobid_ret, data_ret = None, None    
         timeout = 1000
-        while time.perf_counter() - t0 < timeout / 1000:
-            with self.__lock:
-                # check the message validity [nodid, msg size,...]
-                for i, (cobid_ret, msg_ret, dlc, flag, t , error_frame) in zip(range(len(self.__canMsgQueue)), self.__canMsgQueue):
-                    data_ret, messageValid, errorResponse  = await self.check_valid_message(nodeId, index, subindex, cobid_ret, msg_ret, dlc, error_frame, SDO_TX, SDO_RX)
-                    if (messageValid or errorResponse): 
-                        del self.__canMsgQueue[i]
-                    self.__canMsgThread.join()#Dominic to join the thread with Pill 2 kill  
+        frame = await waiter.wait_async(timeout / 1000)
+        if frame is None:
+            self.dispatcher.cancel_waiter(waiter)
+            self.__cnt.inc('SDO_read_response_timeout')
+            return None, None
+        cobid_ret, msg_ret, dlc, flag, t , error_frame = frame
+        data_ret, messageValid, errorResponse  = await self.check_valid_message(nodeId, index, subindex, cobid_ret, msg_ret, dlc, error_frame, SDO_TX, SDO_RX)
         return cobid_ret, data_ret
+
+    @staticmethod
+    def _sdo_response_filter(index, subindex):
+        """Return a predicate accepting only the |SDO| responses to the given index and subindex"""
+        def _filter(frame):
+            data = frame[1]
+            return (frame[2] == 8
+                    and data[1] | (data[2] << 8) == index
+                    and data[3] == subindex)
+        return _filter
     
     async def check_valid_message(self, nodeId = None, index = None, subindex = None, cobid_ret = None, data_ret = None, dlc = None, error_frame = None, SDO_TX = None, SDO_RX = None, print_sdo = None):
         # The following are the only expected response
@@ -632,7 +1083,7 @@ class CanWrapper(object):#READSocketcan):#Instead of object
             # 1. read the can reset signal
             # 2. read the next can message and check its validity
             #self.logger_file.notice(f'Received an error response with cobid:{hex(cobid_ret)} while calling subindex: {hex(subindex)}')
-            self.__cnt['error_frame'] += 1
+            self.__cnt.inc('error_frame')
             cobid_ret, data_ret, dlc, flag, _, _, t, error_frame = await self.read_can_message()
             messageValid = (dlc == 8 
                             and cobid_ret == SDO_RX + nodeId
@@ -650,13 +1101,15 @@ class CanWrapper(object):#READSocketcan):#Instead of object
             return int.from_bytes(data, 'little'), messageValid, errorResponse
         else:
             self.logger_file.warning(f'SDO read response timeout (node {nodeId}, index {index:04X}:{subindex:02X})')
-            self.__cnt['SDO_read_response_timeout'] += 1
+            self.__cnt.inc('SDO_read_response_timeout')
             return None, messageValid, errorResponse
     
-    async def read_sdo_can(self, nodeId=None, index=None, subindex=None, max_data_bytes=8, SDO_TX=0x600, SDO_RX=0x580, bus =0, cobid=None):
+    async def read_sdo_can(self, nodeId=None, index=None, subindex=None, max_data_bytes=8, SDO_TX=0x600, SDO_RX=0x580, bus =0, cobid=None, channel=None):
         """Read an object via |SDO|
     
         Currently expedited and segmented transfer is supported by this method.
+        A segmented upload of the node is completed with :class:`SdoTransfer`,
+        use :meth:`upload_sdo` to get the raw bytes of large objects.
         The function will writing the dictionary request from the master to the node then read the response from the node to the master
         The user has to decide how to decode the data.
     
@@ -668,73 +1121,206 @@ class CanWrapper(object):#READSocketcan):#Instead of object
             The Object Dictionary index to read from
         subindex : :obj:`int`
             |OD| Subindex. Defaults to zero for single value entries.
+        channel : :obj:`str` or :obj:`int`, optional
+            Channel of :attr:`channels` to use [default: the primary channel]
     
         Returns
         -------
-        :obj:`list` of :obj:`int`
-            The data if was successfully read
-        :data:`None`
-            In case of errors
+        :class:`SdoResult`
+            Unpacks as ``(data, reqmsg, requestreg, respmsg, responsereg, status, errorResponse)``.
+            data is :data:`None` in case of errors. The registers are only computed if they are read.
+
+        The response timeout is the adaptive one of the node [see :class:`NodeHealth`], a request
+        without response is sent again up to :meth:`get_sdo_retries` times and the requests to
+        a parked node return immediately without being sent.
         """
-        status =0;
-        respmsg, responsereg,errorResponse = None, None, None
         if nodeId is None or index is None or subindex is None:
             self.logger_file.warning('SDO read protocol cancelled before it could begin.')         
-            return None, None, None,respmsg, responsereg , status, errorResponse             
-        
-        if cobid : cobid = cobid
-        else: cobid = SDO_TX + nodeId
-        msg = [0 for i in range(max_data_bytes)]
-        if SDO_TX==0x600 : msg[0] = 0x40
-        else : msg[0] = 0x00
+            return SdoResult()
+        # The request frame and the response filter are encoded once per object
+        key = (nodeId, index, subindex, bus, SDO_TX, SDO_RX, cobid)
+        _request = self.__sdo_frames.get(key)
+        if _request is None:
+            _request = self.__sdo_frames[key] = (encode_sdo_request(nodeId, index, subindex, bus, SDO_TX, cobid),
+                                                 self._sdo_response_filter(index, subindex) if SDO_RX != 0x700 else None)
+        (cobid, msg), _filter = _request
+        port = self.get_can_channel(channel)
+        dispatcher, cnt, metrics, health = port.dispatcher, port.cnt, port.metrics, port.node_health
+        if not health.allow(nodeId, bus):
+            metrics.observe_sdo(nodeId, bus, None, SDO_SKIPPED)
+            return SdoResult(status=SDO_SKIPPED, request=(cobid, msg))
+        for attempt in range(self.__sdo_retries + 1):
+            # Register the waiter of the response before sending the request
+            waiter = None
+            if dispatcher is not None:
+                waiter = dispatcher.register_waiter(SDO_RX + nodeId, _filter)
+            t_sent = time.perf_counter()
+            try:
+                reqmsg = await port.write_can_message(cobid = cobid,
+                                                       data = msg,
+                                                       dlc = 8)
+            except:
+                reqmsg = 0
+                cnt.inc('SDO_read_request_timeout')
+            result = SdoResult(reqmsg=reqmsg, request=(cobid, msg))
+            if waiter is not None:
+                _frame = await waiter.wait_async(health.timeout(nodeId, bus))
+                if _frame is not None:
+                    cobid_ret, msg_ret, dlc, flag, t, error_frame = _frame
+                    break
+                dispatcher.cancel_waiter(waiter)
+            else:
+                cobid_ret, msg_ret, dlc, flag, _, _, t, error_frame = await port.read_can_message()
+                if not (cobid_ret is None and msg_ret is None):
+                    break
+            health.on_timeout(nodeId, bus)
+            if attempt < self.__sdo_retries and health.state(nodeId, bus) == CLOSED:
+                cnt.inc('SDO_read_retry')
+                continue
+            metrics.observe_sdo(nodeId, bus, None, 0)
+            return result
+        rtt = time.perf_counter() - t_sent
+        # The round trip of a retried request is ambiguous [Karn]
+        health.on_response(nodeId, bus, rtt if attempt == 0 else None)
+        result.respmsg = 1
+        result.response = (cobid_ret, msg_ret)
+        if SDO_RX != 0x700 and dlc == 8 and (msg_ret[0] & 0xE2) == 0x40:
+            # The node initiated a segmented upload
+            _data = await port.sdo_transfer.upload_segments(nodeId, index, subindex, msg_ret, bus=bus)
+            result.status = int(_data is not None)
+            result.data = int.from_bytes(_data, 'little') if _data is not None else None
+            metrics.observe_sdo(nodeId, bus, time.perf_counter() - t_sent, result.status)
+            return result
+        data_ret, messageValid, result.errorResponse  = await self.check_valid_message(nodeId, index, subindex, cobid_ret, msg_ret, dlc, error_frame, SDO_TX, SDO_RX)
+        # Check command byte
+        if msg_ret[0] == (0x80):
+            abort_code = int.from_bytes(bytes(msg_ret[4:8]), 'little')
+            self.logger_file.error(f'Received SDO abort message while reading '
+                              f'object {index:04X}:{subindex:02X} of node '
+                              f'{nodeId} with abort code {abort_code:08X}')
+            cnt.inc('SDO_read_abort')
+            metrics.observe_sdo(nodeId, bus, rtt, 2)
+            return result
+        result.data = data_ret
+        result.status = int(bool(messageValid))
+        metrics.observe_sdo(nodeId, bus, rtt, result.status)
+        return result
+
+    async def upload_sdo(self, nodeId=None, index=None, subindex=None, block=False, blksize=None, bus=0):
+        """Read a large object via segmented or block |SDO| upload
+    
+        Parameters
+        ----------
+        nodeId : :obj:`int`
+            The id from the node to read from
+        index : :obj:`int`
+            The Object Dictionary index to read from
+        subindex : :obj:`int`
+            |OD| Subindex
+        block : :obj:`bool`
+            Use the block upload instead of the segmented one
+        blksize : :obj:`int`, optional
+            Number of segments per block [defaults to :meth:`get_sdo_block_size`]
+    
+        Returns
+        -------
+        :obj:`bytes`
+            The data if was successfully read or :data:`None` in case of errors
+        """
+        if block:
+            return await self.sdo_transfer.block_upload(nodeId, index, subindex, blksize=blksize, bus=bus)
+        return await self.sdo_transfer.upload(nodeId, index, subindex, bus=bus)
+
+    async def download_sdo(self, nodeId=None, index=None, subindex=None, data=b"", block=False, blksize=None):
+        """Write a large object via segmented or block |SDO| download
+        The MOPSHUB bus byte cannot be sent since the segments use all 8 data bytes.
+    
+        Returns
+        -------
+        :obj:`bool`
+            True if the node confirmed the transfer
+        """
+        if block:
+            return await self.sdo_transfer.block_download(nodeId, index, subindex, data, blksize=blksize)
+        return await self.sdo_transfer.download(nodeId, index, subindex, data)
+
+    def upload_sdo_sync(self, *args, timeout=None, **kwargs):
+        """Blocking version of :meth:`upload_sdo` which can be called from any thread"""
+        return self.run_coroutine_sync(self.upload_sdo(*args, **kwargs), timeout=timeout)
+
+    def download_sdo_sync(self, *args, timeout=None, **kwargs):
+        """Blocking version of :meth:`download_sdo` which can be called from any thread"""
+        return self.run_coroutine_sync(self.download_sdo(*args, **kwargs), timeout=timeout)
+
+    async def write_sdo_can(self, nodeId=None, index=None, subindex=None, value=0, size=4, SDO_TX=0x600, SDO_RX=0x580, bus=0, timeout=None):
+        """Write an object via |SDO| expedited download
+    
+        Parameters
+        ----------
+        nodeId : :obj:`int`
+            The id from the node to write to
+        index : :obj:`int`
+            The Object Dictionary index to write to
+        subindex : :obj:`int`
+            |OD| Subindex
+        value : :obj:`int`
+            The value to be written
+        size : :obj:`int`
+            Number of data bytes [1-4]. The MOPSHUB bus byte msg[7] is only sent if size < 4.
+    
+        Returns
+        -------
+        :obj:`bool`
+            True if the node confirmed the download
+        """
+        if nodeId is None or index is None or subindex is None:
+            self.logger_file.warning('SDO write protocol cancelled before it could begin.')
+            return False
+        msg = [0 for i in range(8)]
+        msg[0] = 0x23 | ((4 - size) << 2)
         msg[1], msg[2] = index.to_bytes(2, 'little')
-        msg[3] = subindex 
-        msg[7] =bus
-        requestreg = Analysis().binToHexa(bin(cobid)[2:].zfill(8)+ 
-                                          bin(msg[0])[2:].zfill(8)+ 
-                                          bin(msg[1])[2:].zfill(8)+
-                                          bin(msg[2])[2:].zfill(8)+
-                                          bin(msg[3])[2:].zfill(8)+ 
-                                          bin(msg[4])[2:].zfill(8)+
-                                          bin(msg[5])[2:].zfill(8)+
-                                          bin(msg[6])[2:].zfill(8)+ 
-                                          bin(msg[7])[2:].zfill(8))     
-        try:
-            reqmsg = await self.write_can_message(cobid = cobid,
-                                                   data = msg,
-                                                   dlc = 8)
-        except:
-            reqmsg = 0
-            self.__cnt['SDO_read_request_timeout'] += 1
-            
-        
-        _frame = await self.read_can_message()
-        
-        if (not all(m is None for m in _frame[0:2])):
-           cobid_ret, msg_ret, dlc, flag, respmsg, responsereg, t, error_frame = _frame
-           data_ret, messageValid, errorResponse  = await self.check_valid_message(nodeId, index, subindex, cobid_ret, msg_ret, dlc, error_frame, SDO_TX, SDO_RX)
-           if messageValid: status=1;
-           else:  status =0;
-           # Check command byte
-           if msg_ret[0] == (0x80):
-                status = 0
-                abort_code = int.from_bytes(data_ret[4:], 'little')
-                self.logger_file.error(f'Received SDO abort message while reading '
-                                  f'object {index:04X}:{subindex:02X} of node '
-                                  f'{nodeId} with abort code {abort_code:08X}')
-                self.__cnt['SDO_read_abort'] += 1
-                if requestreg is not None: 
-                    return None, reqmsg, hex(requestreg),respmsg, responsereg, status, errorResponse
-                else: return None, reqmsg, requestreg,respmsg, responsereg, status, errorResponse              
-           else:
-                return data_ret, reqmsg , hex(requestreg) , respmsg, responsereg  , status, errorResponse     
-        else:
-            
-            status = 0
-            if responsereg is not None: return None, reqmsg, hex(responsereg),respmsg, responsereg, status, errorResponse
-            else : return None, reqmsg, hex(requestreg),respmsg, responsereg, status, errorResponse               
+        msg[3] = subindex
+        msg[4:4 + size] = int(value).to_bytes(size, 'little')
+        if size < 4: msg[7] = bus
+        waiter = self.dispatcher.register_waiter(SDO_RX + nodeId, self._sdo_response_filter(index, subindex))
+        reqmsg = await self.write_can_message(cobid = SDO_TX + nodeId, data = msg, dlc = 8)
+        if not reqmsg:
+            self.dispatcher.cancel_waiter(waiter)
+            self.__cnt.inc('SDO_write_request_timeout')
+            return False
+        frame = await waiter.wait_async(timeout if timeout is not None else self.__sdo_timeout)
+        if frame is None:
+            self.dispatcher.cancel_waiter(waiter)
+            self.__cnt.inc('SDO_write_response_timeout')
+            self.logger_file.warning(f'SDO write response timeout (node {nodeId}, index {index:04X}:{subindex:02X})')
+            return False
+        if frame[1][0] == 0x80:
+            abort_code = int.from_bytes(bytes(frame[1][4:8]), 'little')
+            self.logger_file.error(f'Received SDO abort message while writing '
+                                   f'object {index:04X}:{subindex:02X} of node '
+                                   f'{nodeId} with abort code {abort_code:08X}')
+            self.__cnt.inc('SDO_write_abort')
+            return False
+        return frame[1][0] == 0x60
+
+    async def send_nmt(self, command=0x01, nodeId=0):
+        """Send an |NMT| command [0x01: start, 0x02: stop, 0x80: pre-operational, 0x81: reset node] (nodeId 0 = all nodes)"""
+        return await self.write_can_message(cobid = 0x000, data = [command, nodeId], dlc = 2)
 
-    async def  write_can_message(self, cobid = None, data = [None], flag=0, dlc = 8):
+    async def send_sync(self, cobid=0x80):
+        """Broadcast a SYNC message"""
+        return await self.write_can_message(cobid = cobid, data = [], dlc = 0)
+
+    async def _wait_response(self, waiter, timeout):
+        """Await the frame of a waiter and return it in the same format as :meth:`read_can_message`"""
+        frame = await waiter.wait_async(timeout)
+        if frame is None:
+            self.dispatcher.cancel_waiter(waiter)
+            return None, None, None, None, None, None, None, None
+        cobid, data, dlc, flag, t, error_frame = frame
+        return cobid, data, dlc, flag, 1, hex(frame_register(cobid, data)), t, error_frame
+
+    async def  write_can_message(self, cobid = None, data = [None], flag=0, dlc = 8, channel = None):
         """Combining writing functions for different |CAN| interfaces
         Parameters
         ----------
@@ -744,53 +1330,24 @@ class CanWrapper(object):#READSocketcan):#Instead of object
             Data bytes
         flag : :obj:`int`, optional
             Message flag (|RTR|, etc.). Defaults to zero.
+        channel : :obj:`str` or :obj:`int`, optional
+            Channel of :attr:`channels` to use [default: the primary channel]
         """
-        reqmsg = 0
-        try:
-            if self.__interface == 'Kvaser':
-                frame = Frame(id_=cobid, data=data, timestamp=None, dlc=dlc , flags=canlib.MessageFlag.STD)
-                self.ch0.write(frame)  #writeWait(frame, 100) #
-                reqmsg = 1
-            elif self.__interface == 'AnaGate':
-                if not self.ch0.deviceOpen:
-                    self.logger_file.notice('Reopening AnaGate CAN interface')
-                self.ch0.write(cobid, data, flag)
-                reqmsg = 1
-            else:
-                msg = can.Message(arbitration_id=cobid, data=data, is_extended_id=False, is_error_frame=False,dlc = dlc)
-                #timeout wait up to this many seconds for message to be ACK'ed or
-                # A timeout in the range of 10 milliseconds  with CAN bus speed of 125 kb/s
-                self.ch0.send(msg, 10) 
-                reqmsg = 1
-            self.__cnt['tx_msg'] += 1
-        except:  # can.CanError:
-            self.__cnt['Not_active_bus'] += 1
-            self.logger_file.error("An Error occurred, The bus is not active")
-        return reqmsg
+        port = self.get_can_channel(channel)
+        if port.interface == 'AnaGate' and not port.bus.deviceOpen:
+            self.logger_file.notice('Reopening AnaGate CAN interface')
+        return port.send(cobid, data, dlc=dlc, flag=flag)
     
     def can_setup(self, channel: int, interface : str):
         self.logger_file.info("Resetting CAN Interface as soon as communication threads are finished")
         self.sem_config_block.acquire()
         self.set_interface(interface)
-        try:
-            if channel == self.can_0_settings['channel']:
-                #check if the bus is on
-                if self.__busOn0:
-                    self.ch0.shutdown()
-                    self.hardware_config(channel = channel,interface = interface)
-            elif channel == self.can_1_settings['channel']:
-                if self.__busOn1:
-                    self.ch1.shutdown()
-                    self.hardware_config(channel = channel,interface = interface)
-        except:
-            if channel == 0:
-                if self.__busOn0:
-                    self.ch0.shutdown()
-                    self.hardware_config(channel = channel,interface = interface)
-            elif channel == 1:
-                if self.__busOn1:
-                    self.ch1.shutdown()
-                    self.hardware_config(channel = channel,interface = interface)            
+        #check if the bus is on
+        _channel = self.__channelRegistry.get(channel_name(interface, channel))
+        if _channel is not None and _channel.bus_on:
+            _channel.close()
+            self.hardware_config(channel = channel,interface = interface)
+            _channel.open()
         self.logger_file.info(f"Channel {channel} is set")
         self.sem_config_block.release()
         self.logger_file.success("Resetting the CAN channel is done")
@@ -798,186 +1355,63 @@ class CanWrapper(object):#READSocketcan):#Instead of object
     def hardware_config(self, bitrate = None, channel = None, interface = None, sjw = None,samplepoint = None,tseg1 = None,tseg2 = None):
         '''
         Pass channel string (example 'can0') to configure OS level drivers and interface.
+        The settings default to the ones of the channel in :attr:`can_settings`.
         '''
         #sudo chown root:root socketcan_wrapper_enable.sh
         #sudo chmod 4775 socketcan_wrapper_enable.sh
         #sudo bash socketcan_wrapper_enable.sh 111111 0.5 4 can0 can 5 6
-        if interface == "socketcan":
-            _bus_type = "can"
-            if channel == 0:
-                _can_channel = _bus_type + f"{self.can_0_settings['channel']}"
-            if channel == 1:
-                _can_channel = _bus_type + f"{self.can_1_settings['channel']}"
-            self.logger_file.info('Configure CAN hardware drivers for channel %s' % _can_channel)
-            if channel == 0:
-                #os.system("." + rootdir + "/socketcan_wrapper_enable.sh %i %s %s %s %s %s %s" % (bitrate, samplepoint, sjw, _can_channel, _bus_type,tseg1,tseg2))
-                os.system("bash " + rootdir + "/socketcan_wrapper_enable.sh %s %s %s %s %s %s %s" % (f"{self.can_0_settings['bitrate']}",
-                                 f"{self.can_0_settings['samplePoint']}",f"{self.can_0_settings['SJW']}",_can_channel,_bus_type,
-                                 f"{self.can_0_settings['tseg1']}", f"{self.can_0_settings['tseg2']}"))
-                # subprocess.call(['sh', 'bash socketcan_wrapper_enable.sh', f"{self.can_0_settings['bitrate']}",
-                #                  f"{self.can_0_settings['samplePoint']}",f"{self.can_0_settings['SJW']}",_can_channel,_bus_type,
-                #                  f"{self.can_0_settings['tseg1']}", f"{self.can_0_settings['tseg2']}"],
-                #                  cwd=rootdir)
-            if channel == 1:
-                #os.system("." + rootdir + "/socketcan_wrapper_enable.sh %i %s %s %s %s %s %s" % (bitrate, samplepoint, sjw, _can_channel, _bus_type,tseg1,tseg2))
-                os.system("bash " + rootdir + "/socketcan_wrapper_enable.sh %s %s %s %s %s %s %s" % (f"{self.can_0_settings['bitrate']}",
-                                 f"{self.can_0_settings['samplePoint']}",f"{self.can_0_settings['SJW']}",_can_channel,_bus_type,
-                                 f"{self.can_0_settings['tseg1']}", f"{self.can_0_settings['tseg2']}"))
-                # subprocess.call(['sh', 'bash socketcan_wrapper_enable.sh', f"{self.can_0_settings['bitrate']}",
-                #                  f"{self.can_0_settings['samplePoint']}",f"{self.can_0_settings['SJW']}",_can_channel,_bus_type,
-                #                  f"{self.can_0_settings['tseg1']}", f"{self.can_0_settings['tseg2']}"],
-                #                  cwd=rootdir)                  
-        elif interface == "virtual":
-            _bus_type = "vcan"
-            if channel == 0:
-                _can_channel = _bus_type + f"{self.can_0_settings['channel']}"
-            if channel == 1:
-                _can_channel = _bus_type + f"{self.can_1_settings['channel']}"
+        _settings = self.can_settings.get(channel, {})
+        _channel = self.__channelRegistry.get(channel_name(interface, channel)) or self.__primary
+        bitrate = bitrate if bitrate is not None else _settings.get('bitrate', _channel.bitrate)
+        samplepoint = samplepoint if samplepoint is not None else _settings.get('samplePoint', 0.5)
+        sjw = sjw if sjw is not None else _settings.get('SJW', _channel.sjw)
+        tseg1 = tseg1 if tseg1 is not None else _settings.get('tseg1', _channel.tseg1)
+        tseg2 = tseg2 if tseg2 is not None else _settings.get('tseg2', _channel.tseg2)
+        if interface in ["socketcan", "virtual"]:
+            _bus_type = "can" if interface == "socketcan" else "vcan"
+            _can_channel = _bus_type + f"{_settings.get('channel', channel)}"
             self.logger_file.info('Configure CAN hardware drivers for channel %s' % _can_channel)
-            #os.system(". sudo " + rootdir + "/socketcan_wrapper_enable.sh %i %s %s %s %s %s %s" % (bitrate, samplepoint, sjw, _can_channel, _bus_type,tseg1,tseg2))
-            if channel == 0:
-                subprocess.call(['sh', 'sudo  ./socketcan_wrapper_enable.sh', f"{self.can_0_settings['bitrate']}",
-                                 f"{self.can_0_settings['samplePoint']}",f"{self.can_0_settings['SJW']}",_can_channel,_bus_type,
-                                 f"{self.can_0_settings['tseg1']}", f"{self.can_0_settings['tseg2']}"],
-                                 cwd=rootdir)
-            if channel == 1:
-                subprocess.call(['sh', 'sudo  ./socketcan_wrapper_enable.sh', f"{self.can_1_settings['bitrate']}",
-                                 f"{self.can_1_settings['samplePoint']}",f"{self.can_1_settings['SJW']}",_can_channel,_bus_type,
-                                 f"{self.can_1_settings['tseg1']}", f"{self.can_1_settings['tseg2']}"],
-                                 cwd=rootdir)
-                
-
+            _args = [f"{bitrate}", f"{samplepoint}", f"{sjw}", _can_channel, _bus_type, f"{tseg1}", f"{tseg2}"]
+            if interface == "socketcan":
+                os.system("bash " + rootdir + "/socketcan_wrapper_enable.sh " + " ".join(_args))
+            else:
+                subprocess.call(['sh', 'sudo  ./socketcan_wrapper_enable.sh'] + _args, cwd=rootdir)
         else:
             #Do nothing because it is not CAN
             _can_channel = str(channel)
         self.logger_file.info('%s[%s] Interface is initialized....' % (interface,_can_channel))
            
-    def read_can_message_thread(self):
-        """Read incoming |CAN| messages and store them in the queue
-        :attr:`canMsgQueue`.
+    def read_can_message_thread(self, timeout=0.01):
+        """Read the next incoming |CAN| message which was not routed to a waiter.
 
-        This method runs an endless loop which can only be stopped by setting
-        the :class:`~threading.Event` :attr:`pill2kill` and is therefore
-        designed to be used as a :class:`~threading.Thread`.
+        The frames are received by the thread :class:`CanDispatcher` which stores them in
+        the queue :attr:`canMsgQueue`. The function is used e.g. to dump the bus traffic.
+
+        Returns
+        -------
+        :obj:`tuple`
+            ``(cobid, data, dlc, flag, t, error_frame)`` or a tuple of :data:`None`
         """
-        
-        #self.__pill2kill = Event()
-        _interface = self.__interface;
-        respmsg = 0
-        while not self.__pill2kill.is_set(): 
-            try:
-                if _interface == 'Kvaser':
-                    with self.__kvaserLock:#Added for urgent cases
-                        frame = self.ch0.read(100)
-                    cobid, data, dlc, flag, t = (frame.id, frame.data,
-                                                 frame.dlc, frame.flags,
-                                                 frame.timestamp)
-                    error_frame = None
-                    if frame is None or (cobid == 0 and dlc == 0):
-                        raise canlib.CanNoMsg
-                
-                elif _interface == 'AnaGate':
-                    cobid, data, dlc, flag, t = self.ch0.getMessage()
-                    if (cobid == 0 and dlc == 0):
-                        raise analib.CanNoMsg
-                else:
-                    frame = self.ch0.recv(0.01)
-                    if frame is not None:
-                        cobid, data, dlc, flag, t , error_frame = (frame.arbitration_id, frame.data,
-                                                                   frame.dlc, frame.is_extended_id,
-                                                                   frame.timestamp, frame.is_error_frame)
-                        respmsg = 1
-                    else:
-                        self.__pill2kill.set()
-                        respmsg = 0
-                        # raise can.CanError
-                try:
-                    responsereg = Analysis().binToHexa(bin(cobid)[2:].zfill(11)+
-                                                       bin(data[0])[2:].zfill(8)+
-                                                       bin(data[1])[2:].zfill(8)+
-                                                       bin(data[2])[2:].zfill(8)+
-                                                       bin(data[3])[2:].zfill(8)+
-                                                       bin(data[4])[2:].zfill(8)+
-                                                       bin(data[5])[2:].zfill(8)+
-                                                       bin(data[6])[2:].zfill(8)+
-                                                       bin(data[7])[2:].zfill(8))
-                        
-                except: 
-                    responsereg = 0
-                
-                with self.__lock:
-                    self.__canMsgQueue.appendleft((cobid, data, dlc, flag, t , error_frame))
-                    
-                self.dumpMessage(cobid, data, dlc, flag, t , error_frame)
-                self.__cnt['rx_msg'] += 1
-                return cobid, data, dlc, flag, t, error_frame
-            except:
-               self.__pill2kill = Event()
-               return None, None, None, None, None, None
+        if self.dispatcher is None:
+            self.start_dispatcher()
+        frame = self.dispatcher.get(timeout)
+        if frame is None:
+            return None, None, None, None, None, None
+        cobid, data, dlc, flag, t, error_frame = frame
+        self.dumpMessage(cobid, data, dlc, flag, t , error_frame)
+        return cobid, data, dlc, flag, t, error_frame
 
-    async def read_can_message(self):
-        """Read incoming |CAN| messages without storing any Queue
-        This method runs an endless loop which can only be stopped by setting
+    async def read_can_message(self, timeout=0.01, channel=None):
+        """Read the next incoming |CAN| message which was not routed to a waiter
+        (see :meth:`CanDispatcher.register_waiter`) without storing it in any Queue
         """
-        respmsg = 0
-        try:        
-            if self.__interface == 'Kvaser':
-                    with self.__kvaserLock:#Added for urgent cases
-                        frame = self.ch0.read(100)
-                        if frame is not None:
-                            # raise can.CanError
-                            cobid, data, dlc, flag, t = (frame.id, frame.data,
-                                                        frame.dlc, frame.flags,
-                                                        frame.timestamp)
-                            error_frame = None
-                            respmsg = 1
-                            responsereg = Analysis().binToHexa(bin(cobid)[2:].zfill(11)+
-                                                            bin(data[0])[2:].zfill(8)+
-                                                            bin(data[1])[2:].zfill(8)+
-                                                            bin(data[2])[2:].zfill(8)+
-                                                            bin(data[3])[2:].zfill(8)+
-                                                            bin(data[4])[2:].zfill(8)+
-                                                            bin(data[5])[2:].zfill(8)+
-                                                            bin(data[6])[2:].zfill(8)+
-                                                            bin(data[7])[2:].zfill(8))
-                            
-                        else:
-                            respmsg = 0
-                            responsereg = 0
-                            #raise canlib.CanNoMsg
-            elif self.__interface == 'AnaGate':
-                cobid, data, dlc, flag, t = self.ch0.getMessage()
-                error_frame = None
-                respmsg = 1
-                #return cobid, data, dlc, flag, t, error_frame
-                if (cobid == 0 and dlc == 0):
-                    raise analib.CanNoMsg
-            else:  
-                frame = self.ch0.recv(0.01)
-                #print(frame)
-                if frame is not None:
-                    # raise can.CanError
-                    cobid, data, dlc, flag, t , error_frame = (frame.arbitration_id, frame.data,
-                                                               frame.dlc, frame.is_extended_id,
-                                                               frame.timestamp, frame.is_error_frame)
-                    respmsg = 1
-                    responsereg = Analysis().binToHexa(bin(cobid)[2:].zfill(11)+
-                                                       bin(data[0])[2:].zfill(8)+
-                                                       bin(data[1])[2:].zfill(8)+
-                                                       bin(data[2])[2:].zfill(8)+
-                                                       bin(data[3])[2:].zfill(8)+
-                                                       bin(data[4])[2:].zfill(8)+
-                                                       bin(data[5])[2:].zfill(8)+
-                                                       bin(data[6])[2:].zfill(8)+
-                                                       bin(data[7])[2:].zfill(8))
-                
-                else:
-                    respmsg = 0
-                    responsereg = 0
-            self.__cnt['rx_msg'] += 1        
-            return cobid, data, dlc, flag, respmsg, hex(responsereg), t, error_frame
-        except:  # (canlib.CanNoMsg, analib.CanNoMsg,can.CanError):
+        port = self.get_can_channel(channel)
+        if port.dispatcher is None:
+            port.start_dispatcher()
+        cobid, data, dlc, flag, _, _, t, error_frame = await port.read_can_message(timeout)
+        if cobid is None:
             return None, None, None, None, None, None, None, None
+        return cobid, data, dlc, flag, 1, hex(frame_register(cobid, data)), t, error_frame
         
         
     # The following functions are to read the can messages
@@ -1017,9 +1451,7 @@ class CanWrapper(object):#READSocketcan):#Instead of object
             """
             data = ct.string_at(data, dlc)
             t = time.time()
-            with self.__lock:
-                self.__canMsgQueue.appendleft((cobid, data, dlc, flag, t , error_frame))
-            self.dumpMessage(cobid, data, dlc, flag, t)
+            self.dispatcher.dispatch((cobid, data, dlc, flag, t , None))
         
         return cbFunc
     
@@ -1082,8 +1514,29 @@ class CanWrapper(object):#READSocketcan):#Instead of object
     def set_ipAddress(self, x):
         self.__ipAddress = x
         
+    def set_sdo_timeout(self, x):
+        self.__sdo_timeout = float(x)
+        self.node_health.initial_timeout = self.__sdo_timeout
+
+    def get_sdo_timeout(self):
+        return self.__sdo_timeout
+
+    def set_sdo_retries(self, x):
+        self.__sdo_retries = int(x)
+        self.sdo_engine.retries = self.__sdo_retries
+
+    def get_sdo_retries(self):
+        return self.__sdo_retries
+
+    def set_sdo_block_size(self, x):
+        self.sdo_transfer.set_block_size(x)
+
+    def get_sdo_block_size(self):
+        return self.sdo_transfer.get_block_size()
+
     def set_bitrate(self, bitrate):
         self.__bitrate = bitrate 
+        self.__primary.bitrate = bitrate
  
     def set_sample_point(self, x):
         self.__sample_point = float(x)
@@ -1143,29 +1596,28 @@ class CanWrapper(object):#READSocketcan):#Instead of object
 
     @property
     def canMsgQueue(self):
-        """:class:`collections.deque` : Queue object holding incoming |CAN|
-        messages. This class supports thread-safe adding and removing of
-        elements but not thread-safe iterating. Therefore the designated
-        :class:`~threading.Lock` object :attr:`lock` should be acquired before
-        accessing it.
-
-        The queue is initialized with a maxmimum length of ``1000`` elements
-        to avoid memory problems although it is not expected to grow at all.
-
-        This special class is used instead of the :class:`queue.Queue` class
-        because it is iterable and fast."""
+        """:class:`CanMsgQueueView` : Read view of the incoming |CAN| messages
+        compatible with the former :class:`collections.deque` [newest frame at index 0,
+        :meth:`~CanMsgQueueView.pop` returns the oldest one]. The frames are stored in
+        :attr:`canMsgRing` and no lock is needed to read them."""
         return self.__canMsgQueue
+
+    @property
+    def canMsgRing(self):
+        """:class:`CanRingBuffer` : Ring buffer of the incoming |CAN| messages. A consumer
+        is created with :meth:`CanRingBuffer.reader`, it counts the frames it lost."""
+        return self.__canMsgRing
     
     @property
     def kvaserLock(self):
         """:class:`~threading.Lock` : Lock object which should be acquired for
         performing read or write operations on the Kvaser |CAN| channel. It
         turned out that bad things can happen if that is not done."""
-        return self.__kvaserLock
+        return self.__primary.read_lock
 
     @property
     def cnt(self):
-        """:class:`~collections.Counter` : Counter holding information about
+        """:class:`MetricCounter` : Counter holding information about
         quality of transmitting and receiving. Its contens are logged when the
         program ends."""
         return self.__cnt
@@ -1184,25 +1636,23 @@ class CanWrapper(object):#READSocketcan):#Instead of object
     def channel(self):
         """Currently used |CAN| channel. The actual class depends on the used
         |CAN| interface."""
-        return self.ch0
+        return self.__primary.bus
 
     @property
     def bitRate(self):
         """:obj:`int` : Currently used bit rate. When you try to change it
-        :func:`stop` will be called before."""
-        if self.__interface == 'Kvaser':
-            return self.__bitrate
-        else:
-            return self.ch0.baudrate
+        the channel is restarted."""
+        if self.__interface == 'AnaGate':
+            return self.__primary.bus.baudrate
+        return self.__primary.bitrate
      
     @bitRate.setter
     def bitRate(self, bitrate):
-        if self.__interface == 'Kvaser':
-            self.stop()
-            self.__bitrate = bitrate
-            self.start()
+        if self.__interface == 'AnaGate':
+            self.__primary.bus.baudrate = bitrate     
         else:
-            self.ch0.baudrate = bitrate     
+            self.set_bitrate(bitrate)
+            self.restart_channel_connection()
 
 def main():
     """Wrapper function for using the server as a command line tool
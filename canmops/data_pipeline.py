@@ -0,0 +1,190 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+
+import os
+import csv
+import gzip
+import time
+import queue
+import logging
+from threading import Thread
+import numpy as np
+try:
+    from .logger_main import Logger
+except (ImportError, ModuleNotFoundError):
+    from logger_main import Logger
+
+log_call = Logger(name = "DataPipeline",console_loglevel=logging.INFO, logger_file = False)
+
+_STOP = object()
+
+class CsvSink(object):
+    """Write the samples ``(time, bus, nodeId, channel, raw, value)`` to a csv file
+
+    Parameters
+    ----------
+    csv_writer, csv_file :
+        An open writer and its file [e.g. from :meth:`AnalysisUtils.build_data_base`]
+    formatter : callable, optional
+        Converts a sample into the row of the file. The samples are written as they are by default.
+    footer : :obj:`tuple`, optional
+        Last row written by :meth:`close`
+    """
+
+    def __init__(self, csv_writer, csv_file, formatter=None, footer=None):
+        self.csv_writer = csv_writer
+        self.csv_file = csv_file
+        self.formatter = formatter
+        self.footer = footer
+
+    @classmethod
+    def open(cls, outputname, directory, fieldnames, secondary_fieldnames=None, compress=False, formatter=None):
+        """Create directory/outputname.csv [or .csv.gz if compress] and write the header"""
+        os.makedirs(directory, exist_ok=True)
+        filename = os.path.join(directory, outputname) + (".csv.gz" if compress else ".csv")
+        csv_file = gzip.open(filename, "wt", newline="") if compress else open(filename, "w", newline="")
+        csv_writer = csv.writer(csv_file)
+        if secondary_fieldnames: csv_writer.writerow(secondary_fieldnames)
+        csv_writer.writerow(fieldnames)
+        return cls(csv_writer, csv_file, formatter=formatter)
+
+    def write(self, samples):
+        if self.formatter is not None:
+            samples = map(self.formatter, samples)
+        self.csv_writer.writerows(samples)
+        self.csv_file.flush()
+
+    def close(self):
+        if self.footer is not None:
+            self.csv_writer.writerow(self.footer)
+        self.csv_file.close()
+
+class H5Sink(object):
+    """Write the samples ``(time, bus, nodeId, channel, raw, value)`` to an :class:`H5Store`.
+    Missing values (None) are stored as raw = 0 and value = NaN."""
+
+    def __init__(self, h5_store):
+        self.h5_store = h5_store
+
+    def write(self, samples):
+        data = np.array(samples, dtype=np.float64).reshape(-1, 6)
+        keys = data[:, 1] * 65536 + data[:, 2]
+        for key in np.unique(keys):
+            rows = data[keys == key]
+            self.h5_store.append(rows[0, 1], rows[0, 2], rows[:, 0], rows[:, 3],
+                                 np.nan_to_num(rows[:, 4]), rows[:, 5])
+
+    def close(self):
+        self.h5_store.close()
+
+class DataPipeline(Thread):
+    """Bounded queue between the acquisition and a storage sink
+
+    The acquisition only calls :meth:`put`. A worker thread collects the samples and hands them
+    to the sink in batches of ``batch_rows`` samples or after ``batch_interval`` s, whichever
+    comes first. If the queue is full the sample is dropped [``block = False``] or :meth:`put` waits up to
+    ``put_timeout`` s before dropping it [``block = True``]. The drops are counted in :attr:`dropped`.
+
+    Parameters
+    ----------
+    sink :
+        Object with ``write(samples)`` and ``close()`` [:class:`CsvSink`, :class:`H5Sink`]
+    maxsize : :obj:`int`
+        Capacity of the queue in samples
+    """
+
+    def __init__(self, sink, maxsize=100000, batch_rows=1000, batch_interval=1.0, block=False, put_timeout=0.1, name="storage"):
+        Thread.__init__(self, name=f"DataPipeline[{name}]", daemon=True)
+        self.logger = log_call.setup_main_logger()
+        self.sink = sink
+        self.batch_rows = batch_rows
+        self.batch_interval = batch_interval
+        self.block = block
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize)
+        self.accepted = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self.max_queued = 0
+
+    def put(self, sample):
+        """Queue one sample. Returns False if it was dropped."""
+        try:
+            if self.block:
+                self._queue.put(sample, timeout=self.put_timeout)
+            else:
+                self._queue.put_nowait(sample)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.accepted += 1
+        return True
+
+    def put_many(self, samples):
+        """Queue many samples. Returns the number of dropped samples."""
+        dropped = 0
+        for sample in samples:
+            if not self.put(sample):
+                dropped += 1
+        return dropped
+
+    def _write(self, batch):
+        try:
+            self.sink.write(batch)
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            self.errors += 1
+            self.logger.error(f"Writing {len(batch)} samples to {self.sink.__class__.__name__} failed: {e}")
+
+    def run(self):
+        batch = []
+        deadline = None
+        stop = False
+        while not stop:
+            timeout = self.batch_interval if not batch else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+                # Take everything that is already queued
+                while True:
+                    if item is _STOP:
+                        stop = True
+                        break
+                    if not batch:
+                        deadline = time.monotonic() + self.batch_interval
+                    batch.append(item)
+                    if len(batch) >= self.batch_rows:
+                        break
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.max_queued = max(self.max_queued, self._queue.qsize())
+            if batch and (stop or len(batch) >= self.batch_rows or time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+        try:
+            self.sink.close()
+        except Exception as e:
+            self.logger.error(f"Closing {self.sink.__class__.__name__} failed: {e}")
+
+    def stop(self, timeout=None):
+        """Write the queued samples, close the sink and stop the worker"""
+        if self.is_alive():
+            self._queue.put(_STOP)
+            self.join(timeout)
+        if self.dropped:
+            self.logger.warning(f"{self.dropped} samples were dropped [queue full]")
+        return self.statistics()
+
+    def statistics(self):
+        return {"accepted": self.accepted, "dropped": self.dropped, "written": self.written,
+                "batches": self.batches, "errors": self.errors, "max_queued": self.max_queued,
+                "queued": self._queue.qsize()}
@@ -0,0 +1,115 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+
+import time
+import logging
+from threading import Lock
+try:
+    from .logger_main import Logger
+    from .metrics import MetricCounter
+except (ImportError, ModuleNotFoundError):
+    from logger_main import Logger
+    from metrics import MetricCounter
+
+log_call = Logger(name = "  Deadband  ",console_loglevel=logging.INFO, logger_file = False)
+
+class DeadbandFilter(object):
+    """Change-only publishing of samples with an absolute/relative deadband and a heartbeat
+
+    A sample of a channel is passed on if
+
+    * it is the first one of the channel or the value appeared/disappeared [None]
+    * ``|value - last| > max(absolute, relative * |last|)``, where last is the last value passed on
+      [a slow drift is therefore published once it left the deadband]
+    * the last value passed on is older than ``heartbeat`` s [None: never]
+
+    Everything else is suppressed, so the storage, the GUI and the OPC UA server only see the
+    changes of slowly varying values plus one refresh per heartbeat.
+
+    Parameters
+    ----------
+    absolute, relative : :obj:`float`
+        Default deadband of all the channels [0, 0: only identical values are suppressed]
+    heartbeat : :obj:`float`, optional
+        Maximum time in s between two published samples of a channel
+    channels : :obj:`dict`, optional
+        ``{channel or channel type: {"absolute": ..., "relative": ...}}`` [e.g. ``{"T": {"absolute": 0.1}}``].
+        The keys are the last item of the key of :meth:`accept` [the ADC channel] or its type of ``channel_types``
+    channel_types : :obj:`dict`, optional
+        ``{channel: type}`` [e.g. ``adc_channels_reg`` of the device: ``{'3': 'T', '4': 'V', ...}``]
+    """
+
+    def __init__(self, absolute=0.0, relative=0.0, heartbeat=None, channels=None, channel_types=None, counters=None):
+        self.logger = log_call.setup_main_logger()
+        self.absolute = absolute
+        self.relative = relative
+        self.heartbeat = heartbeat
+        self.channels = {str(k): v for k, v in (channels or {}).items()}
+        self.channel_types = {str(k): v for k, v in (channel_types or {}).items()}
+        self.cnt = counters if counters is not None else MetricCounter()
+        self._bands = {}
+        self._last = {}  # key -> (value, t)
+        self._lock = Lock()
+
+    @classmethod
+    def from_config(cls, dev, counters=None):
+        """Filter of the ``deadband`` section of the yaml file of a device [see mops_config.yml]:
+        ``heartbeat``, the band of all the channels ``default`` and the bands by channel or channel type"""
+        conf = dict(dev.get("deadband", None) or {})
+        heartbeat = conf.pop("heartbeat", None)
+        default = conf.pop("default", None) or {}
+        channel_types = (dev.get("adc_channels_reg", {}) or {}).get("adc_channels", None)
+        return cls(absolute=default.get("absolute", 0.0), relative=default.get("relative", 0.0), heartbeat=heartbeat,
+                   channels=conf, channel_types=channel_types, counters=counters)
+
+    def _band(self, channel):
+        band = self._bands.get(channel)
+        if band is None:
+            conf = self.channels.get(str(channel)) or self.channels.get(self.channel_types.get(str(channel))) or {}
+            band = self._bands[channel] = (conf.get("absolute", self.absolute), conf.get("relative", self.relative))
+        return band
+
+    def accept(self, key, value, t=None):
+        """True if the sample of the channel ``key`` [e.g. ``(bus, nodeId, channel)``] is to be published"""
+        t = time.monotonic() if t is None else t
+        last = self._last.get(key)
+        if last is not None:
+            last_value, t_last = last
+            if self.heartbeat is None or t - t_last < self.heartbeat:
+                if value is None and last_value is None:
+                    self.cnt.inc('deadband_suppressed')
+                    return False
+                if value is not None and last_value is not None:
+                    absolute, relative = self._band(key[-1] if isinstance(key, tuple) else key)
+                    if abs(value - last_value) <= max(absolute, relative * abs(last_value)):
+                        self.cnt.inc('deadband_suppressed')
+                        return False
+        with self._lock:
+            self._last[key] = (value, t)
+        self.cnt.inc('deadband_published')
+        return True
+
+    def filter(self, samples, prefix=()):
+        """Samples ``(time, bus, nodeId, channel, raw, value)`` [see :class:`DataPipeline`] to be published.
+        The keys of the channels are ``prefix + (bus, nodeId, channel)``."""
+        return [s for s in samples if self.accept(prefix + (s[1], s[2], s[3]), s[5], s[0])]
+
+    def reset(self, key=None):
+        """Publish the next sample of one or all the channels [e.g. after a reconnection]"""
+        with self._lock:
+            if key is None:
+                self._last.clear()
+            else:
+                self._last.pop(key, None)
+
+    def statistics(self):
+        published, suppressed = self.cnt['deadband_published'], self.cnt['deadband_suppressed']
+        total = published + suppressed
+        return {"published": published, "suppressed": suppressed,
+                "suppressed_ratio": suppressed / total if total else 0.0, "channels": len(self._last)}
@@ -0,0 +1,148 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+
+import os
+import logging
+import numpy as np
+import tables as tb
+try:
+    from .logger_main import Logger
+except (ImportError, ModuleNotFoundError):
+    from logger_main import Logger
+
+log_call = Logger(name = " H5 Store  ",console_loglevel=logging.INFO, logger_file = False)
+
+# One row of an ADC table
+ADC_DTYPE = np.dtype([("time", "<f8"),
+                      ("channel", "u1"),
+                      ("raw", "<u4"),
+                      ("value", "<f4")])
+
+class H5Store(object):
+    """Append-only HDF5 store of the ADC data
+
+    Each (bus, node) has its own extendable table ``/bus<bus>/node<node>`` with the columns
+    time, channel, raw (ADC counts) and value (converted). The tables are chunked and
+    Blosc compressed. The rows are buffered per table and appended in blocks of ``buffer_rows``.
+
+    Parameters
+    ----------
+    filename : :obj:`str`
+        Output file [e.g. output_data/adc_data.h5]. Existing tables are extended.
+    complib : :obj:`str`
+        Compression library of :class:`tables.Filters`
+    expectedrows : :obj:`int`
+        Expected number of rows per table, used by PyTables to choose the chunk size
+    """
+
+    def __init__(self, filename, title="ADC data", complib="blosc:lz4", complevel=5,
+                 expectedrows=1000000, buffer_rows=10000):
+        self.logger = log_call.setup_main_logger()
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.filename = filename
+        self.expectedrows = expectedrows
+        self.buffer_rows = buffer_rows
+        self.filters = tb.Filters(complevel=complevel, complib=complib, shuffle=True)
+        self.__h5 = tb.open_file(filename, mode="a", title=title)
+        self.__tables = {}
+        self.__buffers = {}
+        self.__buffered = {}
+
+    def table(self, bus, node):
+        """Return the table of the (bus, node), it is created at the first use"""
+        key = (int(bus), int(node))
+        table = self.__tables.get(key)
+        if table is None:
+            where = f"/bus{key[0]}"
+            name = f"node{key[1]}"
+            if f"{where}/{name}" in self.__h5:
+                table = self.__h5.get_node(where, name)
+            else:
+                table = self.__h5.create_table(where, name, description=ADC_DTYPE,
+                                               title=f"ADC data of node {key[1]} on bus {key[0]}",
+                                               filters=self.filters, expectedrows=self.expectedrows,
+                                               createparents=True)
+            self.__tables[key] = table
+            self.__buffers[key] = []
+            self.__buffered[key] = 0
+        return table
+
+    def append(self, bus, node, time, channel, raw, value):
+        """Append one or many rows to the table of the (bus, node)
+
+        Parameters
+        ----------
+        time, channel, raw, value : scalar or :class:`numpy.ndarray`
+            The columns of the rows. Scalars are broadcast to the length of the arrays.
+        """
+        time, channel, raw, value = np.broadcast_arrays(time, channel, raw, value)
+        rows = np.empty(time.size, dtype=ADC_DTYPE)
+        rows["time"] = time.ravel()
+        rows["channel"] = channel.ravel()
+        rows["raw"] = raw.ravel()
+        rows["value"] = value.ravel()
+        self.append_rows(bus, node, rows)
+
+    def append_rows(self, bus, node, rows):
+        """Append a structured array of :data:`ADC_DTYPE` to the table of the (bus, node)"""
+        key = (int(bus), int(node))
+        self.table(*key)
+        self.__buffers[key].append(rows)
+        self.__buffered[key] += len(rows)
+        if self.__buffered[key] >= self.buffer_rows:
+            self._write(key)
+
+    def _write(self, key):
+        buffers = self.__buffers[key]
+        if not buffers:
+            return
+        rows = buffers[0] if len(buffers) == 1 else np.concatenate(buffers)
+        self.__tables[key].append(rows)
+        self.__buffers[key] = []
+        self.__buffered[key] = 0
+
+    def flush(self):
+        for key in self.__tables:
+            self._write(key)
+        self.__h5.flush()
+
+    def close(self):
+        if self.__h5.isopen:
+            self.flush()
+            self.__h5.close()
+            self.logger.notice(f"ADC data are saved to {self.filename}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def read_table(filename, bus, node, start=None, stop=None, condition=None):
+    """Read the rows of the (bus, node) from an :class:`H5Store` file
+
+    Parameters
+    ----------
+    start, stop : :obj:`int`, optional
+        Row range to be read
+    condition : :obj:`str`, optional
+        In-kernel selection [e.g. ``"(channel == 5) & (time > 10)"``]
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        Structured array of :data:`ADC_DTYPE`
+    """
+    with tb.open_file(filename, "r") as h5:
+        table = h5.get_node(f"/bus{int(bus)}", f"node{int(node)}")
+        if condition is not None:
+            return table.read_where(condition, start=start, stop=stop)
+        return table.read(start=start, stop=stop)
@@ -0,0 +1,302 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+
+import re
+import time
+import logging
+from bisect import bisect_left
+from collections import Counter
+from threading import Lock, Thread
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+try:
+    from .logger_main import Logger
+except (ImportError, ModuleNotFoundError):
+    from logger_main import Logger
+
+log_call = Logger(name = "   Metrics  ",console_loglevel=logging.INFO, logger_file = False)
+
+# Upper bounds of the latency buckets in s [50 us .. 6.5 s, factor 2]
+LATENCY_BUCKETS = tuple(50e-6 * 2 ** k for k in range(18))
+SDO_STATUS = {1: "ok", 0: "timeout", 2: "abort", 3: "skipped"}
+# Keys of the counters which are assigned a current value instead of being incremented, exported as gauges
+GAUGE_KEYS = frozenset({"Residual CAN messages"})
+
+class MetricCounter(Counter):
+    """:class:`~collections.Counter` with the atomic increment :meth:`inc`
+
+    ``cnt[key] += 1`` reads and writes the item in two steps, increments of several
+    threads [receive thread, event loop, GUI] can be lost. :meth:`inc` holds a lock.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._lock = Lock()
+        Counter.__init__(self, *args, **kwargs)
+
+    def inc(self, key, n=1):
+        with self._lock:
+            self[key] = self.get(key, 0) + n
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self)
+
+    def clear(self):
+        with self._lock:
+            Counter.clear(self)
+
+    def __reduce__(self):
+        return (Counter, (dict(self),))
+
+class Histogram(object):
+    """Thread-safe histogram with fixed buckets [see :data:`LATENCY_BUCKETS`]"""
+    __slots__ = ("bounds", "counts", "count", "sum", "max", "_lock")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q):
+        """Estimate of the quantile q [0..1], interpolated linearly inside the bucket"""
+        with self._lock:
+            counts, count, _max = list(self.counts), self.count, self.max
+        if count == 0:
+            return None
+        rank = q * count
+        seen = 0
+        for i, c in enumerate(counts):
+            if c and seen + c >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else _max
+                return min(lower + (upper - lower) * (rank - seen) / c, _max)
+            seen += c
+        return _max
+
+    def merge(self, other):
+        with other._lock:
+            counts, count, _sum, _max = list(other.counts), other.count, other.sum, other.max
+        with self._lock:
+            self.counts = [a + b for a, b in zip(self.counts, counts)]
+            self.count += count
+            self.sum += _sum
+            self.max = max(self.max, _max)
+
+    def summary(self):
+        """``{"count", "mean", "p50", "p99", "max"}`` in s"""
+        return {"count": self.count, "mean": self.sum / self.count if self.count else None,
+                "p50": self.quantile(0.5), "p99": self.quantile(0.99), "max": self.max if self.count else None}
+
+def _metric_name(key):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", str(key)).strip("_").lower()
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+class MetricsRegistry(object):
+    """In-process metrics of a :class:`CanWrapper` or :class:`CanChannel`
+
+    * |SDO| round-trip latency histograms per (bus, node) and the counts per status
+      [:meth:`observe_sdo`, called by :meth:`CanWrapper.read_sdo_can` and :class:`SdoEngine`]
+    * the counters of ``cnt`` [timeouts, aborts, error frames, TX/RX frames, ...]
+    * gauges [e.g. queue depths] read by a callable when the metrics are collected
+
+    :meth:`snapshot` returns everything as a dictionary, :meth:`rates` the counters per second
+    since its previous call and :meth:`prometheus_text` the Prometheus text format served by
+    :meth:`start_http_server`.
+
+    Parameters
+    ----------
+    counters : :class:`MetricCounter`, optional
+        Counters exported as ``canmops_<key>_total``, the keys of :data:`GAUGE_KEYS` as gauges ``canmops_<key>``
+    labels : :obj:`dict`, optional
+        Labels added to all the samples [e.g. ``{"channel": "can1"}``]
+    """
+
+    def __init__(self, counters=None, labels=None, prefix="canmops"):
+        self.logger = log_call.setup_main_logger()
+        self.counters = counters if counters is not None else MetricCounter()
+        self.labels = dict(labels or {})
+        self.prefix = prefix
+        self._sdo_latency = {}
+        self._sdo_status = MetricCounter()
+        self._gauges = {}
+        self._children = []
+        self._lock = Lock()
+        self._last_rates = (time.monotonic(), {})
+        self._server = None
+
+    # SDO latency
+    def observe_sdo(self, nodeId, bus, seconds, status=1):
+        """Record one |SDO| request: round-trip time in s [None if no response] and status [1 ok, 0 timeout, 2 abort, 3 skipped]"""
+        key = (int(bus), int(nodeId))
+        self._sdo_status.inc(key + (SDO_STATUS.get(int(status), str(status)),))
+        if seconds is None:
+            return
+        histogram = self._sdo_latency.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._sdo_latency.setdefault(key, Histogram())
+        histogram.observe(seconds)
+
+    def sdo_latency(self, nodeId=None, bus=None):
+        """Latency histogram of one node, one bus or all the requests [None = any]"""
+        merged = Histogram()
+        for (_bus, _nodeId), histogram in list(self._sdo_latency.items()):
+            if (bus is None or _bus == bus) and (nodeId is None or _nodeId == nodeId):
+                merged.merge(histogram)
+        return merged
+
+    def sdo_latency_summary(self):
+        """``{(bus, nodeId): summary}`` of every node, see :meth:`Histogram.summary`"""
+        return {key: histogram.summary() for key, histogram in sorted(self._sdo_latency.items())}
+
+    def sdo_status(self):
+        """``{(bus, nodeId, status): count}``"""
+        return self._sdo_status.snapshot()
+
+    # Gauges and children
+    def add_gauge(self, name, function, help=""):
+        """Export the value returned by ``function()`` [e.g. a queue depth]"""
+        self._gauges[name] = (function, help)
+
+    def remove_gauge(self, name):
+        self._gauges.pop(name, None)
+
+    def add_child(self, registry):
+        """Collect the metrics of another registry [e.g. of an additional channel] with this one"""
+        if registry not in self._children:
+            self._children.append(registry)
+
+    def remove_child(self, registry):
+        if registry in self._children:
+            self._children.remove(registry)
+
+    def gauges(self):
+        values = {}
+        for name, (function, _) in list(self._gauges.items()):
+            try:
+                values[name] = function()
+            except Exception:
+                values[name] = None
+        return values
+
+    # Collection
+    def rates(self):
+        """Increase per second of every counter since the previous call"""
+        now, counters = time.monotonic(), self.counters.snapshot()
+        t_last, last = self._last_rates
+        self._last_rates = (now, counters)
+        dt = now - t_last
+        if dt <= 0:
+            return {}
+        return {key: (value - last.get(key, 0)) / dt for key, value in counters.items() if key not in GAUGE_KEYS}
+
+    def snapshot(self):
+        """All the metrics of the registry and its children"""
+        status = self.sdo_status()
+        requests = sum(status.values())
+        by_status = Counter()
+        for (_, _, s), n in status.items():
+            by_status[s] += n
+        snapshot = {"labels": dict(self.labels),
+                    "counters": self.counters.snapshot(),
+                    "gauges": self.gauges(),
+                    "sdo_requests": requests,
+                    "sdo_timeout_rate": by_status["timeout"] / requests if requests else 0.0,
+                    "sdo_abort_rate": by_status["abort"] / requests if requests else 0.0,
+                    "sdo_latency": self.sdo_latency().summary(),
+                    "sdo_latency_per_node": self.sdo_latency_summary()}
+        if self._children:
+            snapshot["children"] = [child.snapshot() for child in self._children]
+        return snapshot
+
+    def _families(self):
+        """Metric families ``{name: (type, help, [(suffix, labels, value)])}`` of this registry"""
+        p = self.prefix
+        families = {}
+        def add(name, kind, help, labels, value, suffix=""):
+            families.setdefault(name, (kind, help, []))[2].append((suffix, {**self.labels, **labels}, value))
+        for key, value in sorted(self.counters.snapshot().items(), key=lambda kv: str(kv[0])):
+            if key in GAUGE_KEYS:
+                add(f"{p}_{_metric_name(key)}", "gauge", key, {}, value)
+            else:
+                add(f"{p}_{_metric_name(key)}_total", "counter", f"Counter {key}", {}, value)
+        for name, value in self.gauges().items():
+            if value is not None:
+                add(f"{p}_{_metric_name(name)}", "gauge", self._gauges[name][1] or name, {}, value)
+        for (bus, nodeId, status), value in sorted(self.sdo_status().items()):
+            add(f"{p}_sdo_requests_total", "counter", "SDO requests by status", {"bus": bus, "node": nodeId, "status": status}, value)
+        # Histograms per bus, quantiles per node
+        for bus in sorted({bus for bus, _ in self._sdo_latency}):
+            histogram = self.sdo_latency(bus=bus)
+            cumulative = 0
+            for bound, count in zip(list(histogram.bounds) + ["+Inf"], histogram.counts):
+                cumulative += count
+                add(f"{p}_sdo_latency_seconds", "histogram", "SDO round-trip time", {"bus": bus, "le": bound}, cumulative, "_bucket")
+            add(f"{p}_sdo_latency_seconds", "histogram", "SDO round-trip time", {"bus": bus}, histogram.sum, "_sum")
+            add(f"{p}_sdo_latency_seconds", "histogram", "SDO round-trip time", {"bus": bus}, histogram.count, "_count")
+        for (bus, nodeId), summary in self.sdo_latency_summary().items():
+            for q in ("p50", "p99", "max"):
+                add(f"{p}_sdo_node_latency_seconds", "gauge", "SDO round-trip time per node",
+                    {"bus": bus, "node": nodeId, "quantile": q}, summary[q])
+        return families
+
+    def prometheus_text(self):
+        """Metrics of the registry and its children in the Prometheus text format"""
+        families = {}
+        for registry in [self] + self._children:
+            for name, (kind, help, samples) in registry._families().items():
+                families.setdefault(name, (kind, help, []))[2].extend(samples)
+        lines = []
+        for name, (kind, help, samples) in families.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{_labels(labels)} {float(value)!r}")
+        return "\n".join(lines) + "\n"
+
+    # Endpoint
+    def start_http_server(self, port=9464, addr="127.0.0.1"):
+        """Serve :meth:`prometheus_text` on http://addr:port/metrics from a daemon thread"""
+        registry = self
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, *args):
+                pass
+        self.stop_http_server()
+        self._server = ThreadingHTTPServer((addr, port), _Handler)
+        Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True).start()
+        self.logger.info(f"Metrics are served on http://{addr}:{self._server.server_port}/metrics")
+        return self._server.server_port
+
+    def stop_http_server(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,713 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+
+import os
+import time
+import heapq
+import random
+import logging
+from threading import Thread, Event, Lock
+try:
+    from .logger_main import Logger
+    from .analysis_utils import AnalysisUtils
+    from .object_dictionary import load_object_dictionary
+    from .can_channel import channel_name
+    from .metrics import MetricCounter
+    from .sdo_engine import decode_expedited_upload, _EXPEDITED_UPLOAD
+    from .sdo_transfer import crc16, ABORT_TOGGLE, ABORT_CRC
+except (ImportError, ModuleNotFoundError):
+    from logger_main import Logger
+    from analysis_utils import AnalysisUtils
+    from object_dictionary import load_object_dictionary
+    from can_channel import channel_name
+    from metrics import MetricCounter
+    from sdo_engine import decode_expedited_upload, _EXPEDITED_UPLOAD
+    from sdo_transfer import crc16, ABORT_TOGGLE, ABORT_CRC
+
+try:
+    import can
+except (ImportError, ModuleNotFoundError):
+    can = None
+
+rootdir = os.path.dirname(os.path.abspath(__file__))
+config_dir = "config_files/"
+lib_dir = rootdir[:-8]
+log_call = Logger(name = "MOPS Simulator",console_loglevel=logging.INFO, logger_file = False)
+
+# NMT states [byte 0 of the boot-up and node guarding messages, bit 7 is the toggle bit]
+NMT_BOOTUP = 0x00
+NMT_STOPPED = 0x04
+NMT_OPERATIONAL = 0x05
+NMT_PRE_OPERATIONAL = 0x7F
+# SDO abort codes
+ABORT_COMMAND = 0x05040001
+ABORT_NO_OBJECT = 0x06020000
+ABORT_NO_SUBINDEX = 0x06090011
+ABORT_GENERAL = 0x08000000
+# Fault probabilities per SDO request [toggle and crc per segmented or block transfer]
+FAULTS = ("drop", "abort", "corrupt", "error_frame", "reset", "toggle", "crc")
+TRIM_COBID = 0x555
+SYNC_COBID = 0x80
+TPDO_MAP_INDEX = 0x1A00
+ADC_BITS = 12
+
+def mopshub_bus_number(cic, port):
+    """MOPSHUB bus byte of a port of a CIC [see :meth:`MopshubChildWindow.get_true_bus_number`]"""
+    return 33 - (port + 1) - 2 * cic
+
+class MopsNode(object):
+    """Object dictionary and NMT state of one simulated MOPS
+
+    The communication objects get the defaults of the CANopen profile, the ADC
+    [``od.adc``] and monitoring [``od.mon``] channels return a fixed baseline with
+    gaussian noise unless the value is pinned with :meth:`set_adc` or :meth:`set_value`.
+    Objects of any length [e.g. a firmware image] are set with :meth:`set_domain` and
+    read and written with segmented or block transfers.
+
+    Parameters
+    ----------
+    nodeId : :obj:`int`
+        Node ID of the chip
+    bus : :obj:`int`
+        MOPSHUB bus byte ``msg[7]`` of the requests to this node [0 without MOPSHUB]
+    od : :class:`ObjectDictionary`
+        Compiled dictionary of the chip [default: mops_config.yml]
+    latency : :obj:`float`, optional
+        Response time of this node in s [default: the one of the simulator]
+    faults : :obj:`dict`, optional
+        Fault probabilities of this node, see :data:`FAULTS`
+    """
+
+    def __init__(self, nodeId, bus=0, od=None, latency=None, faults=None, noise=2.0, vendorId=0, seed=None, blksize=127):
+        self.nodeId = int(nodeId)
+        self.bus = int(bus)
+        self.od = od if od is not None else load_object_dictionary(file=config_dir + "mops_config.yml", directory=lib_dir)
+        self.latency = latency
+        self.faults = dict(faults or {})
+        self.noise = noise
+        """:obj:`int` : Segments per block of the block downloads to this node"""
+        self.blksize = blksize
+        self.online = True
+        self.trimmed = False
+        self.state = NMT_OPERATIONAL
+        self.toggle = 0
+        """:obj:`float` : The node does not answer before this time [reset in progress]"""
+        self.down_until = 0.0
+        self._rng = random.Random(seed if seed is not None else (self.bus << 8) | self.nodeId)
+        n = self.nodeId
+        self.objects = {(g.index, int(s)): 0 for g in self.od.groups.values() for s in g.subindices}
+        self.objects.update({(0x1000, 0): 0x191, (0x1005, 0): 0x80, (0x1014, 0): 0x80 + n,
+                             (0x1018, 0): 1, (0x1018, 1): vendorId,
+                             (0x1200, 0): 2, (0x1200, 1): 0x600 + n, (0x1200, 2): 0x580 + n})
+        for i, index in enumerate((0x1800, 0x1801)):
+            self.objects.update({(index, 0): 6, (index, 1): 0x180 + 0x100 * i + n, (index, 2): 0xFE})
+            # Up to 8 mapping entries per TPDO [index << 16 | subindex << 8 | bits]
+            self.objects.update({(TPDO_MAP_INDEX + i, s): 0 for s in range(9)})
+        self.sync_count = 0
+        # Baselines of the ADC and monitoring channels
+        self.readings = {}
+        for g in self.od.adc:
+            for s, channel_type in zip(g.subindices, g.channel_types):
+                self.readings[(g.index, int(s))] = self._rng.uniform(1800, 2200) if channel_type == 'T' else self._rng.uniform(800, 1200)
+        for g in self.od.mon:
+            for s in g.subindices:
+                self.readings[(g.index, int(s))] = self._rng.uniform(1800, 2200)
+        self._pinned = {}
+        self.domains = {}
+
+    def __repr__(self):
+        return f"MopsNode(nodeId={self.nodeId}, bus={self.bus}, online={self.online})"
+
+    def set_value(self, index, subindex, value):
+        """Pin the value of an object [None releases an ADC or monitoring channel]"""
+        if value is None:
+            self._pinned.pop((index, subindex), None)
+        else:
+            self._pinned[(index, subindex)] = int(value)
+
+    def set_adc(self, channel, value):
+        """Pin the value of an ADC channel [subindex + 2]"""
+        for g in self.od.adc:
+            for s, c in zip(g.subindices, g.channels):
+                if c == channel:
+                    self.set_value(g.index, int(s), value)
+
+    def set_domain(self, index, subindex, data):
+        """Store the bytes of an object [None removes it]"""
+        if data is None:
+            self.domains.pop((index, subindex), None)
+        else:
+            self.domains[(index, subindex)] = bytes(data)
+
+    def read_bytes(self, index, subindex):
+        """Return ``(data, abort_code)`` of a segmented or block upload [4 bytes of the other objects]"""
+        if (index, subindex) in self.domains:
+            return self.domains[(index, subindex)], None
+        value, abort = self.read(index, subindex)
+        return (int(value).to_bytes(4, 'little') if abort is None else None), abort
+
+    def write_bytes(self, index, subindex, data):
+        """Segmented or block download, return the abort code or :data:`None`"""
+        key = (index, subindex)
+        if key not in self.domains and key not in self.objects and key not in self.readings:
+            return ABORT_NO_OBJECT
+        if key in self.domains or len(data) > 4:
+            self.domains[key] = bytes(data)
+            return None
+        return self.write(index, subindex, int.from_bytes(data, 'little'))
+
+    def read(self, index, subindex):
+        """Return ``(value, abort_code)`` of an upload, abort_code is :data:`None` on success"""
+        key = (index, subindex)
+        if key in self._pinned:
+            return self._pinned[key], None
+        if key in self.readings:
+            value = int(round(self._rng.gauss(self.readings[key], self.noise)))
+            return min(max(value, 0), (1 << ADC_BITS) - 1), None
+        if key in self.objects:
+            return self.objects[key], None
+        if any(i == index for i, _ in self.objects):
+            return None, ABORT_NO_SUBINDEX
+        return None, ABORT_NO_OBJECT
+
+    def write(self, index, subindex, value):
+        """Expedited download, return the abort code or :data:`None`"""
+        key = (index, subindex)
+        if key not in self.objects and key not in self.readings:
+            return ABORT_NO_OBJECT
+        self.objects[key] = value
+        return None
+
+    def tpdos(self):
+        """Frames ``(cobid, data)`` of the synchronous TPDOs sent after a SYNC [transmission type 1-240]"""
+        self.sync_count += 1
+        frames = []
+        for i, index in enumerate((0x1800, 0x1801)):
+            cobid, transmission = self.objects[(index, 1)], self.objects[(index, 2)]
+            if cobid & 0x80000000 or not 1 <= transmission <= 240 or self.sync_count % transmission:
+                continue
+            data = bytearray()
+            for s in range(1, self.objects[(TPDO_MAP_INDEX + i, 0)] + 1):
+                entry = self.objects[(TPDO_MAP_INDEX + i, s)]
+                value, abort = self.read(entry >> 16, (entry >> 8) & 0xFF)
+                data += int(value if abort is None else 0).to_bytes((entry & 0xFF) // 8, 'little')
+            frames.append((cobid & 0x7FF, list(data[:8])))
+        return frames
+
+    def guard(self):
+        """State byte of the node guarding response with the toggle bit"""
+        byte = self.state | self.toggle
+        self.toggle ^= 0x80
+        return byte
+
+    def reset(self):
+        self.state = NMT_OPERATIONAL
+        self.toggle = 0
+        self.trimmed = False
+        self.sync_count = 0
+
+class MopsSimulator(Thread):
+    """Software MOPS/MOPSHUB crate answering on a virtual or vcan bus
+
+    The simulator emulates the CANopen slaves of :class:`MopsNode` for load tests of
+    :class:`CanWrapper` without hardware:
+
+    * expedited |SDO| uploads and downloads of the object dictionary [0x1000, 0x1018,
+      the 0x2310 monitoring and the 0x2400 ADC channels, ...]; the response echoes the
+      MOPSHUB bus byte ``msg[7]``, which selects the node together with the node ID
+    * segmented and block |SDO| uploads and downloads [toggle bit, block acknowledge and CRC]
+      of the objects set with :meth:`MopsNode.set_domain`; one transfer per node ID at a time,
+      the segments do not carry the bus byte
+    * boot-up messages on 0x700 + nodeId when started or reset, node guarding and the NMT commands on 0x000
+    * the trim handshake: a frame on 0x555 is answered by every node with 0x85 on 0x700 + nodeId
+    * synchronous TPDOs: after a SYNC on 0x80 every operational node sends the TPDOs configured
+      with the transmission types 1-240 and the mapping of 0x1A00/0x1A01 [see :class:`PdoAcquisition`]
+    * a response time [``latency`` + gaussian ``jitter``] per request, the nodes answer independently
+    * fault injection with the probabilities of :data:`FAULTS` per request: no response,
+      |SDO| abort, response to another subindex, error frame 0x88 before the response,
+      and a reset of the node [boot-up message, no responses for ``reset_time`` s]
+
+    Parameters
+    ----------
+    interface : :obj:`str`
+        'virtual_bus' [python-can in-process bus], 'virtual' [SocketCAN vcan] or 'socketcan'
+    channel : :obj:`int`
+        Channel number [vbusN, vcanN or canN, the same channel as the wrapper]
+    nodes : :obj:`list` of :class:`MopsNode`, optional
+        Nodes of the crate, see also :meth:`populate` and :meth:`from_config`
+
+    Examples
+    --------
+    >>> simulator = MopsSimulator.from_config(interface="virtual_bus", channel=0)
+    >>> simulator.start()
+    >>> wrapper = CanWrapper(interface="virtual_bus", channel=0, bitrate=125000)
+    """
+
+    def __init__(self, interface="virtual_bus", channel=0, nodes=None, latency=0.0, jitter=0.0,
+                 faults=None, reset_time=0.1, bootup=True, seed=None):
+        Thread.__init__(self, name="MopsSimulator", daemon=True)
+        self.logger = log_call.setup_main_logger()
+        self.interface = interface
+        self.channel = channel
+        self.latency = latency
+        self.jitter = jitter
+        self.faults = dict(faults or {})
+        self.reset_time = reset_time
+        self.bootup = bootup
+        self.cnt = MetricCounter()
+        self._nodes = {}
+        self._nodesLock = Lock()
+        self._rng = random.Random(seed)
+        self._scheduled = []
+        self._seq = 0
+        self._transfers = {}   # nodeId -> state of the segmented or block transfer
+        self._last_bus = {}    # nodeId -> bus byte of the last request which carried it
+        self._pill2kill = Event()
+        self.bus = None
+        for node in nodes or []:
+            self.add_node(node)
+
+    # Nodes
+    def add_node(self, node):
+        with self._nodesLock:
+            self._nodes[(node.bus, node.nodeId)] = node
+        return node
+
+    def remove_node(self, nodeId, bus=0):
+        with self._nodesLock:
+            return self._nodes.pop((bus, nodeId), None)
+
+    def node(self, nodeId, bus=0):
+        return self._nodes.get((bus, nodeId))
+
+    @property
+    def nodes(self):
+        """:obj:`list` of :class:`MopsNode` sorted by bus and node ID"""
+        return [self._nodes[key] for key in sorted(self._nodes)]
+
+    def populate(self, nodeIds, buses=(0,), od=None, **kwargs):
+        """Add a node for every node ID on every bus [kwargs are passed to :class:`MopsNode`]"""
+        od = od if od is not None else load_object_dictionary(file=config_dir + "mops_config.yml", directory=lib_dir)
+        return [self.add_node(MopsNode(nodeId, bus, od=od, **kwargs)) for bus in buses for nodeId in nodeIds]
+
+    def set_online(self, nodeId, bus=0, online=True):
+        """Disconnect or reconnect a node"""
+        self.node(nodeId, bus).online = online
+
+    def set_faults(self, nodeId=None, bus=0, **faults):
+        """Set fault probabilities [:data:`FAULTS`] of the simulator or of one node"""
+        unknown = set(faults) - set(FAULTS)
+        if unknown:
+            raise ValueError(f"Unknown faults {sorted(unknown)}, use {FAULTS}")
+        (self.faults if nodeId is None else self.node(nodeId, bus).faults).update(faults)
+
+    @classmethod
+    def from_config(cls, file="mopshub_config.yaml", directory=os.path.join(lib_dir, config_dir), od_file="mops_config.yml", **kwargs):
+        """Populate the crate from the MOPSHUB configuration
+
+        Every "MOPS m" of the "Port b" of "CIC c" becomes a node with its ``node_id`` on the bus
+        :func:`mopshub_bus_number` (c, b); MOPS with ``Status: False`` are offline. The optional
+        section "Simulation" scales the crate up and sets the response time and the faults::
+
+            Simulation:
+               CICs: 16           # CICs without an entry get the layout of CIC 0
+               MOPS per Port: 8   # node_id 0..7 on every port instead of the listed MOPS
+               Latency: 0.0005
+               Jitter: 0.0001
+               Faults: {drop: 0.001, abort: 0.0}
+
+        kwargs override the settings of the file [e.g. ``interface``, ``channel`` or ``latency``].
+        """
+        conf = AnalysisUtils().open_yaml_file(file=file, directory=directory)
+        sim = conf.get("Simulation", None) or {}
+        od = load_object_dictionary(file=od_file, directory=os.path.join(lib_dir, config_dir))
+        kwargs.setdefault("latency", float(sim.get("Latency", 0.0)))
+        kwargs.setdefault("jitter", float(sim.get("Jitter", 0.0)))
+        kwargs.setdefault("faults", sim.get("Faults", None))
+        simulator = cls(**kwargs)
+        cics = conf["MOPSHUB"]
+        mops_per_port = sim.get("MOPS per Port", None)
+        for c in range(int(sim.get("CICs", len(cics)))):
+            cic = cics.get(f"CIC {c}", cics["CIC 0"])
+            for port_key, port in cic.items():
+                b = int(port_key.split()[-1])
+                if mops_per_port is not None:
+                    chips = [(m, True) for m in range(int(mops_per_port))]
+                else:
+                    chips = [(int(mops["node_id"]), bool(mops.get("Status", True))) for mops in port.values()]
+                for nodeId, status in chips:
+                    node = simulator.add_node(MopsNode(nodeId, mopshub_bus_number(c, b), od=od))
+                    node.online = status
+        simulator.logger.info(f"Simulated crate {conf.get('Crate ID')} with {len(simulator._nodes)} MOPS "
+                              f"on {len({bus for bus, _ in simulator._nodes})} buses")
+        return simulator
+
+    # Bus
+    def open(self):
+        if can is None:
+            raise RuntimeError("The simulator needs python-can")
+        name = channel_name(self.interface, self.channel)
+        if self.interface == 'virtual_bus':
+            self.bus = can.Bus(interface="virtual", channel=name, receive_own_messages=False)
+        else:
+            self.bus = can.Bus(interface="socketcan", channel=name)
+        self.logger.notice(f"MOPS simulator on {name} [{len(self._nodes)} nodes]")
+        return self.bus
+
+    def _send(self, cobid, data):
+        try:
+            self.bus.send(can.Message(arbitration_id=cobid, data=data, is_extended_id=False))
+            self.cnt.inc('tx_msg')
+        except can.CanError as e:
+            self.cnt.inc('tx_error')
+            self.logger.error(f"Sending {cobid:03X} failed: {e}")
+
+    def _respond(self, node, frames):
+        """Send the frames now or after the response time of the node"""
+        latency = node.latency if node.latency is not None else self.latency
+        delay = latency + (self._rng.gauss(0, self.jitter) if self.jitter else 0)
+        if delay <= 0:
+            for frame in frames:
+                self._send(*frame)
+            return
+        self._seq += 1
+        heapq.heappush(self._scheduled, (time.monotonic() + delay, self._seq, frames))
+
+    def _bootup(self, node):
+        node.reset()
+        self.cnt.inc('bootup')
+        self._respond(node, [(0x700 + node.nodeId, [NMT_BOOTUP, 0, 0, 0, 0, 0, 0, node.bus])])
+
+    def _fault(self, node, name):
+        p = node.faults.get(name, self.faults.get(name, 0.0))
+        return p > 0 and self._rng.random() < p
+
+    # Protocol
+    def _handle(self, msg):
+        cobid, data = msg.arbitration_id, msg.data
+        self.cnt.inc('rx_msg')
+        if cobid == 0x000 and len(data) >= 2:
+            self._nmt(data)
+        elif cobid == TRIM_COBID:
+            self._trim()
+        elif cobid == SYNC_COBID and len(data) == 0:
+            self._sync()
+        elif 0x600 <= cobid < 0x680 and len(data) == 8:
+            self._sdo(cobid - 0x600, data)
+        elif 0x700 <= cobid < 0x780:
+            node = self._nodes.get((data[7] if len(data) == 8 else 0, cobid - 0x700))
+            if node is not None and self._available(node):
+                self.cnt.inc('node_guarding')
+                self._respond(node, [(cobid, [node.guard(), 0, 0, 0, 0, 0, 0, node.bus])])
+
+    def _available(self, node):
+        if not node.online:
+            self.cnt.inc('offline')
+            return False
+        if node.down_until > time.monotonic():
+            self.cnt.inc('resetting')
+            return False
+        return True
+
+    def _nmt(self, data):
+        command, nodeId = data[0], data[1]
+        self.cnt.inc('nmt')
+        for node in self.nodes:
+            if (nodeId and node.nodeId != nodeId) or (len(data) == 8 and data[7] and node.bus != data[7]) or not node.online:
+                continue
+            if command == 0x01:
+                node.state = NMT_OPERATIONAL
+            elif command == 0x02:
+                node.state = NMT_STOPPED
+            elif command == 0x80:
+                node.state = NMT_PRE_OPERATIONAL
+            elif command in (0x81, 0x82):
+                self._bootup(node)
+
+    def _trim(self):
+        for node in self.nodes:
+            if self._available(node):
+                node.trimmed = True
+                self.cnt.inc('trim')
+                self._respond(node, [(0x700 + node.nodeId, [0x80 | NMT_OPERATIONAL, 0, 0, 0, 0, 0, 0, node.bus])])
+
+    def _sync(self):
+        self.cnt.inc('sync')
+        for node in self.nodes:
+            if node.state == NMT_OPERATIONAL and self._available(node):
+                frames = node.tpdos()
+                if frames:
+                    self.cnt.inc('tpdo', len(frames))
+                    self._respond(node, frames)
+
+    def _sdo(self, nodeId, data):
+        if data[0] == 0x80:
+            # Abort of the client: no response
+            if self._transfers.pop(nodeId, None) is not None:
+                self.cnt.inc('sdo_client_abort')
+            return
+        transfer = self._transfers.get(nodeId)
+        if transfer is not None and self._available(transfer["node"]):
+            frames = self._transfer(nodeId, transfer, data)
+            if frames is not None:
+                self._respond(transfer["node"], frames)
+                return
+        if data[0] in (0x21, 0x22, 0x23) or data[0] & 0xE1 == 0xC0:
+            # The data or the size of the download overwrite the bus byte
+            bus = self._last_bus.get(nodeId, 0)
+        else:
+            bus = self._last_bus[nodeId] = data[7]
+        node = self._nodes.get((bus, nodeId))
+        if node is None or not self._available(node):
+            return
+        index, subindex = data[1] | (data[2] << 8), data[3]
+        command = data[0]
+        self.cnt.inc('sdo_request')
+        if self._fault(node, "reset"):
+            self.cnt.inc('injected_reset')
+            node.down_until = time.monotonic() + self.reset_time
+            self._bootup(node)
+            return
+        if self._fault(node, "drop"):
+            self.cnt.inc('injected_drop')
+            return
+        frames = []
+        if self._fault(node, "error_frame"):
+            self.cnt.inc('injected_error_frame')
+            frames.append((0x88, [0x00, 0, 0, 0, 0, 0, 0, 0]))
+        if self._fault(node, "corrupt"):
+            self.cnt.inc('injected_corrupt')
+            subindex = (subindex + 1) & 0xFF
+        abort = None
+        if self._fault(node, "abort"):
+            self.cnt.inc('injected_abort')
+            abort = ABORT_GENERAL
+        elif command == 0x40 and (index, subindex) in node.domains:
+            abort = self._initiate_upload(node, nodeId, index, subindex, frames)
+        elif command & 0xE3 == 0xA0 or command == 0x21 or command & 0xE1 == 0xC0:
+            abort = self._initiate_transfer(node, nodeId, command, index, subindex, data, frames)
+        elif command == 0x40:
+            value, abort = node.read(index, subindex)
+            if abort is None:
+                self.cnt.inc('sdo_upload')
+                v = int(value).to_bytes(4, 'little')
+                # 3 data bytes, byte 7 is the MOPSHUB bus byte
+                frames.append((0x580 + nodeId, [0x43, data[1], data[2], subindex, v[0], v[1], v[2], node.bus]))
+        elif command & 0xE3 == 0x23:
+            n = 4 - ((command >> 2) & 0b11)
+            abort = node.write(index, subindex, int.from_bytes(bytes(data[4:4 + n]), 'little'))
+            if abort is None:
+                self.cnt.inc('sdo_download')
+                frames.append((0x580 + nodeId, [0x60, data[1], data[2], subindex, 0, 0, 0, node.bus]))
+        else:
+            abort = ABORT_COMMAND
+        if abort is not None:
+            self.cnt.inc('sdo_abort')
+            frames.append((0x580 + nodeId, [0x80, data[1], data[2], subindex, *abort.to_bytes(4, 'little')]))
+        self._respond(node, frames)
+
+    # Segmented and block transfers
+    def _initiate_upload(self, node, nodeId, index, subindex, frames):
+        data, abort = node.read_bytes(index, subindex)
+        if abort is not None:
+            return abort
+        if len(data) <= 4:
+            frames.append((0x580 + nodeId, [0x43 | ((4 - len(data)) << 2), index & 0xFF, index >> 8, subindex]
+                           + list(data.ljust(4, b"\0"))))
+            self.cnt.inc('sdo_upload')
+            return None
+        self._transfers[nodeId] = {"kind": "upload", "node": node, "index": index, "subindex": subindex,
+                                   "data": data, "pos": 0, "toggle": 0, "fault": self._fault(node, "toggle")}
+        frames.append((0x580 + nodeId, [0x41, index & 0xFF, index >> 8, subindex, *len(data).to_bytes(4, 'little')]))
+        return None
+
+    def _initiate_transfer(self, node, nodeId, command, index, subindex, data, frames):
+        key = (index, subindex)
+        crc = bool(command & 0x04)
+        transfer = {"node": node, "index": index, "subindex": subindex, "crc": crc, "buf": bytearray(),
+                    "toggle": 0, "fault": self._fault(node, "toggle" if command == 0x21 else "crc")}
+        if command & 0xE3 == 0xA0:
+            payload, abort = node.read_bytes(index, subindex)
+            if abort is not None:
+                return abort
+            segments = [payload[pos:pos + 7] for pos in range(0, len(payload), 7)] or [b""]
+            transfer.update(kind="block_upload", segments=segments, start=0, blksize=max(data[4], 1),
+                            payload=payload, state="initiated")
+            frames.append((0x580 + nodeId, [0xC2 | (0x04 if crc else 0), index & 0xFF, index >> 8, subindex,
+                                            *len(payload).to_bytes(4, 'little')]))
+        else:
+            if key not in node.domains and key not in node.objects and key not in node.readings:
+                return ABORT_NO_OBJECT
+            if command == 0x21:
+                transfer.update(kind="download")
+                frames.append((0x580 + nodeId, [0x60, index & 0xFF, index >> 8, subindex, 0, 0, 0, 0]))
+            else:
+                transfer.update(kind="block_download", blksize=node.blksize, seqno=0, state="blocks")
+                frames.append((0x580 + nodeId, [0xA0 | (0x04 if crc else 0), index & 0xFF, index >> 8, subindex,
+                                                node.blksize, 0, 0, 0]))
+        self._transfers[nodeId] = transfer
+        return None
+
+    def _transfer(self, nodeId, transfer, data):
+        """Response frames to a frame of the running transfer of the node, None if the frame starts a new request"""
+        command, kind = data[0], transfer["kind"]
+        index, subindex = transfer["index"], transfer["subindex"]
+        cobid = 0x580 + nodeId
+
+        def _abort(code):
+            del self._transfers[nodeId]
+            self.cnt.inc('sdo_abort')
+            return [(cobid, [0x80, index & 0xFF, index >> 8, subindex, *code.to_bytes(4, 'little')])]
+
+        if kind == "upload":
+            if command & 0xE0 != 0x60:
+                del self._transfers[nodeId]
+                return None
+            if (command >> 4) & 1 != transfer["toggle"]:
+                return _abort(ABORT_TOGGLE)
+            pos = transfer["pos"]
+            segment = transfer["data"][pos:pos + 7]
+            last = pos + 7 >= len(transfer["data"])
+            toggle = transfer["toggle"] ^ int(transfer["fault"])
+            transfer["pos"] += 7
+            transfer["toggle"] ^= 1
+            if last:
+                del self._transfers[nodeId]
+                self.cnt.inc('sdo_segmented_upload')
+            return [(cobid, [(toggle << 4) | ((7 - len(segment)) << 1) | int(last)] + list(segment.ljust(7, b"\0")))]
+        if kind == "download":
+            if command & 0xE0 != 0x00:
+                del self._transfers[nodeId]
+                return None
+            toggle = (command >> 4) & 1
+            if toggle != transfer["toggle"]:
+                return _abort(ABORT_TOGGLE)
+            transfer["buf"] += bytes(data[1:8 - ((command >> 1) & 0b111)])
+            transfer["toggle"] ^= 1
+            response = [(cobid, [0x20 | ((toggle ^ int(transfer["fault"])) << 4), 0, 0, 0, 0, 0, 0, 0])]
+            if command & 0x01:
+                del self._transfers[nodeId]
+                abort = transfer["node"].write_bytes(index, subindex, bytes(transfer["buf"]))
+                if abort is not None:
+                    self._transfers[nodeId] = transfer
+                    return _abort(abort)
+                self.cnt.inc('sdo_segmented_download')
+            return response
+        if kind == "block_upload":
+            if transfer["state"] == "initiated" and command == 0xA3:
+                return self._upload_block(nodeId, transfer)
+            if transfer["state"] == "blocks" and command & 0xE3 == 0xA2:
+                transfer["start"] += data[1]
+                transfer["blksize"] = max(data[2], 1)
+                if transfer["start"] < len(transfer["segments"]):
+                    return self._upload_block(nodeId, transfer)
+                transfer["state"] = "end"
+                crc = crc16(transfer["payload"]) ^ (0x5555 if transfer["fault"] else 0) if transfer["crc"] else 0
+                return [(cobid, [0xC1 | ((7 - len(transfer["segments"][-1])) << 2), *crc.to_bytes(2, 'little'), 0, 0, 0, 0, 0])]
+            if transfer["state"] == "end" and command == 0xA1:
+                del self._transfers[nodeId]
+                self.cnt.inc('sdo_block_upload')
+                return []
+            del self._transfers[nodeId]
+            return None
+        # Block download: every frame of a block is a segment
+        if transfer["state"] == "blocks":
+            seqno = command & 0x7F
+            if seqno == transfer["seqno"] + 1:
+                transfer["seqno"] = seqno
+                transfer["buf"] += bytes(data[1:8])
+                if command & 0x80:
+                    transfer["state"] = "end"
+            if command & 0x80 or seqno >= transfer["blksize"]:
+                ackseq, transfer["seqno"] = transfer["seqno"], 0
+                return [(cobid, [0xA2, ackseq, transfer["blksize"], 0, 0, 0, 0, 0])]
+            return []
+        if command & 0xE3 != 0xC1:
+            del self._transfers[nodeId]
+            return None
+        buf = transfer["buf"]
+        n = (command >> 2) & 0b111
+        if n:
+            del buf[-n:]
+        if transfer["crc"] and (crc16(buf) ^ (0x5555 if transfer["fault"] else 0)) != int.from_bytes(bytes(data[1:3]), 'little'):
+            return _abort(ABORT_CRC)
+        abort = transfer["node"].write_bytes(index, subindex, bytes(buf))
+        if abort is not None:
+            return _abort(abort)
+        del self._transfers[nodeId]
+        self.cnt.inc('sdo_block_download')
+        return [(cobid, [0xA1, 0, 0, 0, 0, 0, 0, 0])]
+
+    def _upload_block(self, nodeId, transfer):
+        segments, start = transfer["segments"], transfer["start"]
+        block = segments[start:start + transfer["blksize"]]
+        transfer["state"] = "blocks"
+        return [(0x580 + nodeId, [(0x80 if start + k == len(segments) - 1 else 0) | (k + 1)] + list(segment.ljust(7, b"\0")))
+                for k, segment in enumerate(block)]
+
+    def run(self):
+        if self.bus is None:
+            self.open()
+        if self.bootup:
+            for node in self.nodes:
+                if node.online:
+                    self._bootup(node)
+        try:
+            while not self._pill2kill.is_set():
+                now = time.monotonic()
+                while self._scheduled and self._scheduled[0][0] <= now:
+                    for frame in heapq.heappop(self._scheduled)[2]:
+                        self._send(*frame)
+                timeout = min(self._scheduled[0][0] - now, 0.05) if self._scheduled else 0.05
+                msg = self.bus.recv(max(timeout, 0))
+                if msg is not None and not msg.is_error_frame:
+                    self._handle(msg)
+        finally:
+            self.bus.shutdown()
+            self.bus = None
+
+    def replay_frame(self, cobid, data, dlc, flag, t, error_frame):
+        """Take the value of a recorded |SDO| upload response [target of :class:`CanReplay`]
+
+        The node [added if it is missing] answers the next requests of the object with this
+        value, so the GUI windows polling the simulator follow the recorded data.
+        """
+        if 0x580 <= cobid < 0x600 and dlc == 8 and data[0] in _EXPEDITED_UPLOAD:
+            nodeId, bus = cobid - 0x580, data[7]
+            node = self._nodes.get((bus, nodeId)) or self.add_node(MopsNode(nodeId, bus))
+            node.set_value(data[1] | (data[2] << 8), data[3], decode_expedited_upload(data))
+            self.cnt.inc('replayed')
+
+    def statistics(self):
+        return self.cnt.snapshot()
+
+    def stop(self, timeout=1):
+        self._pill2kill.set()
+        if self.is_alive():
+            self.join(timeout)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Simulate the MOPS of a MOPSHUB crate")
+    parser.add_argument("--interface", default="virtual", help="virtual [vcanN] or socketcan [canN]")
+    parser.add_argument("--channel", type=int, default=0)
+    parser.add_argument("--config", default="mopshub_config.yaml")
+    parser.add_argument("--latency", type=float, default=None, help="Response time in s")
+    args = parser.parse_args()
+    kwargs = {"interface": args.interface, "channel": args.channel}
+    if args.latency is not None:
+        kwargs["latency"] = args.latency
+    simulator = MopsSimulator.from_config(file=args.config, **kwargs)
+    simulator.start()
+    try:
+        while simulator.is_alive():
+            time.sleep(10)
+            simulator.logger.info(f"{simulator.statistics()}")
+    except KeyboardInterrupt:
+        simulator.stop()
@@ -0,0 +1,178 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+
+import time
+import logging
+from threading import Lock
+try:
+    from .logger_main import Logger
+    from .metrics import MetricCounter
+except (ImportError, ModuleNotFoundError):
+    from logger_main import Logger
+    from metrics import MetricCounter
+
+log_call = Logger(name = "Node Health ",console_loglevel=logging.INFO, logger_file = False)
+
+# States of the circuit breaker of a node
+CLOSED = "closed"        # requests are sent
+OPEN = "open"            # the node is parked, requests are skipped
+HALF_OPEN = "half-open"  # one probe request is outstanding
+
+class NodeState(object):
+    """Round-trip time estimate and circuit breaker of one (bus, node)
+
+    The timeout follows the retransmission timer of TCP [RFC 6298]: ``srtt + k * rttvar``
+    with the EWMA of the round-trip time and of its deviation, doubled after every timeout.
+    """
+    __slots__ = ("srtt", "rttvar", "rto", "failures", "state", "opened", "probe_interval", "probe_sent",
+                 "timeouts", "responses", "skipped")
+
+    def __init__(self, initial_timeout, probe_interval):
+        self.srtt = None
+        self.rttvar = None
+        self.rto = initial_timeout
+        self.failures = 0
+        self.state = CLOSED
+        self.opened = 0.0
+        self.probe_interval = probe_interval
+        self.probe_sent = 0.0
+        self.timeouts = 0
+        self.responses = 0
+        self.skipped = 0
+
+class NodeHealth(object):
+    """Adaptive |SDO| timeouts and dead-node circuit breaker of the nodes of one channel
+
+    :class:`CanWrapper` and :class:`SdoEngine` ask :meth:`timeout` for the response timeout of
+    every request and report the result with :meth:`on_response` or :meth:`on_timeout`. After
+    ``failure_threshold`` consecutive timeouts the node is parked: :meth:`allow` returns False and
+    its requests are not sent, except one probe every ``probe_interval`` s [doubled after every failed
+    probe up to ``max_probe_interval``]. The first response closes the breaker again.
+
+    The transitions are counted in ``counters`` [node_parked, node_probe, node_recovered,
+    SDO_read_skipped], :meth:`parked` lists the parked nodes.
+
+    Parameters
+    ----------
+    counters : :class:`MetricCounter`, optional
+        Counters of the wrapper or channel
+    initial_timeout : :obj:`float`
+        Timeout in s of a node without round-trip time samples
+    min_timeout, max_timeout : :obj:`float`
+        Bounds of the timeout in s
+    """
+
+    def __init__(self, counters=None, initial_timeout=0.01, min_timeout=0.005, max_timeout=1.0, k=4,
+                 alpha=0.125, beta=0.25, failure_threshold=3, probe_interval=5.0, max_probe_interval=60.0):
+        self.logger = log_call.setup_main_logger()
+        self.cnt = counters if counters is not None else MetricCounter()
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.k = k
+        self.alpha = alpha
+        self.beta = beta
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.max_probe_interval = max_probe_interval
+        self._nodes = {}
+        self._lock = Lock()
+
+    def _node(self, nodeId, bus):
+        key = (int(bus), int(nodeId))
+        node = self._nodes.get(key)
+        if node is None:
+            with self._lock:
+                node = self._nodes.setdefault(key, NodeState(self.initial_timeout, self.probe_interval))
+        return node
+
+    def timeout(self, nodeId, bus=0):
+        """Response timeout of the next request to the node in s"""
+        return self._node(nodeId, bus).rto
+
+    def allow(self, nodeId, bus=0):
+        """True if a request may be sent to the node [an open breaker lets one probe through when it is due]"""
+        node = self._node(nodeId, bus)
+        if node.state == CLOSED:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            if node.state == OPEN and now - node.opened >= node.probe_interval:
+                node.state = HALF_OPEN
+                node.probe_sent = now
+                self.cnt.inc('node_probe')
+                return True
+            if node.state == HALF_OPEN and now - node.probe_sent > 2 * self.max_timeout:
+                # The result of the last probe was never reported
+                node.probe_sent = now
+                self.cnt.inc('node_probe')
+                return True
+        node.skipped += 1
+        self.cnt.inc('SDO_read_skipped')
+        return False
+
+    def on_response(self, nodeId, bus=0, rtt=None):
+        """Report a response [also an abort]. rtt is None if the request was retried [Karn]"""
+        node = self._node(nodeId, bus)
+        node.responses += 1
+        node.failures = 0
+        if rtt is not None:
+            if node.srtt is None:
+                node.srtt, node.rttvar = rtt, rtt / 2
+            else:
+                node.rttvar = (1 - self.beta) * node.rttvar + self.beta * abs(node.srtt - rtt)
+                node.srtt = (1 - self.alpha) * node.srtt + self.alpha * rtt
+            node.rto = min(max(node.srtt + self.k * node.rttvar, self.min_timeout), self.max_timeout)
+        elif node.srtt is not None:
+            node.rto = min(max(node.srtt + self.k * node.rttvar, self.min_timeout), self.max_timeout)
+        if node.state != CLOSED:
+            with self._lock:
+                node.state = CLOSED
+                node.probe_interval = self.probe_interval
+            self.cnt.inc('node_recovered')
+            self.logger.notice(f"Node {nodeId} on bus {bus} answers again")
+
+    def on_timeout(self, nodeId, bus=0):
+        """Report a request without response"""
+        node = self._node(nodeId, bus)
+        node.timeouts += 1
+        node.failures += 1
+        node.rto = min(node.rto * 2, self.max_timeout)
+        with self._lock:
+            if node.state == HALF_OPEN:
+                node.state = OPEN
+                node.opened = time.monotonic()
+                node.probe_interval = min(node.probe_interval * 2, self.max_probe_interval)
+            elif node.state == CLOSED and node.failures >= self.failure_threshold:
+                node.state = OPEN
+                node.opened = time.monotonic()
+                self.cnt.inc('node_parked')
+                self.logger.warning(f"Node {nodeId} on bus {bus} did not answer {node.failures} requests, "
+                                    f"it is probed every {node.probe_interval} s")
+
+    def state(self, nodeId, bus=0):
+        return self._node(nodeId, bus).state
+
+    def parked(self):
+        """(bus, nodeId) of the nodes whose breaker is not closed"""
+        return sorted(key for key, node in list(self._nodes.items()) if node.state != CLOSED)
+
+    def reset(self, nodeId=None, bus=0):
+        """Forget the state of one node or of all the nodes [e.g. after powering a bus]"""
+        with self._lock:
+            if nodeId is None:
+                self._nodes.clear()
+            else:
+                self._nodes.pop((int(bus), int(nodeId)), None)
+
+    def statistics(self):
+        """``{(bus, nodeId): {state, srtt, rttvar, timeout, timeouts, responses, skipped}}`` [times in s]"""
+        return {key: {"state": node.state, "srtt": node.srtt, "rttvar": node.rttvar, "timeout": node.rto,
+                      "timeouts": node.timeouts, "responses": node.responses, "skipped": node.skipped}
+                for key, node in sorted(self._nodes.items())}
@@ -0,0 +1,164 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+
+import os
+import logging
+from collections import namedtuple
+import numpy as np
+try:
+    from .logger_main import Logger
+    from .analysis import AdcConverter
+    from .analysis_utils import AnalysisUtils
+except (ImportError, ModuleNotFoundError):
+    from logger_main import Logger
+    from analysis import AdcConverter
+    from analysis_utils import AnalysisUtils
+
+log_call = Logger(name = " Object Dict",console_loglevel=logging.INFO, logger_file = False)
+# The paths of the yaml files [e.g. icon_dir, calibration_file] are relative to the package root
+lib_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# One entry of the object dictionary
+OD_DTYPE = np.dtype([("index", "<u2"),
+                     ("subindex", "u1"),
+                     ("channel", "<i2")])
+
+OdGroup = namedtuple("OdGroup", ["index", "index_key", "description", "subindices", "subindex_keys",
+                                 "subindex_descriptions", "channels", "channel_types", "requests"])
+OdGroup.__doc__ = """Compiled index of the object dictionary
+
+index : :obj:`int`
+index_key : :obj:`str`
+    The key of the index in the yaml file [e.g. '0x2400']
+subindices : :class:`numpy.ndarray`
+    Integer subindices
+subindex_keys : :obj:`list`
+    The keys of the subindices in the yaml file [e.g. '1A']
+channels : :class:`numpy.ndarray`
+    ADC channel of each subindex [subindex + 2] or -1 if the index has no ADC channels
+channel_types : :obj:`list`
+    Type of each ADC channel ["V", "T"] or None
+requests : :class:`numpy.ndarray`
+    (n, 8) uint8 payloads of the |SDO| upload requests. The last byte [bus] is 0.
+"""
+
+def sdo_upload_request(index, subindex, bus=0):
+    """Payload of an expedited |SDO| upload request"""
+    return [0x40, index & 0xFF, (index >> 8) & 0xFF, subindex, 0, 0, 0, bus]
+
+class ObjectDictionary(object):
+    """Object dictionary of a device compiled from its yaml file [e.g. mops_config.yml]
+
+    All the hex keys of ``index_items`` are parsed once. The refresh loops of the wrapper and
+    the GUIs iterate over the integer arrays of :attr:`adc`, :attr:`mon` and :attr:`conf`
+    and do not touch the yaml dictionary any more.
+
+    Parameters
+    ----------
+    dev : :obj:`dict`
+        Loaded yaml file of the device
+
+    Examples
+    --------
+    >>> od = load_object_dictionary(file="config_files/mops_config.yml", directory=lib_dir)
+    >>> for group in od.adc:
+    ...     for subindex, channel in zip(group.subindices, group.channels): ...
+    """
+
+    def __init__(self, dev):
+        self.dev = dev
+        application = dev["Application"]
+        self.device_name = application["device_name"]
+        self.chipId = application.get("chipId")
+        self.nodeIds = [int(n) for n in application.get("nodeIds", [])]
+        self.hardware = dev.get("Hardware", {})
+        adc_channels_reg = dev.get("adc_channels_reg", {})
+        self.adc_channels_reg = adc_channels_reg.get("adc_channels", {}) or {}
+        adc_keys = list(adc_channels_reg.get("adc_index", None) or [])
+        self.groups = {}
+        for index_key, item in application["index_items"].items():
+            self.groups[int(index_key, 16)] = self._compile(index_key, item, adc=index_key in adc_keys)
+        self.adc = self._select(adc_keys)
+        self.mon = self._select(adc_channels_reg.get("mon_index", None))
+        self.conf = self._select(adc_channels_reg.get("conf_index", None))
+        entries = [(g.index, s, c) for g in self.groups.values() for s, c in zip(g.subindices, g.channels)]
+        self.entries = np.array(entries, dtype=OD_DTYPE)
+
+    def _compile(self, index_key, item, adc=False):
+        index = int(index_key, 16)
+        subindex_items = item.get("subindex_items", None) or {}
+        subindex_keys = [str(k) for k in subindex_items]
+        subindices = np.array([int(k, 16) for k in subindex_keys], dtype=np.int64)
+        if adc:
+            # subindex 0 is the number of entries, not an ADC channel
+            keep = subindices != 0
+            subindex_keys = [k for k, kept in zip(subindex_keys, keep) if kept]
+            subindices = subindices[keep]
+            channels = subindices + 2
+            channel_types = [self.adc_channels_reg.get(str(c)) for c in channels]
+        else:
+            channels = np.full(len(subindices), -1, dtype=np.int64)
+            channel_types = [None] * len(subindices)
+        requests = np.array([sdo_upload_request(index, int(s)) for s in subindices], dtype=np.uint8).reshape(-1, 8)
+        return OdGroup(index=index, index_key=index_key, description=item.get("description_items"),
+                       subindices=subindices, subindex_keys=subindex_keys,
+                       subindex_descriptions=[subindex_items[k] for k in subindex_items if str(k) in subindex_keys],
+                       channels=channels, channel_types=channel_types, requests=requests)
+
+    def _select(self, index_keys):
+        return [self.groups[int(k, 16)] for k in (index_keys or []) if int(k, 16) in self.groups]
+
+    def group(self, index):
+        """Return the :class:`OdGroup` of an index [int or hex string]"""
+        return self.groups[int(index, 16) if isinstance(index, str) else int(index)]
+
+    def adc_requests(self, nodeIds, buses=(0,)):
+        """Requests ``(nodeId, index, subindex, bus)`` of all the ADC channels [see :meth:`CanWrapper.read_sdo_batch`]"""
+        return [(int(nodeId), g.index, int(s), int(bus)) for bus in buses
+                                                        for nodeId in nodeIds
+                                                        for g in self.adc
+                                                        for s in g.subindices]
+
+    def adc_channels(self):
+        """ADC channels of all the ADC indices in the order of :meth:`adc_requests`"""
+        return np.concatenate([g.channels for g in self.adc]) if self.adc else np.zeros(0, dtype=np.int64)
+
+    def converter(self, **kwargs):
+        """:class:`AdcConverter` of the ADC channels [kwargs are passed to :meth:`AdcConverter.from_config`]
+
+        ``calibration_file`` and ``apply_gain`` default to the keys of the Hardware section of the yaml file.
+        A calibration file which does not exist is ignored with a warning.
+        """
+        if "calibration_file" not in kwargs and self.hardware.get("calibration_file"):
+            calibration_file = os.path.join(lib_dir, self.hardware["calibration_file"])
+            if os.path.isfile(calibration_file):
+                kwargs["calibration_file"] = calibration_file
+            else:
+                log_call.setup_main_logger().warning(f"ADC calibration file {calibration_file} not found. The ADC values are not calibrated.")
+        kwargs.setdefault("apply_gain", bool(self.hardware.get("apply_gain", False)))
+        return AdcConverter.from_config(self.dev, **kwargs)
+
+# Compiled dictionaries by file, rebuilt if the file changes
+_cache = {}
+
+def load_object_dictionary(file, directory=""):
+    """Load and compile the yaml file of a device once
+
+    The wrapper, the GUIs and the OPC UA server get the same :class:`ObjectDictionary`
+    for the same file as long as the file is not modified.
+    """
+    filename = os.path.abspath(os.path.join(directory, file))
+    mtime = os.path.getmtime(filename)
+    cached = _cache.get(filename)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    od = ObjectDictionary(AnalysisUtils().open_yaml_file(file=filename, directory=""))
+    _cache[filename] = (mtime, od)
+    log_call.setup_main_logger().info(f"Compiled object dictionary of {od.device_name} [{len(od.entries)} entries] from {filename}")
+    return od
@@ -0,0 +1,199 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+
+import time
+import logging
+import numpy as np
+try:
+    from .logger_main import Logger
+    from .sdo_engine import SDO_OK, SDO_TIMEOUT
+    from .can_dispatcher import AsyncFrameQueue
+except (ImportError, ModuleNotFoundError):
+    from logger_main import Logger
+    from sdo_engine import SDO_OK, SDO_TIMEOUT
+    from can_dispatcher import AsyncFrameQueue
+
+log_call = Logger(name = "PDO Acquire ",console_loglevel=logging.INFO, logger_file = False)
+
+TPDO_COMM_INDEX = 0x1800
+TPDO_MAP_INDEX = 0x1A00
+# Default |COBID| of TPDO1..TPDO4 (+ nodeId)
+TPDO_COBID_BASE = (0x180, 0x280, 0x380, 0x480)
+SYNC_COBID = 0x80
+# Transmission type: synchronous, sent after every SYNC
+TRANSMISSION_SYNC = 0x01
+
+def count_tpdos(dictionary_items):
+    """Number of TPDO communication parameters (0x1800, 0x1801,...) declared in the object dictionary"""
+    n = 0
+    while f"0x{TPDO_COMM_INDEX + n:04X}" in dictionary_items and f"0x{TPDO_MAP_INDEX + n:04X}" in dictionary_items:
+        n += 1
+    return min(n, len(TPDO_COBID_BASE))
+
+class PdoAcquisition(object):
+    """Push-mode readout of the MOPS ADC channels with synchronous TPDOs
+
+    The TPDO mappings are configured once via |SDO|. Afterwards every sweep is one
+    SYNC broadcast: all the nodes sample their mapped channels at the same SYNC and answer
+    with up to 4 channels (16 bit each) per TPDO. The channels which do not fit into the
+    TPDOs of the object dictionary are read with the pipelined |SDO| batch of the wrapper.
+
+    Parameters
+    ----------
+    wrapper : :class:`CanWrapper`
+        The wrapper used to send and receive the |CAN| messages
+    nodeIds : :obj:`list` of :obj:`int`
+        The nodes to be read
+    subindices : :obj:`list` of :obj:`int`
+        The ADC subindices of ``adc_index`` in the order of the returned samples
+    n_tpdo : :obj:`int`
+        Number of TPDOs supported by the nodes [see :func:`count_tpdos`]
+    bits : :obj:`int`
+        Width of one mapped ADC sample
+    """
+
+    def __init__(self, wrapper, nodeIds, subindices, adc_index=0x2400, n_tpdo=2, bits=16,
+                 sync_cobid=SYNC_COBID, bus=0, timeout=0.05):
+        self.wrapper = wrapper
+        self.logger = log_call.setup_main_logger()
+        self.nodeIds = list(nodeIds)
+        self.subindices = list(subindices)
+        self.adc_index = adc_index
+        self.bits = bits
+        self.sync_cobid = sync_cobid
+        self.bus = bus
+        self.timeout = timeout
+        per_pdo = 64 // bits
+        n_mapped = min(len(self.subindices), n_tpdo * per_pdo)
+        # Sub-lists of the mapped subindices per TPDO
+        self.pdo_map = [self.subindices[p:p + per_pdo] for p in range(0, n_mapped, per_pdo)]
+        self.polled = self.subindices[n_mapped:]
+        self.__configured = False
+        # cobid -> (row of the node, first column of the TPDO)
+        self.__pdo_slot = {}
+        for row, nodeId in enumerate(self.nodeIds):
+            for p in range(len(self.pdo_map)):
+                self.__pdo_slot[TPDO_COBID_BASE[p] + nodeId] = (row, p * per_pdo)
+        self.__per_pdo = per_pdo
+        if self.polled:
+            self.logger.notice(f'{len(self.polled)} ADC channels do not fit into {n_tpdo} TPDOs '
+                               f'and are read via SDO')
+
+    async def configure(self):
+        """Write the TPDO communication and mapping parameters and start the nodes
+        [CiA 301: disable the PDO, clear the mapping, write the entries, enable the PDO]
+
+        Returns
+        -------
+        :obj:`bool`
+            True if all nodes confirmed the configuration
+        """
+        ok = True
+        self.wrapper.add_can_filters(self.__pdo_slot)
+        for nodeId in self.nodeIds:
+            for p, entries in enumerate(self.pdo_map):
+                cobid = TPDO_COBID_BASE[p] + nodeId
+                comm, mapping = TPDO_COMM_INDEX + p, TPDO_MAP_INDEX + p
+                steps = [(comm, 1, cobid | 0x80000000, 4),
+                         (comm, 2, TRANSMISSION_SYNC, 1),
+                         (mapping, 0, 0, 1)]
+                steps += [(mapping, k + 1, (self.adc_index << 16) | (subindex << 8) | self.bits, 4)
+                          for k, subindex in enumerate(entries)]
+                steps += [(mapping, 0, len(entries), 1),
+                          (comm, 1, cobid, 4)]
+                for index, subindex, value, size in steps:
+                    if not await self.wrapper.write_sdo_can(nodeId=nodeId, index=index, subindex=subindex,
+                                                            value=value, size=size, bus=self.bus):
+                        self.logger.error(f'Node {nodeId} rejected TPDO{p + 1} parameter {index:04X}:{subindex:02X}')
+                        ok = False
+                        break
+            await self.wrapper.send_nmt(command=0x01, nodeId=nodeId)
+        self.__configured = ok
+        if ok:
+            self.logger.success(f'TPDOs of nodes {self.nodeIds} are configured '
+                                f'[{sum(len(e) for e in self.pdo_map)} channels per SYNC]')
+        return ok
+
+    def decode(self, cobids, frames):
+        """Decode the received TPDOs into a sample matrix
+
+        Parameters
+        ----------
+        cobids : :obj:`list` of :obj:`int`
+            |COBID| of each TPDO
+        frames : :class:`numpy.ndarray`
+            ``(n, 8)`` uint8 array with the data bytes of each TPDO
+
+        Returns
+        -------
+        values : :class:`numpy.ndarray`
+            ``(len(nodeIds), len(subindices))`` int64 array
+        status : :class:`numpy.ndarray`
+            :data:`SDO_OK` where a sample was received
+        """
+        values = np.zeros((len(self.nodeIds), len(self.subindices)), dtype=np.int64)
+        status = np.full(values.shape, SDO_TIMEOUT, dtype=np.uint8)
+        if len(cobids) == 0:
+            return values, status
+        samples = np.ascontiguousarray(frames).view(f'<u{self.bits // 8}')
+        slots = np.array([self.__pdo_slot[cobid] for cobid in cobids])
+        rows = np.repeat(slots[:, 0], self.__per_pdo)
+        cols = (slots[:, 1:2] + np.arange(self.__per_pdo)).ravel()
+        # Drop the unused entries of a partially mapped TPDO
+        valid = cols < sum(len(e) for e in self.pdo_map)
+        values[rows[valid], cols[valid]] = samples.ravel()[valid]
+        status[rows[valid], cols[valid]] = SDO_OK
+        return values, status
+
+    async def read_sweep(self):
+        """Broadcast one SYNC and collect the TPDOs of all the nodes
+
+        Returns
+        -------
+        values : :class:`numpy.ndarray`
+            ``(len(nodeIds), len(subindices))`` int64 array
+        status : :class:`numpy.ndarray`
+            :data:`SDO_OK` or :data:`SDO_TIMEOUT` for each sample
+        ts : :obj:`float`
+            Time of the SYNC, common to all the mapped samples
+        """
+        dispatcher = self.wrapper.dispatcher
+        cobids = tuple(self.__pdo_slot)
+        frame_queue = dispatcher.route(cobids, AsyncFrameQueue())
+        received = {}
+        try:
+            ts = time.time()
+            await self.wrapper.send_sync(cobid=self.sync_cobid)
+            deadline = time.perf_counter() + self.timeout
+            while len(received) < len(cobids):
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                frame = await frame_queue.get(remaining)
+                if frame is None:
+                    break
+                received[frame[0]] = frame[1]
+        finally:
+            dispatcher.unroute(cobids, frame_queue)
+        if len(received) < len(cobids):
+            self.wrapper.cnt.inc('PDO_timeout', len(cobids) - len(received))
+        frames = np.zeros((len(received), 8), dtype=np.uint8)
+        for k, data in enumerate(received.values()):
+            frames[k, :len(data)] = list(data)
+        values, status = self.decode(list(received), frames)
+        if self.polled:
+            requests = [(nodeId, self.adc_index, subindex, self.bus) for nodeId in self.nodeIds for subindex in self.polled]
+            polled_values, polled_status = await self.wrapper.read_sdo_batch(requests)
+            first = len(self.subindices) - len(self.polled)
+            values[:, first:] = polled_values.reshape(len(self.nodeIds), -1)
+            status[:, first:] = polled_status.reshape(len(self.nodeIds), -1)
+        return values, status, ts
+
+    def is_configured(self):
+        return self.__configured
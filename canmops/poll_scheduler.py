@@ -0,0 +1,309 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+
+import time
+import heapq
+import logging
+from threading import Thread, Event, Lock
+try:
+    from .logger_main import Logger
+    from .metrics import MetricCounter
+except (ImportError, ModuleNotFoundError):
+    from logger_main import Logger
+    from metrics import MetricCounter
+
+log_call = Logger(name = "Poll Schedul",console_loglevel=logging.INFO, logger_file = False)
+
+# Bits of one standard 8-byte |CAN| frame with the worst-case bit stuffing and the interframe space
+FRAME_BITS = 135
+# An expedited |SDO| upload is a request and a response frame
+SDO_BITS = 2 * FRAME_BITS
+
+def sdo_capacity(bitrate, utilisation=0.5):
+    """Expedited |SDO| uploads per s that fit into ``utilisation`` of the bus"""
+    return utilisation * bitrate / SDO_BITS
+
+def object_periods(od, periods, default=None):
+    """Sampling period in s of every object of the groups adc, mon and conf of an :class:`ObjectDictionary`
+
+    The period of an object is the first of the keys of ``periods`` found:
+
+    * ``'<index>:<subindex>'`` [e.g. '0x2400:1F'] or ``'<index>'`` [e.g. '0x1018'], these keys can
+      also add objects of other indices
+    * the type of the ADC channel ["V", "T" of ``adc_channels_reg``]
+    * the group ["adc", "mon" or "conf"]
+    * ``default``
+
+    Returns
+    -------
+    :obj:`list` of :obj:`tuple`
+        ``(index, subindex, period)`` [period 0: the object is not polled]
+
+    Raises
+    ------
+    ValueError
+        A key names an index or subindex which is not in the object dictionary
+    """
+    periods = {str(k): v for k, v in (periods or {}).items()}
+    def _period(group, s, kind, channel_type=None):
+        for key in (f"{group.index_key}:{group.subindex_keys[s]}", group.index_key, channel_type, kind):
+            if key is not None and periods.get(key) is not None:
+                return float(periods[key])
+        return default
+    objects = {}
+    for kind, groups in (("adc", od.adc), ("mon", od.mon), ("conf", od.conf)):
+        for group in groups:
+            for s, subindex in enumerate(group.subindices):
+                period = _period(group, s, kind, group.channel_types[s])
+                if period is not None:
+                    objects[(group.index, int(subindex))] = period
+    # Objects listed by index only
+    for key, period in periods.items():
+        index_key, _, subindex_key = key.partition(":")
+        if not index_key.lower().startswith("0x") or period is None:
+            continue
+        try:
+            group = od.group(index_key)
+        except (KeyError, ValueError):
+            raise ValueError(f"Period {key!r}: the index {index_key} is not in the object dictionary") from None
+        if subindex_key and subindex_key not in group.subindex_keys:
+            raise ValueError(f"Period {key!r}: the subindex {subindex_key} is not in the index {index_key}")
+        for s, subindex in enumerate(group.subindices):
+            if (not subindex_key or group.subindex_keys[s] == subindex_key) and (group.index, int(subindex)) not in objects:
+                objects[(group.index, int(subindex))] = _period(group, s, None)
+    return [(index, subindex, period) for (index, subindex), period in objects.items()]
+
+class PollScheduler(Thread):
+    """Deadline-based |SDO| polling with a sampling period per object
+
+    Every object ``(nodeId, index, subindex, bus)`` has its own period [e.g. 0.5 s for the voltages,
+    5 s for the temperatures, 0 for the configuration objects which are read once or never].
+    The scheduler sleeps until the earliest deadline, collects all the objects due within
+    ``coalesce`` s, earliest deadline first, and reads them with one pipelined
+    :meth:`CanWrapper.read_sdo_batch`. The next deadline of an object is its previous deadline plus
+    its period, so the sampling does not drift with the time spent on the bus.
+
+    The requests are packed into a bus budget [a token bucket of :func:`sdo_capacity` requests per s,
+    ``utilisation`` of the bitrate]. Objects which do not fit are read late; an object late by more
+    than a whole period lost a sample, this is counted in ``poll_overrun``. :meth:`add` warns if the
+    requested rates exceed the budget, :meth:`statistics` reports the demand, the budget,
+    the achieved rate and the lag.
+
+    Parameters
+    ----------
+    wrapper : :class:`CanWrapper`
+        Wrapper used for the requests
+    callback : callable, optional
+        ``callback(t, requests, values, status)`` after every batch [requests: ``(nodeId, index, subindex, bus)``].
+        The last sample of every object is also kept in :attr:`latest`.
+    bitrate : :obj:`int`, optional
+        Bitrate of the channel [default: the one of the wrapper or of the channel]
+    utilisation : :obj:`float`
+        Share of the bus available to the polling
+    coalesce : :obj:`float`
+        Objects due within this time in s are read in the same batch
+    channel : :obj:`str` or :obj:`int`, optional
+        Channel of :attr:`CanWrapper.channels` [default: the primary channel]
+
+    Examples
+    --------
+    >>> scheduler = wrapper.start_polling(nodeIds=[1, 2], periods={"V": 0.5, "T": 5.0, "mon": 1.0, "conf": 0})
+    >>> scheduler.latest[(0, 1, 0x2400, 0x1F)]
+    (1760000000.1, 2048, 1)
+    """
+
+    def __init__(self, wrapper, callback=None, bitrate=None, utilisation=0.5, coalesce=0.01, channel=None, counters=None):
+        Thread.__init__(self, name="PollScheduler", daemon=True)
+        self.logger = log_call.setup_main_logger()
+        self.wrapper = wrapper
+        self.callback = callback
+        self.channel = channel
+        self.coalesce = coalesce
+        self.cnt = counters if counters is not None else MetricCounter()
+        if bitrate is None:
+            bitrate = wrapper.get_can_channel(channel).bitrate
+        self.capacity = sdo_capacity(int(bitrate), utilisation)
+        # Token bucket of the bus budget
+        self.burst = max(self.capacity * 0.1, 1.0)
+        self._tokens = self.burst
+        self._t_tokens = time.monotonic()
+        self._periods = {}   # (nodeId, index, subindex, bus) -> (period, seq of the live heap entry)
+        self._heap = []      # [deadline, seq, key, period]
+        self._seq = 0
+        self._lock = Lock()
+        self._wakeup = Event()
+        self._pill2kill = Event()
+        self.latest = {}     # (bus, nodeId, index, subindex) -> (t, value, status)
+        self.batches = 0
+        self.requests = 0
+        self.max_lag = 0.0
+        self.busy = 0.0
+        self._t_start = None
+
+    # Objects
+    def add(self, nodeId, index, subindex, period, bus=0, phase=0.0):
+        """Poll an object every period s [0 or None removes it]. The first reading is due in phase s."""
+        key = (int(nodeId), int(index), int(subindex), int(bus))
+        with self._lock:
+            if not period:
+                self._periods.pop(key, None)
+            else:
+                self._seq += 1
+                self._periods[key] = (float(period), self._seq)
+                heapq.heappush(self._heap, [time.monotonic() + phase, self._seq, key, float(period)])
+        self._wakeup.set()
+
+    def add_objects(self, nodeIds, objects, buses=(0,)):
+        """Add ``(index, subindex, period)`` [see :func:`object_periods`] of all the nodes and buses
+
+        The first readings are spread over the periods, so the objects do not all fall due at the same time.
+        """
+        entries = [(nodeId, index, subindex, period, bus) for bus in buses
+                                                         for nodeId in nodeIds
+                                                         for index, subindex, period in objects]
+        for i, (nodeId, index, subindex, period, bus) in enumerate(entries):
+            self.add(nodeId, index, subindex, period, bus=bus, phase=(period or 0.0) * i / len(entries))
+        self.check_budget()
+
+    def add_object_dictionary(self, od, nodeIds, buses=(0,), periods=None, default=None):
+        """Add the objects of an :class:`ObjectDictionary` with the periods of :func:`object_periods`
+        [default: the ``polling`` section of the yaml file of the device]"""
+        if periods is None:
+            periods = od.dev.get("polling", None) or {}
+        self.add_objects(nodeIds, object_periods(od, periods, default=default), buses=buses)
+
+    def remove(self, nodeId=None, bus=None):
+        """Stop polling the objects of a node, of a bus or all the objects [None = any]"""
+        with self._lock:
+            for key in [k for k in self._periods if (nodeId is None or k[0] == nodeId) and (bus is None or k[3] == bus)]:
+                del self._periods[key]
+
+    def demand(self):
+        """Requests per s asked for by the periods of all the objects"""
+        return sum(1.0 / period for period, _ in list(self._periods.values()))
+
+    def check_budget(self):
+        """Warn if the requested rates exceed the bus budget. Returns the ratio demand/budget."""
+        ratio = self.demand() / self.capacity
+        if ratio > 1:
+            self.logger.warning(f"The polling asks for {self.demand():.0f} SDO/s, the bus budget is {self.capacity:.0f} SDO/s: "
+                                f"the objects will be read late [increase the periods or the utilisation]")
+        return ratio
+
+    # Scheduling
+    def _take_tokens(self, n, now):
+        self._tokens = min(self._tokens + (now - self._t_tokens) * self.capacity, self.burst)
+        self._t_tokens = now
+        n = min(n, int(self._tokens))
+        self._tokens -= n
+        return n
+
+    def _token_wait(self, now):
+        """Time in s until the tokens for the objects which are due [up to the burst] are available"""
+        with self._lock:
+            n_due = sum(1 for entry in self._heap if entry[0] <= now + self.coalesce)
+            self._take_tokens(0, now)
+            needed = min(n_due, int(self.burst)) - self._tokens
+        return max(needed / self.capacity, self.coalesce)
+
+    def _due(self, now):
+        """Pop the entries due until now + coalesce that fit into the budget, earliest deadline first"""
+        due = []
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0][0] <= now + self.coalesce:
+                entry = heapq.heappop(heap)
+                # Removed or added again objects leave stale entries
+                if self._periods.get(entry[2], (None, None))[1] == entry[1]:
+                    due.append(entry)
+            n = self._take_tokens(len(due), now)
+            for entry in due[n:]:
+                heapq.heappush(heap, entry)
+        return due[:n]
+
+    def _reschedule(self, entries, now):
+        with self._lock:
+            for entry in entries:
+                deadline, seq, key, period = entry
+                lag = now - deadline
+                if lag > self.max_lag:
+                    self.max_lag = lag
+                missed = int(lag // period) if lag > 0 else 0
+                if missed:
+                    self.cnt.inc('poll_overrun', missed)
+                if self._periods.get(key, (None, None))[1] != seq:
+                    continue
+                entry[0] = deadline + (missed + 1) * period
+                heapq.heappush(self._heap, entry)
+
+    def next_deadline(self):
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def poll(self):
+        """Read the objects which are due. Returns the number of requests sent."""
+        now = time.monotonic()
+        entries = self._due(now)
+        if not entries:
+            return 0
+        requests = [entry[2] for entry in entries]
+        t_batch = time.perf_counter()
+        values, status = self.wrapper.read_sdo_batch_sync(requests, channel=self.channel)
+        self.busy += time.perf_counter() - t_batch
+        t = time.time()
+        for (nodeId, index, subindex, bus), value, st in zip(requests, values.tolist(), status.tolist()):
+            self.latest[(bus, nodeId, index, subindex)] = (t, value, st)
+        self._reschedule(entries, now)
+        self.batches += 1
+        self.requests += len(requests)
+        self.cnt.inc('poll_request', len(requests))
+        if self.callback is not None:
+            try:
+                self.callback(t, requests, values, status)
+            except Exception as e:
+                self.logger.error(f"Polling callback failed: {e}")
+        return len(requests)
+
+    def run(self):
+        self._t_start = time.monotonic()
+        while not self._pill2kill.is_set():
+            try:
+                sent = self.poll()
+            except Exception as e:
+                self.logger.error(f"Polling failed: {e}")
+                sent = 0
+            if sent:
+                continue
+            deadline = self.next_deadline()
+            now = time.monotonic()
+            if deadline is None:
+                wait = 1.0
+            elif deadline <= now + self.coalesce:
+                # Due, but the budget is used up: wait until a whole batch fits again
+                wait = self._token_wait(now)
+            else:
+                wait = deadline - now
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+    def statistics(self):
+        """Demand and budget in requests/s, the achieved rate, the time share spent on the bus,
+        the maximum lag in s and the number of lost samples"""
+        elapsed = time.monotonic() - self._t_start if self._t_start else 0.0
+        return {"objects": len(self._periods), "demand": self.demand(), "capacity": self.capacity,
+                "requests_per_s": self.requests / elapsed if elapsed else 0.0,
+                "busy": self.busy / elapsed if elapsed else 0.0,
+                "batches": self.batches, "requests": self.requests,
+                "max_lag": self.max_lag, "overruns": self.cnt['poll_overrun']}
+
+    def stop(self, timeout=2):
+        self._pill2kill.set()
+        self._wakeup.set()
+        if self.is_alive():
+            self.join(timeout)
@@ -0,0 +1,289 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+
+import time
+import logging
+from collections import deque
+import numpy as np
+try:
+    from .logger_main import Logger
+    from .node_health import CLOSED
+    from .can_dispatcher import AsyncFrameQueue
+    from .sdo_transfer import ABORT_COMMAND
+except (ImportError, ModuleNotFoundError):
+    from logger_main import Logger
+    from node_health import CLOSED
+    from can_dispatcher import AsyncFrameQueue
+    from sdo_transfer import ABORT_COMMAND
+
+log_call = Logger(name = " SDO Engine ",console_loglevel=logging.INFO, logger_file = False)
+
+# Status codes of the batch API
+SDO_TIMEOUT = 0
+SDO_OK = 1
+SDO_ABORT = 2
+# Not sent: the node is parked by the circuit breaker of :class:`NodeHealth`
+SDO_SKIPPED = 3
+
+_EXPEDITED_UPLOAD = (0x43, 0x47, 0x4b, 0x4f, 0x42)
+
+def decode_expedited_upload(data):
+    """Decode the data bytes of an expedited |SDO| upload response
+    The decoding is the same as in :meth:`CanWrapper.check_valid_message`
+    """
+    nDatabytes = 4 - ((data[0] >> 2) & 0b11) if data[0] != 0x42 else 4
+    return int.from_bytes(bytes(data[4:4 + nDatabytes - 1]), 'little')
+
+def encode_sdo_request(nodeId, index, subindex, bus=0, SDO_TX=0x600, cobid=None):
+    """Encode an expedited |SDO| upload request once
+
+    Returns
+    -------
+    :obj:`tuple`
+        ``(cobid, data)`` with the 8 data bytes as immutable :obj:`bytes`
+    """
+    return (cobid if cobid else SDO_TX + nodeId,
+            bytes((0x40 if SDO_TX == 0x600 else 0x00, index & 0xFF, (index >> 8) & 0xFF, subindex, 0, 0, 0, bus)))
+
+def frame_register(cobid, data):
+    """Register of a frame as one integer [the |COBID| followed by the 8 data bytes], 0 if the frame is not complete"""
+    if data is None or len(data) < 8:
+        return 0
+    return (cobid << 64) | int.from_bytes(bytes(data[:8]), 'big')
+
+class SdoResult(object):
+    """Result of :meth:`CanWrapper.read_sdo_can`
+
+    The registers of the request and of the response are only packed when
+    :attr:`requestreg` or :attr:`responsereg` is read. The result unpacks as the tuple
+    ``(data, reqmsg, requestreg, respmsg, responsereg, status, errorResponse)``.
+    """
+    __slots__ = ("data", "reqmsg", "respmsg", "status", "errorResponse", "request", "response")
+
+    def __init__(self, data=None, reqmsg=None, respmsg=None, status=0, errorResponse=None, request=None, response=None):
+        self.data = data
+        self.reqmsg = reqmsg
+        self.respmsg = respmsg
+        self.status = status
+        self.errorResponse = errorResponse
+        # (cobid, data) of the request and of the response
+        self.request = request
+        self.response = response
+
+    @property
+    def requestreg(self):
+        return hex(frame_register(*self.request)) if self.request is not None else None
+
+    @property
+    def responsereg(self):
+        return hex(frame_register(*self.response)) if self.response is not None else None
+
+    def __iter__(self):
+        return iter((self.data, self.reqmsg, self.requestreg, self.respmsg, self.responsereg, self.status, self.errorResponse))
+
+    def __getitem__(self, i):
+        return tuple(self)[i]
+
+    def __len__(self):
+        return 7
+
+    def __repr__(self):
+        return f"SdoResult(data={self.data}, status={self.status}, reqmsg={self.reqmsg}, respmsg={self.respmsg})"
+
+class SdoEngine(object):
+    """Pipelined |SDO| client for many nodes on the same |CAN| channel
+
+    Every node is an independent |SDO| server, so the engine keeps one outstanding
+    expedited upload per node and MOPSHUB bus and matches the responses by ``SDO_RX + nodeId``,
+    index, subindex and the bus byte ``msg[7]`` echoed by the MOPSHUB.
+
+    Parameters
+    ----------
+    wrapper : :class:`CanWrapper`
+        The wrapper used to send and receive the |CAN| messages
+    timeout : :obj:`float`
+        Response timeout of each request in s
+    match_bus_byte : :obj:`bool`
+        Requests to the same node on different buses are outstanding at the same time [default].
+        Set it to False for nodes which do not echo the bus byte, their requests are serialized.
+        An abort response carries its code in ``msg[4:8]`` and is matched without the bus byte.
+        So is the initiate response of a segmented upload [size in ``msg[4:8]``]: the engine only
+        reads expedited objects, it aborts the transfer and reports :data:`SDO_ABORT`
+        [use :meth:`CanWrapper.read_sdo_can` or :class:`SdoTransfer` for objects larger than 4 bytes].
+    retries : :obj:`int`
+        Number of times a request without response is sent again
+
+    If the wrapper has a :class:`NodeHealth` [``wrapper.node_health``], the timeout of each request
+    is the adaptive one of its node and the requests to parked nodes are not sent [:data:`SDO_SKIPPED`].
+    """
+
+    def __init__(self, wrapper, SDO_TX=0x600, SDO_RX=0x580, timeout=0.1, match_bus_byte=True, retries=1):
+        self.wrapper = wrapper
+        self.logger = log_call.setup_main_logger()
+        self.SDO_TX = SDO_TX
+        self.SDO_RX = SDO_RX
+        self.timeout = timeout
+        self.match_bus_byte = match_bus_byte
+        self.retries = retries
+        # Pre-encoded request frames
+        self._frames = {}
+
+    def _slot(self, nodeId, bus):
+        return (nodeId, bus) if self.match_bus_byte else nodeId
+
+    def _response_key(self, nodeId, index, subindex, bus):
+        if self.match_bus_byte:
+            return (self.SDO_RX + nodeId, index, subindex, bus)
+        return (self.SDO_RX + nodeId, index, subindex)
+
+    async def _send_request(self, nodeId, index, subindex, bus):
+        key = (nodeId, index, subindex, bus)
+        frame = self._frames.get(key)
+        if frame is None:
+            frame = self._frames[key] = encode_sdo_request(nodeId, index, subindex, bus, SDO_TX=self.SDO_TX)
+        return await self.wrapper.write_can_message(cobid=frame[0], data=frame[1], dlc=8)
+
+    async def _abort(self, request, command):
+        i, nodeId, index, subindex, bus, _ = request
+        self.wrapper.cnt.inc('SDO_read_segmented_abort' if (command & 0xE2) == 0x40 else 'SDO_read_unexpected_abort')
+        self.logger.warning(f'Aborted the SDO upload of object {index:04X}:{subindex:02X} of node {nodeId} [bus {bus}]: '
+                            f'response {command:02X} is not an expedited upload')
+        await self.wrapper.write_can_message(cobid=self.SDO_TX + nodeId, dlc=8,
+                                             data=bytes((0x80, index & 0xFF, (index >> 8) & 0xFF, subindex))
+                                                  + ABORT_COMMAND.to_bytes(4, 'little'))
+
+    async def _receive(self, frame_queue, timeout=0.01):
+        """Return the next received frame as ``(cobid, data)`` or ``None``"""
+        if frame_queue is None:
+            _frame = await self.wrapper.read_can_message()
+        else:
+            _frame = await frame_queue.get(timeout)
+            if _frame is None:
+                return None
+        if _frame[0] is None or _frame[1] is None:
+            return None
+        return _frame[0], _frame[1]
+
+    async def read_batch(self, requests):
+        """Read a list of objects from many nodes with pipelined |SDO| requests
+
+        Parameters
+        ----------
+        requests : :obj:`list` of :obj:`tuple`
+            ``(nodeId, index, subindex)`` or ``(nodeId, index, subindex, bus)``
+
+        Returns
+        -------
+        values : :class:`numpy.ndarray`
+            The data of each request (0 if no valid response was received)
+        status : :class:`numpy.ndarray`
+            :data:`SDO_OK`, :data:`SDO_TIMEOUT`, :data:`SDO_ABORT` or :data:`SDO_SKIPPED` for each request
+        """
+        n = len(requests)
+        values = np.zeros(n, dtype=np.int64)
+        status = np.full(n, SDO_TIMEOUT, dtype=np.uint8)
+        # One FIFO of pending requests per slot
+        pending = {}
+        for i, req in enumerate(requests):
+            nodeId, index, subindex = req[0], req[1], req[2]
+            bus = req[3] if len(req) > 3 else 0
+            pending.setdefault(self._slot(nodeId, bus), deque()).append((i, nodeId, index, subindex, bus, 0))
+        outstanding = {}  # response key -> (request position, slot, sending time, nodeId, bus, deadline, request)
+        busy = set()
+        # Route the responses of all the nodes into one queue of the receive thread
+        dispatcher = self.wrapper.dispatcher
+        cobids = {self.SDO_RX + req[0] for req in requests}
+        frame_queue = dispatcher.route(cobids, AsyncFrameQueue()) if dispatcher is not None else None
+        try:
+            await self._pipeline(pending, outstanding, busy, values, status, frame_queue)
+        finally:
+            if frame_queue is not None:
+                dispatcher.unroute(cobids, frame_queue)
+        return values, status
+
+    async def _pipeline(self, pending, outstanding, busy, values, status, frame_queue):
+        n = len(values)
+        done = 0
+        metrics = getattr(self.wrapper, "metrics", None)
+        health = getattr(self.wrapper, "node_health", None)
+        while done < n:
+            # Fill every free slot with its next request
+            for slot, fifo in pending.items():
+                if slot in busy:
+                    continue
+                while fifo:
+                    request = fifo.popleft()
+                    i, nodeId, index, subindex, bus, attempt = request
+                    if health is not None and not health.allow(nodeId, bus):
+                        # Parked node: finish without sending
+                        status[i] = SDO_SKIPPED
+                        done += 1
+                        if metrics is not None:
+                            metrics.observe_sdo(nodeId, bus, None, SDO_SKIPPED)
+                        continue
+                    reqmsg = await self._send_request(nodeId, index, subindex, bus)
+                    if not reqmsg:
+                        self.wrapper.cnt.inc('SDO_read_request_timeout')
+                        done += 1
+                        continue
+                    t_sent = time.perf_counter()
+                    timeout = health.timeout(nodeId, bus) if health is not None else self.timeout
+                    outstanding[self._response_key(nodeId, index, subindex, bus)] = (i, slot, t_sent, nodeId, bus, t_sent + timeout, request)
+                    busy.add(slot)
+                    break
+            if not outstanding:
+                continue
+            timeout = min(item[5] for item in outstanding.values()) - time.perf_counter()
+            frame = await self._receive(frame_queue, timeout=min(max(timeout, 0.0005), 0.01))
+            if frame is not None:
+                cobid, data = frame
+                if len(data) == 8:
+                    key = (cobid, data[1] | (data[2] << 8), data[3])
+                    if self.match_bus_byte:
+                        if data[0] == 0x80 or (data[0] & 0xE2) == 0x40:
+                            # The abort code or the size of a segmented upload overwrites the bus byte
+                            key = next((k for k in outstanding if k[:3] == key), key + (data[7],))
+                        else:
+                            key = key + (data[7],)
+                    match = outstanding.pop(key, None)
+                    if match is not None:
+                        i, slot, t_sent, nodeId, bus, _, request = match
+                        busy.discard(slot)
+                        done += 1
+                        if health is not None:
+                            # The round trip of a retried request is ambiguous [Karn]
+                            health.on_response(nodeId, bus, time.perf_counter() - t_sent if request[5] == 0 else None)
+                        if data[0] in _EXPEDITED_UPLOAD:
+                            values[i] = decode_expedited_upload(data)
+                            status[i] = SDO_OK
+                        elif data[0] == 0x80:
+                            status[i] = SDO_ABORT
+                            self.wrapper.cnt.inc('SDO_read_abort')
+                        else:
+                            # Segmented upload or unexpected command: release the SDO server of the node
+                            status[i] = SDO_ABORT
+                            await self._abort(request, data[0])
+                        if metrics is not None:
+                            metrics.observe_sdo(nodeId, bus, time.perf_counter() - t_sent, status[i])
+            # Retry or release the slots of timed out requests
+            now = time.perf_counter()
+            for key, (i, slot, t_sent, nodeId, bus, deadline, request) in list(outstanding.items()):
+                if now > deadline:
+                    del outstanding[key]
+                    busy.discard(slot)
+                    if health is not None:
+                        health.on_timeout(nodeId, bus)
+                    if request[5] < self.retries and (health is None or health.state(nodeId, bus) == CLOSED):
+                        self.wrapper.cnt.inc('SDO_read_retry')
+                        pending[slot].appendleft(request[:5] + (request[5] + 1,))
+                        continue
+                    done += 1
+                    self.wrapper.cnt.inc('SDO_read_response_timeout')
+                    if metrics is not None:
+                        metrics.observe_sdo(nodeId, bus, None, SDO_TIMEOUT)
\ No newline at end of file
@@ -0,0 +1,306 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+
+import logging
+import binascii
+from contextlib import contextmanager
+try:
+    from .logger_main import Logger
+    from .can_dispatcher import AsyncFrameQueue
+except (ImportError, ModuleNotFoundError):
+    from logger_main import Logger
+    from can_dispatcher import AsyncFrameQueue
+
+log_call = Logger(name = "SDO Transfer",console_loglevel=logging.INFO, logger_file = False)
+
+# SDO abort codes [CiA 301]
+ABORT_TOGGLE = 0x05030000
+ABORT_TIMEOUT = 0x05040000
+ABORT_COMMAND = 0x05040001
+ABORT_BLOCK_SIZE = 0x05040002
+ABORT_SEQUENCE = 0x05040003
+ABORT_CRC = 0x05040004
+
+def crc16(data):
+    """CRC of the |SDO| block transfer [CRC-16-CCITT, polynomial 0x1021, initial value 0]"""
+    return binascii.crc_hqx(bytes(data), 0)
+
+class SdoTransfer(object):
+    """Segmented and block |SDO| upload/download for objects larger than 4 bytes
+
+    All the frames of one transaction are routed by the receive thread of the wrapper into
+    a private queue, so a transfer never competes with the other readers of the channel.
+
+    Parameters
+    ----------
+    wrapper : :class:`CanWrapper`
+        The wrapper used to send and receive the |CAN| messages
+    timeout : :obj:`float`
+        Timeout of each response in s
+    blksize : :obj:`int`
+        Number of segments per block [1-127] requested in block uploads and
+        the upper limit accepted in block downloads
+    crc : :obj:`bool`
+        Use the CRC of the block transfer if the node supports it
+    """
+
+    def __init__(self, wrapper, SDO_TX=0x600, SDO_RX=0x580, timeout=0.5, blksize=127, crc=True):
+        self.wrapper = wrapper
+        self.logger = log_call.setup_main_logger()
+        self.SDO_TX = SDO_TX
+        self.SDO_RX = SDO_RX
+        self.timeout = timeout
+        self.crc = crc
+        self.set_block_size(blksize)
+
+    def set_block_size(self, x):
+        if not 1 <= x <= 127:
+            raise ValueError(f"SDO block size must be in the range [1, 127], got {x}")
+        self.__blksize = x
+
+    def get_block_size(self):
+        return self.__blksize
+
+    @contextmanager
+    def _session(self, nodeId):
+        """Route the responses of the node into a private queue during the transaction"""
+        dispatcher = self.wrapper.dispatcher
+        cobid = self.SDO_RX + nodeId
+        frame_queue = dispatcher.route(cobid, AsyncFrameQueue())
+        try:
+            yield frame_queue
+        finally:
+            dispatcher.unroute(cobid, frame_queue)
+
+    async def _send(self, nodeId, msg):
+        msg = list(msg) + [0] * (8 - len(msg))
+        return await self.wrapper.write_can_message(cobid=self.SDO_TX + nodeId, data=msg, dlc=8)
+
+    async def _recv(self, frame_queue):
+        frame = await frame_queue.get(self.timeout)
+        if frame is None:
+            return None
+        return frame[1] if len(frame[1]) == 8 else None
+
+    async def _request(self, nodeId, frame_queue, msg):
+        if not await self._send(nodeId, msg):
+            return None
+        return await self._recv(frame_queue)
+
+    async def _abort(self, nodeId, index, subindex, code):
+        self.wrapper.cnt.inc('SDO_transfer_abort')
+        self.logger.error(f'SDO transfer of object {index:04X}:{subindex:02X} of node {nodeId} '
+                          f'aborted with abort code {code:08X}')
+        await self._send(nodeId, [0x80, index & 0xFF, index >> 8, subindex] + list(code.to_bytes(4, 'little')))
+
+    def _check_response(self, nodeId, index, subindex, data, expected, mask=0xE0):
+        """Return True if the command byte of the response is the expected one. Log SDO aborts of the node."""
+        if data is None:
+            return False
+        if data[0] == 0x80:
+            self.wrapper.cnt.inc('SDO_transfer_abort')
+            self.logger.error(f'Node {nodeId} aborted the SDO transfer of object {index:04X}:{subindex:02X} '
+                              f'with abort code {int.from_bytes(bytes(data[4:8]), "little"):08X}')
+            return False
+        return (data[0] & mask) == expected
+
+    async def _fail(self, nodeId, index, subindex, data, code=ABORT_COMMAND):
+        """Abort the transaction after an unexpected, missing or abort response"""
+        if data is None:
+            self.wrapper.cnt.inc('SDO_transfer_timeout')
+            await self._abort(nodeId, index, subindex, ABORT_TIMEOUT)
+        elif data[0] != 0x80:
+            await self._abort(nodeId, index, subindex, code)
+
+    # Segmented transfer
+    async def upload(self, nodeId, index, subindex, bus=0):
+        """Read an object via |SDO| upload (expedited or segmented, as chosen by the node)
+
+        Returns
+        -------
+        :obj:`bytes`
+            The data of the object or :data:`None` in case of errors
+        """
+        with self._session(nodeId) as frame_queue:
+            data = await self._request(nodeId, frame_queue, [0x40, index & 0xFF, index >> 8, subindex, 0, 0, 0, bus])
+            if not self._check_response(nodeId, index, subindex, data, 0x40):
+                await self._fail(nodeId, index, subindex, data)
+                return None
+            return await self._upload_segments(nodeId, index, subindex, data, frame_queue, bus)
+
+    async def upload_segments(self, nodeId, index, subindex, data, bus=0):
+        """Continue an upload after the node answered the initiate request [``data``] of :meth:`CanWrapper.read_sdo_can`"""
+        with self._session(nodeId) as frame_queue:
+            return await self._upload_segments(nodeId, index, subindex, data, frame_queue, bus)
+
+    async def _upload_segments(self, nodeId, index, subindex, data, frame_queue, bus):
+        if data[0] & 0x02:
+            # Expedited
+            n = 4 - ((data[0] >> 2) & 0b11) if data[0] & 0x01 else 4
+            return bytes(data[4:4 + n])
+        size = int.from_bytes(bytes(data[4:8]), 'little') if data[0] & 0x01 else None
+        buf = bytearray()
+        toggle = 0
+        while True:
+            data = await self._request(nodeId, frame_queue, [0x60 | (toggle << 4), 0, 0, 0, 0, 0, 0, bus])
+            if not self._check_response(nodeId, index, subindex, data, toggle << 4, mask=0xF0):
+                await self._fail(nodeId, index, subindex, data, ABORT_TOGGLE)
+                return None
+            n = (data[0] >> 1) & 0b111
+            buf += bytes(data[1:8 - n])
+            if data[0] & 0x01:
+                break
+            toggle ^= 1
+        if size is not None and len(buf) != size:
+            self.logger.warning(f'Node {nodeId} indicated {size} bytes for object {index:04X}:{subindex:02X} but sent {len(buf)}')
+        self.wrapper.cnt.inc('SDO_segmented_upload')
+        return bytes(buf)
+
+    async def download(self, nodeId, index, subindex, data):
+        """Write an object via |SDO| download (expedited up to 4 bytes, segmented otherwise)
+
+        Returns
+        -------
+        :obj:`bool`
+            True if the node confirmed the transfer
+        """
+        data = bytes(data)
+        with self._session(nodeId) as frame_queue:
+            if len(data) <= 4:
+                msg = [0x23 | ((4 - len(data)) << 2), index & 0xFF, index >> 8, subindex] + list(data)
+            else:
+                msg = [0x21, index & 0xFF, index >> 8, subindex] + list(len(data).to_bytes(4, 'little'))
+            response = await self._request(nodeId, frame_queue, msg)
+            if not self._check_response(nodeId, index, subindex, response, 0x60):
+                await self._fail(nodeId, index, subindex, response)
+                return False
+            if len(data) <= 4:
+                return True
+            toggle = 0
+            for pos in range(0, len(data), 7):
+                segment = data[pos:pos + 7]
+                last = pos + 7 >= len(data)
+                msg = [(toggle << 4) | ((7 - len(segment)) << 1) | int(last)] + list(segment)
+                response = await self._request(nodeId, frame_queue, msg)
+                if not self._check_response(nodeId, index, subindex, response, 0x20 | (toggle << 4), mask=0xF0):
+                    await self._fail(nodeId, index, subindex, response, ABORT_TOGGLE)
+                    return False
+                toggle ^= 1
+        self.wrapper.cnt.inc('SDO_segmented_download')
+        return True
+
+    # Block transfer
+    async def block_upload(self, nodeId, index, subindex, blksize=None, bus=0):
+        """Read an object via |SDO| block upload
+
+        Parameters
+        ----------
+        blksize : :obj:`int`, optional
+            Number of segments per block [defaults to :meth:`get_block_size`]
+
+        Returns
+        -------
+        :obj:`bytes`
+            The data of the object or :data:`None` in case of errors
+        """
+        blksize = blksize if blksize is not None else self.__blksize
+        with self._session(nodeId) as frame_queue:
+            msg = [0xA0 | (0x04 if self.crc else 0), index & 0xFF, index >> 8, subindex, blksize, 0, 0, bus]
+            data = await self._request(nodeId, frame_queue, msg)
+            if not self._check_response(nodeId, index, subindex, data, 0xC0, mask=0xE1):
+                await self._fail(nodeId, index, subindex, data)
+                return None
+            use_crc = self.crc and bool(data[0] & 0x04)
+            size = int.from_bytes(bytes(data[4:8]), 'little') if data[0] & 0x02 else None
+            await self._send(nodeId, [0xA3])
+            buf = bytearray()
+            complete = False
+            while not complete:
+                ackseq = 0
+                while True:
+                    data = await self._recv(frame_queue)
+                    if data is None:
+                        await self._fail(nodeId, index, subindex, data)
+                        return None
+                    seqno = data[0] & 0x7F
+                    if seqno == ackseq + 1:
+                        ackseq = seqno
+                        buf += bytes(data[1:8])
+                        complete = bool(data[0] & 0x80)
+                    # A lost segment: the node repeats the block from ackseq + 1
+                    if data[0] & 0x80 or seqno >= blksize:
+                        break
+                await self._send(nodeId, [0xA2, ackseq, blksize])
+            data = await self._recv(frame_queue)
+            if not self._check_response(nodeId, index, subindex, data, 0xC1, mask=0xE3):
+                await self._fail(nodeId, index, subindex, data)
+                return None
+            n = (data[0] >> 2) & 0b111
+            if n:
+                del buf[-n:]
+            if use_crc and crc16(buf) != int.from_bytes(bytes(data[1:3]), 'little'):
+                await self._abort(nodeId, index, subindex, ABORT_CRC)
+                return None
+            await self._send(nodeId, [0xA1])
+        if size is not None and len(buf) != size:
+            self.logger.warning(f'Node {nodeId} indicated {size} bytes for object {index:04X}:{subindex:02X} but sent {len(buf)}')
+        self.wrapper.cnt.inc('SDO_block_upload')
+        return bytes(buf)
+
+    async def block_download(self, nodeId, index, subindex, data, blksize=None):
+        """Write an object via |SDO| block download
+
+        Parameters
+        ----------
+        blksize : :obj:`int`, optional
+            Upper limit of the segments per block [the node decides the block size]
+
+        Returns
+        -------
+        :obj:`bool`
+            True if the node confirmed the transfer
+        """
+        data = bytes(data)
+        max_blksize = blksize if blksize is not None else self.__blksize
+        with self._session(nodeId) as frame_queue:
+            msg = [0xC2 | (0x04 if self.crc else 0), index & 0xFF, index >> 8, subindex] + list(len(data).to_bytes(4, 'little'))
+            response = await self._request(nodeId, frame_queue, msg)
+            if not self._check_response(nodeId, index, subindex, response, 0xA0, mask=0xE3):
+                await self._fail(nodeId, index, subindex, response)
+                return False
+            use_crc = self.crc and bool(response[0] & 0x04)
+            blksize = min(response[4], max_blksize)
+            if blksize < 1:
+                await self._abort(nodeId, index, subindex, ABORT_BLOCK_SIZE)
+                return False
+            segments = [data[pos:pos + 7] for pos in range(0, len(data), 7)] or [b""]
+            pos = 0
+            while pos < len(segments):
+                block = segments[pos:pos + blksize]
+                for k, segment in enumerate(block):
+                    last = pos + k == len(segments) - 1
+                    await self._send(nodeId, [(0x80 if last else 0) | (k + 1)] + list(segment))
+                response = await self._recv(frame_queue)
+                if not self._check_response(nodeId, index, subindex, response, 0xA2, mask=0xE3):
+                    await self._fail(nodeId, index, subindex, response)
+                    return False
+                if response[1] > len(block):
+                    await self._abort(nodeId, index, subindex, ABORT_SEQUENCE)
+                    return False
+                # Repeat the segments after the last acknowledged one
+                pos += response[1]
+                blksize = min(response[2], max_blksize) or blksize
+            n = 7 - len(segments[-1])
+            crc = crc16(data) if use_crc else 0
+            response = await self._request(nodeId, frame_queue, [0xC1 | (n << 2)] + list(crc.to_bytes(2, 'little')))
+            if not self._check_response(nodeId, index, subindex, response, 0xA1, mask=0xE3):
+                await self._fail(nodeId, index, subindex, response)
+                return False
+        self.wrapper.cnt.inc('SDO_block_download')
+        return True
@@ -0,0 +1,266 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+
+import re
+import time
+import queue
+import logging
+import multiprocessing
+from collections import namedtuple
+from threading import Thread, Lock
+import numpy as np
+try:
+    from .logger_main import Logger
+    from .object_dictionary import load_object_dictionary
+    from .sdo_engine import SDO_OK
+except (ImportError, ModuleNotFoundError):
+    from logger_main import Logger
+    from object_dictionary import load_object_dictionary
+    from sdo_engine import SDO_OK
+
+log_call = Logger(name = "Sharded Acq.",console_loglevel=logging.INFO, logger_file = False)
+
+# One converted sample. raw = 0 and value = NaN if the request failed [status != SDO_OK]
+SAMPLE_DTYPE = np.dtype([("time", "<f8"),
+                         ("shard", "<u2"),
+                         ("bus", "<u2"),
+                         ("nodeId", "<u2"),
+                         ("channel", "<u2"),
+                         ("raw", "<i8"),
+                         ("value", "<f8"),
+                         ("status", "u1")])
+
+AcquisitionShard = namedtuple("AcquisitionShard", ["interface", "channel", "file", "directory", "nodeIds", "buses",
+                                                   "bitrate", "ipAddress", "n_readings", "interval"],
+                              defaults=[(0,), 125000, None, None, 0.0])
+AcquisitionShard.__doc__ = """Work of one acquisition process: the ADC channels of ``nodeIds`` on ``buses``
+read through the |CAN| ``channel`` of the ``interface``. ``n_readings`` = None reads until
+:meth:`ShardedAcquisition.stop`, ``interval`` is the pause between two readings in s.
+Shards on the same |CAN| channel [e.g. one per CIC] can read the same node IDs on different buses:
+the responses are matched on (nodeId, bus) with the bus byte they echo [see :class:`SdoEngine`]."""
+
+# Messages of the workers besides the sample blocks
+_STARTED, _ERROR, _DONE = "started", "error", "done"
+
+def channel_number(channel):
+    """Number of a channel given as number or name [e.g. 1, "1" or "can1" -> 1]"""
+    if isinstance(channel, (int, np.integer)):
+        return int(channel)
+    return int(re.search(r"(\d+)$", str(channel)).group(1))
+
+def samples_of(block):
+    """Rows ``(time, bus, nodeId, channel, raw, value)`` of a sample block for :class:`DataPipeline`.
+    Failed requests give raw = value = None."""
+    ok = block["status"] == SDO_OK
+    return [(t, bus, nodeId, channel, int(raw) if good else None, float(value) if good else None)
+            for t, bus, nodeId, channel, raw, value, good in zip(block["time"].tolist(), block["bus"].tolist(),
+                                                                 block["nodeId"].tolist(), block["channel"].tolist(),
+                                                                 block["raw"], block["value"], ok)]
+
+def _acquisition_worker(shard_id, shard, samples, stop, put_timeout):
+    """Entry point of an acquisition process: one :class:`CanWrapper` reading one shard"""
+    try:
+        from .can_wrapper_main import CanWrapper
+    except (ImportError, ModuleNotFoundError):
+        from can_wrapper_main import CanWrapper
+    stats = {"readings": 0, "samples": 0, "failed": 0, "dropped": 0}
+    wrapper = None
+    try:
+        wrapper = CanWrapper(interface=shard.interface, channel=channel_number(shard.channel),
+                             bitrate=shard.bitrate, ipAddress=shard.ipAddress)
+        # The other shards of the channel see the responses too: match them on (nodeId, bus)
+        wrapper.sdo_engine.match_bus_byte = True
+        od = load_object_dictionary(file=shard.file, directory=shard.directory)
+        requests = od.adc_requests(shard.nodeIds, buses=shard.buses)
+        _requests = np.array(requests, dtype=np.int64).reshape(-1, 4)
+        converter = od.converter()
+        block = np.zeros(len(requests), dtype=SAMPLE_DTYPE)
+        block["shard"] = shard_id
+        block["bus"] = _requests[:, 3]
+        block["nodeId"] = _requests[:, 0]
+        block["channel"] = np.tile(od.adc_channels(), len(requests) // max(len(od.adc_channels()), 1))
+        samples.put((_STARTED, shard_id, None))
+        while not stop.is_set() and (shard.n_readings is None or stats["readings"] < shard.n_readings):
+            values, status = wrapper.read_sdo_batch_sync(requests)
+            ok = status == SDO_OK
+            block["time"] = time.time()
+            block["raw"] = np.where(ok, values, 0)
+            block["value"] = np.where(ok, np.round(converter.convert(values, channels=block["channel"]), 3), np.nan)
+            block["status"] = status
+            stats["readings"] += 1
+            stats["samples"] += len(block)
+            stats["failed"] += int(len(block) - np.count_nonzero(ok))
+            try:
+                samples.put(block, timeout=put_timeout)
+            except queue.Full:
+                stats["dropped"] += len(block)
+            if shard.interval:
+                stop.wait(shard.interval)
+    except (Exception, SystemExit) as e:
+        # CanWrapper exits if the channel can not be opened
+        samples.put((_ERROR, shard_id, f"{e.__class__.__name__}: {e}"))
+    finally:
+        if wrapper is not None:
+            stats["cnt"] = dict(wrapper.cnt)
+            wrapper.stop()
+        samples.put((_DONE, shard_id, stats))
+
+class ShardedAcquisition(object):
+    """Read the ADC channels with one process per |CAN| channel or CIC
+
+    Every :class:`AcquisitionShard` runs in its own process with its own :class:`CanWrapper`,
+    so the |SDO| traffic, the conversion and the packing of the samples of the shards use
+    different cores. The workers send one block of :data:`SAMPLE_DTYPE` per reading through
+    a :class:`multiprocessing.Queue`. The coordinator thread merges the blocks into one stream:
+    the subscribers [e.g. the storage pipelines, the GUI or the OPC UA server] are called with
+    every block and, with ``merge``, :meth:`get` returns the blocks in order of arrival.
+
+    Parameters
+    ----------
+    shards : :obj:`list` of :class:`AcquisitionShard`
+    maxsize : :obj:`int`
+        Capacity of the queues in blocks. Blocks are dropped and counted if the queues are full.
+    merge : :obj:`bool`
+        Also queue the blocks for :meth:`get` and :meth:`get_all` [pull API]. Without it the blocks
+        only go to the subscribers and are not kept in memory.
+    context : :obj:`str`, optional
+        Start method of the processes ['spawn', 'forkserver', 'fork']. 'fork' copies the threads
+        state of the parent [e.g. a running :class:`CanWrapper`] and is only safe in a fresh process.
+
+    Examples
+    --------
+    >>> acquisition = ShardedAcquisition([AcquisitionShard("socketcan", ch, "mops_config.yml", config_dir,
+    ...                                                    nodeIds=[1, 2], buses=range(1, 5)) for ch in (0, 1)])
+    >>> acquisition.subscribe(lambda block: print(block["value"].mean()))
+    >>> acquisition.start().join()
+    """
+
+    def __init__(self, shards, maxsize=1000, put_timeout=0.1, context="spawn", merge=False):
+        self.logger = log_call.setup_main_logger()
+        self.shards = list(shards)
+        self.put_timeout = put_timeout
+        self._ctx = multiprocessing.get_context(context)
+        self._samples = self._ctx.Queue(maxsize)
+        self._pill2kill = self._ctx.Event()
+        self._merged = queue.Queue(maxsize) if merge else None
+        self._processes = []
+        self._subscribers = []
+        self._lock = Lock()
+        self._collector = None
+        self._statistics = {shard_id: {"started": False, "done": False, "blocks": 0, "samples": 0,
+                                       "merged_dropped": 0, "error": None, "worker": None}
+                            for shard_id in range(len(self.shards))}
+
+    def subscribe(self, callback):
+        """Call ``callback(block)`` from the coordinator thread for every block of samples"""
+        with self._lock:
+            self._subscribers = self._subscribers + [callback]
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s is not callback]
+
+    def start(self):
+        """Start the worker processes and the coordinator thread"""
+        for shard_id, shard in enumerate(self.shards):
+            process = self._ctx.Process(target=_acquisition_worker, name=f"Acquisition[{shard.interface}{shard.channel}]",
+                                        args=(shard_id, shard, self._samples, self._pill2kill, self.put_timeout), daemon=True)
+            process.start()
+            self._processes.append(process)
+        self._collector = Thread(target=self._collect, name="ShardedAcquisition", daemon=True)
+        self._collector.start()
+        self.logger.info(f"Started {len(self._processes)} acquisition processes")
+        return self
+
+    def _collect(self):
+        done = 0
+        while done < len(self.shards):
+            try:
+                item = self._samples.get(timeout=0.5)
+            except queue.Empty:
+                if not any(p.is_alive() for p in self._processes):
+                    break
+                continue
+            if isinstance(item, tuple):
+                kind, shard_id, payload = item
+                stats = self._statistics[shard_id]
+                if kind == _STARTED:
+                    stats["started"] = True
+                elif kind == _ERROR:
+                    stats["error"] = payload
+                    self.logger.error(f"Acquisition of shard {shard_id} failed: {payload}")
+                elif kind == _DONE:
+                    stats["done"] = True
+                    stats["worker"] = payload
+                    done += 1
+                continue
+            stats = self._statistics[int(item["shard"][0])] if len(item) else None
+            if stats is not None:
+                stats["blocks"] += 1
+                stats["samples"] += len(item)
+            for subscriber in self._subscribers:
+                try:
+                    subscriber(item)
+                except Exception as e:
+                    self.logger.error(f"Subscriber of the acquisition failed: {e}")
+            if self._merged is None:
+                continue
+            try:
+                self._merged.put_nowait(item)
+            except queue.Full:
+                if stats is not None:
+                    stats["merged_dropped"] += len(item)
+
+    def get(self, timeout=None):
+        """Return the next block of the merged stream or :data:`None` on timeout"""
+        self._check_merge()
+        try:
+            return self._merged.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def get_all(self):
+        """Return all the queued blocks merged into one array of :data:`SAMPLE_DTYPE`"""
+        self._check_merge()
+        blocks = []
+        while True:
+            try:
+                blocks.append(self._merged.get_nowait())
+            except queue.Empty:
+                break
+        return np.concatenate(blocks) if blocks else np.zeros(0, dtype=SAMPLE_DTYPE)
+
+    def _check_merge(self):
+        if self._merged is None:
+            raise RuntimeError("The merged stream is not queued, create the acquisition with merge=True")
+
+    def is_running(self):
+        return self._collector is not None and self._collector.is_alive()
+
+    def join(self, timeout=None):
+        """Wait until all the shards finished their readings"""
+        if self._collector is not None:
+            self._collector.join(timeout)
+        for process in self._processes:
+            process.join(timeout)
+        return self.statistics()
+
+    def stop(self, timeout=5):
+        """Stop the workers after their current reading"""
+        self._pill2kill.set()
+        self.join(timeout)
+        for process in self._processes:
+            if process.is_alive():
+                self.logger.warning(f"Terminating {process.name}")
+                process.terminate()
+        return self.statistics()
+
+    def statistics(self):
+        """Counters of every shard [blocks and samples received by the coordinator, counters of the worker]"""
+        return {shard_id: dict(stats) for shard_id, stats in self._statistics.items()}
@@ -2,14 +2,17 @@
 """
     This file is part of the MOPS-Hub project.
     Author: Ahmed Qamesh (University of Wuppertal)
-    email: ahmed.qamesh@cern.ch  
+    email: ahmed.qamesh@cern.ch
     Date: 01.05.2020
 """
 ########################################################
 
-import subprocess
+import os
 import time
-from threading import Thread
+import socket
+import select
+from collections import Counter
+from threading import Thread, Event
 from EventNotifier import Notifier
 import logging
 try:
@@ -17,31 +20,159 @@ try:
 except:
     from .logger_main import Logger
 log_call = Logger(name = " CAN Watch ",console_loglevel=logging.INFO, logger_file = False)
+
+SYSFS_NET = "/sys/class/net"
+# Counters of /sys/class/net/<interface>/statistics sampled by the watchdog
+LINK_STATISTICS = ["rx_packets", "tx_packets", "rx_errors", "tx_errors", "rx_dropped", "tx_dropped",
+                   "rx_over_errors", "tx_aborted_errors"]
+# rtnetlink multicast group of the link changes [linux/rtnetlink.h]
+RTMGRP_LINK = 0x1
+IFF_UP = 0x1
+
+def read_sysfs(path, default=None):
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
 class WATCHCan(Thread):
-    def __init__(self):
+    """Link monitor of the |CAN| interfaces
+
+    The thread reads the state of every interface from sysfs [operstate, flags, carrier_changes and
+    the counters of :data:`LINK_STATISTICS`] at most every ``interval`` s. If a netlink socket can be
+    opened it wakes up as soon as the kernel reports a link change, but never polls more often than
+    every ``min_interval`` s. A change from "up" to another state raises the event
+    "restart bus_channel" of :attr:`watchdog_notifier` with the channel number.
+
+    Parameters
+    ----------
+    interfaces : :obj:`list` of :obj:`str`, optional
+        Names of the interfaces [default: can0..can(bus_num-1)]
+    interval : :obj:`float`
+        Maximum time between two samples in s
+    """
+    def __init__(self, interfaces=None, interval=1.0, min_interval=0.05, use_netlink=True, sysfs=SYSFS_NET):
         Thread.__init__(self)
         self.bus_num = 2
+        self.interfaces = list(interfaces) if interfaces is not None else [f"can{n}" for n in range(self.bus_num)]
+        self.interval = interval
+        self.min_interval = min_interval
+        self.use_netlink = use_netlink
+        self.sysfs = sysfs
         self.logger_thread = log_call.setup_main_logger()
         self.watchdog_notifier = Notifier(["restart bus_channel"])
         self.running = True
+        self.daemon = True
+        self._pill2kill = Event()
+        self._netlink = None
+        """:obj:`dict` : Last state of each interface ["up", "down", "absent", ...]"""
+        self.link_state = {}
+        """:obj:`dict` : Last sample of :data:`LINK_STATISTICS` of each interface"""
+        self.link_statistics = {}
+        """:obj:`dict` : :class:`~collections.Counter` of the events of each interface
+        [polls, state_changes, link_down, carrier_changes and the increments of :data:`LINK_STATISTICS`]"""
+        self.link_cnt = {}
         self.logger_thread.notice(f"Start a CAN bus thread")
-    
-    def run(self):
-        while self.running:
-            for bus_channel in range(self.bus_num):
-                status = subprocess.run(["cat", f"/sys/class/net/can{bus_channel}/operstate", "/dev/null"], capture_output=True)
-                if "up" in status.stdout.decode("utf-8"):
-                    pass
-                # elif "down" in status.stdout.decode("utf-8"):
-                #     if bus_channel == 0:
-                #         self.logger_thread.warning(f"CAN bus_channel {bus_channel} is down -  going to restart")
-                #         self.watchdog_notifier.raise_event("restart bus_channel", channel=0)
-                #     elif bus_channel == 1:
-                #         self.logger_thread.warning(f"CAN bus_channel {bus_channel} is down -  going to restart")
-                #         self.watchdog_notifier.raise_event("restart bus_channel", channel=1)
-                #         time.sleep(0.5)
-                    
-                else:
+
+    def set_interfaces(self, interfaces):
+        self.interfaces = list(interfaces)
+
+    def get_interfaces(self):
+        return list(self.interfaces)
+
+    def _open_netlink(self):
+        if not self.use_netlink or not hasattr(socket, "AF_NETLINK"):
+            return None
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            sock.bind((0, RTMGRP_LINK))
+            sock.setblocking(False)
+            return sock
+        except OSError as e:
+            self.logger_thread.warning(f"Netlink link events are not available [{e}], polling sysfs every {self.interval} s")
+            return None
+
+    def _link_state(self, interface):
+        operstate = read_sysfs(os.path.join(self.sysfs, interface, "operstate"))
+        if operstate is None:
+            return "absent"
+        if operstate == "unknown":
+            # Virtual interfaces [vcan] do not report their operational state
+            flags = read_sysfs(os.path.join(self.sysfs, interface, "flags"), "0x0")
+            return "up" if int(flags, 16) & IFF_UP else "down"
+        return operstate
+
+    def poll(self):
+        """Sample all the interfaces once and raise the events of the state changes"""
+        for interface in self.interfaces:
+            cnt = self.link_cnt.setdefault(interface, Counter())
+            cnt["polls"] += 1
+            state = self._link_state(interface)
+            previous = self.link_state.get(interface)
+            self.link_state[interface] = state
+            if state != "absent":
+                self._sample_statistics(interface, cnt)
+            if previous is not None and state != previous:
+                cnt["state_changes"] += 1
+                self.logger_thread.warning(f"CAN interface {interface} changed from {previous} to {state}")
+                if previous == "up":
+                    cnt["link_down"] += 1
+                    self.restart_bus_channel(interface)
+        return dict(self.link_state)
+
+    def _sample_statistics(self, interface, cnt):
+        path = os.path.join(self.sysfs, interface)
+        sample = {}
+        for name in LINK_STATISTICS + ["carrier_changes"]:
+            value = read_sysfs(os.path.join(path, "statistics", name) if name != "carrier_changes" else os.path.join(path, name))
+            if value is not None and value.isdigit():
+                sample[name] = int(value)
+        last = self.link_statistics.get(interface)
+        if last is not None:
+            for name, value in sample.items():
+                # The counters restart from zero if the interface is recreated
+                delta = value - last.get(name, 0)
+                if delta > 0:
+                    cnt[name] += delta
+        self.link_statistics[interface] = sample
+
+    def restart_bus_channel(self, interface):
+        channel = "".join(c for c in interface if c.isdigit())
+        self.logger_thread.warning(f"CAN bus_channel {interface} is down - going to restart")
+        self.watchdog_notifier.raise_event("restart bus_channel", channel=int(channel) if channel else interface)
+
+    def _wait(self, timeout):
+        """Wait up to timeout s for a link event or the stop of the thread"""
+        if self._netlink is None:
+            self._pill2kill.wait(timeout)
+            return
+        readable, _, _ = select.select([self._netlink], [], [], timeout)
+        if readable:
+            try:
+                while self._netlink.recv(65536):
                     pass
+            except (BlockingIOError, OSError):
+                pass
+            self._pill2kill.wait(self.min_interval)
+
+    def run(self):
+        self._netlink = self._open_netlink()
+        try:
+            while self.running and not self._pill2kill.is_set():
+                t0 = time.monotonic()
+                self.poll()
+                self._wait(max(self.interval - (time.monotonic() - t0), self.min_interval))
+        finally:
+            if self._netlink is not None:
+                self._netlink.close()
+                self._netlink = None
+
+    def statistics(self):
+        """State and counters of every interface"""
+        return {interface: {"state": self.link_state.get(interface), **self.link_cnt.get(interface, {})}
+                for interface in self.interfaces}
+
     def stop(self):
         self.running = False
+        self._pill2kill.set()
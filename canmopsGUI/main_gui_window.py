@@ -32,10 +32,13 @@ from typing                 import *
 from random                 import randint
 from canmopsGUI          import menu_window,child_window, data_monitoring, mops_child_window, multi_device_window
 from mopshubGUI          import mopshub_child_window
-from canmops.analysis       import Analysis
+from canmops.analysis       import Analysis, AdcConverter
 from canmops.logger_main         import Logger 
 from canmops.analysis_utils  import AnalysisUtils
 from canmops.can_wrapper_main     import CanWrapper
+from canmops.h5_store       import H5Store
+from canmops.data_pipeline  import DataPipeline, CsvSink, H5Sink
+from canmops.deadband       import DeadbandFilter
 log_call = Logger(name = " Main  GUI ",console_loglevel=logging.INFO, logger_file = False)
 
 
@@ -65,6 +68,13 @@ class MainWindow(QMainWindow):
         self.__refresh_rate = conf["Application"]["refresh_rate"] #millisecondsrefresh_rate
         self.__mopshub_mode = conf["Application"]["mopshub_mode"]
         self.__mopshub_communication_mode = conf["Application"]["mopshub_communication_mode"]
+        self.__acquisition_mode = conf["Application"].get("acquisition_mode", "SDO")
+        self.__acquisition_worker = None
+        self.__acquisition_thread = None
+        self.__storage_format = conf["Application"].get("storage_format", "CSV")
+        self.__storage_batch_rows = conf["Application"].get("storage_batch_rows", 1000)
+        self.__storage_batch_interval = conf["Application"].get("storage_batch_interval", 1.0)
+        self.__data_pipeline = None
 
         self.__canId_rx = 0x580
         self.__canId_tx = 0x600        
@@ -74,6 +84,9 @@ class MainWindow(QMainWindow):
         self.__channelPorts = list(conf["channel_ports"])
         self.__interface = None
         self.__ref_voltage = None
+        self.__adc_converters = None
+        self.__object_dictionary = None
+        self.__deadband = None
         self.__channel = None
         self.__ipAddress = None
         self.__bitrate = None
@@ -905,9 +918,10 @@ class MainWindow(QMainWindow):
     '''
     Define can communication messages
     '''
-    def read_sdo_can(self):
+    def read_sdo_can(self, index=None, subindex=None):
         """Read an object via |SDO| with message validity check
-        1. Request the SDO message parameters [e.g.  Index, subindex and _nodeId]
+        1. Request the SDO message parameters [e.g.  Index, subindex and _nodeId]. 
+           The integer index and subindex of the compiled object dictionary can be given directly.
         2. Communicate with the read_sdo_can function in the CANWrapper to send SDO message
         3. Print the result if print_sdo is True
         The function is called by the following functions: 
@@ -916,20 +930,20 @@ class MainWindow(QMainWindow):
            c) read_configuration_values
         """
         data_RX = None
-        _index = int(self.get_index(), 16)
-        _subIndex = int(self.get_subIndex(), 16)
+        _index = int(self.get_index(), 16) if index is None else index
+        _subIndex = int(self.get_subIndex(), 16) if subindex is None else subindex
         _nodeId = int(self.get_nodeId())
         _busId = self.get_busId()
-        data_RX,_,_,_,_,_,_ = asyncio.run(self.wrapper.read_sdo_can(nodeId = _nodeId,
+        data_RX,_,_,_,_,_,_ = self.wrapper.read_sdo_can_sync(nodeId = _nodeId,
                                                                   index = _index, 
                                                                   subindex = _subIndex, 
-                                                                  bus =  int(_busId)))
+                                                                  bus =  int(_busId))
         self.update_bus_progress(reset_progress =False)
         return data_RX
     
     def trim_nodes(self): 
          _channel = self.get_channel()
-         asyncio.run(self.wrapper.trim_nodes(channel=int(_channel))) 
+         self.wrapper.run_coroutine_sync(self.wrapper.trim_nodes(channel=int(_channel))) 
          return None
                               
     def read_sdo_can_thread(self, trending=False, print_sdo=True):
@@ -951,7 +965,7 @@ class MainWindow(QMainWindow):
             SDO_RX = self.get_canId_rx()
             _cobid_TX = SDO_TX + _nodeId
             _busId = self.get_busId()
-            _cobid_RX, data_RX = asyncio.run(self.wrapper.read_sdo_can_thread(nodeId=_nodeId,
+            _cobid_RX, data_RX = self.wrapper.run_coroutine_sync(self.wrapper.read_sdo_can_thread(nodeId=_nodeId,
                                                                       index=_index,
                                                                       subindex=_subIndex,
                                                                       SDO_TX=SDO_TX,
@@ -988,10 +1002,7 @@ class MainWindow(QMainWindow):
             # printing TX   
             self.set_textBox_message(comunication_object="SDO_RX", msg=str([hex(m)[2:] for m in RX_response]), cobid=str(hex(cobid_RX) + " "))
             # print decoded response
-            converted_response = Analysis().adc_conversion(adc_channels_reg = "V", 
-                                                             value = response_from_node,
-                                                             resistor_ratio =  self.__resistor_ratio,
-                                                             ref_voltage = self.__ref_voltage)
+            converted_response = self.get_adc_converters()["sdo"].convert_one(0, response_from_node)
                     
             decoded_response = f'{response_from_node:03X}'
             self.set_textBox_message(comunication_object="Decoded", msg=decoded_response, cobid=str(hex(cobid_RX) + ": Hex value = "))
@@ -1065,7 +1076,7 @@ class MainWindow(QMainWindow):
         
         try: 
                 # Send the can Message
-            asyncio.run(self.wrapper.write_can_message(cobid = int(_cobid_TX, 16),data =  _bytes, flag=0, dlc =_dlc))
+            self.wrapper.write_can_message_sync(cobid = int(_cobid_TX, 16),data =  _bytes, flag=0, dlc =_dlc)
             #go back to the default dlc
             self.set_dlc(8)
             # receive the message
@@ -1135,6 +1146,9 @@ class MainWindow(QMainWindow):
         '''
         The function will  update the GUI with the ADC data ach period in ms.
         ''' 
+        if self.__acquisition_thread is not None:
+            self.error_message("The previous acquisition is still stopping")
+            return
         self.stop_adc_reading = True  
         try:
             # Disable the logger when reading ADC values [The exception statement is made to avoid user mistakes]
@@ -1144,6 +1158,9 @@ class MainWindow(QMainWindow):
             
         self.logger.notice("Reading ADC data...")
         self.__mon_time = time.time()
+        # Only the changed values are shown, all of them are saved [deadband section of the device yaml file]
+        _dev = self.get_object_dictionary().dev
+        self.__deadband = DeadbandFilter.from_config(_dev) if _dev.get("deadband", None) else None
         # A possibility to save the data into a file
         self.__default_file = self.get_default_file()
         
@@ -1151,15 +1168,38 @@ class MainWindow(QMainWindow):
             self.logger.notice("Preparing an output file [%s]..." % (output_dir+self.__default_file))
             fieldnames = ['Time', 'Channel', "nodeId", "ADCChannel", "ADCData" , "ADCDataConverted"]
             secondary_fieldnames = [f"resistor_ratio:{self.__resistor_ratio}",f"BG_voltage:{self.__BG_voltage}V"]
-            self.csv_writer, self.out_file_csv = AnalysisUtils().build_data_base(fieldnames=fieldnames,
-                                                                                 outputname=self.__default_file[:-4],
-                                                                                  directory=output_dir,
-                                                                                  secondary_fieldnames = secondary_fieldnames)   
-            eventTimer = mops_child_window.EventTimer()
-            self.adc_timer = eventTimer.initiate_timer()
-            self.adc_timer.setInterval(int(self.__refresh_rate))
-            self.adc_timer.timeout.connect(self.update_adc_channels)
-            self.adc_timer.timeout.connect(self.update_monitoring_values)
+            # The samples are written by a worker thread [see DataPipeline]
+            if self.__storage_format == "HDF5":
+                _sink = H5Sink(H5Store(output_dir + self.__default_file[:-4] + ".h5"))
+            else:
+                _channel = self.get_channel()
+                _sink = CsvSink.open(outputname=self.__default_file[:-4], directory=output_dir,
+                                     fieldnames=fieldnames, secondary_fieldnames=secondary_fieldnames,
+                                     compress=self.__storage_format == "CSV.GZ",
+                                     formatter=lambda s: (str(round(s[0], 1)), str(_channel), str(s[2]),
+                                                          str(s[3]), str(s[4]), str(s[5])))
+            self.__data_pipeline = DataPipeline(_sink, batch_rows=self.__storage_batch_rows,
+                                                batch_interval=self.__storage_batch_interval, name="gui")
+            self.__data_pipeline.start()
+            # The SDOs, the conversion and the storage run in the acquisition thread,
+            # the GUI thread only renders one batched signal per sweep
+            self.__acquisition_worker = mops_child_window.AcquisitionWorker(self.wrapper, self.get_object_dictionary(),
+                                                                            nodeId=self.get_nodeId(), busId=self.get_busId(),
+                                                                            converters=self.get_adc_converters(),
+                                                                            period=self.__refresh_rate, pipeline=self.__data_pipeline,
+                                                                            deadband=self.__deadband, acquisition_mode=self.__acquisition_mode,
+                                                                            dictionary_items=self.__dictionary_items, mon_time=self.__mon_time)
+            self.__acquisition_thread = QThread()
+            self.__acquisition_worker.moveToThread(self.__acquisition_thread)
+            self.__acquisition_thread.started.connect(self.__acquisition_worker.start)
+            self.__acquisition_worker.sweepReady.connect(self.show_sweep)
+            self.__acquisition_worker.error.connect(self.logger.error)
+            self.__acquisition_worker.finished.connect(self.__acquisition_thread.quit)
+            # The references are kept until the thread finished [a late sweep must find the worker alive]
+            self.__acquisition_thread.finished.connect(self.__acquisition_worker.deleteLater)
+            self.__acquisition_thread.finished.connect(self.__acquisition_thread.deleteLater)
+            self.__acquisition_thread.finished.connect(self.acquisition_thread_finished)
+            self.__acquisition_thread.start()
         else:
             self.error_message("Please add an output file name")
              
@@ -1174,7 +1214,7 @@ class MainWindow(QMainWindow):
         atexit.register(exit_handler)  
         try:
             self.stop_adc_reading = False
-            self.adc_timer.stop()
+            self.stop_acquisition_worker()
             self.logger.warning("User interrupted. Closing the program.")       
                   
             # self.csv_writer.writerow((str(None),
@@ -1184,13 +1224,35 @@ class MainWindow(QMainWindow):
             #              str(None), 
             #              "End of Test") ) 
             # self.out_file_csv.flush() # Flush the buffer to update the file
-            self.out_file_csv.close()
+            _statistics = self.__data_pipeline.stop()
+            self.__data_pipeline = None
+            if _statistics["dropped"]:
+                self.logger.warning(f'{_statistics["dropped"]} ADC samples were not saved [storage too slow]')
             self.logger.notice("ADC data are saved to %s" % (output_dir))
             self.control_logger.disabled = False   
             self.logger.notice("Stop reading ADC data...")
         except Exception:
             pass
 
+    def stop_acquisition_worker(self, timeout=5000):
+        '''
+        The function will stop the acquisition worker and wait for its thread [timeout in ms].
+        '''
+        if self.__acquisition_thread is None:
+            return
+        self.__acquisition_worker.request_stop()
+        if not self.__acquisition_thread.wait(timeout):
+            self.logger.warning("The acquisition thread did not stop in time")
+
+    def acquisition_thread_finished(self):
+        '''
+        The function will release the acquisition worker and its thread once the thread finished.
+        '''
+        # A thread of a previous acquisition must not release the current one
+        if self.sender() is self.__acquisition_thread:
+            self.__acquisition_worker = None
+            self.__acquisition_thread = None
+
     def initiate_random_timer(self, period=5000):
         '''
         The function will  send random CAN messages to the bus each period in ms.
@@ -1228,99 +1290,47 @@ class MainWindow(QMainWindow):
             pass
         
                       
-    def update_adc_channels(self):
+    def show_sweep(self, t, adc, mon, adc_changed, mon_changed):
         '''
-        The function will will send a CAN message to read the ADC channels using the function read_sdo_can and
-            update the channelValueBox in adc_values_window.
-        The calling function is initiate_adc_timer.
-        '''   
-        _adc_channels_reg = self.get_adc_channels_reg()
-        _dictionary = self.__dictionary_items
-        _adc_indices = list(self.__adc_index)
-        try:
-            for i in np.arange(len(_adc_indices)):
-                _subIndexItems = list(AnalysisUtils().get_subindex_yaml(dictionary=_dictionary, index=_adc_indices[i], subindex="subindex_items"))
-                self.set_index(_adc_indices[i])  # set index for later usage
-                _start_a = 3  # to ignore the first subindex it is not ADC
-                for subindex in np.arange(_start_a, len(_subIndexItems) + _start_a - 1):
-                    s = subindex - _start_a
-                    s_correction = subindex - 2
-                    self.set_subIndex(_subIndexItems[s_correction])
-                    # read SDO CAN messages
-                    #self.update_bus_progress(reset_progress =False)
-                    data_point = self.read_sdo_can()  # _thread(print_sdo=False)
-                    time.sleep(self.__wait_time )
-                    ts = time.time()
-                    if data_point is None: 
-                        #self.logger.warning(f"No responses in the Bus for subindex {_subIndexItems[s_correction]}")
-                        #self.stop_adc_timer()
-                        self.__adc_converted = None
-                        self.channelValueBox[s].setText(str(self.__adc_converted))
-                    else:
-                        self.__adc_converted = Analysis().adc_conversion(adc_channels_reg = _adc_channels_reg[str(subindex)], 
-                                                                           value = data_point, 
-                                                                           resistor_ratio =self.__resistor_ratio,
-                                                                            ref_voltage = self.__ref_voltage)
-                     
-                        self.set_adc_converted(self.__adc_converted)
-                        self.channelValueBox[s].setText(str(round(self.__adc_converted, 3)))
-                    
-                    elapsedtime = ts - self.__mon_time
-                    # update the progression bar to show bus statistics
-                    self.progressBar.setValue(subindex)    
-                    self.csv_writer.writerow((str(round(elapsedtime, 1)),
-                                         str(self.get_channel()),
-                                         str(self.get_nodeId()),
-                                         str(subindex),
-                                         str(data_point),
-                                         str(self.__adc_converted)))
-                    self.out_file_csv.flush() # Flush the buffer to update the file
-                    if self.trendingBox[s] == True and self.__adc_converted is not None:
-                        # Monitor a window of 100 points is enough to avoid Memory issues
-                        if len(self.x[s]) >= 100:
-                            self.DataMonitoring.reset_data_holder(self.__adc_converted,s)
-                        self.DataMonitoring.update_figure(data=self.__adc_converted, subindex=subindex, graphWidget = self.graphWidget[s])
-
-        except (KeyboardInterrupt):
-            #Handle Ctrl+C to gracefully exit the loop
-            
-            self.logger.warning("User interrupted. Closing the program.")
-            self.stop_adc_timer()
-            sys.exit(1) 
+        Slot of AcquisitionWorker.sweepReady, runs in the GUI thread and only renders the values of one sweep.
+        '''
+        self.update_adc_channels(adc, adc_changed)
+        self.update_monitoring_values(mon, mon_changed)
+
+    def update_adc_channels(self, adc, changed):
+        '''
+        The function will update the ADC value table [channelValueBox] of adc_values_window and the trending plots
+            with the converted ADC values of one sweep [NaN: no response].
+        Only the values which passed the deadband [changed] are rendered, the table repaints them with the next display frame.
+        The calling function is show_sweep.
+        '''
+        _channels = self.get_object_dictionary().adc_channels()
+        _changed = np.flatnonzero(changed)
+        if _changed.size == 0:
+            return self.__adc_converted
+        self.channelValueBox.set_values(adc, changed)
+        # update the progression bar to show bus statistics
+        self.progressBar.setValue(int(_channels[_changed[-1]]))
+        for s in _changed.tolist():
+            subindex = int(_channels[s])
+            value = float(adc[s])
+            self.__adc_converted = None if np.isnan(value) else value
+            if self.trendingBox[s] == True and self.__adc_converted is not None:
+                # Monitor a window of 100 points is enough to avoid Memory issues
+                if len(self.x[s]) >= 100:
+                    self.DataMonitoring.reset_data_holder(self.__adc_converted,s)
+                self.DataMonitoring.update_figure(data=self.__adc_converted, subindex=subindex, graphWidget = self.graphWidget[s])
+        if self.__adc_converted is not None:
+            self.set_adc_converted(self.__adc_converted)
         return self.__adc_converted
 
-    def update_monitoring_values(self):
+    def update_monitoring_values(self, mon, changed):
         '''
-        The function will will send a CAN message to read monitoring values using the function read_sdo_can and
-         update the monValueBox in monitoring_values_window.
-        The calling function is initiate_adc_timer.
-        ''' 
-        _dictionary = self.__dictionary_items
-        _mon_indices = list(self.__mon_index)
-        for i in np.arange(len(_mon_indices)):
-            _subIndexItems = list(AnalysisUtils().get_subindex_yaml(dictionary=_dictionary, index=_mon_indices[i], subindex="subindex_items"))
-            self.set_index(_mon_indices[i])  # set index for later usage
-            for s in np.arange(0, len(_subIndexItems)):
-                self.set_subIndex(_subIndexItems[s])
-                #self.update_bus_progress(reset_progress =True)
-                data_point = self.read_sdo_can()  # _thread(print_sdo=False)
-                time.sleep(self.__wait_time )
-                if data_point is None: 
-                    #self.stop_adc_timer()
-                    self.__adc_converted = None
-                    self.monValueBox[s].setText(str(self.__adc_converted))
-                    #break
-                else:
-                    if   s == 0: resistor_ratio = 1
-                    elif s == 1: resistor_ratio = 2.5
-                    elif s == 2: resistor_ratio = 1  
-
-                    self.__adc_converted = Analysis().adc_conversion(adc_channels_reg = "V", 
-                                                                     value = data_point,
-                                                                     resistor_ratio = resistor_ratio,
-                                                                     ref_voltage = self.__ref_voltage)
-                    self.set_adc_converted(self.__adc_converted)
-                    self.monValueBox[s].setText(str(round(self.__adc_converted, 3)))
+        The function will update the monitoring value table [monValueBox] of monitoring_values_window with the converted
+         monitoring values of one sweep [NaN: no response].
+        The calling function is show_sweep.
+        '''
+        self.monValueBox.set_values(mon, changed)
     
     def error_message(self, text=False):
         '''
@@ -1574,6 +1584,9 @@ class MainWindow(QMainWindow):
     def set_dictionary_items(self, x):
         self.__dictionary_items = x
 
+    def set_object_dictionary(self, x):
+        self.__object_dictionary = x
+
     def set_nodeList(self, x):
         self.__nodeIds = x 
 
@@ -1681,6 +1694,9 @@ class MainWindow(QMainWindow):
     def get_dictionary_items(self):
         return self.__dictionary_items  
 
+    def get_object_dictionary(self):
+        return self.__object_dictionary
+
     def get_icon_dir(self):
         return  self.__appIconDir
     
@@ -1700,6 +1716,23 @@ class MainWindow(QMainWindow):
     def get_adc_channels_reg(self):
         return self.__adc_channels_reg
 
+    def get_adc_converters(self):
+        '''
+        The function returns the ADC lookup tables [see AdcConverter]. They are only rebuilt if the
+        reference voltage or the resistor ratio has changed.
+        > adc: ADC channels of adc_channels_reg
+        > mon: monitoring values VBANDGAP, VCANSEN [resistor ratio 2.5] and VGNDSEN
+        > sdo: single voltage read by print_sdo_can
+        '''
+        _key = (self.__ref_voltage, self.__resistor_ratio)
+        if self.__adc_converters is None or self.__adc_converters[0] != _key:
+            # The ADC channels are calibrated as set in the Hardware section of the yaml file [see ObjectDictionary.converter]
+            converters = {"adc": self.get_object_dictionary().converter(ref_voltage=self.__ref_voltage, resistor_ratio=self.__resistor_ratio),
+                          "mon": AdcConverter(channels=[0, 1, 2], ref_voltage=self.__ref_voltage, resistor_ratio=[1, 2.5, 1]),
+                          "sdo": AdcConverter(channels=[0], ref_voltage=self.__ref_voltage, resistor_ratio=self.__resistor_ratio)}
+            self.__adc_converters = (_key, converters)
+        return self.__adc_converters[1]
+
     def get_busId(self):
         return self.__busid
         
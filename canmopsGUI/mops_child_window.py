@@ -9,14 +9,16 @@
 
 from matplotlib.backends.qt_compat import QtCore, QtWidgets
 from matplotlib.backends.backend_qt5agg import FigureCanvas
-from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal, pyqtSlot
 from PyQt5.QtCore    import *
 from PyQt5.QtGui     import *
 from PyQt5.QtWidgets import *
 from PyQt5 import QtGui
 from canmops.analysis_utils import AnalysisUtils
 from canmops.logger_main    import Logger 
-from canmopsGUI import main_gui_window, menu_window, data_monitoring
+from canmops.object_dictionary import ObjectDictionary, load_object_dictionary
+from canmops.sdo_engine     import SDO_OK
+from canmopsGUI import main_gui_window, menu_window, data_monitoring, value_table
 import numpy as np
 import time
 import os
@@ -36,11 +38,9 @@ class MopsChildWindow(QWidget):
        super(MopsChildWindow, self).__init__(parent)
        self.logger = log_call.setup_main_logger()
        
-       dev = AnalysisUtils().open_yaml_file(file=config_yaml, directory=lib_dir)
-       self.configure_devices(dev)
+       self.configure_devices(load_object_dictionary(file=config_yaml, directory=lib_dir))
        max_mops_num = 4
        max_bus_num = 4
-       self.loop_thread = LoopThread(mainWindow)
        self.adcItems= [str(k) for k in np.arange(3,35)] 
        
     def bus_child_window(self,childWindow):      
@@ -84,7 +84,10 @@ class MopsChildWindow(QWidget):
     def configure_devices(self, dev):
         '''
         The function provides all the configuration parameters stored in the configuration file of the device [e.g. MOPS] stored in the config_dir
+        dev is the loaded yaml file or its compiled ObjectDictionary
         '''
+        self.__object_dictionary = dev if isinstance(dev, ObjectDictionary) else ObjectDictionary(dev)
+        dev = self.__object_dictionary.dev
         self.__deviceName = dev["Application"]["device_name"] 
         self.__version = dev['Application']['device_version']
         self.__appIconDir = dev["Application"]["icon_dir"]
@@ -125,6 +128,7 @@ class MopsChildWindow(QWidget):
         mainWindow.set_icon_dir(self.__appIconDir)
         mainWindow.set_nodeList(self.__nodeIds)
         mainWindow.set_dictionary_items(self.__dictionary_items) 
+        mainWindow.set_object_dictionary(self.__object_dictionary)
         mainWindow.set_adc_channels_reg(self.__adc_channels_reg)            
         try:
             mainWindow.deviceButton.deleteLater()
@@ -409,21 +413,16 @@ class MopsChildWindow(QWidget):
 
             tabLayout.addLayout(nodeHLayout, 1, 0)
             tabLayout.addLayout(busHLayout, 2, 0)            
-            def  start_loop():
-                self.loop_thread.start_loop()
-                self.loop_thread.start()
-                    
-            
             HBox = QHBoxLayout()
             send_button = QPushButton("run ")
             send_button.setIcon(QIcon(icon_location+'icon_start.png'))
             send_button.clicked.connect(__set_bus_timer)
             send_button.clicked.connect(__check_file_box)
-            send_button.clicked.connect(mainWindow.initiate_adc_timer)#start_loop)#
+            send_button.clicked.connect(mainWindow.initiate_adc_timer)
     
             stop_button = QPushButton("stop ")
             stop_button.setIcon(QIcon(icon_location+'icon_stop.png')) 
-            stop_button.clicked.connect(mainWindow.stop_adc_timer)#self.loop_thread.stop_loop) #
+            stop_button.clicked.connect(mainWindow.stop_adc_timer)
     
             # update a progress bar for the bus statistics
             progressLabel = QLabel()
@@ -633,6 +632,7 @@ class MopsChildWindow(QWidget):
     def adc_values_window(self,adc_channels_reg = None, mainWindow =None,cic = None, port = None , mops = None):
         '''
         The function will create a QGroupBox for ADC Values [it is called by the function device_child_window]
+        The values are shown by two ValueTableViews [the two halves of the channels] of one ValueTableModel.
         '''
         # info to read the ADC from the yaml file
         self.ADCGroupBox = QGroupBox("ADC Channels")
@@ -640,57 +640,43 @@ class MopsChildWindow(QWidget):
         _adc_channels_reg = adc_channels_reg
         _dictionary = self.__dictionary_items
         _adc_indices = list(self.__adc_index)
+        labelChannel, statusTips, icons, subindices = [], [], [], []
         for i in np.arange(len(_adc_indices)):
             _subIndexItems = list(AnalysisUtils().get_subindex_yaml(dictionary=_dictionary, index=_adc_indices[i], subindex="subindex_items"))
-            labelChannel = [_subIndexItems[k] for k in np.arange(len(_subIndexItems) * len(_adc_indices))]
-            self.channelValueBox = [_subIndexItems[k] for k in np.arange(len(_subIndexItems) * len(_adc_indices))]
-            self.trendingBox = [False for k in np.arange(len(_subIndexItems) * len(_adc_indices))]
-            self.trendingBotton = [_subIndexItems[k] for k in np.arange(len(_subIndexItems) * len(_adc_indices))]
             _start_a = 3  # to start from channel 3
             for subindex in np.arange(_start_a, len(_subIndexItems) + _start_a - 1):
-                s = subindex - _start_a
                 s_correction = subindex - 2
-                labelChannel[s] = QLabel()
-                self.channelValueBox[s] = QLineEdit()
-                self.channelValueBox[s].setStyleSheet("background-color: white; border: 1px inset black;")
-                self.channelValueBox[s].setReadOnly(True)
-                self.channelValueBox[s].setFixedWidth(60)
                 subindex_description_item = AnalysisUtils().get_subindex_description_yaml(dictionary=_dictionary, index=_adc_indices[i], subindex=_subIndexItems[s_correction])
-                labelChannel[s].setStatusTip('ADC channel %s [index = %s & subIndex = %s]' % (subindex_description_item[25:29],
-                                                                                            _adc_indices[i],
-                                                                                             _subIndexItems[s_correction]))  # show when move mouse to the icon
-                labelChannel[s].setText(subindex_description_item[25:29] + " [V]:")
-                icon = QLabel(self)
+                statusTips.append('ADC channel %s [index = %s & subIndex = %s]' % (subindex_description_item[25:29],
+                                                                                  _adc_indices[i],
+                                                                                  _subIndexItems[s_correction]))  # show when move mouse to the label
+                labelChannel.append(subindex_description_item[25:29] + " [V]:")
                 if _adc_channels_reg[str(subindex)] == "V": 
                     icon_dir = icon_location+'icon_voltage.png'
                 else: 
                     icon_dir = icon_location+'icon_thermometer.png'
-                pixmap = QPixmap(icon_dir)
-                icon.setPixmap(pixmap.scaled(20, 20))
-                self.trendingBotton[s] = QPushButton()
-                self.trendingBotton[s].setObjectName(str(subindex))
-                self.trendingBotton[s].setIcon(QIcon(icon_location+'icon_trend.jpg'))
-                self.trendingBotton[s].setStatusTip('Data Trending for %s' % subindex_description_item[25:29])
-                if cic is not None:
-                    self.trendingBotton[s].clicked.connect(lambda: mainWindow.show_trendWindow(int(cic),int(port),int(mops)))
-                else:
-                    self.trendingBotton[s].clicked.connect(lambda: mainWindow.show_trendWindow())
-                    
-#                 self.trendingBox[s] = QCheckBox("")
-#                 self.trendingBox[s].setChecked(False)
-                col_len = int(len(_subIndexItems) / 2)
-                if s < col_len:
-                    FirstGridLayout.addWidget(icon, s, 0)
-                    # FirstGridLayout.addWidget(self.trendingBox[s], s, 1)
-                    FirstGridLayout.addWidget(self.trendingBotton[s], s, 2)
-                    FirstGridLayout.addWidget(labelChannel[s], s, 3)
-                    FirstGridLayout.addWidget(self.channelValueBox[s], s, 4)
-                else:
-                    FirstGridLayout.addWidget(icon, s - col_len, 5)
-                    # FirstGridLayout.addWidget(self.trendingBox[s], s-col_len, 6)
-                    FirstGridLayout.addWidget(self.trendingBotton[s], s - col_len, 7)
-                    FirstGridLayout.addWidget(labelChannel[s], s - col_len, 8)
-                    FirstGridLayout.addWidget(self.channelValueBox[s], s - col_len , 9)         
+                icons.append(QIcon(QPixmap(icon_dir).scaled(20, 20)))
+                subindices.append(subindex)
+        self.channelValueBox = value_table.ValueTableModel(labelChannel, columns=("Value", ""), tips=statusTips, icons=icons, parent=self.ADCGroupBox)
+        self.trendingBox = [False for k in np.arange(len(labelChannel))]
+        self.trendingBotton = [None for k in np.arange(len(labelChannel))]
+        col_len = int(len(labelChannel) / 2)
+        views = [value_table.ValueTableView(self.channelValueBox, rows=range(0, col_len)),
+                 value_table.ValueTableView(self.channelValueBox, rows=range(col_len, len(labelChannel)))]
+        for s, subindex in enumerate(subindices):
+            self.trendingBotton[s] = QPushButton()
+            self.trendingBotton[s].setObjectName(str(subindex))
+            self.trendingBotton[s].setIcon(QIcon(icon_location+'icon_trend.jpg'))
+            self.trendingBotton[s].setStatusTip('Data Trending for %s' % labelChannel[s][:-5])
+            if cic is not None:
+                self.trendingBotton[s].clicked.connect(lambda: mainWindow.show_trendWindow(int(cic),int(port),int(mops)))
+            else:
+                self.trendingBotton[s].clicked.connect(lambda: mainWindow.show_trendWindow())
+            views[0 if s < col_len else 1].setIndexWidget(self.channelValueBox.index(s, 1), self.trendingBotton[s])
+        for view in views:
+            view.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeToContents)
+        FirstGridLayout.addWidget(views[0], 0, 0)
+        FirstGridLayout.addWidget(views[1], 0, 1)
         self.ADCGroupBox.setLayout(FirstGridLayout)
         return self.channelValueBox, self.trendingBox
 
@@ -699,8 +685,7 @@ class MopsChildWindow(QWidget):
         The function will create a QGroupBox for Monitoring Values [it is called by the function device_child_window]
         '''
         self.SecondGroupBox = QGroupBox("Monitoring Values")
-        labelvalue = [0 for i in np.arange(20)]  # 20 is just a hypothetical number
-        self.monValueBox = [0 for i in np.arange(20)]
+        labelvalue, statusTips = [], []
         SecondGridLayout = QGridLayout()
         _dictionary = self.__dictionary_items
         _mon_indices = list(self.__mon_index)
@@ -708,15 +693,10 @@ class MopsChildWindow(QWidget):
             _subIndexItems = list(AnalysisUtils().get_subindex_yaml(dictionary=_dictionary, index=_mon_indices[i], subindex="subindex_items"))
             for s in np.arange(len(_subIndexItems)):
                 subindex_description_item = AnalysisUtils().get_subindex_description_yaml(dictionary=_dictionary, index=_mon_indices[i], subindex=_subIndexItems[s])
-                labelvalue[s] = QLabel()
-                labelvalue[s].setText(subindex_description_item + ":")
-                labelvalue[s].setStatusTip('%s [index = %s & subIndex = %s]' % (subindex_description_item[9:-11], _mon_indices[i], _subIndexItems[s])) 
-                self.monValueBox[s] = QLineEdit("")
-                self.monValueBox[s].setStyleSheet("background-color: white; border: 1px inset black;")
-                self.monValueBox[s].setReadOnly(True)
-                self.monValueBox[s].setFixedWidth(60)
-                SecondGridLayout.addWidget(labelvalue[s], s, 0)
-                SecondGridLayout.addWidget(self.monValueBox[s], s, 1)
+                labelvalue.append(QTextDocumentFragment.fromHtml(subindex_description_item).toPlainText() + ":")  # the header shows plain text
+                statusTips.append('%s [index = %s & subIndex = %s]' % (subindex_description_item[9:-11], _mon_indices[i], _subIndexItems[s])) 
+        self.monValueBox = value_table.ValueTableModel(labelvalue, tips=statusTips, parent=self.SecondGroupBox)
+        SecondGridLayout.addWidget(value_table.ValueTableView(self.monValueBox), 0, 0)
         self.SecondGroupBox.setLayout(SecondGridLayout)
         return self.monValueBox
     
@@ -725,6 +705,9 @@ class MopsChildWindow(QWidget):
     
     def get_default_file(self):
         return self.__default_file
+
+    def get_object_dictionary(self):
+        return self.__object_dictionary
     
     def set_dir_text_box(self,x):
         self.__default_file = x
@@ -770,30 +753,116 @@ class EventTimer(QWidget):
         self.startBtn.setEnabled(True)
         self.endBtn.setEnabled(False)
  
- # A thread method still under development
-class LoopThread(QThread):
+class AcquisitionWorker(QObject):
+    """Acquisition of the ADC and monitoring values of one node off the GUI thread
+
+    The worker is moved to a :class:`QThread` and owns all the wrapper calls: every ``period`` ms
+    one sweep reads all the objects with one pipelined :meth:`CanWrapper.read_sdo_batch` [or one SYNC
+    in PDO mode], converts them with the lookup tables, queues every ADC sample to the storage pipeline
+    and emits one :attr:`sweepReady` signal. The GUI thread only renders the arrays of the signal.
+
+    sweepReady(t, adc, mon, adc_changed, mon_changed):
+        time of the sweep, converted ADC and monitoring values [NaN without response] and the masks
+        of the values which passed the deadband [all True without deadband, they only select the rows to repaint]
+    """
+    sweepReady = pyqtSignal(float, object, object, object, object)
+    error = pyqtSignal(str)
     finished = pyqtSignal()
+    _stopRequested = pyqtSignal()
+
+    def __init__(self, wrapper, od, nodeId, busId, converters, period=500, pipeline=None, deadband=None,
+                 acquisition_mode="SDO", dictionary_items=None, mon_time=None):
+        super(AcquisitionWorker, self).__init__()
+        self.logger = log_call.setup_main_logger()
+        self.wrapper = wrapper
+        self.nodeId = int(nodeId)
+        self.busId = int(busId)
+        self.converters = converters
+        self.period = int(period)
+        self.pipeline = pipeline
+        self.deadband = deadband
+        self.acquisition_mode = acquisition_mode
+        self.dictionary_items = dictionary_items
+        self.mon_time = mon_time if mon_time is not None else time.time()
+        self.od = od
+        self.adc_requests = [(self.nodeId, g.index, int(s), self.busId) for g in od.adc for s in g.subindices]
+        self.mon_requests = [(self.nodeId, g.index, int(s), self.busId) for g in od.mon for s in g.subindices]
+        self.adc_channels = od.adc_channels()
+        # Monitoring values VBANDGAP, VCANSEN and VGNDSEN [see MainWindow.get_adc_converters]
+        self.mon_channels = np.minimum(np.arange(len(self.mon_requests)), 2)
+        self.pdo_acquisition = None
+        self.timer = None
+        self._stopRequested.connect(self.stop)
+
+    @pyqtSlot()
+    def start(self):
+        """Started by :attr:`QThread.started`, runs in the acquisition thread"""
+        if self.acquisition_mode == "PDO":
+            # Configure the TPDOs once, each sweep is then one SYNC
+            try:
+                self.pdo_acquisition = self.wrapper.run_coroutine_sync(
+                    self.wrapper.setup_pdo_acquisition(nodeIds=[self.nodeId], adc_index=self.od.adc[0].index,
+                                                       subindices=[int(s) for s in self.od.adc[0].subindices],
+                                                       dictionary_items=self.dictionary_items, bus=self.busId))
+            except Exception as e:
+                self.error.emit(f"PDO configuration failed, falling back to SDO polling: {e}")
+        # The timer belongs to the acquisition thread. A sweep longer than the period delays the next one.
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.period)
+        self.timer.timeout.connect(self.sweep)
+        self.timer.start()
+        self.sweep()
 
-    def __init__(self, mainWindow, parent=None):
-        super().__init__(parent)
-        self.main_gui_instance = mainWindow
-        self.looping = False
-
-    def start_loop(self):
-        self.looping = True
-
-    def stop_loop(self):
-        self.looping = False
-
-    def run(self):
-        self.main_gui_instance.initiate_adc_loop()
-        while self.looping:
-            # Execute the functions
-            self.main_gui_instance.update_adc_channels()
-            self.main_gui_instance.update_monitoring_values()
-            self.main_gui_instance.update_configuration_values()
+    @pyqtSlot()
+    def sweep(self):
+        try:
+            self.sweepReady.emit(*self._read())
+        except Exception as e:
+            self.error.emit(f"Acquisition sweep failed: {e}")
+
+    def _read(self):
+        n_adc = len(self.adc_requests)
+        requests = (self.adc_requests if self.pdo_acquisition is None else []) + self.mon_requests
+        values, status = self.wrapper.read_sdo_batch_sync(requests) if requests else (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint8))
+        t = time.time()
+        if self.pdo_acquisition is not None:
+            # One SYNC samples all the channels at the same time
+            pdo_values, pdo_status, _ = self.wrapper.run_coroutine_sync(self.pdo_acquisition.read_sweep())
+            adc_raw, adc_status = pdo_values[0], pdo_status[0]
+            mon_raw, mon_status = values, status
+        else:
+            adc_raw, adc_status = values[:n_adc], status[:n_adc]
+            mon_raw, mon_status = values[n_adc:], status[n_adc:]
+        adc_ok, mon_ok = adc_status == SDO_OK, mon_status == SDO_OK
+        adc = np.where(adc_ok, self.converters["adc"].convert(adc_raw, channels=self.adc_channels[:len(adc_raw)]), np.nan)
+        mon = np.where(mon_ok, self.converters["mon"].convert(mon_raw, channels=self.mon_channels), np.nan)
+        adc_changed = np.ones(len(adc), dtype=bool)
+        mon_changed = np.ones(len(mon), dtype=bool)
+        if self.deadband is not None:
+            for s, (channel, value, ok) in enumerate(zip(self.adc_channels.tolist(), adc.tolist(), adc_ok.tolist())):
+                adc_changed[s] = self.deadband.accept((self.busId, self.nodeId, channel), value if ok else None, t)
+            for s, (value, ok) in enumerate(zip(mon.tolist(), mon_ok.tolist())):
+                mon_changed[s] = self.deadband.accept((self.busId, self.nodeId, "mon", s), value if ok else None, t)
+        if self.pipeline is not None:
+            elapsedtime = t - self.mon_time
+            for s in range(len(adc)):
+                ok = bool(adc_ok[s])
+                self.pipeline.put((elapsedtime, self.busId, self.nodeId, int(self.adc_channels[s]),
+                                   int(adc_raw[s]) if ok else None, float(adc[s]) if ok else None))
+        return t, adc, mon, adc_changed, mon_changed
+
+    @pyqtSlot()
+    def stop(self):
+        """Stop the timer and finish [runs in the acquisition thread, use :meth:`request_stop` from the GUI thread]"""
+        if self.timer is not None:
+            self.timer.stop()
+            self.timer = None
         self.finished.emit()
 
+    def request_stop(self):
+        """Thread-safe stop: the signal is queued to the acquisition thread"""
+        self._stopRequested.emit()
+
                
 if __name__ == "__main__":
     pass
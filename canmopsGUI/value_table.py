@@ -0,0 +1,224 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+
+from PyQt5.QtCore    import Qt, QAbstractTableModel, QModelIndex, QTimer
+from PyQt5.QtGui     import QBrush, QColor
+from PyQt5.QtWidgets import QTableView, QStyledItemDelegate, QHeaderView, QAbstractItemView
+from canmops.logger_main import Logger
+import numpy as np
+import logging
+log_call = Logger(name = " Value Table",console_loglevel=logging.INFO, logger_file = False)
+
+# Alarm levels of a cell [see ValueTableModel.set_alarm_limits]
+NORMAL, WARNING, ALARM = 0, 1, 2
+ALARM_ROLE = Qt.UserRole + 1
+
+class ValueTableModel(QAbstractTableModel):
+    """Table of the values of the channels of one device [ADC channels, monitoring values]
+
+    The values are kept in the array :attr:`values` [rows: channels, NaN: no response] and written
+    with :meth:`set_values` [a whole sweep] or :meth:`set_value` [one cell]. The writes only mark the
+    cells as changed; the views are told once per display frame [``fps``] with one ``dataChanged``
+    per run of adjacent changed rows, so a fast acquisition does not repaint faster than the screen
+    and the unchanged cells are not repainted at all. The alarm level of every cell is computed
+    with the value and rendered by :class:`AlarmDelegate`.
+
+    The model lives in the GUI thread: the acquisition hands its sweeps over with a signal
+    [e.g. :attr:`AcquisitionWorker.sweepReady`].
+
+    Parameters
+    ----------
+    labels : :obj:`list` of :obj:`str`
+        Vertical header of the rows [e.g. "Ch12 [V]:"]
+    columns : :obj:`list` of :obj:`str`
+        Horizontal header. Cells which are never written stay empty [e.g. a column of buttons
+        set with :meth:`QTableView.setIndexWidget`]
+    tips, icons : :obj:`list`, optional
+        Status tips and icons of the rows
+    fps : :obj:`int`
+        Maximum number of repaints per s
+    """
+
+    def __init__(self, labels, columns=("Value",), tips=None, icons=None, decimals=3, fps=25, parent=None):
+        super(ValueTableModel, self).__init__(parent)
+        self.labels = list(labels)
+        self.columns = list(columns)
+        self.tips = list(tips) if tips is not None else None
+        self.icons = list(icons) if icons is not None else None
+        self.decimals = decimals
+        shape = (len(self.labels), len(self.columns))
+        self.values = np.full(shape, np.nan)
+        self.levels = np.zeros(shape, dtype=np.int8)
+        self._filled = np.zeros(shape, dtype=bool)
+        self._dirty = np.zeros(shape, dtype=bool)
+        self.high = None
+        self.warning = None
+        self.frames = 0
+        self.updates = 0
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(int(1000 / fps))
+        self._timer.timeout.connect(self.flush)
+
+    # Qt interface
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.labels)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def flags(self, index):
+        return Qt.ItemIsEnabled
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if not self._filled[row, column]:
+            return None
+        if role == Qt.DisplayRole:
+            value = self.values[row, column]
+            return str(None) if np.isnan(value) else str(round(float(value), self.decimals))
+        if role == ALARM_ROLE:
+            return int(self.levels[row, column])
+        if role == Qt.UserRole:
+            return float(self.values[row, column])
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal:
+            return self.columns[section] if role == Qt.DisplayRole else None
+        if role == Qt.DisplayRole:
+            return self.labels[section]
+        if role == Qt.DecorationRole and self.icons is not None:
+            return self.icons[section]
+        if role in (Qt.StatusTipRole, Qt.ToolTipRole) and self.tips is not None:
+            return self.tips[section]
+        return None
+
+    # Values
+    def set_alarm_limits(self, high=None, warning=None):
+        """Values >= high are an alarm [red], values inside the band warning = (low, high) a warning [yellow]"""
+        if (high, warning) == (self.high, self.warning):
+            return
+        self.high = high
+        self.warning = warning
+        self.levels[...] = self._levels(self.values)
+        self._mark(self._filled)
+
+    def _levels(self, values):
+        levels = np.zeros(values.shape, dtype=np.int8)
+        if self.warning is not None:
+            levels[(values >= self.warning[0]) & (values <= self.warning[1])] = WARNING
+        if self.high is not None:
+            levels[values >= self.high] = ALARM
+        return levels
+
+    def set_values(self, values, changed=None, column=0):
+        """Write the values of the rows of one column [None or NaN: no response]
+
+        ``changed`` selects the rows to write [e.g. the samples which passed the deadband],
+        by default the rows whose value differs from the one shown.
+        """
+        values = np.asarray(values, dtype=float)[:len(self.labels)]
+        rows = slice(0, len(values))
+        old = self.values[rows, column]
+        if changed is None:
+            changed = ~((values == old) | (np.isnan(values) & np.isnan(old))) | ~self._filled[rows, column]
+        else:
+            changed = np.asarray(changed, dtype=bool)[:len(values)]
+        if not changed.any():
+            return
+        self.values[rows, column][changed] = values[changed]
+        self.levels[rows, column][changed] = self._levels(values[changed])
+        self._filled[rows, column][changed] = True
+        self._dirty[rows, column][changed] = True
+        self._schedule()
+
+    def set_value(self, row, value, column=0):
+        """Write the value of one cell [None: no response]"""
+        value = np.nan if value is None else float(value)
+        self.values[row, column] = value
+        self.levels[row, column] = self._levels(np.array(value))
+        self._filled[row, column] = True
+        self._dirty[row, column] = True
+        self._schedule()
+
+    def clear(self):
+        """Empty all the cells [e.g. when the acquisition is restarted]"""
+        self.values[...] = np.nan
+        self.levels[...] = NORMAL
+        self._mark(self._filled)
+        self._filled[...] = False
+
+    def alarm_level(self):
+        """Highest alarm level of the cells [NORMAL, WARNING or ALARM]"""
+        return int(self.levels.max()) if self.levels.size else NORMAL
+
+    # Repaint
+    def _mark(self, cells):
+        self._dirty |= cells
+        self._schedule()
+
+    def _schedule(self):
+        self.updates += 1
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        """Tell the views about the cells changed since the last frame, one ``dataChanged`` per run of rows"""
+        dirty = self._dirty
+        rows = np.flatnonzero(dirty.any(axis=1))
+        if rows.size == 0:
+            return
+        roles = [Qt.DisplayRole, ALARM_ROLE]
+        for run in np.split(rows, np.flatnonzero(np.diff(rows) > 1) + 1):
+            columns = np.flatnonzero(dirty[run].any(axis=0))
+            self.dataChanged.emit(self.index(int(run[0]), int(columns[0])),
+                                  self.index(int(run[-1]), int(columns[-1])), roles)
+        dirty[...] = False
+        self.frames += 1
+
+class AlarmDelegate(QStyledItemDelegate):
+    """Paints the background of a cell by its alarm level [see :meth:`ValueTableModel.set_alarm_limits`]"""
+
+    colors = {WARNING: QColor("yellow"), ALARM: QColor("red")}
+
+    def initStyleOption(self, option, index):
+        super(AlarmDelegate, self).initStyleOption(option, index)
+        color = self.colors.get(index.data(ALARM_ROLE))
+        if color is not None:
+            option.backgroundBrush = QBrush(color)
+
+class ValueTableView(QTableView):
+    """Read-only view of a :class:`ValueTableModel` with the alarm colours of :class:`AlarmDelegate`
+
+    Parameters
+    ----------
+    rows : :obj:`range`, optional
+        Rows to show [several views can share one model, e.g. the two halves of the ADC channels]
+    """
+
+    def __init__(self, model, rows=None, row_height=22, parent=None):
+        super(ValueTableView, self).__init__(parent)
+        self.setModel(model)
+        self.setItemDelegate(AlarmDelegate(self))
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setFocusPolicy(Qt.NoFocus)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setStyleSheet("background-color: white; border: 1px inset black;")
+        self.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.verticalHeader().setDefaultSectionSize(row_height)
+        if rows is not None:
+            for row in range(model.rowCount()):
+                self.setRowHidden(row, row not in rows)
@@ -11,6 +11,7 @@ import asyncio
 import logging
 from logging import Logger
 from canmops.mopshubCrate import MopsHubCrate
+from canmops.deadband import DeadbandFilter
 import numpy as np
 #python CANMOPS_opcuaserver.py start config/config.yaml
 async def main(config_file, endpoint, namespace):
@@ -18,12 +19,15 @@ async def main(config_file, endpoint, namespace):
     mobshub_crate = MopsHubCrate(endpoint=endpoint, namespace=namespace)
     _logger.info('Starting server!')
     await mobshub_crate.init(config_file)
+    # Unchanged values are not written to the nodes again, a heartbeat refreshes them
+    deadband = DeadbandFilter(heartbeat=10.0)
     async with mobshub_crate:
         while True:
             # The main CAN + SPI loop goes here!
             #cic_index [Bus] , mops_index [Node], channel_index, ADC_value
             for a in np.arange(0,32):
-                await mobshub_crate.write_adc(3, 0, 31, a)
+                if deadband.accept((3, 0, 31), a):
+                    await mobshub_crate.write_adc(3, 0, 31, a)
             await asyncio.sleep(0.1)
 
 
@@ -87,7 +87,7 @@ async def test_can_wrapper():
     #
 
     #Example (2): write/read SDO message [For Developers]
-    # VendorId_sync = await wrapper.read_sdo_can_sync(nodeId=NodeIds[0], 
+    # VendorId_sync = wrapper.read_sdo_can_sync(nodeId=NodeIds[0], 
     #                                                index=0x1000,
     #                                                subindex=0,
     #                                                SDO_TX=SDO_TX,
@@ -23,11 +23,12 @@ import yaml
 import logging
 import sys
 #try:
-from canmopsGUI          import menu_window, mops_child_window,data_monitoring
+from canmopsGUI          import menu_window, mops_child_window,data_monitoring, value_table
 from canmops.analysis       import Analysis
 from canmops.logger_main    import Logger 
 from canmops.analysis_utils  import AnalysisUtils
 from canmops.can_wrapper_main     import CanWrapper
+from canmops.deadband       import DeadbandFilter
     #from canmops.mops_readout_thread import READMops
 #except:
 #    pass
@@ -73,7 +74,13 @@ class mopshubWindow(QWidget):
         conf = AnalysisUtils().open_yaml_file(file=config_yaml, directory=lib_dir)
         mops_child = mops_child_window.MopsChildWindow()
         deviceName, version, icon_dir,nodeIds, self.__dictionary_items, self.__adc_channels_reg,\
-        self.__adc_index, self.__chipId, self.__index_items, self.__conf_index, self.__mon_index, self.__resistor_ratio, self.__ref_voltage   = mops_child.configure_devices(conf)       
+        self.__adc_index, self.__chipId, self.__index_items, self.__conf_index, self.__mon_index, self.__resistor_ratio, _, _, _, self.__ref_voltage   = mops_child.configure_devices(conf)       
+        self.__object_dictionary = mops_child.get_object_dictionary()
+        # Only the changed values are shown, all of them are saved [deadband section of the device yaml file]
+        _dev = self.__object_dictionary.dev
+        self.__deadband = DeadbandFilter.from_config(_dev) if _dev.get("deadband", None) else None
+        # ADC lookup tables [see AdcConverter]
+        self.__adc_converter = self.__object_dictionary.converter(ref_voltage=float(self.__ref_voltage), resistor_ratio=float(self.__resistor_ratio))
     
     def initiate_adc_timer(self, period=None,cic=None, mops=None, port=None):
         '''
@@ -97,58 +104,42 @@ class mopshubWindow(QWidget):
 
     def update_mopshub_adc_channels(self,c,b,m):
         #gc.collect() 
-        _dictionary = self.__dictionary_items
-        _adc_indices = list(self.__adc_index)
-        _adc_channels_reg = self.mainWindow.get_adc_channels_reg()
         self.csv_writer = csv.writer(self.out_file_csv[c][b][m])
         #data_point = [0] * 33
-        for i in np.arange(len(_adc_indices)):
-            _subIndexItems = list(AnalysisUtils().get_subindex_yaml(dictionary=_dictionary, index=_adc_indices[i], subindex="subindex_items"))
-            self.mainWindow.set_index(_adc_indices[i]) 
+        for group in self.__object_dictionary.adc:
+            self.mainWindow.set_index(group.index_key) 
             #adc_converted = []
-            _start_a = 3  # to ignore the first subindex it is not ADC
-            for subindex in np.arange(_start_a, len(_subIndexItems) + _start_a - 1):
-                s = subindex - _start_a
-                s_correction = subindex - 2
-                self.mainWindow.set_subIndex(_subIndexItems[s_correction])
+            # subindex is the ADC channel [OD subindex + 2]
+            for s, (_subIndex, subindex) in enumerate(zip(group.subindices, group.channels)):
+                self.mainWindow.set_subIndex(group.subindex_keys[s])
                 # read SDO UHAL messages
                 #data_point, reqmsg, requestreg, respmsg,responsereg , status = self.read_sdo_uhal(c,b,m) #np.random.randint(0,100)     
-                data_point =  self.mainWindow.read_sdo_can()  # _thread(print_sdo=False) #
+                data_point =  self.mainWindow.read_sdo_can(index=group.index, subindex=int(_subIndex))  # _thread(print_sdo=False) #
                 reqmsg, requestreg, respmsg,responsereg , status = None, None,None,None
                 #data_point = "(c%s|b%s|m%s|s%s)"%(c,b,m,s)   
                 ts = time.time()
                 adc_converted = None
                 if data_point is not None: 
-                    adc_converted = Analysis().adc_conversion(_adc_channels_reg[str(subindex)], 
-                                                                               data_point, 
-                                                                               int(self.__resistor_ratio),
-                                                                               int(self.__ref_voltage))                   
-                    self.channelValueBox[c][b][m][s].setText(str(round(adc_converted, 3)))   
+                    adc_converted = self.__adc_converter.convert_one(subindex, data_point)
+                # The deadband only limits the repaints, every sample is saved
+                changed = self.__deadband is None or self.__deadband.accept((c, b, m, subindex), adc_converted, ts)
+                if changed:
+                    self.channelValueBox[c][b][m].set_value(s, adc_converted)
+                if changed and adc_converted is not None:
                     #self.status_x, self.status_y = self.DataMonitoring.update_communication_status(req =int(reqmsg),res =int(respmsg), graphWidget = self.statusGraphWidget)
                     #if len(self.status_x)>= 20: self.DataMonitoring.reset_status_data_holder(req =int(reqmsg),res =int(respmsg),graphWidget = self.statusGraphWidget) 
                     if self.trendingBox[c][b][m][s] == True:
                         if len(self.x[s]) >= 20:# Monitor a window of 100 points is enough to avoid Memory issues 
                             self.DataMonitoring.reset_data_holder(adc_converted,s) 
                         self.DataMonitoring.update_figure(data=adc_converted, subindex=subindex, graphWidget = self.graphWidget[s])
-                    #This will be used later for limits 
-                    if adc_converted >=1.5:
-                        self.update_alarm_limits(high=True, low=None, normal=None, object=self.channelValueBox[c][b][m][s]) 
-                        self.update_alarm_status(on=False, off=True, warning=False, button=self.mops_alarm_led[c][b][m],button_type = "Movie")
-                    elif (adc_converted >=0.025 and adc_converted <=0.1):
-                        self.update_alarm_limits(high=None, low=True, normal=None, object=self.channelValueBox[c][b][m][s])
-                        self.update_alarm_status(on=False, off=False, warning=True, button=self.mops_alarm_led[c][b][m],button_type = "Movie")
-                    else:
-                        self.channelValueBox[c][b][m][s].setStyleSheet("color: black;")
-                        self.update_alarm_status(on=True, off=False, warning=False, button=self.mops_alarm_led[c][b][m],button_type = "Movie")               
-                else: self.channelValueBox[c][b][m][s].setText(str(adc_converted))
                 elapsedtime = ts - self.__mon_time
                 self.csv_writer.writerow((str(elapsedtime),
                                      str(1),
                                      str(b),
                                      str(self.get_nodeId(c, b, m)),
                                      str(str(subindex)),
-                                     str(_adc_indices[i]),
-                                     str(_subIndexItems[s_correction]),
+                                     str(group.index_key),
+                                     str(group.subindex_keys[s]),
                                      str(data_point),
                                      str(adc_converted),
                                      str(reqmsg),
@@ -156,6 +147,7 @@ class mopshubWindow(QWidget):
                                      str(respmsg),
                                      str(responsereg), 
                                      status))                                    
+            self.update_mops_alarm_led(c,b,m)
             self.update_mopshub_configuration_values(c,b,m)
             self.update_mopshub_monitoring_values(c,b,m)
             
@@ -165,14 +157,11 @@ class mopshubWindow(QWidget):
          update the confValueBox in configuration_values_window.
         The calling function is initiate_adc_timer.
         ''' 
-        _dictionary = self.__dictionary_items
-        _conf_indices = list(self.__conf_index)                     
         a = 0 
-        for i in np.arange(len(_conf_indices)):
-            _subIndexItems = list(AnalysisUtils().get_subindex_yaml(dictionary=_dictionary, index=_conf_indices[i], subindex="subindex_items"))
-            self.set_index(_conf_indices[i])  # set index for later usage
-            for s in np.arange(0, len(_subIndexItems)):
-                self.set_subIndex(_subIndexItems[s])
+        for group in self.__object_dictionary.conf:
+            self.set_index(group.index_key)  # set index for later usage
+            for s in np.arange(0, len(group.subindices)):
+                self.set_subIndex(group.subindex_keys[s])
                 conf_adc_value , _, _, _,_ , _ = self.read_sdo_uhal(c,b,m) #np.random.randint(0,100)
                 #conf_adc_value= np.random.randint(0,100) #
                 self.confValueBox[c][b][m][a].setText(str(conf_adc_value))      
@@ -185,17 +174,14 @@ class mopshubWindow(QWidget):
          update the monValueBox in monitoring_values_window.
         The calling function is initiate_adc_timer.
         ''' 
-        _dictionary = self.__dictionary_items                
-        _mon_indices = list(self.__mon_index)    
         a = 0
-        for i in np.arange(len(_mon_indices)):
-            self.set_index(_mon_indices[i])  # set index for later usage
-            _subIndexItems = list(AnalysisUtils().get_subindex_yaml(dictionary=_dictionary, index=_mon_indices[i], subindex="subindex_items"))
-            for s in np.arange(0, len(_subIndexItems)):
-                self.set_subIndex(_subIndexItems[s])
+        for group in self.__object_dictionary.mon:
+            self.set_index(group.index_key)  # set index for later usage
+            for s in np.arange(0, len(group.subindices)):
+                self.set_subIndex(group.subindex_keys[s])
                 mon_adc_value , _, _, _,_ , _ = self.read_sdo_uhal(c,b,m) #
                 #mon_adc_value = np.random.randint(0,100)
-                self.monValueBox[c][b][m][a].setText(str(mon_adc_value))
+                self.monValueBox[c][b][m].set_value(a, mon_adc_value)
                 a = a + 1  
                 #time.sleep(self.__timeout) 
 
@@ -294,6 +280,7 @@ class mopshubWindow(QWidget):
         
         self.mopsBotton         = [[[k  for k  in np.arange(mops_num)]] * bus_num] * cic_num
         self.mops_alarm_led     = [[[m  for m  in np.arange(mops_num)]] * bus_num] * cic_num     
+        self.mops_alarm_level   = {}
         # Prepare a log window
         self.textOutputWindow()        
 
@@ -552,6 +539,7 @@ class mopshubWindow(QWidget):
                                                                                                        mops=mops, 
                                                                                                        port=port, 
                                                                                                        mainWindow = self)
+        self.channelValueBox[int(cic)][int(port)][int(mops)].set_alarm_limits(high=1.5, warning=(0.025, 0.1))
         self.graphWidget = self.DataMonitoring.initiate_trending_figure(n_channels=adc_channels_num)    
         self.initiate_adc_timer(period = 1000, cic=cic, mops=mops, port=port)
         deviceWindow.show()
@@ -632,6 +620,18 @@ class mopshubWindow(QWidget):
                     if adc_value <= 5 : self.update_alarm_limits(low=True, object=self.adc_text_box[c][b][ch]) 
                     else: self.update_alarm_limits(normal=True, object=self.adc_text_box[c][b][ch])
 
+    def update_mops_alarm_led(self, c, b, m):
+        '''
+        The function will show the highest alarm level of the ADC value table of a MOPS on its alarm LED.
+        The LED is only replaced if the level changed.
+        '''
+        level = self.channelValueBox[c][b][m].alarm_level()
+        if self.mops_alarm_level.get((c, b, m)) == level:
+            return
+        self.mops_alarm_level[(c, b, m)] = level
+        self.update_alarm_status(on=level == value_table.NORMAL, off=level == value_table.ALARM, warning=level == value_table.WARNING,
+                                 button=self.mops_alarm_led[c][b][m], button_type = "Movie")
+
     def update_alarm_limits(self, high=None, low=None, normal=None, object=None):
         if high:   object.setStyleSheet(" background-color: red;")
         if low :   object.setStyleSheet(" background-color: yellow;")
@@ -701,18 +701,17 @@ class mopshubWindow(QWidget):
 
         
     def update_mopshub_adc_channels_random(self,c,b,m):
-        _dictionary = self.__dictionary_items
-        _adc_indices = list(self.__adc_index)
         self.csv_writer = csv.writer(self.out_file_csv[c][b][m])
-        
-        for i in np.arange(len(_adc_indices)):
-            _subIndexItems = list(AnalysisUtils().get_subindex_yaml(dictionary=_dictionary, index=_adc_indices[i], subindex="subindex_items"))
-            _start_a = 3  # to ignore the first subindex it is not ADC
-            for subindex in np.arange(_start_a, len(_subIndexItems) + _start_a - 1):
-                s = subindex - _start_a
+        self.channelValueBox[c][b][m].set_alarm_limits(high=95, warning=(50, 80))
+        self.monValueBox[c][b][m].set_alarm_limits(high=95)
+        for group in self.__object_dictionary.adc:
+            # subindex is the ADC channel [OD subindex + 2]
+            data_points = np.random.randint(0, 100, len(group.channels))
+            self.channelValueBox[c][b][m].set_values(data_points)
+            for s, subindex in enumerate(group.channels):
                 ts = time.time()
                 elapsedtime = ts -  self.__mon_time
-                data_point = np.random.randint(0,100)     
+                data_point = data_points[s]
                 #data_point = "(c%s|b%s|m%s|s%s)"%(c,b,m,s)   
                 self.csv_writer.writerow((str(round(elapsedtime, 1)),
                                      str(0),
@@ -720,27 +719,15 @@ class mopshubWindow(QWidget):
                                      str(subindex),
                                      str(data_point),
                                      str(round(data_point, 3)))) 
-                self.channelValueBox[c][b][m][s].setText(str(data_point))   
                 if self.trendingBox[c][b][m][s] == True:
                     if len(self.x[s]) >= 20:# Monitor a window of 100 points is enough to avoid Memory issues 
                         self.DataMonitoring.reset_data_holder(data_point,s) 
                     self.DataMonitoring.update_figure(data=data_point, subindex=subindex, graphWidget = self.graphWidget[s])
-            #This will be used later for limits 
-            if data_point >=95:
-                self.update_alarm_limits(high=True, low=None, normal=None, object=self.channelValueBox[c][b][m][s]) 
-                self.update_alarm_status(on=False, off=True, warning=False, button=self.mops_alarm_led[c][b][m],button_type = "Movie")
-            elif (data_point >=50 and data_point <=80):
-                self.update_alarm_limits(high=None, low=True, normal=None, object=self.channelValueBox[c][b][m][s])
-                self.update_alarm_status(on=False, off=False, warning=True, button=self.mops_alarm_led[c][b][m],button_type = "Movie")
-            else:
-                self.channelValueBox[c][b][m][s].setStyleSheet("color: black;")
-                self.update_alarm_status(on=True, off=False, warning=False, button=self.mops_alarm_led[c][b][m],button_type = "Movie")
+            self.update_mops_alarm_led(c,b,m)
          
-        _conf_indices = list(self.__conf_index)                      
         a = 0 
-        for i in np.arange(len(_conf_indices)):
-            _subIndexItems = list(AnalysisUtils().get_subindex_yaml(dictionary=_dictionary, index=_conf_indices[i], subindex="subindex_items"))
-            for s in np.arange(0, len(_subIndexItems)):
+        for group in self.__object_dictionary.conf:
+            for s in np.arange(0, len(group.subindices)):
                 adc_value = np.random.randint(0,100)
                 self.confValueBox[c][b][m][a].setText(str(adc_value))      
                 if adc_value <=95:
@@ -749,18 +736,10 @@ class mopshubWindow(QWidget):
                     self.confValueBox[c][b][m][a].setStyleSheet(" background-color: red;")
                 a = a + 1    
         
-        _mon_indices = list(self.__mon_index)    
-        a = 0
-        for i in np.arange(len(_mon_indices)):
-            _subIndexItems = list(AnalysisUtils().get_subindex_yaml(dictionary=_dictionary, index=_mon_indices[i], subindex="subindex_items"))
-            for s in np.arange(0, len(_subIndexItems)):
-                adc_value = np.random.randint(0,100)
-                self.monValueBox[c][b][m][a].setText(str(adc_value))
-                if adc_value <=95:
-                    self.monValueBox[c][b][m][a].setStyleSheet("color: black;")
-                else:
-                    self.monValueBox[c][b][m][a].setStyleSheet(" background-color: red;")
-                a = a + 1   
+        mon_values = []
+        for group in self.__object_dictionary.mon:
+            mon_values.extend(np.random.randint(0, 100, len(group.subindices)))
+        self.monValueBox[c][b][m].set_values(mon_values)
   
         
     def show_trendWindow(self,c,b,m):
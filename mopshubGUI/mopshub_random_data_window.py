@@ -22,7 +22,7 @@ import yaml
 import logging
 import sys
 try:
-    from canmopsGUI          import menu_window, mops_child_window, data_monitoring
+    from canmopsGUI          import menu_window, mops_child_window, data_monitoring, value_table
     from canmops.analysis       import Analysis
     from canmops.logger_main    import Logger 
     from canmops.analysis_utils  import AnalysisUtils
@@ -69,6 +69,7 @@ class mopshubWindow(QWidget):
         mops_child = mops_child_window.MopsChildWindow()
         deviceName, version, icon_dir,nodeIds, self.__dictionary_items, self.__adc_channels_reg,\
         self.__adc_index, self.__chipId, self.__index_items, self.__conf_index, self.__mon_index, self.__resistor_ratio, self.__refresh_rate, self.__ref_voltage   = mops_child.configure_devices(conf)       
+        self.__object_dictionary = mops_child.get_object_dictionary()
     
     def initiate_adc_timer(self, period=None,cic=None, mops=None, port=None):
         '''
@@ -163,6 +164,7 @@ class mopshubWindow(QWidget):
         self.confValueBox= [[[ch for ch in np.arange(mops_num)]] * bus_num] * cic_num
         
         self.mops_alarm_led     = [[[m for m in np.arange(mops_num)]] * bus_num] * cic_num   
+        self.mops_alarm_level   = {}
               
         cic_row_len = int(cic_num / 2)
         for c in np.arange(cic_num):
@@ -397,6 +399,8 @@ class mopshubWindow(QWidget):
                                                                                                                                                    mops=mops, 
                                                                                                                                                    port=port, 
                                                                                                                                                    mainWindow = self)
+        self.channelValueBox[int(cic)][int(port)][int(mops)].set_alarm_limits(high=95, warning=(50, 80))
+        self.monValueBox[int(cic)][int(port)][int(mops)].set_alarm_limits(high=95)
         self.graphWidget = self.DataMonitoring.initiate_trending_figure(n_channels=adc_channels_num)    
         self.initiate_adc_timer(period = 500, cic=cic, mops=mops, port=port)
         deviceWindow.show()
@@ -477,6 +481,18 @@ class mopshubWindow(QWidget):
                     else:
                         self.update_alarm_limits(normal=True, object=self.adc_text_box[c][b][ch])
 
+    def update_mops_alarm_led(self, c, b, m):
+        '''
+        The function will show the highest alarm level of the ADC value table of a MOPS on its alarm LED.
+        The LED is only replaced if the level changed.
+        '''
+        level = self.channelValueBox[c][b][m].alarm_level()
+        if self.mops_alarm_level.get((c, b, m)) == level:
+            return
+        self.mops_alarm_level[(c, b, m)] = level
+        self.update_alarm_status(on=level == value_table.NORMAL, off=level == value_table.ALARM, warning=level == value_table.WARNING,
+                                 button=self.mops_alarm_led[c][b][m], button_type = "Movie")
+
     def update_alarm_limits(self, high=None, low=None, normal=None, object=None):
         if high:
             object.setStyleSheet(" background-color: red;")
@@ -547,37 +563,23 @@ class mopshubWindow(QWidget):
 
         
     def read_adc_channels(self,c,b,m):
-        _dictionary = self.__dictionary_items
-        _adc_indices = list(self.__adc_index)
-        for i in np.arange(len(_adc_indices)):
-            _subIndexItems = list(AnalysisUtils().get_subindex_yaml(dictionary=_dictionary, index=_adc_indices[i], subindex="subindex_items"))
-            _start_a = 3  # to ignore the first subindex it is not ADC
-            
-            for subindex in np.arange(_start_a, len(_subIndexItems) + _start_a - 1):
-                s = subindex - _start_a
-                adc_value = np.random.randint(0,100)     
+        # The groups of the compiled object dictionary [the first subindex of the ADC index is not an ADC channel]
+        _od = self.__object_dictionary
+        for group in _od.adc:
+            adc_values = np.random.randint(0, 100, len(group.subindices))
+            self.channelValueBox[c][b][m].set_values(adc_values)
+            for s, subindex in enumerate(group.channels):
+                adc_value = adc_values[s]
                 #adc_value = "(c%s|b%s|m%s|s%s)"%(c,b,m,s)     
-                self.channelValueBox[c][b][m][s].setText(str(adc_value))   
                 if self.trendingBox[c][b][m][s] == True:
                     if len(self.x[s]) >= 10:# Monitor a window of 100 points is enough to avoid Memory issues 
                         self.DataMonitoring.reset_data_holder(adc_value,s) 
                     self.DataMonitoring.update_figure(data=adc_value, subindex=subindex, graphWidget = self.graphWidget[s])     
-            #This will be used later for limits 
-            if adc_value >=95:
-                self.update_alarm_limits(high=True, low=None, normal=None, object=self.channelValueBox[c][b][m][s]) 
-                self.update_alarm_status(on=False, off=True, warning=False, button=self.mops_alarm_led[c][b][m],button_type = "Movie")
-            elif (adc_value >=50 and adc_value <=80):
-                self.update_alarm_limits(high=None, low=True, normal=None, object=self.channelValueBox[c][b][m][s])
-                self.update_alarm_status(on=False, off=False, warning=True, button=self.mops_alarm_led[c][b][m],button_type = "Movie")
-            else:
-                self.channelValueBox[c][b][m][s].setStyleSheet("color: black;")
-                self.update_alarm_status(on=True, off=False, warning=False, button=self.mops_alarm_led[c][b][m],button_type = "Movie")
+            self.update_mops_alarm_led(c,b,m)
          
-        _conf_indices = list(self.__conf_index)                      
         a = 0 
-        for i in np.arange(len(_conf_indices)):
-            _subIndexItems = list(AnalysisUtils().get_subindex_yaml(dictionary=_dictionary, index=_conf_indices[i], subindex="subindex_items"))
-            for s in np.arange(0, len(_subIndexItems)):
+        for group in _od.conf:
+            for s in np.arange(0, len(group.subindices)):
                 adc_value = np.random.randint(0,100)
                 self.confValueBox[c][b][m][a].setText(str(adc_value))      
                 if adc_value <=95:
@@ -586,18 +588,10 @@ class mopshubWindow(QWidget):
                     self.confValueBox[c][b][m][a].setStyleSheet(" background-color: red;")
                 a = a + 1    
         
-        _mon_indices = list(self.__mon_index)    
-        a = 0
-        for i in np.arange(len(_mon_indices)):
-            _subIndexItems = list(AnalysisUtils().get_subindex_yaml(dictionary=_dictionary, index=_mon_indices[i], subindex="subindex_items"))
-            for s in np.arange(0, len(_subIndexItems)):
-                adc_value = np.random.randint(0,100)
-                self.monValueBox[c][b][m][a].setText(str(adc_value))
-                if adc_value <=95:
-                    self.monValueBox[c][b][m][a].setStyleSheet("color: black;")
-                else:
-                    self.monValueBox[c][b][m][a].setStyleSheet(" background-color: red;")
-                a = a + 1   
+        mon_values = []
+        for group in _od.mon:
+            mon_values.extend(np.random.randint(0, 100, len(group.subindices)))
+        self.monValueBox[c][b][m].set_values(mon_values)
   
         
     def show_trendWindow(self,c,b,m):
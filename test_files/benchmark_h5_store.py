@@ -0,0 +1,64 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+# Compare the sustained write rate and the file size of the CSV output
+# [one writerow + flush per sample as in read_adc_channels] with the H5Store
+# at crate scale [32 buses x 2 nodes x 32 ADC channels per sweep]
+import os
+import sys
+import time
+import csv
+import tempfile
+import numpy as np
+rootdir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, rootdir[:-11])
+from canmops.h5_store import H5Store, read_table
+
+n_buses, n_nodes, n_channels = 32, 2, 32
+n_sweeps = 200
+
+def sweeps():
+    rng = np.random.default_rng(1)
+    for i in range(n_sweeps):
+        raw = rng.integers(1500, 2500, size=(n_buses, n_nodes, n_channels))
+        yield i * 0.5, raw, raw * 0.000205
+
+def write_csv(filename):
+    with open(filename, "w") as out_file_csv:
+        csv_writer = csv.writer(out_file_csv)
+        csv_writer.writerow(['time', 'bus_id', "nodeId", "adc_ch", "adc_data", "adc_data_converted"])
+        for ts, raw, value in sweeps():
+            for b in range(n_buses):
+                for n in range(n_nodes):
+                    for c in range(n_channels):
+                        csv_writer.writerow((str(ts), str(b), str(n + 1), str(c + 3), str(raw[b, n, c]), str(round(value[b, n, c], 3))))
+                        out_file_csv.flush()
+
+def write_h5(filename, complib):
+    channels = np.arange(3, 3 + n_channels)
+    with H5Store(filename, complib=complib) as h5_store:
+        for ts, raw, value in sweeps():
+            for b in range(n_buses):
+                for n in range(n_nodes):
+                    h5_store.append(b, n + 1, ts, channels, raw[b, n], value[b, n])
+
+def run(name, function, filename, *args):
+    t0 = time.perf_counter()
+    function(filename, *args)
+    dt = time.perf_counter() - t0
+    rows = n_sweeps * n_buses * n_nodes * n_channels
+    print(f"{name:<18} {rows / dt:>12.0f} rows/s {os.path.getsize(filename) / 1e6:>8.2f} MB")
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{n_sweeps} sweeps of {n_buses * n_nodes * n_channels} samples")
+        run("CSV", write_csv, os.path.join(directory, "adc.csv"))
+        for complib in ["blosc:lz4", "blosc:zstd", "zlib"]:
+            run(f"HDF5 {complib}", write_h5, os.path.join(directory, f"adc_{complib.replace(':', '_')}.h5"), complib)
+        data = read_table(os.path.join(directory, "adc_blosc_lz4.h5"), bus=3, node=1, condition="channel == 5")
+        print(f"Read back bus 3 node 1 channel 5: {len(data)} rows")
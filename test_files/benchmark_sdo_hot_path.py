@@ -0,0 +1,74 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+# Per-request cost of CanWrapper.read_sdo_can against the MOPS simulator [no response delay]:
+# sequential requests without and with the request/response registers [computed on access],
+# concurrent requests to many nodes submitted with read_sdo_can_future.
+# python benchmark_sdo_hot_path.py                       [python-can in-process bus]
+# python benchmark_sdo_hot_path.py --latency 0.005       [5 ms response time per request]
+import os
+import sys
+import time
+import argparse
+import numpy as np
+rootdir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, rootdir[:-11])
+from canmops.can_wrapper_main import CanWrapper
+from canmops.mops_simulator import MopsSimulator
+from canmops.sdo_engine import SDO_OK
+
+def bench_sequential(wrapper, nodeId, index, subindex, n, registers=False):
+    async def _run():
+        seconds = []
+        for _ in range(n):
+            t = time.perf_counter()
+            result = await wrapper.read_sdo_can(nodeId=nodeId, index=index, subindex=subindex)
+            if registers:
+                tuple(result)
+            seconds.append(time.perf_counter() - t)
+            assert result.status == SDO_OK, result
+        return seconds
+    return np.asarray(wrapper.run_coroutine_sync(_run(), timeout=n))
+
+def bench_concurrent(wrapper, nodeIds, index, subindex, n):
+    seconds = []
+    for _ in range(n):
+        t = time.perf_counter()
+        futures = [wrapper.read_sdo_can_future(nodeId=nodeId, index=index, subindex=subindex) for nodeId in nodeIds]
+        results = [future.result(5) for future in futures]
+        seconds.append(time.perf_counter() - t)
+        assert all(result.status == SDO_OK for result in results)
+    return np.asarray(seconds)
+
+def report(name, seconds, requests=1):
+    print(f"{name:<36} p50 {np.median(seconds) / requests * 1e6:>9.1f} us/request "
+          f"p99 {np.percentile(seconds, 99) / requests * 1e6:>9.1f} us/request")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="SDO hot path benchmark of CanWrapper.read_sdo_can")
+    parser.add_argument("--channel", type=int, default=11, help="Channel of the in-process virtual bus")
+    parser.add_argument("--nodes", type=int, default=16, help="Number of simulated nodes")
+    parser.add_argument("--n", type=int, default=2000, help="Number of requests per measurement")
+    parser.add_argument("--latency", type=float, default=0.0, help="Response time of the simulated nodes in s")
+    args = parser.parse_args()
+    nodeIds = list(range(1, args.nodes + 1))
+    index, subindex = 0x2400, 5
+    simulator = MopsSimulator(interface="virtual_bus", channel=args.channel, latency=args.latency, seed=1)
+    simulator.populate(nodeIds)
+    simulator.start()
+    wrapper = CanWrapper(interface="virtual_bus", channel=args.channel, bitrate=125000, console_loglevel="WARNING")
+    try:
+        # Warm up the frame cache and the adaptive timeouts
+        bench_sequential(wrapper, nodeIds[0], index, subindex, 50)
+        report("read_sdo_can", bench_sequential(wrapper, nodeIds[0], index, subindex, args.n))
+        report("read_sdo_can + registers", bench_sequential(wrapper, nodeIds[0], index, subindex, args.n, registers=True))
+        report(f"read_sdo_can_future x {len(nodeIds)} nodes",
+               bench_concurrent(wrapper, nodeIds, index, subindex, max(args.n // len(nodeIds), 1)), requests=len(nodeIds))
+    finally:
+        wrapper.stop()
+        simulator.stop()
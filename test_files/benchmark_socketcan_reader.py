@@ -0,0 +1,98 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+# Latency and CPU use of the SocketCAN receive thread for SDO-like request/response pairs:
+# the former busy-poll [recv(0.0) in a loop, one request at a time] against READSocketcan
+# blocking on the socket with many outstanding requests.
+# python benchmark_socketcan_reader.py --interface socketcan --channel vcan0   [needs a vcan interface]
+# python benchmark_socketcan_reader.py                                        [python-can virtual bus]
+import os
+import sys
+import time
+import argparse
+import threading
+import can
+import numpy as np
+rootdir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, rootdir[:-11])
+from canmops.can_thread_reader import READSocketcan
+
+def responder(interface, channel, stop, delay):
+    """Answer every request 0x600 + nodeId with 0x580 + nodeId after delay s"""
+    bus = can.Bus(interface=interface, channel=channel)
+    while not stop.is_set():
+        msg = bus.recv(0.05)
+        if msg is None or not 0x600 <= msg.arbitration_id < 0x680:
+            continue
+        if delay: time.sleep(delay)
+        d = msg.data
+        bus.send(can.Message(arbitration_id=msg.arbitration_id - 0x80, data=[0x4b, d[1], d[2], d[3], 1, 0, 0, 0], is_extended_id=False))
+    bus.shutdown()
+
+def request(nodeId, subindex):
+    return can.Message(arbitration_id=0x600 + nodeId, data=[0x40, 0x00, 0x24, subindex, 0, 0, 0, 0], is_extended_id=False)
+
+def busy_poll(bus, cobid, subindex, read_timeout=2.0):
+    """The former READSocketcan loop"""
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < read_timeout:
+        msg = bus.recv(0.0)
+        if msg is not None and msg.data[3] == subindex and not msg.is_error_frame and msg.arbitration_id == cobid:
+            return msg
+    return None
+
+def run_legacy(bus, n):
+    latencies = []
+    for i in range(n):
+        subindex = i % 32 + 1
+        t0 = time.perf_counter()
+        bus.send(request(1, subindex))
+        assert busy_poll(bus, 0x581, subindex) is not None
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+def run_reader(reader, bus, n, outstanding):
+    latencies = []
+    for i in range(0, n, outstanding):
+        t0 = time.perf_counter()
+        waiters = []
+        for nodeId in range(1, outstanding + 1):
+            subindex = i % 32 + 1
+            waiters.append(reader.expect(0, 0x580 + nodeId, subindex))
+            bus.send(request(nodeId, subindex))
+        for waiter in waiters:
+            assert waiter.wait(2.0) is not None
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+def measure(name, function, *args):
+    cpu, wall = time.process_time(), time.perf_counter()
+    latencies = np.array(function(*args)) * 1e6
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    print(f"{name:<34} latency median {np.median(latencies):8.1f} us  p99 {np.percentile(latencies, 99):8.1f} us"
+          f"  CPU {100 * cpu / wall:6.1f} % of one core")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--interface", default="virtual")
+    parser.add_argument("--channel", default="bench")
+    parser.add_argument("--n", type=int, default=500)
+    parser.add_argument("--delay", type=float, default=0.002, help="Response time of the node in s")
+    args = parser.parse_args()
+    stop = threading.Event()
+    threading.Thread(target=responder, args=(args.interface, args.channel, stop, args.delay), daemon=True).start()
+    bus = can.Bus(interface=args.interface, channel=args.channel)
+    time.sleep(0.1)
+    measure("busy-poll [1 request]", run_legacy, bus, args.n)
+    reader = READSocketcan(get_bus=lambda channel: bus)
+    reader.start()
+    measure("blocking READSocketcan [1 request]", run_reader, reader, bus, args.n, 1)
+    measure("blocking READSocketcan [8 per batch]", run_reader, reader, bus, args.n, 8)
+    reader.stop()
+    bus.shutdown()
+    stop.set()
@@ -0,0 +1,195 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+# Transport benchmark of CanWrapper against a simulated MOPS responder:
+# single SDO latency, 32 channel sweep [sequential read_sdo_can and read_sdo_batch],
+# crate-scale sweep over many nodes and buses, TX and RX frames/s.
+# The results are written as JSON, --compare prints the ratios to an earlier run.
+# python benchmark_transport.py --output new.json                     [python-can in-process bus]
+# python benchmark_transport.py --interface virtual --channel 0       [needs the vcan0 interface]
+# python benchmark_transport.py --output new.json --compare old.json
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import threading
+import subprocess
+import can
+import numpy as np
+rootdir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, rootdir[:-11])
+from canmops.can_wrapper_main import CanWrapper
+from canmops.can_channel import channel_name
+from canmops.object_dictionary import load_object_dictionary
+
+config_dir = os.path.join(rootdir[:-11], "config_files")
+
+def adc_value(nodeId, subindex, bus):
+    """Value returned by the responder, used to check the readout"""
+    return (nodeId << 12) | (bus << 6) | subindex
+
+class MopsResponder(threading.Thread):
+    """Answer the expedited SDO uploads of the nodes with 0x43 [3 value bytes], echoing the bus byte"""
+
+    def __init__(self, bustype, channel, nodeIds, delay=0.0):
+        threading.Thread.__init__(self, daemon=True)
+        self.bus = can.Bus(interface=bustype, channel=channel)
+        self.nodeIds = set(nodeIds)
+        self.delay = delay
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            msg = self.bus.recv(0.05)
+            if msg is None or not 0x600 < msg.arbitration_id < 0x680:
+                continue
+            nodeId = msg.arbitration_id - 0x600
+            d = msg.data
+            if nodeId not in self.nodeIds or len(d) != 8 or d[0] != 0x40:
+                continue
+            if self.delay:
+                time.sleep(self.delay)
+            value = adc_value(nodeId, d[3], d[7]).to_bytes(3, 'little')
+            self.bus.send(can.Message(arbitration_id=0x580 + nodeId, data=[0x43, d[1], d[2], d[3], *value, d[7]],
+                                      is_extended_id=False))
+
+    def flood(self, n, cobid=0x181):
+        """Send n frames as fast as possible"""
+        msg = can.Message(arbitration_id=cobid, data=[0, 1, 2, 3, 4, 5, 6, 7], is_extended_id=False)
+        for _ in range(n):
+            self.bus.send(msg)
+
+    def stop(self):
+        self.stop_event.set()
+        self.join(1)
+        self.bus.shutdown()
+
+def summary(seconds):
+    seconds = np.asarray(seconds) * 1e3
+    return {"n": int(len(seconds)), "mean_ms": float(seconds.mean()), "p50_ms": float(np.median(seconds)),
+            "p99_ms": float(np.percentile(seconds, 99)), "min_ms": float(seconds.min())}
+
+def bench_single_sdo(wrapper, nodeId, index, n):
+    latencies, errors = [], 0
+    for i in range(n):
+        subindex = i % 32 + 1
+        t0 = time.perf_counter()
+        result = wrapper.read_sdo_can_sync(nodeId, index, subindex, timeout=5)
+        latencies.append(time.perf_counter() - t0)
+        errors += result.data != adc_value(nodeId, subindex, 0)
+    return {**summary(latencies), "errors": int(errors)}
+
+def bench_sweep_sequential(wrapper, requests, repeat):
+    times, errors = [], 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for nodeId, index, subindex, bus in requests:
+            result = wrapper.read_sdo_can_sync(nodeId, index, subindex, bus=bus, timeout=5)
+            errors += result.data != adc_value(nodeId, subindex, bus)
+        times.append(time.perf_counter() - t0)
+    return {**summary(times), "requests": len(requests), "errors": int(errors)}
+
+def bench_sweep_batch(wrapper, requests, repeat):
+    times, errors = [], 0
+    expected = np.array([adc_value(nodeId, subindex, bus) for nodeId, _, subindex, bus in requests])
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        values, status = wrapper.read_sdo_batch_sync(requests, timeout=60)
+        times.append(time.perf_counter() - t0)
+        errors += int(np.count_nonzero(values != expected))
+    result = summary(times)
+    result.update({"requests": len(requests), "errors": errors, "requests_per_s": len(requests) / result["p50_ms"] * 1e3})
+    return result
+
+def bench_tx(wrapper, n):
+    data = bytes(8)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        wrapper.write_can_message_sync(0x181, data, dlc=8, timeout=5)
+    dt = time.perf_counter() - t0
+    return {"frames": n, "seconds": dt, "frames_per_s": n / dt}
+
+def bench_rx(wrapper, responder, n, timeout=30):
+    rx0 = wrapper.cnt['rx_msg']
+    t0 = time.perf_counter()
+    threading.Thread(target=responder.flood, args=(n,), daemon=True).start()
+    while wrapper.cnt['rx_msg'] - rx0 < n and time.perf_counter() - t0 < timeout:
+        time.sleep(0.001)
+    dt = time.perf_counter() - t0
+    received = wrapper.cnt['rx_msg'] - rx0
+    return {"frames": n, "received": int(received), "seconds": dt, "frames_per_s": received / dt}
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=rootdir, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Lower is better for the times, higher for the rates
+_METRICS = [("single_sdo", "p50_ms"), ("single_sdo", "p99_ms"), ("sweep_32_sequential", "p50_ms"),
+            ("sweep_32_batch", "p50_ms"), ("crate_sweep_batch", "p50_ms"), ("crate_sweep_batch", "requests_per_s"),
+            ("tx", "frames_per_s"), ("rx", "frames_per_s")]
+
+def compare(new, old):
+    print(f"\nComparison with {old.get('commit')} [{old.get('date')}]")
+    for case, key in _METRICS:
+        a, b = old["results"].get(case, {}).get(key), new["results"].get(case, {}).get(key)
+        if a is None or b is None:
+            continue
+        better = b < a if key.endswith("_ms") else b > a
+        print(f"{case + ' ' + key:<40} {a:>12.3f} -> {b:>12.3f}  x{b / a:6.2f} {'better' if better else 'worse'}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--interface", default="virtual_bus", choices=["virtual_bus", "virtual"],
+                        help="virtual_bus: python-can in-process bus, virtual: SocketCAN vcan")
+    parser.add_argument("--channel", type=int, default=0)
+    parser.add_argument("--nodes", type=int, default=16, help="Number of node IDs of the crate sweep")
+    parser.add_argument("--buses", type=int, default=4, help="Number of MOPSHUB buses of the crate sweep")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--n", type=int, default=500, help="Requests of the single SDO latency")
+    parser.add_argument("--frames", type=int, default=20000, help="Frames of the TX and RX rates")
+    parser.add_argument("--delay", type=float, default=0.0, help="Response time of the nodes in s")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None)
+    args = parser.parse_args()
+
+    od = load_object_dictionary(file="mops_config.yml", directory=config_dir)
+    index = od.adc[0].index
+    nodeIds = list(range(1, args.nodes + 1))
+    bustype = "virtual" if args.interface == "virtual_bus" else "socketcan"
+    responder = MopsResponder(bustype, channel_name(args.interface, args.channel), nodeIds, args.delay)
+    responder.start()
+    wrapper = CanWrapper(interface=args.interface, channel=args.channel, bitrate=125000, console_loglevel=logging.WARNING)
+    results = {}
+    try:
+        sweep = od.adc_requests([1])
+        crate = od.adc_requests(nodeIds, buses=range(args.buses))
+        results["single_sdo"] = bench_single_sdo(wrapper, 1, index, args.n)
+        results["sweep_32_sequential"] = bench_sweep_sequential(wrapper, sweep, args.repeat)
+        results["sweep_32_batch"] = bench_sweep_batch(wrapper, sweep, args.repeat)
+        results["crate_sweep_batch"] = bench_sweep_batch(wrapper, crate, args.repeat)
+        results["tx"] = bench_tx(wrapper, args.frames)
+        results["rx"] = bench_rx(wrapper, responder, args.frames)
+    finally:
+        wrapper.stop()
+        responder.stop()
+    report = {"commit": git_commit(), "date": time.strftime("%Y-%m-%d %H:%M:%S"), "python": platform.python_version(),
+              "python_can": can.__version__, "interface": args.interface, "channel": args.channel,
+              "nodes": args.nodes, "buses": args.buses, "results": results}
+    for case, result in results.items():
+        print(f"{case:<22} " + "  ".join(f"{k} {v:.3f}" if isinstance(v, float) else f"{k} {v}" for k, v in result.items()))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
@@ -0,0 +1,18 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+# pytest configuration of the automated tests [python -m pytest test_files]
+# The tests run against the MOPS simulator on the in-process python-can bus, no hardware is needed.
+import os
+import sys
+rootdir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, rootdir[:-11])
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# Scripts for the hardware [they talk to the interfaces when they are imported]
+collect_ignore = ["test_AnaGate.py", "test_GUI.py", "test_Kvaser.py", "test_SocketCAN.py"]
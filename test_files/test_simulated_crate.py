@@ -0,0 +1,475 @@
+########################################################
+"""
+    This file is part of the MOPS-Hub project.
+    Author: Ahmed Qamesh (University of Wuppertal)
+    email: ahmed.qamesh@cern.ch
+    Date: 18.10.2026
+"""
+########################################################
+# Automated tests of the acquisition stack against the MOPS simulator on the in-process python-can bus
+# python -m pytest test_files
+import os
+import time
+import queue
+import asyncio
+import itertools
+import threading
+import numpy as np
+import pytest
+pytest.importorskip("can")
+from canmops.can_wrapper_main import CanWrapper
+from canmops.mops_simulator import MopsSimulator, ABORT_NO_OBJECT
+from canmops.sdo_engine import SDO_OK, SDO_TIMEOUT, SDO_ABORT, SDO_SKIPPED
+from canmops.can_dispatcher import CanDispatcher, AsyncFrameQueue
+from canmops.can_ring_buffer import CanRingBuffer, CanMsgQueueView
+from canmops.node_health import NodeHealth, CLOSED, OPEN, HALF_OPEN
+from canmops.poll_scheduler import PollScheduler, object_periods
+from canmops.object_dictionary import load_object_dictionary
+from canmops.deadband import DeadbandFilter
+from canmops.metrics import MetricsRegistry
+from canmops.can_recorder import CanRecorder, open_recording, read_header, to_candump, interface_flag, \
+    FRAME_DTYPE, FLAG_TX, FLAG_EXTENDED
+from canmops.can_replay import CanReplay, read_candump
+
+rootdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADC_INDEX = 0x2400
+# Every test gets its own in-process bus
+_channels = itertools.count(40)
+
+def wait_for(condition, timeout=1.0):
+    """Wait until the simulator handled the last frames of the client [e.g. an abort]"""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return condition()
+
+@pytest.fixture
+def crate():
+    """Simulator with the nodes 1 and 2 on the buses 0 and 1 and a wrapper on the same bus"""
+    channel = next(_channels)
+    simulator = MopsSimulator(interface="virtual_bus", channel=channel, bootup=False, seed=1)
+    simulator.populate([1, 2], buses=(0, 1))
+    simulator.start()
+    wrapper = CanWrapper(interface="virtual_bus", channel=channel, bitrate=125000, console_loglevel="WARNING")
+    yield simulator, wrapper
+    wrapper.stop()
+    simulator.stop()
+
+# SDO engine
+def test_sdo_batch_values_and_status(crate):
+    simulator, wrapper = crate
+    simulator.node(1, 0).set_adc(3, 1234)
+    simulator.node(2, 1).set_adc(3, 567)
+    # Park node 7 without sending any request
+    for _ in range(wrapper.node_health.failure_threshold):
+        wrapper.node_health.on_timeout(7, 0)
+    requests = [(1, ADC_INDEX, 1, 0),   # ADC channel 3 of node 1 on bus 0
+                (2, ADC_INDEX, 1, 1),   # ADC channel 3 of node 2 on bus 1
+                (5, ADC_INDEX, 1, 0),   # no such node
+                (1, 0x2000, 1, 0),      # no such object
+                (7, ADC_INDEX, 1, 0)]   # parked
+    values, status = wrapper.read_sdo_batch_sync(requests, timeout=5)
+    assert status.tolist() == [SDO_OK, SDO_OK, SDO_TIMEOUT, SDO_ABORT, SDO_SKIPPED]
+    assert values[:2].tolist() == [1234, 567]
+    skipped = wrapper.read_sdo_can_sync(nodeId=7, index=ADC_INDEX, subindex=1, timeout=5)
+    assert skipped.status == SDO_SKIPPED and skipped.data is None
+
+def test_sdo_batch_same_node_on_many_buses(crate):
+    simulator, wrapper = crate
+    for bus in (0, 1):
+        for nodeId in (1, 2):
+            simulator.node(nodeId, bus).set_adc(4, 100 * bus + nodeId)
+    requests = [(nodeId, ADC_INDEX, 2, bus) for bus in (0, 1) for nodeId in (1, 2)]
+    values, status = wrapper.read_sdo_batch_sync(requests, timeout=5)
+    assert (status == SDO_OK).all()
+    assert values.tolist() == [1, 2, 101, 102]
+
+def test_sdo_batch_aborts_segmented_uploads(crate):
+    simulator, wrapper = crate
+    import can
+    # Node 9 answers every upload with the initiate response of a segmented upload of 12 bytes
+    node = can.Bus(interface="virtual", channel=f"vbus{wrapper.get_channel()}", receive_own_messages=False)
+    received = []
+
+    def _respond():
+        while len(received) < 2:
+            msg = node.recv(1)
+            if msg is None:
+                break
+            if msg.arbitration_id != 0x609:
+                continue
+            received.append(bytes(msg.data))
+            if msg.data[0] == 0x40:
+                node.send(can.Message(arbitration_id=0x589, data=[0x41, *msg.data[1:4], 12, 0, 0, 0], is_extended_id=False))
+
+    responder = threading.Thread(target=_respond, daemon=True)
+    responder.start()
+    try:
+        values, status = wrapper.read_sdo_batch_sync([(9, 0x1008, 0, 1), (1, ADC_INDEX, 1, 0)], timeout=5)
+        responder.join(2)
+    finally:
+        node.shutdown()
+    assert status.tolist() == [SDO_ABORT, SDO_OK]
+    assert received[1][0] == 0x80 and received[1][1:4] == bytes((0x08, 0x10, 0))
+    assert wrapper.cnt['SDO_read_segmented_abort'] == 1
+
+def test_read_sdo_can(crate):
+    simulator, wrapper = crate
+    simulator.node(2, 0).set_adc(5, 2048)
+    result = wrapper.read_sdo_can_sync(nodeId=2, index=ADC_INDEX, subindex=3, timeout=5)
+    data, reqmsg, requestreg, respmsg, responsereg, status, errorResponse = result
+    assert (data, reqmsg, respmsg, status) == (2048, 1, 1, SDO_OK)
+    abort = wrapper.read_sdo_can_sync(nodeId=2, index=0x2000, subindex=1, timeout=5)
+    assert abort.data is None
+    assert int.from_bytes(bytes(abort.response[1][4:8]), 'little') == ABORT_NO_OBJECT
+
+# Segmented and block transfers
+FIRMWARE = 0x1F50
+
+@pytest.mark.parametrize("block", [False, True])
+def test_sdo_transfer_round_trip(crate, block):
+    simulator, wrapper = crate
+    node = simulator.node(1, 0)
+    node.blksize = 16
+    image = bytes(i % 251 for i in range(1000))
+    node.set_domain(FIRMWARE, 1, b"MOPS v1.2.3 image")
+    assert wrapper.upload_sdo_sync(nodeId=1, index=FIRMWARE, subindex=1, block=block, timeout=5) == b"MOPS v1.2.3 image"
+    # Several blocks [16 segments each] and segments with 1 to 7 bytes
+    for data in (image, image[:15], image[:13]):
+        assert wrapper.download_sdo_sync(nodeId=1, index=FIRMWARE, subindex=1, data=data, block=block, timeout=5)
+        assert node.domains[(FIRMWARE, 1)] == data
+        assert wrapper.upload_sdo_sync(nodeId=1, index=FIRMWARE, subindex=1, block=block, timeout=5) == data
+    kind = "block" if block else "segmented"
+    # The node counts a block upload when the end confirmation of the client arrives
+    assert wait_for(lambda: simulator.cnt[f'sdo_{kind}_upload'] == 4)
+    assert simulator.cnt[f'sdo_{kind}_download'] == 3
+    assert wrapper.cnt[f'SDO_{kind}_upload'] == 4 and wrapper.cnt[f'SDO_{kind}_download'] == 3
+
+def test_sdo_block_transfer_without_crc(crate):
+    simulator, wrapper = crate
+    wrapper.sdo_transfer.crc = False
+    simulator.node(1, 0).set_domain(FIRMWARE, 1, bytes(100))
+    assert wrapper.upload_sdo_sync(nodeId=1, index=FIRMWARE, subindex=1, block=True, timeout=5) == bytes(100)
+    assert wrapper.download_sdo_sync(nodeId=1, index=FIRMWARE, subindex=1, data=bytes(range(50)), block=True, timeout=5)
+
+def test_sdo_block_transfer_crc_mismatch(crate):
+    simulator, wrapper = crate
+    node = simulator.node(1, 0)
+    node.set_domain(FIRMWARE, 1, bytes(range(100)))
+    simulator.set_faults(1, 0, crc=1.0)
+    # The client checks the CRC of the upload, the node the one of the download
+    assert wrapper.upload_sdo_sync(nodeId=1, index=FIRMWARE, subindex=1, block=True, timeout=5) is None
+    assert not wrapper.download_sdo_sync(nodeId=1, index=FIRMWARE, subindex=1, data=bytes(50), block=True, timeout=5)
+    assert node.domains[(FIRMWARE, 1)] == bytes(range(100))
+    assert wait_for(lambda: simulator.cnt['sdo_client_abort'] == 1) and simulator.cnt['sdo_abort'] == 1
+    assert wrapper.cnt['SDO_transfer_abort'] == 2
+    simulator.set_faults(1, 0, crc=0.0)
+    assert wrapper.upload_sdo_sync(nodeId=1, index=FIRMWARE, subindex=1, block=True, timeout=5) == bytes(range(100))
+
+def test_sdo_segmented_transfer_toggle_error(crate):
+    simulator, wrapper = crate
+    node = simulator.node(1, 0)
+    node.set_domain(FIRMWARE, 1, bytes(range(30)))
+    simulator.set_faults(1, 0, toggle=1.0)
+    assert wrapper.upload_sdo_sync(nodeId=1, index=FIRMWARE, subindex=1, timeout=5) is None
+    assert not wrapper.download_sdo_sync(nodeId=1, index=FIRMWARE, subindex=1, data=bytes(20), timeout=5)
+    assert node.domains[(FIRMWARE, 1)] == bytes(range(30))
+    # Both transfers were aborted by the client
+    assert wait_for(lambda: simulator.cnt['sdo_client_abort'] == 2) and wrapper.cnt['SDO_transfer_abort'] == 2
+
+@pytest.mark.parametrize("block", [False, True])
+def test_sdo_transfer_abort_of_the_node(crate, block):
+    simulator, wrapper = crate
+    assert wrapper.upload_sdo_sync(nodeId=1, index=0x2000, subindex=1, block=block, timeout=5) is None
+    assert not wrapper.download_sdo_sync(nodeId=1, index=0x2000, subindex=1, data=bytes(20), block=block, timeout=5)
+    assert simulator.cnt['sdo_abort'] == 2 and wrapper.cnt['SDO_transfer_abort'] == 2
+    # The node is not left in a transfer
+    assert wrapper.read_sdo_can_sync(nodeId=1, index=ADC_INDEX, subindex=1, timeout=5).status == SDO_OK
+
+# PDO acquisition
+@pytest.mark.parametrize("n_channels", [6, None])
+def test_pdo_sweep_decodes_the_node_channel_matrix(crate, n_channels):
+    simulator, wrapper = crate
+    od = load_object_dictionary(os.path.join(rootdir, "config_files", "mops_config.yml"))
+    subindices = [int(s) for s in od.adc[0].subindices][:n_channels]
+    nodeIds = [1, 2]
+    expected = np.array([[100 * nodeId + k for k in range(len(subindices))] for nodeId in nodeIds])
+    for row, nodeId in enumerate(nodeIds):
+        for subindex, value in zip(subindices, expected[row]):
+            simulator.node(nodeId, 0).set_value(od.adc[0].index, subindex, value)
+    # The configuration is written with SDO downloads, do not let a busy test machine fail it
+    wrapper.set_sdo_timeout(0.5)
+    pdo = wrapper.run_coroutine_sync(wrapper.setup_pdo_acquisition(nodeIds=nodeIds, adc_index=od.adc[0].index, subindices=subindices,
+                                                                   dictionary_items=od.dev["Application"]["index_items"]), timeout=10)
+    assert pdo is not None and pdo.is_configured()
+    # 2 TPDOs of 4 channels, the other channels are read via SDO
+    assert [len(entries) for entries in pdo.pdo_map] == [4, min(len(subindices), 8) - 4]
+    assert len(pdo.polled) == max(len(subindices) - 8, 0)
+    values, status, ts = wrapper.run_coroutine_sync(pdo.read_sweep(), timeout=5)
+    assert values.shape == (len(nodeIds), len(subindices))
+    assert (status == SDO_OK).all()
+    assert (values == expected).all()
+    assert simulator.cnt['sync'] == 1 and simulator.cnt['tpdo'] == 2 * len(nodeIds)
+    # The nodes on the other bus are not configured
+    assert simulator.node(1, 1).tpdos() == []
+
+def test_pdo_decode_drops_unused_entries():
+    from canmops.pdo_acquisition import PdoAcquisition
+    pdo = PdoAcquisition(wrapper=None, nodeIds=[3, 4], subindices=[1, 2, 3, 4, 5], n_tpdo=2)
+    frames = np.zeros((3, 8), dtype=np.uint8)
+    frames[0, :8] = [1, 0, 2, 0, 3, 0, 4, 0]          # TPDO1 of node 3
+    frames[1, :8] = [5, 0, 0xFF, 0xFF, 0, 0, 0, 0]    # TPDO2 of node 3 [one mapped entry]
+    frames[2, :8] = [0x34, 0x12, 0, 0, 0, 0, 0, 0]    # TPDO1 of node 4
+    values, status = pdo.decode([0x183, 0x283, 0x184], frames)
+    assert values.tolist() == [[1, 2, 3, 4, 5], [0x1234, 0, 0, 0, 0]]
+    assert status.tolist() == [[SDO_OK] * 5, [SDO_OK] * 4 + [SDO_TIMEOUT]]
+
+# Receive path
+def test_dispatcher_routes_frames():
+    dispatcher = CanDispatcher(read_frame=lambda timeout: None)
+    observed = []
+    dispatcher.add_observer(lambda *frame: observed.append(frame[0]))
+    waiter = dispatcher.register_waiter(0x581, predicate=lambda frame: frame[1][3] == 2)
+    routed = dispatcher.route(0x582)
+    frames = [(0x581, bytes([0x43, 0, 0x24, 1, 0, 0, 0, 0]), 8, False, 0.0, False),   # rejected by the predicate
+              (0x581, bytes([0x43, 0, 0x24, 2, 0, 0, 0, 0]), 8, False, 0.1, False),
+              (0x582, bytes(8), 8, False, 0.2, False),
+              (0x700, bytes(1), 1, False, 0.3, False)]
+    for frame in frames:
+        dispatcher.dispatch(frame)
+    assert observed == [0x581, 0x581, 0x582, 0x700]
+    assert waiter.wait(0) == frames[1]
+    assert routed.get_nowait() == frames[2]
+    # Frames which were not routed are queued in order of arrival
+    assert dispatcher.get(0) == frames[0]
+    assert dispatcher.get(0) == frames[3]
+    assert dispatcher.get(0) is None
+    dispatcher.unroute(0x582, routed)
+    dispatcher.dispatch(frames[2])
+    with pytest.raises(queue.Empty):
+        routed.get_nowait()
+
+def test_dispatcher_wakes_coroutines():
+    dispatcher = CanDispatcher(read_frame=lambda timeout: None)
+    frame = (0x583, bytes(8), 8, False, 0.0, False)
+
+    async def _wait():
+        waiter = dispatcher.register_waiter(0x583)
+        routed = dispatcher.route(0x584, AsyncFrameQueue())
+        threading.Timer(0.01, dispatcher.dispatch, args=(frame,)).start()
+        threading.Timer(0.02, dispatcher.dispatch, args=((0x584,) + frame[1:],)).start()
+        return await waiter.wait_async(1), await routed.get(1), await routed.get(0.01)
+
+    received, routed, timeout = asyncio.run(_wait())
+    assert received == frame
+    assert routed[0] == 0x584
+    assert timeout is None
+
+def test_ring_buffer_readers_count_lost_frames():
+    ring = CanRingBuffer(capacity=8)
+    reader = ring.reader(start=0)
+    view = CanMsgQueueView(ring)
+    for i in range(20):
+        ring.push(0x580 + i, bytes([i] * 8), 8, 0, float(i), False)
+    assert ring.head == 20 and ring.tail() == 12
+    cobid, data, dlc, flag, t, error_frame = reader.get(0)
+    assert (cobid, data[0], t) == (0x580 + 12, 12, 12.0)
+    assert reader.lost == 12
+    assert len(reader.read()) == 7 and reader.pending() == 0
+    # The queue view keeps the newest frame at index 0 and pops the oldest one
+    assert view[0][0] == 0x580 + 19
+    assert view.pop()[0] == 0x580 + 12
+    assert view.lost == 12
+
+# Metrics
+def test_metrics_export_assigned_counters_as_gauges():
+    metrics = MetricsRegistry()
+    metrics.counters.inc('rx_msg', 3)
+    metrics.counters['Residual CAN messages'] = 5
+    text = metrics.prometheus_text()
+    assert "# TYPE canmops_rx_msg_total counter" in text
+    assert "# TYPE canmops_residual_can_messages gauge\ncanmops_residual_can_messages 5.0" in text
+    assert "residual_can_messages_total" not in text
+    assert 'Residual CAN messages' not in metrics.rates()
+
+# Node health
+def test_node_health_parks_and_recovers():
+    health = NodeHealth(initial_timeout=0.01, failure_threshold=3, probe_interval=0.05)
+    for _ in range(3):
+        assert health.allow(4, 1)
+        health.on_timeout(4, 1)
+    assert health.state(4, 1) == OPEN and health.parked() == [(1, 4)]
+    assert not health.allow(4, 1)
+    time.sleep(0.06)
+    # One probe is let through, the others wait for its result
+    assert health.allow(4, 1) and health.state(4, 1) == HALF_OPEN
+    assert not health.allow(4, 1)
+    health.on_response(4, 1, rtt=0.002)
+    assert health.state(4, 1) == CLOSED and health.parked() == []
+    assert health.cnt['node_parked'] == 1 and health.cnt['node_recovered'] == 1
+
+def test_breaker_parks_offline_node_and_recovers(crate):
+    simulator, wrapper = crate
+    wrapper.node_health.probe_interval = 0.05
+    requests = [(1, ADC_INDEX, 1, 0), (2, ADC_INDEX, 1, 0)]
+    simulator.set_online(2, 0, False)
+    for _ in range(3):
+        values, status = wrapper.read_sdo_batch_sync(requests, timeout=5)
+    assert wrapper.node_health.parked() == [(0, 2)]
+    assert status.tolist() == [SDO_OK, SDO_SKIPPED]
+    simulator.set_online(2, 0, True)
+    time.sleep(0.06)
+    values, status = wrapper.read_sdo_batch_sync(requests, timeout=5)
+    assert status.tolist() == [SDO_OK, SDO_OK]
+    assert wrapper.node_health.parked() == []
+
+# Polling and publishing
+def test_poll_scheduler_keeps_the_periods(crate):
+    simulator, wrapper = crate
+    readings = {}
+
+    def _count(t, requests, values, status):
+        for request, st in zip(requests, status.tolist()):
+            readings.setdefault(request[2], []).append(st)
+
+    scheduler = PollScheduler(wrapper, callback=_count)
+    scheduler.add(1, ADC_INDEX, 1, period=0.02)
+    scheduler.add(1, ADC_INDEX, 2, period=0.2)
+    scheduler.start()
+    time.sleep(0.5)
+    scheduler.stop()
+    assert all(st == SDO_OK for statuses in readings.values() for st in statuses)
+    assert len(readings[1]) >= 4 * len(readings[2]) > 0
+    assert scheduler.latest[(0, 1, ADC_INDEX, 1)][2] == SDO_OK
+    assert scheduler.statistics()["overruns"] == 0
+
+def test_poll_scheduler_adds_an_object_once(crate):
+    simulator, wrapper = crate
+    reads = []
+    scheduler = PollScheduler(wrapper, callback=lambda t, requests, values, status: reads.extend(requests))
+    scheduler.add(1, ADC_INDEX, 1, period=0.1)
+    scheduler.add(1, ADC_INDEX, 1, period=0.1)
+    scheduler.start()
+    time.sleep(1.0)
+    scheduler.stop()
+    assert 9 <= len(reads) <= 12
+
+def test_object_periods_reject_unknown_objects():
+    od = load_object_dictionary(os.path.join(rootdir, "config_files", "mops_config.yml"))
+    objects = object_periods(od, {**od.dev["polling"], "0x2400:1F": 0.1})
+    assert (0x2400, 0x1F, 0.1) in objects
+    with pytest.raises(ValueError, match="0x2FFF"):
+        object_periods(od, {"0x2FFF": 1.0})
+    with pytest.raises(ValueError, match="0x2400:7F"):
+        object_periods(od, {"0x2400:7F": 1.0})
+
+def test_deadband_suppresses_until_heartbeat():
+    deadband = DeadbandFilter(absolute=0.5, heartbeat=1.0)
+    key = (0, 1, 3)
+    assert deadband.accept(key, 1.0, t=0.0)
+    assert not deadband.accept(key, 1.3, t=0.1)        # inside the band
+    assert not deadband.accept(key, 1.4, t=0.9)
+    assert deadband.accept(key, 1.4, t=1.05)           # heartbeat
+    assert deadband.accept(key, 2.0, t=1.1)            # left the band
+    assert deadband.accept(key, None, t=1.2)           # no response
+    assert not deadband.accept(key, None, t=1.3)
+    assert deadband.statistics()["published"] == 4 and deadband.statistics()["suppressed"] == 3
+    samples = [(t, 0, 2, 3, 0, 5.0) for t in (0.0, 0.5, 1.5)]
+    assert [s[0] for s in deadband.filter(samples)] == [0.0, 1.5]
+
+def test_value_table_coalesces_repaints():
+    QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+    from canmopsGUI.value_table import ValueTableModel, ALARM_ROLE, NORMAL, WARNING, ALARM
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    model = ValueTableModel([f"Ch{c}" for c in range(6)])
+    changed = []
+    model.dataChanged.connect(lambda first, last, roles: changed.append((first.row(), last.row())))
+    model.set_values([1.0, 2.0, np.nan, 4.0])
+    model.set_value(5, 6.0)
+    model.flush()
+    # One signal per run of adjacent rows
+    assert changed == [(0, 3), (5, 5)]
+    changed.clear()
+    model.set_values([1.0, 2.0, np.nan, 4.0])
+    model.flush()
+    assert changed == []
+    model.set_alarm_limits(high=5.0, warning=(3.5, 4.5))
+    assert model.data(model.index(3, 0), ALARM_ROLE) == WARNING
+    assert model.data(model.index(5, 0), ALARM_ROLE) == ALARM
+    assert model.data(model.index(0, 0), ALARM_ROLE) == NORMAL
+    assert model.data(model.index(2, 0)) == "None" and model.data(model.index(4, 0)) is None
+    assert model.alarm_level() == ALARM
+
+# Recording and replay
+def test_recorder_replay_round_trip(crate, tmp_path):
+    simulator, wrapper = crate
+    filename = str(tmp_path / "trace.canrec")
+    wrapper.start_recorder(filename, flush_interval=0.05)
+    requests = [(nodeId, ADC_INDEX, s, bus) for bus in (0, 1) for nodeId in (1, 2) for s in range(1, 5)]
+    values, status = wrapper.read_sdo_batch_sync(requests, timeout=5)
+    wrapper.stop_recorder()
+    assert (status == SDO_OK).all()
+    records = open_recording(filename)
+    assert read_header(filename)["channel"] == f"virtual_bus{wrapper.get_channel()}"
+    rx = records[(records["flags"] & FLAG_TX) == 0]
+    # A busy machine may retry a request and record its late response as well
+    assert len(records) - len(rx) == len(requests) + wrapper.cnt['SDO_read_retry']
+    assert len(rx) >= len(requests)
+    assert not (records["flags"] & FLAG_EXTENDED).any()
+    # Replay the responses as fast as possible into a callable
+    frames = []
+    replay = CanReplay(filename, lambda *frame: frames.append(frame), speed=0, retime=False)
+    assert replay.play()["frames"] == len(rx)
+    assert [f[0] for f in frames] == rx["cobid"].tolist()
+    assert [f[1] for f in frames] == [bytes(d) for d in rx["data"]]
+    assert set(values.tolist()) <= {int.from_bytes(f[1][4:7], 'little') for f in frames}
+    # The candump export reads back the same frames
+    logfile = str(tmp_path / "trace.log")
+    assert to_candump(filename, logfile) == len(records)
+    candump = read_candump(logfile)
+    assert candump["cobid"].tolist() == records["cobid"].tolist()
+    assert (candump["data"] == records["data"]).all()
+
+def test_replay_into_the_receive_path(crate, tmp_path):
+    simulator, wrapper = crate
+    filename = str(tmp_path / "trace.canrec")
+    wrapper.start_recorder(filename, flush_interval=0.05)
+    wrapper.read_sdo_batch_sync([(1, ADC_INDEX, 1, 0), (2, ADC_INDEX, 1, 1)], timeout=5)
+    wrapper.stop_recorder()
+    recorded = int(((open_recording(filename)["flags"] & FLAG_TX) == 0).sum())
+    rx = wrapper.cnt['rx_msg']
+    wrapper.canMsgQueue.clear()
+    replay = CanReplay(filename, wrapper, speed=0)
+    replay.play()
+    assert recorded >= 2
+    assert wrapper.cnt['rx_msg'] == rx + recorded
+    assert len(wrapper.canMsgQueue) == recorded
+
+@pytest.mark.parametrize("interface, flag", [(None, True), ("Kvaser", 0x0004), ("AnaGate", 0x0001)])
+def test_replay_keeps_the_interface_flag(tmp_path, interface, flag):
+    records = np.zeros(2, dtype=FRAME_DTYPE)
+    records["cobid"] = [0x18FF0001, 0x581]
+    records["dlc"] = 8
+    records["flags"] = [FLAG_EXTENDED, 0]
+    records["t"] = [0.0, 0.001]
+    recorder = CanRecorder(str(tmp_path / "replayed.canrec"), interface=interface, flush_interval=0.01)
+    dispatcher = CanDispatcher(read_frame=lambda timeout: None)
+    dispatcher.add_observer(recorder.record)
+    CanReplay(records, dispatcher, speed=0, interface=interface).play()
+    assert [frame[3] for frame in dispatcher._unrouted] == [flag, interface_flag(False, interface)]
+    # The observers read the extended bit from the interface flag
+    recorder.start()
+    recorder.stop()
+    assert open_recording(recorder.filename)["flags"].tolist() == [FLAG_EXTENDED, 0]
+
+# ADC conversion
+def test_adc_calibration_is_opt_in(tmp_path):
+    od = load_object_dictionary(os.path.join(rootdir, "config_files", "mops_config.yml"))
+    converter = od.converter()
+    assert converter.convert([[1000] * len(converter.channels)])[0][0] == pytest.approx(8.1967, abs=1e-4)
+    calibration_file = tmp_path / "calibration.csv"
+    calibration_file.write_text("chip,calib_a,calib_b\n1,1,2\n1,1,2\n2,1,0\n")
+    calibrated = od.converter(calibration_file=str(calibration_file))
+    assert calibrated.convert([[1000] * len(converter.channels)])[0][0] == pytest.approx(8.2131, abs=1e-4)
+    with pytest.raises(ValueError, match="Chip 1"):
+        od.converter(calibration_file=os.path.join(rootdir, "config_files", "adc_calibration.csv"))